@@ -4,10 +4,18 @@
 import os
 from dotenv import load_dotenv
 import traceback
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, jsonify, render_template, request
 from log_utils.logging_config import configure_logging
 from app.api.routes_api import api_bp
 from app.api.routes_signing import signing_bp
+from app.api.routes_assets import assets_bp
+from app.core.resilience import dependency_snapshot
+from app.core.tracing import install_tracing
+from app.core.metrics import (
+    install_request_metrics, instrument_engine, metrics_authorized, render_metrics, set_deferred_pending
+)
+from app.integrations.salesforce.budget import get_budget
+from app.integrations.ringcentral.dispatcher import get_dispatcher
 
 # Load environment variables
 load_dotenv("/srv/shared/.env")
@@ -26,12 +34,50 @@ def create_app():
     # Register blueprints
     app.register_blueprint(api_bp)
     app.register_blueprint(signing_bp)
+    app.register_blueprint(assets_bp)
+
+    # A trace per request (X-Request-ID / traceparent), see app/core/tracing.py
+    install_tracing(app)
+
+    # Request counts/latency and Postgres statement timings for /metrics
+    install_request_metrics(app)
+    try:
+        from app.db.session import get_engine
+        instrument_engine(get_engine())
+    except Exception:
+        logger.warning("Database unavailable; query metrics disabled", exc_info=True)
 
     # Health check endpoint
     @app.route("/health")
     def health():
         return {"status": "ok"}, 200
 
+    # Circuit breaker / bulkhead state, Salesforce API consumption and webhook
+    # delivery counters for monitoring (never calls the dependencies)
+    @app.route("/health/dependencies")
+    def health_dependencies():
+        return {
+            "dependencies": dependency_snapshot(),
+            "salesforce_api_budget": get_budget().snapshot(),
+            "webhooks": get_dispatcher().snapshot(),
+        }, 200
+
+    # Prometheus scrape endpoint (aggregates all gunicorn workers, see app/core/metrics.py)
+    @app.route("/metrics")
+    def metrics():
+        if not metrics_authorized(request.headers.get("Authorization")):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        try:
+            from app.db.session import get_session
+            from app.db.models import DeferredTask
+            session = get_session()
+            set_deferred_pending(session.query(DeferredTask).filter_by(status="pending").count())
+            session.rollback()
+        except Exception:
+            logger.warning("Could not count deferred tasks for /metrics", exc_info=True)
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
     # Public thank-you route
     @app.route("/thank-you")
     def thank_you():
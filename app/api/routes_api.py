@@ -5,16 +5,19 @@ import hashlib
 import traceback
 from time import time
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 
-import requests
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, Response, request, jsonify, render_template
 
 from log_utils.logging_config import configure_logging
 from app.db.models import SignatureRequest, SignatureStatus
 from app.db.session import get_session
 from app.core.signer import embed_signature_on_pdf
+from app.core.signature_vector import parse_vector_signature
+from app.core.preview_warming import warm_preview
 from app.core.pdf_loader import get_template_path
+from app.core.export import SignedExport
+from app.core.metrics import StageTimer
+from app.integrations.ringcentral.dispatcher import enqueue_webhook, NOTIFY_INITIATED
 
 logger = configure_logging("apps.esign.routes_api", "esign.log")
 
@@ -66,6 +69,7 @@ def should_send_webhook() -> bool:
 @api_bp.route("/initiate", methods=["POST"])
 def initiate_signature():
     try:
+        timer = StageTimer("initiate_signature")
         if not is_valid_hmac_request(request):
             return jsonify({"error": "Unauthorized"}), 401
 
@@ -76,6 +80,7 @@ def initiate_signature():
         if not all(field in data for field in required_fields):
             logger.warning(f"Missing required fields in signature request. Provided fields: {list(data.keys())}")
             return jsonify({"error": "Missing required fields"}), 400
+        timer.lap("validate")
 
         session = get_session()
 
@@ -109,32 +114,37 @@ def initiate_signature():
 
         session.add(signature_request)
         session.commit()
+        timer.lap("create")
         logger.info(f"Successfully created signature request for client: {data.get('client_name')}")
 
+        # Render the preview in the background so the first view of the link does not wait for it
+        try:
+            warm_preview(signature_request.id)
+        except Exception as e:
+            logger.error(f"Failed to queue preview warm-up: {e}")
+        timer.lap("warm_preview")
+
         if should_send_webhook():
             try:
-                rc_webhook_url = os.environ.get("RC_WEBHOOK_URL")
-                if rc_webhook_url:
-                    expires_date = signature_request.expires_at.date().isoformat() if signature_request.expires_at else ""
-                    rc_payload = {
-                        "text": (
-                            f"📝 New document ready for signing:\n"
-                            f"🔗 URL: {full_url}\n"
-                            f"👤 Name: {data.get('client_name', '')}\n"
-                            f"📧 Email: {data.get('client_email', '')}\n"
-                            f"📄 Template: {data.get('template_type', '')}\n"
-                            f"🏢 Salesforce Case ID: {data.get('salesforce_case_id', '')}\n"
-                            f"📋 Envelope Document ID: {data.get('envelope_document_id', 'Not yet assigned')}\n"
-                            f"📊 Status: {signature_request.status.value.title()}\n"
-                            f"⏰ Created: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
-                            f"📅 Expires: {expires_date}\n"
-                            f"🎫 Token: {token[:8]}..."
-                        )
-                    }
-                    rc_response = requests.post(rc_webhook_url, json=rc_payload)
-                    logger.info(f"Posted signing URL to RingCentral webhook: {rc_response.status_code} {rc_response.text}")
+                expires_date = signature_request.expires_at.date().isoformat() if signature_request.expires_at else ""
+                enqueue_webhook(
+                    f"📝 New document ready for signing:\n"
+                    f"🔗 URL: {full_url}\n"
+                    f"👤 Name: {data.get('client_name', '')}\n"
+                    f"📧 Email: {data.get('client_email', '')}\n"
+                    f"📄 Template: {data.get('template_type', '')}\n"
+                    f"🏢 Salesforce Case ID: {data.get('salesforce_case_id', '')}\n"
+                    f"📋 Envelope Document ID: {data.get('envelope_document_id', 'Not yet assigned')}\n"
+                    f"📊 Status: {signature_request.status.value.title()}\n"
+                    f"⏰ Created: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
+                    f"📅 Expires: {expires_date}\n"
+                    f"🎫 Token: {token[:8]}...",
+                    kind=NOTIFY_INITIATED,
+                    summary=f"{data.get('client_name', '')} ({data.get('template_type', '')}) {full_url}",
+                )
             except Exception as e:
-                logger.error(f"Error posting to RingCentral webhook: {e}")
+                logger.error(f"Error queueing RingCentral webhook: {e}")
+        timer.lap("notify")
 
         return jsonify({
             "message": "Signature request created",
@@ -190,14 +200,50 @@ def update_envelope_id():
     }), 200
 
 
+@api_bp.route("/export/signed", methods=["POST"])
+def export_signed_documents():
+    """
+    Stream a zip of the signed PDFs for a case and/or signed_at date range,
+    with manifest.csv first. JSON body: salesforce_case_id, signed_from,
+    signed_to (ISO dates; signed_to is exclusive).
+    """
+    if not is_valid_hmac_request(request):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        signed_from, signed_to = (
+            datetime.fromisoformat(data[field]) if data.get(field) else None
+            for field in ("signed_from", "signed_to")
+        )
+        export = SignedExport(data.get("salesforce_case_id"), signed_from, signed_to)
+    except ValueError as e:
+        logger.warning(f"Rejected export request: {e}")
+        return jsonify({"error": str(e)}), 400
+
+    logger.info(f"Starting signed document export {export.filename}")
+    response = Response(export.stream(), mimetype="application/zip")
+    response.headers.set("Content-Disposition", "attachment", filename=export.filename)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
 @api_bp.route("/sign/<token>", methods=["POST"])
 def sign_document(token):
     try:
+        timer = StageTimer("sign_document")
         logger.info(f"Processing document signing request for token: {token[:8]}...")
         data = request.get_json()
-        if not data or not data.get("consent") or not data.get("signature"):
+        if not data or not data.get("consent") or not (data.get("signature") or data.get("signature_vector")):
             logger.warning(f"Missing consent or signature in request for token: {token[:8]}...")
             return jsonify({"error": "Consent and signature are required"}), 400
+        if data.get("signature_vector") is not None:
+            try:
+                parse_vector_signature(data["signature_vector"])
+            except ValueError as e:
+                logger.warning(f"Rejected vector signature for token {token[:8]}...: {e}")
+                return jsonify({"error": "Invalid signature data"}), 400
+        timer.lap("validate")
 
         session = get_session()
         token_hash = hashlib.sha256(token.encode()).hexdigest()
@@ -214,6 +260,7 @@ def sign_document(token):
         if signature_request.expires_at < datetime.now(timezone.utc):
             logger.warning(f"Signature link expired. Token: {token[:8]}..., Expires: {signature_request.expires_at}")
             return jsonify({"error": "This link has expired"}), 403
+        timer.lap("lookup")
 
         signature_request.status = SignatureStatus.Completed
         signature_request.signed_at = datetime.now(timezone.utc)
@@ -221,23 +268,18 @@ def sign_document(token):
             signature_request.signed_ip = request.remote_addr
         signature_request.user_agent = request.headers.get("User-Agent", "Unknown")
 
-        # Create signed/YYYYMMDD subdirectory and pass it to embed_signature_on_pdf
-        signed_root = Path("signed").resolve()
-        today_folder = datetime.now().strftime("%Y%m%d")
-        dated_dir = signed_root / today_folder
-        dated_dir.mkdir(parents=True, exist_ok=True)
-
-        base_name = f"{token_hash[:8]}_signed.pdf"
-        output_path = dated_dir / base_name
-
+        # embed_signature_on_pdf stores the PDF under signed/YYYYMMDD/ and returns its storage key
         final_output_path = embed_signature_on_pdf(
             template_key=signature_request.template_type,
-            output_path=str(output_path),
-            signature_b64=data.get("signature"),
+            output_path=f"signed/{token_hash[:8]}_signed.pdf",
+            signature_b64=data.get("signature") or "",
             client_name=signature_request.client_name,
             sign_date=datetime.utcnow().strftime("%Y-%m-%d"),
+            signature_request_id=signature_request.id,
+            signature_vector=data.get("signature_vector"),
         )
         signature_request.pdf_path = final_output_path
+        timer.lap("generate")
 
         log_entry = create_audit_log_event(
             "signed",
@@ -250,6 +292,7 @@ def sign_document(token):
             signature_request.audit_log = [log_entry]
 
         session.commit()
+        timer.lap("commit")
         logger.info(f"Successfully processed signature for client: {signature_request.client_name}")
         return render_template("thank-you.html", client_name=signature_request.client_name)
     except Exception:
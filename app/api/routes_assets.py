@@ -0,0 +1,38 @@
+# File: /srv/apps/esign/app/api/routes_assets.py
+
+from log_utils.logging_config import configure_logging
+logger = configure_logging("apps.esign.routes_assets", "esign.log")
+
+import mimetypes
+from flask import Blueprint, abort, request, send_file
+from app.core.assets import asset_file
+
+assets_bp = Blueprint("esign_assets", __name__, url_prefix="/assets")
+
+# Fingerprinted names change with their content, so browsers and proxies may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@assets_bp.route("/<path:filename>", methods=["GET", "HEAD"])
+def serve_asset(filename):
+    """Serve a fingerprinted asset, precompressed (br, then gzip) when the client accepts it."""
+    found = asset_file(filename, request.accept_encodings)
+    if found is None:
+        abort(404)
+    path, encoding = found
+    try:
+        response = send_file(
+            path,
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            conditional=True,
+            etag=True,
+            max_age=31536000,
+        )
+    except FileNotFoundError:
+        logger.warning(f"Asset {filename} was removed while being served")
+        abort(404)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add("Accept-Encoding")
+    return response
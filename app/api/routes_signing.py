@@ -3,25 +3,92 @@
 from log_utils.logging_config import configure_logging
 logger = configure_logging("apps.esign.routes_signing", "esign.log")
 
-from flask import Blueprint, render_template, abort, request, send_file, jsonify
+from flask import Blueprint, Response, render_template, abort, request, jsonify, redirect, url_for
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 from app.db.session import get_session
 from app.db.models import SignatureRequest, SignatureStatus
 from datetime import datetime, timezone, timedelta
 import hashlib
-from app.core.pdf_loader import get_template_path
+import uuid
 import os
 import requests
 from app.core.signer import embed_signature_on_pdf
-from utils.dropbox_api.upload_file import upload_file_to_team_folder
+from app.core.signature_vector import parse_vector_signature
+from app.core.storage import (
+    get_storage, publish_to_team_folder, send_artifact, file_delivery_mode, team_folder_storage, ArtifactNotFoundError
+)
+from app.core.artifacts import find_artifact, set_remote_path, KIND_PREVIEW, KIND_SIGNED
+from app.core.compaction import find_archived
+from app.core.assets import asset_url
+from app.core.metrics import StageTimer
+from app.core.preview_warming import cached_preview_filename, ensure_preview, warm_preview
+from app.core.view_counter import record_view, PAGE_SIGN, PAGE_FINAL_REVIEW
+from app.core.signing_jobs import (
+    create_job, get_job, job_state, open_event_stream, event_streams_enabled, run_job,
+    STAGE_GENERATE, STAGE_UPLOAD, STAGE_RECORDS, STAGE_FINALIZE
+)
 from app.api.update_envelope_document import update_envelope_document, find_envelope_id_by_token, send_webhook_if_enabled
+from app.core.resilience import DependencyUnavailableError
+from app.core.deferred import defer_task, KIND_DROPBOX_UPLOAD, KIND_SALESFORCE_UPDATE
+from app.integrations.ringcentral.dispatcher import (
+    NOTIFY_SIGNED_UPLOADED, NOTIFY_UPLOAD_FAILED, NOTIFY_SALESFORCE_UPDATED
+)
 
 signing_bp = Blueprint("esign_signing", __name__, url_prefix="/v1/sign")
 
 
+@signing_bp.app_context_processor
+def inject_asset_url():
+    # Templates link CSS/JS through the asset manifest (fingerprinted when built)
+    return {"asset_url": asset_url}
+
+
+# Browser cache lifetime for served PDFs; responses are private and revalidated with ETags
+PDF_CACHE_MAX_AGE = int(os.environ.get("ESIGN_PDF_CACHE_MAX_AGE", "3600"))
+
+# Largest signature image accepted as a binary upload (multipart part or raw body)
+SIGNATURE_MAX_BYTES = int(os.environ.get("ESIGN_SIGNATURE_MAX_BYTES", str(1024 * 1024)))
+SIGNATURE_READ_SIZE = 64 * 1024
+
+
 def should_send_webhook() -> bool:
     return os.environ.get("DISABLE_WEBHOOKS", "").lower() != "true"
 
 
+def _read_capped(stream, limit: int) -> bytes:
+    """Read a body or upload part, failing with 413 as soon as it passes `limit` bytes."""
+    data = bytearray()
+    while True:
+        chunk = stream.read(min(SIGNATURE_READ_SIZE, limit + 1 - len(data)))
+        if not chunk:
+            return bytes(data)
+        data += chunk
+        if len(data) > limit:
+            raise RequestEntityTooLarge(f"Signature image is larger than {limit} bytes")
+
+
+def _signature_payload() -> tuple:
+    """
+    (signature_b64, signature_vector, signature_image) from the request:
+    JSON with base64 or strokes, a multipart form with a binary
+    "signature" part, a raw application/octet-stream or image/* body, or
+    a urlencoded form with base64 (older clients).
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        return data.get("signature"), data.get("signature_vector"), None
+    if request.mimetype == "application/octet-stream" or request.mimetype.startswith("image/"):
+        # Also lets werkzeug read chunked bodies, which it skips when no limit is set
+        request.max_content_length = SIGNATURE_MAX_BYTES
+        return None, None, _read_capped(request.stream, SIGNATURE_MAX_BYTES)
+    # Room for the multipart framing, or for base64 in a urlencoded form
+    request.max_content_length = SIGNATURE_MAX_BYTES * 2
+    upload = request.files.get("signature")
+    if upload is not None:
+        return None, None, _read_capped(upload.stream, SIGNATURE_MAX_BYTES)
+    return request.form.get("signature"), None, None
+
+
 @signing_bp.route("/<token>", methods=["GET"])
 def sign_document(token):
     logger.info(f"Processing signature request for token: {token[:8]}...")
@@ -42,38 +109,54 @@ def sign_document(token):
     if signature_request.expires_at < datetime.now(timezone.utc):
         return "This link has expired.", 403
 
-    try:
-        template_path = get_template_path(signature_request.template_type)
-        preview_dir = os.path.abspath("preview")
-        os.makedirs(preview_dir, exist_ok=True)
-        prefill_path = os.path.join(preview_dir, f"{token_hash[:8]}_sample.pdf")
-
-        actual_preview_path = embed_signature_on_pdf(
-            template_key=os.path.splitext(os.path.basename(template_path))[0],
-            output_path=prefill_path,
-            signature_b64="",
-            client_name=signature_request.client_name,
-            sign_date=datetime.utcnow().strftime("%Y-%m-%d"),
-            test_mode=False,
-            is_preview=True
-        )
+    # Rendered by the warm-up queued at initiate time; if it is not ready the frame
+    # loads it from the on-demand endpoint, so this response never waits on PDF work
+    record_view(signature_request.id, PAGE_SIGN)
+    preview_filename = cached_preview_filename(signature_request)
+    if preview_filename is not None:
+        preview_url = url_for("esign_signing.serve_prefilled_pdf", filename=preview_filename)
+    else:
+        try:
+            warm_preview(signature_request.id)
+        except Exception as e:
+            logger.error(f"Failed to queue preview warm-up: {e}")
+        preview_url = url_for("esign_signing.serve_preview_on_demand", token=token)
 
-        signature_request.preview_path = actual_preview_path
-        session.commit()
+    return render_template(
+        "sign.html",
+        client_name=signature_request.client_name,
+        token=token,
+        preview_url=preview_url
+    )
 
-        return render_template(
-            "sign.html",
-            client_name=signature_request.client_name,
-            token=token,
-            prefill_filename=os.path.basename(actual_preview_path)
-        )
+
+@signing_bp.route("/<token>/preview", methods=["GET"])
+def serve_preview_on_demand(token):
+    """Redirect to the request's preview, waiting for (or doing) its render first."""
+    session = get_session()
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    signature_request = session.query(SignatureRequest).filter_by(token_hash=token_hash).first()
+    if not signature_request:
+        abort(404)
+    if signature_request.status not in [SignatureStatus.Sent, SignatureStatus.Delivered]:
+        abort(403)
+    if signature_request.expires_at < datetime.now(timezone.utc):
+        abort(403)
+
+    try:
+        preview_filename = ensure_preview(signature_request)
     except Exception:
         logger.exception("Failed to prepare document")
         return "An error occurred while preparing the document.", 500
+    if preview_filename is None:
+        logger.error(f"Preview for {signature_request.id} was rendered but is not indexed")
+        return "An error occurred while preparing the document.", 500
+    return redirect(url_for("esign_signing.serve_prefilled_pdf", filename=preview_filename))
 
 
 @signing_bp.route("/<token>", methods=["POST"])
 def submit_signature(token):
+    timer = StageTimer("submit_signature")
     logger.info(f"Submitting signature for token: {token[:8]}...")
     session = get_session()
     token_hash = hashlib.sha256(token.encode()).hexdigest()
@@ -87,117 +170,254 @@ def submit_signature(token):
 
     if signature_request.expires_at < datetime.now(timezone.utc):
         return jsonify({"error": "Link expired."}), 403
+    timer.lap("lookup")
 
-    signature_b64 = (request.get_json(silent=True) or {}).get("signature") if request.is_json else request.form.get("signature")
-    if not signature_b64:
+    try:
+        signature_b64, signature_vector, signature_image = _signature_payload()
+    except RequestEntityTooLarge:
+        logger.warning(f"Signature upload over {SIGNATURE_MAX_BYTES} bytes for token {token[:8]}...")
+        return jsonify({"error": "Signature image is too large."}), 413
+    # Strokes from the signature pad are drawn as vector paths; the PNG is the fallback
+    if signature_vector is not None:
+        try:
+            parse_vector_signature(signature_vector)
+        except ValueError as e:
+            logger.warning(f"Rejected vector signature for token {token[:8]}...: {e}")
+            return jsonify({"error": "Invalid signature data."}), 400
+    elif not signature_b64 and not signature_image:
         return jsonify({"error": "Missing signature data."}), 400
+    timer.lap("validate")
 
+    # The pipeline runs in the background; the page follows its stages through the job status
+    signed_ip = request.headers.get("X-Forwarded-For", request.remote_addr).split(",")[0].strip()
+    user_agent = request.headers.get("User-Agent", "")
     try:
-        signed_dir = os.path.abspath("signed")
-        os.makedirs(signed_dir, exist_ok=True)
-        output_path = os.path.join(signed_dir, f"{token_hash[:8]}_signed.pdf")
-
-        signed_pdf_path = embed_signature_on_pdf(
-            template_key=signature_request.template_type,
-            output_path=output_path,
-            signature_b64=signature_b64,
-            client_name=signature_request.client_name,
-            sign_date=datetime.utcnow().strftime("%Y-%m-%d")
-        )
+        job, created = create_job(signature_request.id)
+        if created:
+            run_job(job.id, _complete_signing, signature_request.id, token,
+                    signature_b64=signature_b64, signature_vector=signature_vector, signature_image=signature_image,
+                    signed_ip=signed_ip, user_agent=user_agent)
+        else:
+            logger.info(f"Signature for token {token[:8]}... already in progress as job {job.id}")
+    except Exception:
+        logger.exception("Error processing signature")
+        return jsonify({"error": "Error saving signed document."}), 500
+    timer.lap("enqueue")
 
-        signature_request.status = SignatureStatus.Completed
-        signature_request.signed_at = datetime.utcnow()
-        signature_request.pdf_path = signed_pdf_path
-        signature_request.signed_ip = request.headers.get("X-Forwarded-For", request.remote_addr).split(",")[0].strip()
-        signature_request.user_agent = request.headers.get("User-Agent", "")
-        if isinstance(signature_request.audit_log, list):
-            signature_request.audit_log.append({
-                "event": "signed",
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            })
-        session.commit()
+    payload = {
+        "job_id": str(job.id),
+        "status_url": url_for("esign_signing.signing_job_status", token=token, job_id=job.id),
+    }
+    if event_streams_enabled():
+        payload["events_url"] = url_for("esign_signing.signing_job_events", token=token, job_id=job.id)
+    return jsonify(payload), 202
+
+
+def _complete_signing(progress, signature_request_id, token: str, signature_b64: str = None,
+                      signature_vector: dict = None, signature_image: bytes = None,
+                      signed_ip: str = None, user_agent: str = ""):
+    """The signing pipeline behind a SigningJob; each stage is reported to `progress` as it finishes."""
+    session = get_session()
+    signature_request = session.get(SignatureRequest, signature_request_id)
+    token_hash = signature_request.token_hash
+
+    progress.start(STAGE_GENERATE)
+    signed_pdf_path = embed_signature_on_pdf(
+        template_key=signature_request.template_type,
+        output_path=f"signed/{token_hash[:8]}_signed.pdf",
+        signature_b64=signature_b64 or "",
+        client_name=signature_request.client_name,
+        sign_date=datetime.utcnow().strftime("%Y-%m-%d"),
+        signature_request_id=signature_request.id,
+        signature_vector=signature_vector,
+        signature_image=signature_image
+    )
+
+    signature_request.status = SignatureStatus.Completed
+    signature_request.signed_at = datetime.utcnow()
+    signature_request.pdf_path = signed_pdf_path
+    signature_request.signed_ip = signed_ip
+    signature_request.user_agent = user_agent
+    if isinstance(signature_request.audit_log, list):
+        signature_request.audit_log.append({
+            "event": "signed",
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+    session.commit()
+    signed_artifact = get_storage().stat(signed_pdf_path)
+    progress.done(STAGE_GENERATE)
 
-        # Upload to Dropbox team folder using proven approach
-        upload_success, dropbox_path = upload_file_to_team_folder(
-            local_path=signed_pdf_path,
-            filename=os.path.basename(signed_pdf_path)
+    # Make the signed PDF available in the Dropbox team folder (each Dropbox call is guarded inside)
+    progress.start(STAGE_UPLOAD)
+    upload_success, upload_deferred = False, False
+    try:
+        upload_success, dropbox_path = publish_to_team_folder(signed_pdf_path)
+    except DependencyUnavailableError as e:
+        logger.warning(f"Dropbox unavailable, deferring upload of {signed_pdf_path}: {e}")
+        upload_deferred = True
+    except Exception as e:
+        logger.error(f"Dropbox upload error for {signed_pdf_path}: {e}")
+
+    if upload_success:
+        logger.info(f"Successfully uploaded to Dropbox: {dropbox_path}")
+        set_remote_path(signed_pdf_path, dropbox_path)
+        send_webhook_if_enabled(
+            f"✅ Document signed and uploaded to Dropbox:\n"
+            f"Client: {signature_request.client_name}\n"
+            f"Email: {signature_request.client_email}\n"
+            f"Template: {signature_request.template_type}\n"
+            f"Local Path: {signed_artifact.location}\n"
+            f"Dropbox Path: {dropbox_path}\n"
+            f"File Size: {signed_artifact.size} bytes\n"
+            f"Signed At: {signature_request.signed_at.isoformat()}\n"
+            f"Salesforce Case: {signature_request.salesforce_case_id}\n"
+            f"Envelope ID: {signature_request.envelope_document_id or 'TBD'}",
+            NOTIFY_SIGNED_UPLOADED,
+            f"{signature_request.client_name} ({signature_request.template_type}) {dropbox_path}",
+        )
+    else:
+        logger.error(f"Failed to upload {signed_pdf_path} to Dropbox team folder")
+        # Continue with Salesforce update even if Dropbox upload fails
+        dropbox_path = f"UPLOAD_FAILED: {signed_pdf_path}"
+        if upload_deferred:
+            defer_task(KIND_DROPBOX_UPLOAD, {
+                "signature_request_id": str(signature_request.id),
+                "storage_key": signed_pdf_path,
+                "filename": os.path.basename(signed_pdf_path),
+                "envelope_document_id": signature_request.envelope_document_id,
+            })
+        send_webhook_if_enabled(
+            f"❌ Document signed but Dropbox upload failed:\n"
+            f"Client: {signature_request.client_name}\n"
+            f"Email: {signature_request.client_email}\n"
+            f"Template: {signature_request.template_type}\n"
+            f"Local Path: {signed_artifact.location}\n"
+            f"Error: Dropbox upload failed\n"
+            f"Signed At: {signature_request.signed_at.isoformat()}\n"
+            f"Salesforce Case: {signature_request.salesforce_case_id}\n"
+            f"Envelope ID: {signature_request.envelope_document_id or 'TBD'}",
+            NOTIFY_UPLOAD_FAILED,
         )
+
+    progress.done(STAGE_UPLOAD)
+
+    # Salesforce update with Dropbox path (migration-safe)
+    progress.start(STAGE_RECORDS)
+    try:
+        salesforce_updates = {
+            "dropbox_file_path__c": dropbox_path,  # Use Dropbox path instead of local path
+            "Envelope_Status__c": "Completed",
+            "Sign_Date__c": signature_request.signed_at.isoformat(),
+            "Expiration_Date__c": signature_request.expires_at.date().isoformat()
+        }
+        lookup_deferred = False
+        envelope_document_id = signature_request.envelope_document_id
+        if not envelope_document_id:
+            try:
+                envelope_document_id = find_envelope_id_by_token(signature_request.token)
+            except DependencyUnavailableError as e:
+                # The replay looks the envelope up by token before updating it
+                logger.warning(f"Salesforce unavailable, deferring envelope lookup and update for "
+                               f"request {signature_request.id}: {e}")
+                defer_task(KIND_SALESFORCE_UPDATE, {
+                    "token": signature_request.token,
+                    "signature_request_id": str(signature_request.id),
+                    "updates": salesforce_updates,
+                })
+                lookup_deferred = True
+                envelope_document_id = None
+            except Exception as e:
+                logger.warning(f"Could not find envelope by token (expected during migration): {e}")
+                envelope_document_id = None
         
-        if upload_success:
-            logger.info(f"Successfully uploaded to Dropbox: {dropbox_path}")
-            send_webhook_if_enabled(
-                f"✅ Document signed and uploaded to Dropbox:\n"
-                f"Client: {signature_request.client_name}\n"
-                f"Email: {signature_request.client_email}\n"
-                f"Template: {signature_request.template_type}\n"
-                f"Local Path: {signed_pdf_path}\n"
-                f"Dropbox Path: {dropbox_path}\n"
-                f"File Size: {os.path.getsize(signed_pdf_path)} bytes\n"
-                f"Signed At: {signature_request.signed_at.isoformat()}\n"
-                f"Salesforce Case: {signature_request.salesforce_case_id}\n"
-                f"Envelope ID: {signature_request.envelope_document_id or 'TBD'}"
-            )
-        else:
-            logger.error(f"Failed to upload {signed_pdf_path} to Dropbox team folder")
-            # Continue with Salesforce update even if Dropbox upload fails
-            dropbox_path = f"UPLOAD_FAILED: {signed_pdf_path}"
-            send_webhook_if_enabled(
-                f"❌ Document signed but Dropbox upload failed:\n"
-                f"Client: {signature_request.client_name}\n"
-                f"Email: {signature_request.client_email}\n"
-                f"Template: {signature_request.template_type}\n"
-                f"Local Path: {signed_pdf_path}\n"
-                f"Error: Dropbox upload failed\n"
-                f"Signed At: {signature_request.signed_at.isoformat()}\n"
-                f"Salesforce Case: {signature_request.salesforce_case_id}\n"
-                f"Envelope ID: {signature_request.envelope_document_id or 'TBD'}"
-            )
-
-        # Salesforce update with Dropbox path (migration-safe)
-        try:
-            envelope_document_id = signature_request.envelope_document_id
-            if not envelope_document_id:
-                try:
-                    envelope_document_id = find_envelope_id_by_token(signature_request.token)
-                except Exception as e:
-                    logger.warning(f"Could not find envelope by token (expected during migration): {e}")
-                    envelope_document_id = None
+        if envelope_document_id:
+            signature_request.envelope_document_id = envelope_document_id
+            session.commit()
             
-            if envelope_document_id:
-                signature_request.envelope_document_id = envelope_document_id
-                session.commit()
-                
-                try:
-                    update_envelope_document({
-                        "dropbox_file_path__c": dropbox_path,  # Use Dropbox path instead of local path
-                        "Envelope_Status__c": "Completed",
-                        "Sign_Date__c": signature_request.signed_at.isoformat(),
-                        "Expiration_Date__c": signature_request.expires_at.date().isoformat()
-                    }, envelope_document_id)
-                    logger.info(f"Salesforce updated for envelope {envelope_document_id} with Dropbox path: {dropbox_path}")
-                    send_webhook_if_enabled(
-                        f"✅ Salesforce updated successfully:\n"
-                        f"Client: {signature_request.client_name}\n"
-                        f"Envelope ID: {envelope_document_id}\n"
-                        f"Dropbox Path: {dropbox_path}\n"
-                        f"Status: Completed\n"
-                        f"Sign Date: {signature_request.signed_at.isoformat()}\n"
-                        f"Salesforce Case: {signature_request.salesforce_case_id}"
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to update Salesforce envelope {envelope_document_id}: {e}")
-                    logger.info("Continuing with signing process despite Salesforce update failure")
-            else:
-                logger.warning("No envelope_document_id available for Salesforce update (expected during migration)")
-                logger.info(f"Dropbox path would be: {dropbox_path}")
-        except Exception as e:
-            logger.error(f"Salesforce integration error: {e}")
-            logger.info("Continuing with signing process despite Salesforce error")
+            try:
+                update_envelope_document(salesforce_updates, envelope_document_id)
+                logger.info(f"Salesforce updated for envelope {envelope_document_id} with Dropbox path: {dropbox_path}")
+                send_webhook_if_enabled(
+                    f"✅ Salesforce updated successfully:\n"
+                    f"Client: {signature_request.client_name}\n"
+                    f"Envelope ID: {envelope_document_id}\n"
+                    f"Dropbox Path: {dropbox_path}\n"
+                    f"Status: Completed\n"
+                    f"Sign Date: {signature_request.signed_at.isoformat()}\n"
+                    f"Salesforce Case: {signature_request.salesforce_case_id}",
+                    NOTIFY_SALESFORCE_UPDATED,
+                    f"{signature_request.client_name}: Envelope {envelope_document_id} completed",
+                )
+            except DependencyUnavailableError as e:
+                logger.warning(f"Salesforce unavailable, deferring update of envelope {envelope_document_id}: {e}")
+                defer_task(KIND_SALESFORCE_UPDATE, {
+                    "record_id": envelope_document_id,
+                    "updates": salesforce_updates,
+                })
+            except Exception as e:
+                logger.error(f"Failed to update Salesforce envelope {envelope_document_id}: {e}")
+                logger.info("Continuing with signing process despite Salesforce update failure")
+        elif not lookup_deferred:
+            logger.warning("No envelope_document_id available for Salesforce update (expected during migration)")
+            logger.info(f"Dropbox path would be: {dropbox_path}")
+    except Exception as e:
+        logger.error(f"Salesforce integration error: {e}")
+        logger.info("Continuing with signing process despite Salesforce error")
+    progress.done(STAGE_RECORDS)
+
+    # The final review page serves the signed PDF through the artifact index
+    progress.start(STAGE_FINALIZE)
+    if find_artifact(os.path.basename(signed_pdf_path), KIND_SIGNED) is None:
+        raise RuntimeError(f"Signed PDF {signed_pdf_path} is not available")
+    progress.done(STAGE_FINALIZE)
+    progress.complete(f"/v1/sign/final/{token}")
+
+
+def _job_for_token(token: str, job_id: str):
+    """The signing job, if it belongs to the request behind this token."""
+    try:
+        job = get_job(uuid.UUID(job_id))
+    except ValueError:
+        return None
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    signature_request = get_session().query(SignatureRequest.id).filter_by(token_hash=token_hash).first()
+    if job is None or signature_request is None or job.signature_request_id != signature_request.id:
+        return None
+    return job
 
-        return jsonify({"redirect_url": f"/v1/sign/final/{token}"})
-    except Exception:
-        logger.exception("Error processing signature")
-        return jsonify({"error": "Error saving signed document."}), 500
+
+@signing_bp.route("/<token>/jobs/<job_id>/events", methods=["GET"])
+def signing_job_events(token, job_id):
+    """Server-Sent Events with the stages of a signing job."""
+    job = _job_for_token(token, job_id)
+    if job is None:
+        abort(404)
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", "0"))
+    except ValueError:
+        last_event_id = 0
+    events = open_event_stream(job.id, last_event_id=last_event_id)
+    if events is None:
+        # Streams off or at the per-process cap: the page falls back to polling the status
+        return Response("Event streams unavailable; poll the job status.", status=503,
+                        headers={"Retry-After": "5"}, mimetype="text/plain")
+    return Response(
+        events,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@signing_bp.route("/<token>/jobs/<job_id>", methods=["GET"])
+def signing_job_status(token, job_id):
+    """JSON state of a signing job, for clients that poll instead of streaming."""
+    job = _job_for_token(token, job_id)
+    if job is None:
+        abort(404)
+    state = job_state(job)
+    if state["error"]:
+        state["error"] = "Error saving signed document."
+    return jsonify(state)
 
 
 @signing_bp.route("/final/<token>", methods=["GET"])
@@ -209,12 +429,18 @@ def final_review(token):
     if not signature_request or signature_request.status != SignatureStatus.Completed:
         abort(403)
 
-    if isinstance(signature_request.audit_log, list):
-        signature_request.audit_log.append({
+    # Only the first view goes into the audit log; repeat views are counted in memory
+    audit_log = signature_request.audit_log if isinstance(signature_request.audit_log, list) else None
+    if audit_log is not None and not any(
+        isinstance(event, dict) and event.get("event") == "final_review_viewed" for event in audit_log
+    ):
+        # A new list, so the JSON column is seen as changed
+        signature_request.audit_log = audit_log + [{
             "event": "final_review_viewed",
             "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+        }]
         session.commit()
+    record_view(signature_request.id, PAGE_FINAL_REVIEW)
 
     return render_template(
         "final_review.html",
@@ -224,34 +450,51 @@ def final_review(token):
     )
 
 
+def _send_indexed_artifact(artifact, filename: str, route: str, as_attachment: bool = False):
+    """
+    Conditional, range-capable response for an indexed artifact (strong ETag
+    from its SHA-256). The route name selects the delivery mode, so e.g.
+    downloads can be offloaded to nginx while previews stay in the app.
+    Signed PDFs compacted into a date-folder archive are read from it, and
+    those whose local copy retention removed are streamed from the team folder.
+    """
+    options = dict(
+        download_name=filename,
+        as_attachment=as_attachment,
+        sha256=artifact.sha256,
+        size=artifact.size,
+        last_modified=artifact.created_at,
+        max_age=PDF_CACHE_MAX_AGE,
+    )
+    if artifact.local_deleted_at is None:
+        try:
+            return send_artifact(artifact.storage_key, delivery=file_delivery_mode(route), **options)
+        except ArtifactNotFoundError:
+            archived = find_archived(artifact.storage_key)
+            if archived is not None:
+                archived_options = dict(options, sha256=archived.sha256, size=archived.size)
+                return send_artifact(artifact.storage_key, archive=(archived.archive_key, archived.offset),
+                                     **archived_options)
+            if not artifact.remote_path:
+                raise
+    if not artifact.remote_path:
+        raise ArtifactNotFoundError(artifact.storage_key)
+    return send_artifact(artifact.remote_path, storage=team_folder_storage(), **options)
+
+
 @signing_bp.route("/preview/<filename>", methods=["GET"])
 def serve_prefilled_pdf(filename):
     """Serve preview PDF files for document preview."""
     try:
-        preview_dir = os.path.abspath("preview")
-        
-        # First try direct path
-        file_path = os.path.join(preview_dir, filename)
-        
-        # If not found, search in dated subdirectories
-        if not os.path.exists(file_path):
-            # Look for the file in dated subdirectories (YYYYMMDD format)
-            for subdir in os.listdir(preview_dir):
-                subdir_path = os.path.join(preview_dir, subdir)
-                if os.path.isdir(subdir_path) and subdir.isdigit() and len(subdir) == 8:
-                    potential_file = os.path.join(subdir_path, filename)
-                    if os.path.exists(potential_file):
-                        file_path = potential_file
-                        break
-        
-        # Security check: ensure file is within preview directory tree
-        if not os.path.commonpath([preview_dir, file_path]) == preview_dir:
-            abort(403)
-        
-        if not os.path.exists(file_path):
+        artifact = find_artifact(filename, KIND_PREVIEW)
+        if not artifact:
             abort(404)
-            
-        return send_file(file_path, mimetype='application/pdf')
+        return _send_indexed_artifact(artifact, filename, "preview")
+    except ArtifactNotFoundError:
+        logger.error(f"Preview file missing from storage: {filename}")
+        abort(404)
+    except HTTPException:
+        raise
     except Exception:
         logger.exception(f"Error serving preview PDF: {filename}")
         abort(500)
@@ -260,15 +503,15 @@ def serve_prefilled_pdf(filename):
 @signing_bp.route("/signed/<filename>", methods=["GET"])
 def serve_signed_pdf(filename):
     """Serve signed PDF files."""
-    signed_root = os.path.abspath("signed")
-    for dated_folder in sorted(os.listdir(signed_root), reverse=True):
-        candidate_path = os.path.join(signed_root, dated_folder, filename)
-        if os.path.exists(candidate_path):
-            try:
-                return send_file(candidate_path, mimetype='application/pdf', as_attachment=False, download_name=filename)
-            except Exception:
-                logger.exception("Error serving signed PDF")
-                abort(500)
+    artifact = find_artifact(filename, KIND_SIGNED)
+    if artifact:
+        try:
+            return _send_indexed_artifact(artifact, filename, "signed", as_attachment=False)
+        except ArtifactNotFoundError:
+            pass
+        except Exception:
+            logger.exception("Error serving signed PDF")
+            abort(500)
     logger.error(f"Signed file not found: {filename}")
     abort(404)
 
@@ -276,15 +519,15 @@ def serve_signed_pdf(filename):
 @signing_bp.route("/download/<filename>", methods=["GET"])
 def download_signed_pdf(filename):
     """Download signed PDF files as attachment."""
-    signed_root = os.path.abspath("signed")
-    for dated_folder in sorted(os.listdir(signed_root), reverse=True):
-        candidate_path = os.path.join(signed_root, dated_folder, filename)
-        if os.path.exists(candidate_path):
-            try:
-                return send_file(candidate_path, mimetype='application/pdf', as_attachment=True, download_name=filename)
-            except Exception:
-                logger.exception("Error downloading signed PDF")
-                abort(500)
+    artifact = find_artifact(filename, KIND_SIGNED)
+    if artifact:
+        try:
+            return _send_indexed_artifact(artifact, filename, "download", as_attachment=True)
+        except ArtifactNotFoundError:
+            pass
+        except Exception:
+            logger.exception("Error downloading signed PDF")
+            abort(500)
     logger.error(f"Signed file not found for download: {filename}")
     abort(404)
 
@@ -7,11 +7,21 @@ from simple_salesforce import Salesforce
 from dotenv import load_dotenv
 import logging
 
+from app.core.resilience import get_dependency, DependencyUnavailableError, SALESFORCE
+from app.core.metrics import record_retry
+from app.integrations.ringcentral.dispatcher import (
+    enqueue_webhook, NOTIFY_SALESFORCE_RETRY_FAILED, NOTIFY_SALESFORCE_FAILED
+)
+from app.integrations.salesforce.budget import (
+    get_budget, record_simple_salesforce_call, PRIORITY_CRITICAL, CALL_TOKEN, CALL_SOQL, CALL_UPDATE
+)
+
 load_dotenv("/srv/shared/.env")
 
 logger = logging.getLogger(__name__)
 
-def get_salesforce_token():
+def get_salesforce_token(priority: str = PRIORITY_CRITICAL):
+    get_budget().check(priority)
     try:
         client_id = os.environ["SALESFORCE_CLIENT_ID"]
         username = os.environ["SALESFORCE_USERNAME"]
@@ -30,13 +40,19 @@ def get_salesforce_token():
 
         assertion = jwt.encode(payload, private_key, algorithm="RS256")
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        response = requests.post(
-            f"{login_url}/services/oauth2/token",
-            headers=headers,
-            data={"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": assertion}
-        )
-        response.raise_for_status()
-        return response.json()
+
+        def request_token():
+            response = requests.post(
+                f"{login_url}/services/oauth2/token",
+                headers=headers,
+                data={"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": assertion},
+                timeout=10
+            )
+            get_budget().record(CALL_TOKEN, response.headers)
+            response.raise_for_status()
+            return response
+
+        return get_dependency(SALESFORCE).call(request_token).json()
     except requests.exceptions.RequestException as e:
         raise RuntimeError(f"Failed to obtain Salesforce token: {e}")
 
@@ -44,54 +60,72 @@ def should_send_webhook() -> bool:
     """Check if webhooks should be sent (respects DISABLE_WEBHOOKS setting)."""
     return os.environ.get("DISABLE_WEBHOOKS", "").lower() != "true"
 
-def send_webhook_if_enabled(message: str):
-    """Send webhook notification if webhooks are enabled."""
+def send_webhook_if_enabled(message: str, kind: str = None, summary: str = None):
+    """
+    Queue a webhook notification if webhooks are enabled (delivered in the background).
+    kind/summary let digest mode coalesce routine notifications, see WEBHOOK_NOTIFICATIONS.md.
+    """
     if not should_send_webhook():
         logger.info(f"Webhook disabled - would have sent: {message}")
         return
-        
+
     try:
-        webhook_url = os.environ.get("RC_WEBHOOK_URL")
-        if webhook_url:
-            import requests
-            response = requests.post(webhook_url, json={"text": message}, timeout=5)
-            logger.info(f"Webhook sent: {response.status_code}")
+        enqueue_webhook(message, kind=kind, summary=summary)
     except Exception as e:
-        logger.error(f"Failed to send webhook: {e}")
+        logger.error(f"Failed to queue webhook: {e}")
 
-def update_envelope_document(updates: dict, record_id: str, max_attempts: int = 3):
+def update_envelope_document(updates: dict, record_id: str, max_attempts: int = 3, priority: str = PRIORITY_CRITICAL):
     if not record_id:
         raise RuntimeError("No Envelope Document ID provided for update.")
 
-    token_data = get_salesforce_token()
+    token_data = get_salesforce_token(priority)
     sf = Salesforce(instance_url=token_data["instance_url"], session_id=token_data["access_token"])
+    envelope_documents = sf.Envelope_Document__c
+
+    def update():
+        try:
+            return envelope_documents.update(record_id, updates)
+        finally:
+            record_simple_salesforce_call(envelope_documents, CALL_UPDATE)
 
     for attempt in range(1, max_attempts + 1):
         try:
-            sf.Envelope_Document__c.update(record_id, updates)
+            get_budget().check(priority)
+            get_dependency(SALESFORCE).call(update)
             return
+        except DependencyUnavailableError:
+            # Breaker is open: stop retrying so the caller can defer the update
+            raise
         except Exception as e:
             error_msg = f"Salesforce update retry {attempt} failed for Envelope Document {record_id}: {e}"
             logger.warning(error_msg)
-            send_webhook_if_enabled(error_msg)
+            send_webhook_if_enabled(error_msg, NOTIFY_SALESFORCE_RETRY_FAILED)
             
             if attempt == max_attempts:
                 final_error_msg = f"Salesforce update failed for Envelope Document {record_id} after {max_attempts} attempts."
                 logger.error(final_error_msg)
-                send_webhook_if_enabled(final_error_msg)
+                send_webhook_if_enabled(final_error_msg, NOTIFY_SALESFORCE_FAILED)
                 raise RuntimeError(f"Failed to update Salesforce Envelope Document {record_id}: {e}")
+            record_retry(SALESFORCE, "update")
             time.sleep(2 ** (attempt - 1))
 
-def find_envelope_id_by_token(token: str) -> str | None:
+def find_envelope_id_by_token(token: str, priority: str = PRIORITY_CRITICAL) -> str | None:
     try:
-        token_data = get_salesforce_token()
+        token_data = get_salesforce_token(priority)
         sf = Salesforce(instance_url=token_data["instance_url"], session_id=token_data["access_token"])
 
         logger.info(f"Searching for Envelope Document with token: {token}")
 
         query = f"SELECT Id FROM Envelope_Document__c WHERE Signing_Token__c = '{token}' LIMIT 1"
         logger.info(f"Executing Salesforce query: {query}")
-        result = sf.query(query)
+
+        def run_query():
+            try:
+                return sf.query(query)
+            finally:
+                record_simple_salesforce_call(sf, CALL_SOQL)
+
+        result = get_dependency(SALESFORCE).call(run_query)
 
         if result.get("records"):
             record_id = result["records"][0]["Id"]
@@ -100,6 +134,8 @@ def find_envelope_id_by_token(token: str) -> str | None:
 
         logger.warning(f"No Envelope Document found for token: {token}")
         return None
+    except DependencyUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Failed to query Salesforce for token '{token}': {e}")
         raise RuntimeError(f"Failed to query Salesforce for token '{token}': {e}")
\ No newline at end of file
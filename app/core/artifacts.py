@@ -0,0 +1,135 @@
+# ------------------------------------------------------------------------
+# File: artifacts.py
+# Location: /srv/apps/esign/app/core/artifacts.py
+# Description:
+#     Artifact index. Every preview or signed PDF the signer writes is
+#     recorded in the artifacts table (request ID, filename, storage key,
+#     size, SHA-256), so the serve and download routes resolve a filename
+#     with one indexed lookup instead of scanning dated folders.
+#     Files written before the index existed (including ones since
+#     compacted into a signed/archive/ zip) are indexed by
+#     scripts/backfill_artifact_index.py, which must run once before the
+#     routes can serve them: a request never searches signature_requests.
+# ------------------------------------------------------------------------
+
+import hashlib
+import posixpath
+
+from log_utils.logging_config import configure_logging
+from app.db.models import Artifact, SignatureRequest
+from app.db.session import get_session
+from app.core.storage import get_storage, StoredArtifact, CHUNK_SIZE
+from app.core.compaction import find_archived
+
+logger = configure_logging(name="apps.esign.artifacts", logfile="esign.log", level=None)
+
+KIND_PREVIEW = "preview"
+KIND_SIGNED = "signed"
+
+
+def index_artifact(stored: StoredArtifact, kind: str, signature_request_id=None, session=None) -> Artifact:
+    """Insert or refresh the index row for a stored artifact."""
+    session = session or get_session()
+    filename = posixpath.basename(stored.key)
+    row = (
+        session.query(Artifact)
+        .filter(Artifact.signature_request_id == signature_request_id, Artifact.filename == filename)
+        .first()
+    )
+    if row is None:
+        row = Artifact(signature_request_id=signature_request_id, filename=filename)
+        session.add(row)
+    row.kind = kind
+    row.storage_key = stored.key
+    row.backend = stored.backend
+    row.size = stored.size
+    row.sha256 = stored.sha256 or row.sha256
+    session.commit()
+    return row
+
+
+def find_artifact(filename: str, kind: str) -> Artifact | None:
+    """Most recent indexed artifact of this kind with this filename."""
+    return (
+        get_session().query(Artifact)
+        .filter(Artifact.filename == filename, Artifact.kind == kind)
+        .order_by(Artifact.created_at.desc())
+        .first()
+    )
+
+
+def set_remote_path(storage_key: str, remote_path: str) -> None:
+    """Record where the team-folder copy of an artifact was uploaded."""
+    session = get_session()
+    updated = (
+        session.query(Artifact)
+        .filter(Artifact.storage_key == storage_key)
+        .update({Artifact.remote_path: remote_path}, synchronize_session=False)
+    )
+    session.commit()
+    if not updated:
+        logger.warning(f"No artifact index row for {storage_key}; remote path {remote_path} not recorded")
+
+
+def _sha256_of(storage, key: str) -> str:
+    digest = hashlib.sha256()
+    with storage.open(key) as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def backfill_index(batch_size: int = 500, compute_hash: bool = True, dry_run: bool = False) -> dict:
+    """
+    Index the preview and signed PDFs referenced by existing signature_requests
+    rows. Rows are paged by id; artifacts already indexed are skipped, so the
+    backfill can be re-run safely.
+    """
+    session = get_session()
+    storage = get_storage()
+    totals = {"rows": 0, "indexed": 0, "already_indexed": 0, "missing": 0, "unresolvable": 0}
+    last_id = None
+    while True:
+        query = session.query(SignatureRequest.id, SignatureRequest.preview_path, SignatureRequest.pdf_path).filter(
+            (SignatureRequest.preview_path.isnot(None)) | (SignatureRequest.pdf_path.isnot(None))
+        )
+        if last_id is not None:
+            query = query.filter(SignatureRequest.id > last_id)
+        rows = query.order_by(SignatureRequest.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        indexed = {
+            (request_id, filename)
+            for request_id, filename in session.query(Artifact.signature_request_id, Artifact.filename)
+            .filter(Artifact.signature_request_id.in_([row.id for row in rows]))
+        }
+        for row in rows:
+            totals["rows"] += 1
+            for kind, stored_path in ((KIND_PREVIEW, row.preview_path), (KIND_SIGNED, row.pdf_path)):
+                if not stored_path:
+                    continue
+                if (row.id, posixpath.basename(stored_path.replace("\\", "/"))) in indexed:
+                    totals["already_indexed"] += 1
+                    continue
+                try:
+                    key = storage.key_for(stored_path)
+                except ValueError:
+                    totals["unresolvable"] += 1
+                    logger.warning(f"Cannot map {stored_path} into {storage.name} storage")
+                    continue
+                stored = storage.stat(key)
+                if stored is None:
+                    archived = find_archived(key)
+                    if archived is None:
+                        totals["missing"] += 1
+                        continue
+                    stored = StoredArtifact(key, archived.size, archived.sha256, backend=storage.name)
+                if compute_hash and not stored.sha256:
+                    stored.sha256 = _sha256_of(storage, key)
+                if not dry_run:
+                    index_artifact(stored, kind, row.id, session=session)
+                totals["indexed"] += 1
+        logger.info(f"Artifact backfill progress: {totals}")
+    return totals
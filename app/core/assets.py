@@ -0,0 +1,162 @@
+# ------------------------------------------------------------------------
+# File: assets.py
+# Location: /srv/apps/esign/app/core/assets.py
+# Description:
+#     Fingerprinted static assets. build_assets() (scripts/build_assets.py,
+#     run on deploy) copies the CSS, JavaScript and images under app/static
+#     to app/static/dist with a content hash in the filename, writes gzip
+#     and brotli variants next to the text files, and records everything
+#     in dist/manifest.json:
+#
+#       {"css/esign-sign.css": {"path": "css/esign-sign.1a2b3c4d5e6f.css",
+#                               "encodings": ["br", "gzip"]}, ...}
+#
+#     Templates link assets with asset_url("css/esign-sign.css"), which
+#     returns the hashed URL served by /assets/ (app/api/routes_assets.py)
+#     with a year-long immutable Cache-Control, and falls back to the
+#     unversioned /static/esign/ URL when no build has been run. /assets/
+#     serves any fingerprinted file under the dist directory, not only the
+#     current manifest's, so pages rendered before a deploy keep loading
+#     the previous build's files until build_assets --clean removes them.
+#     Brotli variants need the Brotli package; without it only gzip is
+#     written.
+# ------------------------------------------------------------------------
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+from flask import current_app, url_for
+
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging(name="apps.esign.assets", logfile="esign.log", level=None)
+
+STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static"))
+DIST_DIR = os.environ.get("ESIGN_ASSET_DIR", os.path.join(STATIC_DIR, "dist"))
+MANIFEST_NAME = "manifest.json"
+ASSET_ENDPOINT = "esign_assets.serve_asset"
+
+FINGERPRINTED_DIRS = ("css", "js", "assets")
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt")
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[A-Za-z0-9]+$")
+
+_brotli_warned = False
+_manifest_lock = threading.Lock()
+_manifest_cache = (None, {})  # ((manifest path, mtime), entries)
+
+
+def _variants(data: bytes) -> dict:
+    """Compressed copies of `data` by content coding, kept only when smaller."""
+    global _brotli_warned
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        if not _brotli_warned:
+            logger.warning("Brotli is not installed; writing gzip variants only")
+            _brotli_warned = True
+    else:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def build_assets(static_dir: str = None, dist_dir: str = None, clean: bool = False) -> dict:
+    """Fingerprint and precompress the static assets; returns the manifest."""
+    static_dir = static_dir or STATIC_DIR
+    dist_dir = dist_dir or DIST_DIR
+    manifest, written = {}, set()
+    for folder in FINGERPRINTED_DIRS:
+        root = os.path.join(static_dir, folder)
+        for current, _, files in sorted(os.walk(root)):
+            for name in sorted(files):
+                source = os.path.join(current, name)
+                logical = os.path.relpath(source, static_dir).replace(os.sep, "/")
+                with open(source, "rb") as f:
+                    data = f.read()
+                stem, ext = os.path.splitext(logical)
+                hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+                outputs = {hashed: data}
+                encodings = []
+                if ext.lower() in COMPRESSIBLE:
+                    for encoding, body in sorted(_variants(data).items()):
+                        outputs[hashed + ENCODING_SUFFIXES[encoding]] = body
+                        encodings.append(encoding)
+                for relative, body in outputs.items():
+                    target = os.path.join(dist_dir, relative)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    # Hashed names never change content, so existing files are left alone
+                    if not os.path.exists(target):
+                        with open(target + ".tmp", "wb") as f:
+                            f.write(body)
+                        os.replace(target + ".tmp", target)
+                    written.add(relative)
+                manifest[logical] = {"path": hashed, "encodings": encodings}
+
+    if clean:
+        # Only with --clean: pages rendered before a deploy still reference the previous hashes
+        for current, _, files in os.walk(dist_dir):
+            for name in files:
+                relative = os.path.relpath(os.path.join(current, name), dist_dir).replace(os.sep, "/")
+                if relative != MANIFEST_NAME and relative not in written:
+                    os.remove(os.path.join(current, name))
+
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    logger.info(f"Built {len(manifest)} fingerprinted assets into {dist_dir}")
+    return manifest
+
+
+def load_manifest() -> dict:
+    """The asset manifest, re-read when the build replaces it; empty if there is none."""
+    global _manifest_cache
+    path = os.path.join(DIST_DIR, MANIFEST_NAME)
+    try:
+        version = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return {}
+    if _manifest_cache[0] != version:
+        with _manifest_lock:
+            if _manifest_cache[0] != version:
+                try:
+                    with open(path, "r") as f:
+                        _manifest_cache = (version, json.load(f))
+                except (OSError, ValueError):
+                    logger.exception(f"Unreadable asset manifest {path}")
+                    return {}
+    return _manifest_cache[1]
+
+
+def asset_url(filename: str) -> str:
+    """URL for a static asset: fingerprinted when built, the plain static URL otherwise."""
+    entry = load_manifest().get(filename)
+    if entry is not None and ASSET_ENDPOINT in current_app.view_functions:
+        return url_for(ASSET_ENDPOINT, filename=entry["path"])
+    return url_for("static", filename=f"esign/{filename}")
+
+
+def asset_file(path: str, accept_encodings) -> tuple[str, str | None] | None:
+    """
+    (file path, content coding) for a fingerprinted file of this or an
+    earlier build, preferring the best precompressed variant the client
+    accepts; None for anything else.
+    """
+    if not _HASHED_NAME.search(path):
+        return None
+    root = os.path.realpath(DIST_DIR)
+    target = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, target]) != root or not os.path.isfile(target):
+        return None
+    if os.path.splitext(target)[1].lower() in COMPRESSIBLE:
+        encodings = [encoding for encoding, suffix in ENCODING_SUFFIXES.items() if os.path.isfile(target + suffix)]
+        encoding = accept_encodings.best_match(encodings) if encodings else None
+        if encoding:
+            return target + ENCODING_SUFFIXES[encoding], encoding
+    return target, None
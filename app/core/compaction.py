@@ -0,0 +1,182 @@
+# ------------------------------------------------------------------------
+# File: compaction.py
+# Location: /srv/apps/esign/app/core/compaction.py
+# Description:
+#     Cold-storage compaction for signed PDFs. Each signed/YYYYMMDD folder
+#     older than ESIGN_COMPACT_AFTER_DAYS (default 60) is packed into one
+#     uncompressed zip, signed/archive/YYYYMMDD.zip, and the loose files
+#     and folder are removed. PDFs are already compressed, so members are
+#     stored as-is: every document is a contiguous byte range of the
+#     archive, and its data offset, size and SHA-256 are recorded in the
+#     archived_artifacts table. Serving one document seeks to its offset;
+#     the zip's central directory is never read on the request path.
+#
+#     Originals are only deleted after the archived copy has been read
+#     back and its hash checked, and the archive rows committed, so an
+#     interrupted run is simply re-run. Local storage only.
+# ------------------------------------------------------------------------
+
+import hashlib
+import os
+import re
+import struct
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+from log_utils.logging_config import configure_logging
+from app.db.models import ArchivedArtifact
+from app.db.session import get_session
+from app.core.storage import get_storage, CHUNK_SIZE
+
+logger = configure_logging(name="apps.esign.compaction", logfile="esign.log", level=None)
+
+SIGNED_PREFIX = "signed"
+ARCHIVE_PREFIX = "signed/archive"
+
+_DATE_FOLDER = re.compile(r"^\d{8}$")
+_LOCAL_HEADER = struct.Struct("<4s22xHH")  # signature ... file name length, extra field length
+
+
+def compact_after_days() -> int:
+    return int(os.environ.get("ESIGN_COMPACT_AFTER_DAYS", "60"))
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _data_offset(archive_file, info: zipfile.ZipInfo) -> int:
+    """Offset of a member's data, read from its local header (its extra field may differ from the central one)."""
+    archive_file.seek(info.header_offset)
+    signature, name_length, extra_length = _LOCAL_HEADER.unpack(archive_file.read(_LOCAL_HEADER.size))
+    if signature != b"PK\x03\x04":
+        raise ValueError(f"No local file header for {info.filename} at {info.header_offset}")
+    return info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+
+def _range_sha256(archive_file, offset: int, size: int) -> str:
+    archive_file.seek(offset)
+    digest = hashlib.sha256()
+    remaining = size
+    while remaining:
+        chunk = archive_file.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def find_archived(storage_key: str) -> ArchivedArtifact | None:
+    """Archive location of a compacted artifact, by the key it had before compaction."""
+    return get_session().query(ArchivedArtifact).filter(ArchivedArtifact.storage_key == storage_key).first()
+
+
+class Compaction:
+    """Packs old signed/ date folders into per-day archives."""
+
+    def __init__(self, older_than_days: int = None, dry_run: bool = False, limit: int = None, storage=None,
+                 now: datetime = None):
+        self.older_than_days = older_than_days if older_than_days is not None else compact_after_days()
+        self.dry_run = dry_run
+        self.limit = limit  # folders per run
+        self.storage = storage or get_storage()
+        self.now = now or datetime.now(timezone.utc)
+        self.totals = {"folders": 0, "files": 0, "bytes": 0, "already_archived": 0, "errors": 0}
+
+    def run(self) -> dict:
+        root = self.storage.local_path(SIGNED_PREFIX)
+        if not root:
+            logger.warning(f"Compaction needs local storage; {self.storage.name} storage is skipped")
+            return dict(self.totals, skipped=self.storage.name)
+        if os.path.isdir(root):
+            with os.scandir(root) as entries:
+                folders = sorted(entry.name for entry in entries if entry.is_dir() and _DATE_FOLDER.match(entry.name))
+            # The signer names date folders in server local time
+            local_cutoff = (self.now - timedelta(days=self.older_than_days)).astimezone().replace(tzinfo=None)
+            for folder in folders:
+                try:
+                    day_end = datetime.strptime(folder, "%Y%m%d") + timedelta(days=1)
+                except ValueError:
+                    continue
+                if day_end > local_cutoff:
+                    break  # folders are in date order; the rest are too recent
+                if self.limit is not None and self.totals["folders"] >= self.limit:
+                    break
+                self.compact_folder(folder)
+        result = dict(self.totals, dry_run=self.dry_run, older_than_days=self.older_than_days)
+        logger.info(f"Compaction finished: {result}")
+        return result
+
+    def compact_folder(self, folder: str) -> None:
+        folder_path = self.storage.local_path(f"{SIGNED_PREFIX}/{folder}")
+        with os.scandir(folder_path) as entries:
+            # Partial writes (*.tmp) belong to a signer still running
+            files = sorted((entry.name, entry.path) for entry in entries
+                           if entry.is_file() and not entry.name.endswith(".tmp"))
+        self.totals["folders"] += 1
+        if self.dry_run:
+            self.totals["files"] += len(files)
+            self.totals["bytes"] += sum(os.path.getsize(path) for _, path in files)
+            return
+
+        archive_key = f"{ARCHIVE_PREFIX}/{folder}.zip"
+        archive_path = self.storage.local_path(archive_key)
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        mode = "a" if os.path.exists(archive_path) else "w"
+        with zipfile.ZipFile(archive_path, mode, compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            members = set(archive.namelist())
+            for name, path in files:
+                if name not in members:
+                    archive.write(path, arcname=name)
+                else:
+                    # Left over from an interrupted run; checked against the original below
+                    self.totals["already_archived"] += 1
+            infos = {info.filename: info for info in archive.infolist()}
+
+        verified = []
+        with open(archive_path, "rb") as archive_file:
+            for name, path in files:
+                info = infos[name]
+                offset = _data_offset(archive_file, info)
+                sha256 = _file_sha256(path)
+                if info.file_size != os.path.getsize(path) or _range_sha256(archive_file, offset, info.file_size) != sha256:
+                    self.totals["errors"] += 1
+                    logger.error(f"Compaction: archived copy of {folder}/{name} does not match; original kept")
+                    continue
+                verified.append((name, path, offset, info.file_size, sha256))
+
+        session = get_session()
+        keys = [f"{SIGNED_PREFIX}/{folder}/{name}" for name, *_ in verified]
+        existing = {
+            row.storage_key: row
+            for row in session.query(ArchivedArtifact).filter(ArchivedArtifact.storage_key.in_(keys))
+        } if keys else {}
+        for key, (name, path, offset, size, sha256) in zip(keys, verified):
+            row = existing.get(key) or ArchivedArtifact(storage_key=key)
+            row.archive_key = archive_key
+            row.member = name
+            row.offset = offset
+            row.size = size
+            row.sha256 = sha256
+            session.add(row)
+        session.commit()
+
+        for name, path, offset, size, sha256 in verified:
+            os.remove(path)
+            self.totals["files"] += 1
+            self.totals["bytes"] += size
+        try:
+            os.rmdir(folder_path)
+        except OSError:
+            pass  # an original was kept, or a late write landed
+        logger.info(f"Compacted {len(verified)} files from {SIGNED_PREFIX}/{folder} into {archive_key}")
+
+
+def compact_signed_folders(older_than_days: int = None, dry_run: bool = False, **kwargs) -> dict:
+    """Compact signed/ date folders older than the given age and return totals."""
+    return Compaction(older_than_days, dry_run=dry_run, **kwargs).run()
@@ -0,0 +1,166 @@
+# ------------------------------------------------------------------------
+# File: deferred.py
+# Location: /srv/apps/esign/app/core/deferred.py
+# Description:
+#     Deferred task pipeline. When an outbound dependency is unavailable
+#     (its circuit breaker is open or its bulkhead is full) the signing
+#     routes record the work as a DeferredTask row instead of blocking the
+#     request. scripts/run_deferred_tasks.py replays pending tasks with
+#     exponential backoff once the dependency has recovered. A task keeps
+#     the trace it was deferred from (payload "trace"), so its replay shows
+#     up in the same trace. A Salesforce update deferred before its
+#     envelope was known carries the signing token instead of a record ID
+#     and looks the envelope up when it is replayed.
+# ------------------------------------------------------------------------
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from log_utils.logging_config import configure_logging
+from app.db.models import DeferredTask, SignatureRequest
+from app.db.session import get_session
+from app.core.tracing import current_context, span, SpanContext
+
+logger = configure_logging(name="apps.esign.deferred", logfile="esign.log", level=None)
+
+KIND_DROPBOX_UPLOAD = "dropbox_upload"
+KIND_SALESFORCE_UPDATE = "salesforce_update"
+
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 3600
+LEASE_SECONDS = 300
+
+
+def defer_task(kind: str, payload: dict, delay_seconds: int = 60) -> DeferredTask:
+    """Persist a task to be replayed by the deferred task runner."""
+    session = get_session()
+    trace = current_context()
+    if trace is not None:
+        payload = {**payload, "trace": trace.to_dict()}
+    task = DeferredTask(
+        kind=kind,
+        payload=payload,
+        status="pending",
+        attempts=0,
+        run_after=datetime.now(timezone.utc) + timedelta(seconds=delay_seconds),
+    )
+    session.add(task)
+    session.commit()
+    logger.info(f"Deferred {kind} task {task.id}")
+    return task
+
+
+def _handle_dropbox_upload(payload: dict) -> None:
+    from utils.dropbox_api.upload_file import upload_file_to_team_folder
+    from app.core.resilience import get_dependency, DROPBOX
+    from app.core.storage import publish_to_team_folder
+    from app.api.update_envelope_document import update_envelope_document
+
+    def upload_legacy():
+        # Tasks queued before the storage layer carry a local path
+        success, path = upload_file_to_team_folder(local_path=payload["local_path"], filename=payload["filename"])
+        if not success:
+            raise RuntimeError(f"Dropbox upload failed for {payload['local_path']}")
+        return path
+
+    if payload.get("storage_key"):
+        # Guards each Dropbox call itself; wrapping it in the dependency as well would starve those calls
+        success, dropbox_path = publish_to_team_folder(payload["storage_key"])
+        if not success:
+            raise RuntimeError(f"Dropbox upload failed for {payload['storage_key']}")
+    else:
+        dropbox_path = get_dependency(DROPBOX).call(upload_legacy)
+    logger.info(f"Deferred Dropbox upload completed: {dropbox_path}")
+    if payload.get("storage_key"):
+        from app.core.artifacts import set_remote_path
+        set_remote_path(payload["storage_key"], dropbox_path)
+
+    envelope_document_id = payload.get("envelope_document_id")
+    if envelope_document_id:
+        # A follow-up task keeps the upload from being repeated if only Salesforce fails
+        try:
+            update_envelope_document({"dropbox_file_path__c": dropbox_path}, envelope_document_id)
+        except Exception as e:
+            logger.warning(f"Deferring Salesforce path update for {envelope_document_id}: {e}")
+            defer_task(KIND_SALESFORCE_UPDATE, {
+                "record_id": envelope_document_id,
+                "updates": {"dropbox_file_path__c": dropbox_path},
+            })
+
+
+def _handle_salesforce_update(payload: dict) -> None:
+    from app.api.update_envelope_document import update_envelope_document, find_envelope_id_by_token
+
+    record_id = payload.get("record_id")
+    if not record_id:
+        # Deferred before the envelope was known: find it by the signing token first
+        record_id = find_envelope_id_by_token(payload["token"])
+        if not record_id:
+            logger.warning(f"No envelope document for request {payload.get('signature_request_id')}, "
+                           f"deferred Salesforce update dropped")
+            return
+        if payload.get("signature_request_id"):
+            session = get_session()
+            signature_request = session.get(SignatureRequest, uuid.UUID(payload["signature_request_id"]))
+            if signature_request is not None and not signature_request.envelope_document_id:
+                signature_request.envelope_document_id = record_id
+                session.commit()
+    update_envelope_document(payload["updates"], record_id)
+    logger.info(f"Deferred Salesforce update completed for {record_id}")
+
+
+DEFAULT_HANDLERS = {
+    KIND_DROPBOX_UPLOAD: _handle_dropbox_upload,
+    KIND_SALESFORCE_UPDATE: _handle_salesforce_update,
+}
+
+
+def run_pending_tasks(handlers: dict = None, limit: int = 50) -> tuple[int, int]:
+    """
+    Replay up to `limit` due tasks. Returns (succeeded, failed).
+
+    Failed tasks are rescheduled with exponential backoff and marked 'failed'
+    after MAX_ATTEMPTS. Due rows are claimed with SKIP LOCKED and leased by
+    pushing run_after forward, so several runners can work the queue at once.
+    """
+    handlers = handlers or DEFAULT_HANDLERS
+    session = get_session()
+    now = datetime.now(timezone.utc)
+    tasks = (
+        session.query(DeferredTask)
+        .filter(DeferredTask.status == "pending", DeferredTask.run_after <= now)
+        .order_by(DeferredTask.run_after)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for task in tasks:
+        task.run_after = now + timedelta(seconds=LEASE_SECONDS)
+    session.commit()
+
+    succeeded = failed = 0
+    for task in tasks:
+        handler = handlers.get(task.kind)
+        task.attempts = (task.attempts or 0) + 1
+        parent = SpanContext.from_dict(task.payload.get("trace")) if isinstance(task.payload, dict) else None
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for task kind '{task.kind}'")
+            with span(f"deferred.{task.kind}", parent=parent, task_id=str(task.id), attempt=task.attempts):
+                handler(task.payload)
+            task.status = "done"
+            task.last_error = None
+            succeeded += 1
+        except Exception as e:
+            task.last_error = str(e)
+            if task.attempts >= MAX_ATTEMPTS or handler is None:
+                task.status = "failed"
+                logger.error(f"Deferred task {task.id} ({task.kind}) failed permanently: {e}")
+            else:
+                backoff = min(60 * 2 ** (task.attempts - 1), MAX_BACKOFF_SECONDS)
+                task.run_after = datetime.now(timezone.utc) + timedelta(seconds=backoff)
+                logger.warning(f"Deferred task {task.id} ({task.kind}) attempt {task.attempts} failed, retrying in {backoff}s: {e}")
+            failed += 1
+        session.commit()
+
+    return succeeded, failed
@@ -0,0 +1,227 @@
+# ------------------------------------------------------------------------
+# File: export.py
+# Location: /srv/apps/esign/app/core/export.py
+# Description:
+#     Bulk export of signed documents for litigation holds and audits. The
+#     signed PDFs of one Salesforce case and/or a signed_at date range are
+#     streamed as a zip: manifest.csv first (client, template, case,
+#     signed_at, SHA-256, size), then one member per PDF, then missing.csv
+#     listing every signed request whose PDF could not be read.
+#
+#     Selection starts from signature_requests (signed_at set), so requests
+#     with no artifact index row are listed as missing rather than left
+#     out. A PDF whose local copy is gone (removed by retention, or lost)
+#     is read from its team-folder copy when the index has a remote_path.
+#
+#     The zip is written to an unseekable sink that the generator drains
+#     after every chunk, so nothing is staged on disk and memory stays at
+#     one chunk plus one page of rows however many documents match.
+#     Requests are keyset-paged by (signed_at, id) and their artifacts
+#     fetched per page (the manifest and the files are two passes over the
+#     same query). Members are stored, not deflated, as PDFs are already
+#     compressed.
+# ------------------------------------------------------------------------
+
+import csv
+import io
+import os
+import posixpath
+import zipfile
+from datetime import datetime, timezone
+
+from log_utils.logging_config import configure_logging
+from app.db.models import Artifact, SignatureRequest
+from app.db.session import get_session
+from app.core.storage import get_storage, team_folder_storage, ArtifactNotFoundError, CHUNK_SIZE
+from app.core.artifacts import KIND_SIGNED
+from app.core.compaction import find_archived
+
+logger = configure_logging(name="apps.esign.export", logfile="esign.log", level=None)
+
+MANIFEST_COLUMNS = ["filename", "client_name", "client_email", "template_type", "salesforce_case_id",
+                    "signed_at", "sha256", "size"]
+MISSING_COLUMNS = ["signature_request_id", "filename", "storage_key", "remote_path", "reason"]
+
+MISSING_NOT_INDEXED = "not_indexed"    # signed, but no artifact index row
+MISSING_NOT_FOUND = "not_found"        # neither the local nor a team-folder copy exists
+MISSING_REMOTE_ERROR = "remote_error"  # the team-folder copy could not be fetched
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object; written bytes are collected until drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class SignedExport:
+    """Signed PDFs selected by case and/or signed_at range, streamed as a zip."""
+
+    def __init__(self, case_id: str = None, signed_from: datetime = None, signed_to: datetime = None,
+                 storage=None, page_size: int = None, remote_storage=None):
+        if not case_id and not (signed_from or signed_to):
+            raise ValueError("An export needs a case ID or a signed_at date range")
+        self.case_id = case_id
+        self.signed_from = signed_from
+        self.signed_to = signed_to
+        self.storage = storage or get_storage()
+        self.page_size = page_size or int(os.environ.get("ESIGN_EXPORT_PAGE_SIZE", "200"))
+        self._remote_storage = remote_storage
+        self.totals = {"documents": 0, "bytes": 0, "missing": 0, "from_team_folder": 0}
+
+    @property
+    def filename(self) -> str:
+        scope = self.case_id or "signed"
+        dates = "_".join(d.strftime("%Y%m%d") for d in (self.signed_from, self.signed_to) if d)
+        return f"esign_export_{scope}{'_' + dates if dates else ''}.zip"
+
+    @property
+    def remote_storage(self):
+        if self._remote_storage is None:
+            self._remote_storage = team_folder_storage()
+        return self._remote_storage
+
+    def _query(self):
+        query = get_session().query(SignatureRequest).filter(SignatureRequest.signed_at.isnot(None))
+        if self.case_id:
+            query = query.filter(SignatureRequest.salesforce_case_id == self.case_id)
+        if self.signed_from:
+            query = query.filter(SignatureRequest.signed_at >= self.signed_from)
+        if self.signed_to:
+            query = query.filter(SignatureRequest.signed_at < self.signed_to)
+        return query
+
+    def rows(self):
+        """
+        (artifact, signature_request) pairs, one page of requests in memory
+        at a time; artifact is None for a signed request that is not indexed.
+        """
+        session = get_session()
+        query = self._query()
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                page = page.filter(
+                    (SignatureRequest.signed_at > last[0])
+                    | ((SignatureRequest.signed_at == last[0]) & (SignatureRequest.id > last[1]))
+                )
+            requests = page.order_by(SignatureRequest.signed_at, SignatureRequest.id).limit(self.page_size).all()
+            if not requests:
+                return
+            last = (requests[-1].signed_at, requests[-1].id)
+            artifacts = {}
+            for artifact in (
+                session.query(Artifact)
+                .filter(Artifact.kind == KIND_SIGNED, Artifact.signature_request_id.in_([r.id for r in requests]))
+                .order_by(Artifact.created_at, Artifact.id)
+            ):
+                artifacts.setdefault(artifact.signature_request_id, []).append(artifact)
+            for signature_request in requests:
+                for artifact in artifacts.get(signature_request.id) or [None]:
+                    yield artifact, signature_request
+
+    def _open(self, artifact: Artifact):
+        """A reader for the PDF: local storage, its compaction archive, then the team-folder copy."""
+        if artifact.local_deleted_at is None:
+            try:
+                return self.storage.open(artifact.storage_key)
+            except ArtifactNotFoundError:
+                archived = find_archived(artifact.storage_key)
+                if archived is not None:
+                    return self.storage.open_range(archived.archive_key, archived.offset, archived.size)
+        if not artifact.remote_path:
+            raise ArtifactNotFoundError(artifact.storage_key)
+        source = self.remote_storage.open(artifact.remote_path)
+        self.totals["from_team_folder"] += 1
+        return source
+
+    def stream(self):
+        """Zip bytes, yielded as they are produced."""
+        for data in self._stream():
+            if data:
+                yield data
+
+    def _stream(self):
+        sink = _ChunkSink()
+        missing = []
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            with archive.open(self._member("manifest.csv", datetime.now(timezone.utc)), "w") as manifest:
+                text = io.TextIOWrapper(manifest, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow(MANIFEST_COLUMNS)
+                for artifact, signature_request in self.rows():
+                    writer.writerow([
+                        artifact.filename if artifact else posixpath.basename(signature_request.pdf_path or ""),
+                        signature_request.client_name, signature_request.client_email,
+                        signature_request.template_type, signature_request.salesforce_case_id,
+                        signature_request.signed_at.isoformat(),
+                        (artifact.sha256 or "") if artifact else "", artifact.size if artifact else "",
+                    ])
+                    text.flush()
+                    yield sink.drain()
+                text.flush()
+                text.detach()
+            yield sink.drain()
+
+            for artifact, signature_request in self.rows():
+                if artifact is None:
+                    missing.append([signature_request.id, posixpath.basename(signature_request.pdf_path or ""),
+                                    "", "", MISSING_NOT_INDEXED])
+                    continue
+                try:
+                    source = self._open(artifact)
+                except ArtifactNotFoundError:
+                    missing.append(self._missing_row(artifact, MISSING_NOT_FOUND))
+                    continue
+                except Exception:
+                    # A Dropbox outage must not abort a zip that is already half sent
+                    logger.exception(f"Export {self.filename}: team-folder copy {artifact.remote_path} unreadable")
+                    missing.append(self._missing_row(artifact, MISSING_REMOTE_ERROR))
+                    continue
+                member = self._member(f"signed/{artifact.filename}", artifact.created_at)
+                with source, archive.open(member, "w", force_zip64=artifact.size >= zipfile.ZIP64_LIMIT) as dest:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                        dest.write(chunk)
+                        yield sink.drain()
+                self.totals["documents"] += 1
+                self.totals["bytes"] += artifact.size
+                yield sink.drain()
+
+            if missing:
+                self.totals["missing"] = len(missing)
+                logger.warning(f"Export {self.filename}: {len(missing)} signed documents could not be read")
+                listing = io.StringIO()
+                csv.writer(listing).writerows([MISSING_COLUMNS] + missing)
+                archive.writestr(self._member("missing.csv", datetime.now(timezone.utc)), listing.getvalue())
+        yield sink.drain()
+        logger.info(f"Export {self.filename} finished: {self.totals}")
+
+    @staticmethod
+    def _missing_row(artifact: Artifact, reason: str) -> list:
+        return [artifact.signature_request_id, artifact.filename, artifact.storage_key, artifact.remote_path or "",
+                reason]
+
+    @staticmethod
+    def _member(name: str, modified: datetime) -> zipfile.ZipInfo:
+        modified = modified or datetime.now(timezone.utc)
+        info = zipfile.ZipInfo(name, date_time=max(modified.timetuple()[:6], (1980, 1, 1, 0, 0, 0)))
+        info.compress_type = zipfile.ZIP_STORED
+        return info
@@ -0,0 +1,31 @@
+# ------------------------------------------------------------------------
+# File: forking.py
+# Location: /srv/apps/esign/app/core/forking.py
+# Description:
+#     Fork safety for the in-process background workers (webhook senders,
+#     signing jobs, preview warming, view counts, span export). Threads do
+#     not survive a fork, and what a pre-forked gunicorn worker inherits
+#     (queues, buffers, locks a parent thread may have held) belongs to the
+#     parent. An owner registered here has its _after_fork() called in the
+#     child straight after the fork, before the child queues any work, so
+#     it drops that state and starts its own threads on first use.
+# ------------------------------------------------------------------------
+
+import os
+import weakref
+
+_owners = weakref.WeakSet()
+
+
+def reset_after_fork(owner) -> None:
+    """Call owner._after_fork() in every forked child; the owner is only weakly referenced."""
+    _owners.add(owner)
+
+
+def _after_fork_in_child() -> None:
+    for owner in list(_owners):
+        owner._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,224 @@
+# ------------------------------------------------------------------------
+# File: metrics.py
+# Location: /srv/apps/esign/app/core/metrics.py
+# Description:
+#     Prometheus metrics, exposed on /metrics:
+#
+#       esign_http_requests_total                request count by route, method, status
+#       esign_http_request_duration_seconds      request latency by route
+#       esign_stage_duration_seconds             time per stage of submit_signature,
+#                                                sign_document, initiate_signature
+#                                                and embed_signature_on_pdf
+#       esign_dependency_call_duration_seconds   outbound calls (Dropbox, Salesforce
+#                                                token/SOQL/update, RingCentral) by
+#                                                outcome, timed in Dependency.call
+#       esign_dependency_retries_total           retried outbound calls
+#       esign_db_query_duration_seconds          Postgres statements by verb
+#       esign_pdf_output_bytes                   generated PDF size by template
+#       esign_queue_depth                        preview warm-up, signing jobs and
+#                                                webhook queues of the live workers
+#       esign_deferred_tasks_pending             deferred task backlog (read at scrape)
+#
+#     Every stage, dependency call and statement timed here is also
+#     recorded as a span of the current trace (app/core/tracing.py).
+#
+#     Routes are labelled by their rule ("/v1/sign/<token>"), never the URL,
+#     so tokens do not end up in label values.
+#
+#     Under gunicorn set PROMETHEUS_MULTIPROC_DIR to an empty directory
+#     (wiped before each start): every worker then writes its samples there
+#     and /metrics aggregates all of them, whichever worker serves it. The
+#     gunicorn config should call mark_worker_dead(worker.pid) from its
+#     child_exit hook. With ESIGN_METRICS_TOKEN set, /metrics requires
+#     "Authorization: Bearer <token>".
+# ------------------------------------------------------------------------
+
+import hmac
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+from app.core.tracing import record_span, span, KIND_CLIENT
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PDF_SIZE_BUCKETS = (16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+
+HTTP_REQUESTS = Counter(
+    "esign_http_requests_total", "HTTP requests by route, method and status", ["route", "method", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "esign_http_request_duration_seconds", "HTTP request latency", ["route", "method"], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "esign_stage_duration_seconds", "Time spent in each stage of an operation", ["operation", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_LATENCY = Histogram(
+    "esign_dependency_call_duration_seconds", "Outbound dependency call latency",
+    ["dependency", "operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_RETRIES = Counter(
+    "esign_dependency_retries_total", "Outbound calls retried after a failure", ["dependency", "operation"]
+)
+DB_LATENCY = Histogram(
+    "esign_db_query_duration_seconds", "Database statement latency", ["statement"], buckets=LATENCY_BUCKETS
+)
+PDF_OUTPUT_BYTES = Histogram(
+    "esign_pdf_output_bytes", "Size of generated PDFs", ["template", "kind"], buckets=PDF_SIZE_BUCKETS
+)
+# livesum: summed over live workers; values from exited workers are dropped
+QUEUE_DEPTH = Gauge("esign_queue_depth", "Items waiting in a work queue", ["queue"], multiprocess_mode="livesum")
+# A database count, the same whichever worker reads it: report the latest reading
+DEFERRED_PENDING = Gauge(
+    "esign_deferred_tasks_pending", "Deferred tasks waiting to be replayed", multiprocess_mode="livemostrecent"
+)
+
+QUEUE_PREVIEW_WARM = "preview_warm"
+QUEUE_SIGNING_JOBS = "signing_jobs"
+QUEUE_WEBHOOKS = "webhooks"
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+
+DB_STATEMENTS = ("select", "insert", "update", "delete", "begin", "commit", "rollback")
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one operation: lap(stage) records the time
+    since the previous lap (or since the timer was created).
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._last = time.perf_counter()
+        self._last_ns = time.time_ns()
+
+    def lap(self, stage: str) -> float:
+        now, now_ns = time.perf_counter(), time.time_ns()
+        elapsed, self._last = now - self._last, now
+        STAGE_LATENCY.labels(self.operation, stage).observe(elapsed)
+        record_span(f"{self.operation}.{stage}", self._last_ns, now_ns, operation=self.operation, stage=stage)
+        self._last_ns = now_ns
+        return elapsed
+
+    def skip(self) -> None:
+        """Restart the clock without recording (for work that is not a stage)."""
+        self._last = time.perf_counter()
+        self._last_ns = time.time_ns()
+
+
+@contextmanager
+def stage_timer(operation: str, stage: str):
+    started = time.perf_counter()
+    try:
+        with span(f"{operation}.{stage}", operation=operation, stage=stage):
+            yield
+    finally:
+        STAGE_LATENCY.labels(operation, stage).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def dependency_timer(dependency: str, operation: str):
+    """Time one outbound call; the outcome label is "error" if the block raises."""
+    started, outcome = time.perf_counter(), OUTCOME_OK
+    try:
+        with span(f"{dependency}.{operation}", KIND_CLIENT, dependency=dependency, operation=operation):
+            yield
+    except BaseException:
+        outcome = OUTCOME_ERROR
+        raise
+    finally:
+        DEPENDENCY_LATENCY.labels(dependency, operation, outcome).observe(time.perf_counter() - started)
+
+
+def record_retry(dependency: str, operation: str) -> None:
+    DEPENDENCY_RETRIES.labels(dependency, operation).inc()
+
+
+def record_pdf_size(template: str, kind: str, size: int) -> None:
+    PDF_OUTPUT_BYTES.labels(template, kind).observe(size)
+
+
+def set_queue_depth(queue: str, depth: int) -> None:
+    QUEUE_DEPTH.labels(queue).set(depth)
+
+
+def set_deferred_pending(count: int) -> None:
+    DEFERRED_PENDING.set(count)
+
+
+def instrument_engine(engine) -> None:
+    """Time every statement run on a SQLAlchemy engine (idempotent)."""
+    if getattr(engine, "_esign_metrics", False):
+        return
+    engine._esign_metrics = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("esign_query_started", []).append((time.perf_counter(), time.time_ns()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("esign_query_started")
+        if not started:
+            return
+        started, started_ns = started.pop()
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+        verb = verb if verb in DB_STATEMENTS else "other"
+        DB_LATENCY.labels(verb).observe(time.perf_counter() - started)
+        # The statement text only: parameters are never recorded
+        record_span(f"db.{verb}", started_ns, time.time_ns(), KIND_CLIENT, statement=statement)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # A failed statement never reaches after_cursor_execute
+        started = context.connection.info.get("esign_query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def install_request_metrics(app) -> None:
+    """Count and time every request by its URL rule."""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started", None)
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        if started is not None:
+            HTTP_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+        return response
+
+
+def metrics_authorized(authorization: str | None) -> bool:
+    token = os.environ.get("ESIGN_METRICS_TOKEN")
+    if not token:
+        return True
+    return hmac.compare_digest(authorization or "", f"Bearer {token}")
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Exposition-format metrics and their content type, aggregated over workers in multiprocess mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop an exited worker's live gauges (gunicorn child_exit hook)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
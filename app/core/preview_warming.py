@@ -0,0 +1,196 @@
+# ------------------------------------------------------------------------
+# File: preview_warming.py
+# Location: /srv/apps/esign/app/core/preview_warming.py
+# Description:
+#     Preview warming. /api/v1/initiate queues the preview render for a new
+#     signature request on a small in-process pool
+#     (ESIGN_PREVIEW_WARM_WORKERS, default 2), so the PDF is usually ready
+#     before the client opens the link. The signing page then only looks
+#     the preview up in the artifact index; when it is not there yet the
+#     page is sent straight away and the preview frame loads from
+#     /v1/sign/<token>/preview, which waits for the queued render (or
+#     renders) there instead of in the page request.
+#
+#     A preview shows the signing date, so only one rendered today (UTC)
+#     counts as current. Renders are de-duplicated per request within a
+#     worker process; the queue holds at most ESIGN_PREVIEW_WARM_QUEUE
+#     requests, beyond which previews are left to the on-demand endpoint.
+#
+#     Page views never write: today's preview filename is cached per process
+#     under (signature request id, UTC date), so after the first lookup a
+#     view needs no artifact query either.
+# ------------------------------------------------------------------------
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from log_utils.logging_config import configure_logging
+from app.db.models import Artifact, SignatureRequest, SignatureStatus
+from app.db.session import get_session, SessionLocal
+from app.core.artifacts import KIND_PREVIEW
+from app.core.forking import reset_after_fork
+from app.core.metrics import set_queue_depth, QUEUE_PREVIEW_WARM
+from app.core.tracing import bind_context, span
+from app.core.pdf_loader import get_template_path
+from app.core.signer import embed_signature_on_pdf
+
+logger = configure_logging(name="apps.esign.preview_warming", logfile="esign.log", level=None)
+
+PREVIEW_WAIT_SECONDS = float(os.environ.get("ESIGN_PREVIEW_WAIT_SECONDS", "60"))
+PREVIEW_CACHE_SIZE = 10000
+
+_preview_cache = {}  # (signature request id, UTC date) -> preview filename
+_preview_cache_lock = threading.Lock()
+
+
+def _cache_key(signature_request_id) -> tuple:
+    return signature_request_id, datetime.now(timezone.utc).date()
+
+
+def _remember(signature_request_id, filename: str) -> str:
+    with _preview_cache_lock:
+        while len(_preview_cache) >= PREVIEW_CACHE_SIZE:
+            del _preview_cache[next(iter(_preview_cache))]
+        _preview_cache[_cache_key(signature_request_id)] = filename
+    return filename
+
+
+def current_preview(signature_request) -> Artifact | None:
+    """The request's most recent preview, if it was rendered today (UTC)."""
+    row = (
+        get_session().query(Artifact)
+        .filter(Artifact.signature_request_id == signature_request.id, Artifact.kind == KIND_PREVIEW)
+        .order_by(Artifact.created_at.desc())
+        .first()
+    )
+    if row is None or row.created_at is None:
+        return None
+    created_at = row.created_at if row.created_at.tzinfo else row.created_at.replace(tzinfo=timezone.utc)
+    if created_at.astimezone(timezone.utc).date() != datetime.now(timezone.utc).date():
+        return None
+    return row
+
+
+def cached_preview_filename(signature_request) -> str | None:
+    """Filename of today's preview, from the process cache or else the artifact index (read-only)."""
+    filename = _preview_cache.get(_cache_key(signature_request.id))
+    if filename is None:
+        preview = current_preview(signature_request)
+        if preview is None:
+            return None
+        filename = _remember(signature_request.id, preview.filename)
+    return filename
+
+
+def render_preview(signature_request) -> str:
+    """Render and index the preview PDF for a request; returns its storage key."""
+    template_path = get_template_path(signature_request.template_type)
+    preview_key = embed_signature_on_pdf(
+        template_key=os.path.splitext(os.path.basename(template_path))[0],
+        output_path=f"preview/{signature_request.token_hash[:8]}_sample.pdf",
+        signature_b64="",
+        client_name=signature_request.client_name,
+        sign_date=datetime.utcnow().strftime("%Y-%m-%d"),
+        test_mode=False,
+        is_preview=True,
+        signature_request_id=signature_request.id
+    )
+    signature_request.preview_path = preview_key
+    get_session().commit()
+    _remember(signature_request.id, os.path.basename(preview_key))
+    return preview_key
+
+
+class PreviewWarmer:
+    """Renders previews on a thread pool, one render per signature request at a time."""
+
+    def __init__(self, workers: int = None, max_pending: int = None):
+        self.workers = workers or int(os.environ.get("ESIGN_PREVIEW_WARM_WORKERS", "2"))
+        self.max_pending = max_pending or int(os.environ.get("ESIGN_PREVIEW_WARM_QUEUE", "100"))
+        self._lock = threading.Lock()
+        self._pending = {}  # signature request id -> Future
+        self._executor = None
+        reset_after_fork(self)
+
+    def _after_fork(self) -> None:
+        # The parent's renders are not running here
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._executor = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Caller holds the lock
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preview-warm")
+        return self._executor
+
+    def submit(self, signature_request_id):
+        """Queue a render; returns its Future (shared with a render already queued), or None if the queue is full."""
+        with self._lock:
+            pool = self._pool()
+            future = self._pending.get(signature_request_id)
+            if future is not None:
+                return future
+            if len(self._pending) >= self.max_pending:
+                logger.warning(f"Preview queue full ({self.max_pending}); {signature_request_id} renders on demand")
+                return None
+            future = pool.submit(bind_context(self._warm), signature_request_id)
+            self._pending[signature_request_id] = future
+            set_queue_depth(QUEUE_PREVIEW_WARM, len(self._pending))
+        future.add_done_callback(lambda done: self._finished(signature_request_id, done))
+        return future
+
+    def _finished(self, signature_request_id, future) -> None:
+        with self._lock:
+            if self._pending.get(signature_request_id) is future:
+                del self._pending[signature_request_id]
+            set_queue_depth(QUEUE_PREVIEW_WARM, len(self._pending))
+
+    def _warm(self, signature_request_id) -> str | None:
+        with span("preview_warm", signature_request_id=str(signature_request_id)):
+            return self._render(signature_request_id)
+
+    def _render(self, signature_request_id) -> str | None:
+        try:
+            signature_request = get_session().get(SignatureRequest, signature_request_id)
+            if signature_request is None or signature_request.status not in (SignatureStatus.Sent,
+                                                                              SignatureStatus.Delivered):
+                return None
+            existing = current_preview(signature_request)
+            if existing is not None:
+                return existing.storage_key
+            preview_key = render_preview(signature_request)
+            logger.info(f"Warmed preview for {signature_request_id}: {preview_key}")
+            return preview_key
+        except Exception:
+            logger.exception(f"Preview warm-up failed for {signature_request_id}")
+            raise
+        finally:
+            # Worker threads get their own scoped session; drop it with the task
+            SessionLocal.remove()
+
+    def ensure(self, signature_request, timeout: float = None) -> str | None:
+        """Filename of today's preview for a request, waiting for its queued render or rendering it here."""
+        filename = cached_preview_filename(signature_request)
+        if filename is not None:
+            return filename
+        future = self.submit(signature_request.id)
+        if future is None:
+            render_preview(signature_request)
+        else:
+            future.result(timeout=timeout if timeout is not None else PREVIEW_WAIT_SECONDS)
+        return cached_preview_filename(signature_request)
+
+
+_warmer = PreviewWarmer()
+
+
+def warm_preview(signature_request_id):
+    """Queue the preview render for a request (no-op if one is already queued)."""
+    return _warmer.submit(signature_request_id)
+
+
+def ensure_preview(signature_request, timeout: float = None) -> str | None:
+    return _warmer.ensure(signature_request, timeout)
@@ -0,0 +1,285 @@
+# ------------------------------------------------------------------------
+# File: resilience.py
+# Location: /srv/apps/esign/app/core/resilience.py
+# Description:
+#     Bulkheads and circuit breakers for the outbound dependencies of the
+#     signing pipeline (Dropbox, Salesforce and the RingCentral webhook).
+#     Each dependency gets a bounded number of concurrent calls and a
+#     failure-rate breaker; once the breaker opens, calls fail fast with
+#     CircuitOpenError so callers can hand the work to the deferred task
+#     pipeline instead of tying up a worker. After the reset timeout a
+#     limited number of probe calls are let through (half-open) to decide
+#     whether to close the breaker again.
+# ------------------------------------------------------------------------
+
+import os
+import threading
+import time
+from collections import deque
+
+from log_utils.logging_config import configure_logging
+from app.core.metrics import dependency_timer
+
+logger = configure_logging(name="apps.esign.resilience", logfile="esign.log", level=None)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class DependencyUnavailableError(RuntimeError):
+    """Raised when a call is rejected without being attempted."""
+
+    def __init__(self, dependency: str, message: str):
+        super().__init__(message)
+        self.dependency = dependency
+
+
+class CircuitOpenError(DependencyUnavailableError):
+    """Raised when the dependency's circuit breaker is open."""
+
+
+class BulkheadFullError(DependencyUnavailableError):
+    """Raised when all concurrency slots for the dependency are taken."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over a rolling window of recent calls.
+
+    The breaker opens when at least `min_calls` outcomes are in the window and
+    the share of failures reaches `failure_rate`. It stays open for
+    `reset_timeout` seconds, then admits up to `half_open_max_calls` probes.
+    A successful probe closes the breaker; a failed probe re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._outcomes = deque(maxlen=window_size)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected_calls = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = STATE_HALF_OPEN
+            self._half_open_in_flight = 0
+            logger.info(f"Circuit '{self.name}' half-open, allowing probe calls")
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Reserve permission for one call. Must be followed by record_*()."""
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                logger.info(f"Circuit '{self.name}' probe succeeded, closing")
+                self._state = STATE_CLOSED
+                self._outcomes.clear()
+                self._half_open_in_flight = 0
+                return
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                logger.warning(f"Circuit '{self.name}' probe failed, re-opening")
+                self._open()
+                return
+            self._outcomes.append(False)
+            if self._state == STATE_CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    logger.error(
+                        f"Circuit '{self.name}' opened: {failures}/{len(self._outcomes)} recent calls failed"
+                    )
+                    self._open()
+
+    def release_probe(self) -> None:
+        """Return a half-open probe slot for a call that was never attempted."""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._half_open_in_flight:
+                self._half_open_in_flight -= 1
+
+    def _open(self) -> None:
+        self._state = STATE_OPEN
+        self._opened_at = self._clock()
+        self._half_open_in_flight = 0
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            failures = self._outcomes.count(False)
+            return {
+                "state": state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": failures,
+                "rejected_calls": self.rejected_calls,
+                "times_opened": self.times_opened,
+            }
+
+
+class Bulkhead:
+    """Caps the number of concurrent calls into one dependency."""
+
+    def __init__(self, name: str, max_concurrent: int = 4, max_wait: float = 0.5):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected_calls = 0
+
+    def acquire(self) -> bool:
+        if not self._semaphore.acquire(timeout=self.max_wait):
+            with self._lock:
+                self.rejected_calls += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self.in_flight,
+                "rejected_calls": self.rejected_calls,
+            }
+
+
+class Dependency:
+    """A named outbound dependency guarded by a bulkhead and a circuit breaker."""
+
+    def __init__(self, name: str, breaker: CircuitBreaker, bulkhead: Bulkhead):
+        self.name = name
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+
+    def call(self, func, *args, **kwargs):
+        """
+        Invoke func(*args, **kwargs) under the dependency's guards.
+
+        Raises CircuitOpenError or BulkheadFullError without calling func when
+        the dependency is unavailable; any exception raised by func counts as
+        a failure and is re-raised unchanged.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.name, f"Circuit for '{self.name}' is open")
+        if not self.bulkhead.acquire():
+            # This call never reached the dependency, so give back any probe slot
+            self.breaker.release_probe()
+            raise BulkheadFullError(self.name, f"Too many concurrent calls to '{self.name}'")
+        try:
+            with dependency_timer(self.name, getattr(func, "__name__", "call")):
+                result = func(*args, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.bulkhead.release()
+        self.breaker.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        return {"breaker": self.breaker.snapshot(), "bulkhead": self.bulkhead.snapshot()}
+
+
+def _env_number(name: str, default, cast):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+def build_dependency(name: str) -> Dependency:
+    """Build a Dependency whose limits come from ESIGN_<NAME>_* environment variables."""
+    prefix = f"ESIGN_{name.upper()}_"
+    breaker = CircuitBreaker(
+        name,
+        failure_rate=_env_number(prefix + "FAILURE_RATE", 0.5, float),
+        window_size=_env_number(prefix + "WINDOW_SIZE", 20, int),
+        min_calls=_env_number(prefix + "MIN_CALLS", 5, int),
+        reset_timeout=_env_number(prefix + "RESET_TIMEOUT", 30.0, float),
+        half_open_max_calls=_env_number(prefix + "HALF_OPEN_CALLS", 1, int),
+    )
+    bulkhead = Bulkhead(
+        name,
+        max_concurrent=_env_number(prefix + "MAX_CONCURRENT", 4, int),
+        max_wait=_env_number(prefix + "MAX_WAIT", 0.5, float),
+    )
+    return Dependency(name, breaker, bulkhead)
+
+
+DROPBOX = "dropbox"
+SALESFORCE = "salesforce"
+RINGCENTRAL = "ringcentral"
+
+_dependencies = {}
+_registry_lock = threading.Lock()
+
+
+def get_dependency(name: str) -> Dependency:
+    """Return the process-wide Dependency for name, creating it on first use."""
+    with _registry_lock:
+        if name not in _dependencies:
+            _dependencies[name] = build_dependency(name)
+        return _dependencies[name]
+
+
+def reset_dependencies() -> None:
+    """Drop all breaker/bulkhead state (used by tests and fault-injection runs)."""
+    with _registry_lock:
+        _dependencies.clear()
+
+
+def dependency_snapshot() -> dict:
+    """Breaker state and rejection counts for every dependency, for monitoring."""
+    for name in (DROPBOX, SALESFORCE, RINGCENTRAL):
+        get_dependency(name)
+    with _registry_lock:
+        dependencies = dict(_dependencies)
+    return {name: dep.snapshot() for name, dep in dependencies.items()}
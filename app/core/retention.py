@@ -0,0 +1,248 @@
+# ------------------------------------------------------------------------
+# File: retention.py
+# Location: /srv/apps/esign/app/core/retention.py
+# Description:
+#     Retention engine for generated PDFs. Each class of artifact has its
+#     own policy:
+#
+#       preview          previews, one per signing-page load; disposable
+#                        (ESIGN_RETENTION_PREVIEW_HOURS, default 24)
+#       signed_uploaded  signed PDFs whose team-folder copy exists
+#                        (ESIGN_RETENTION_SIGNED_UPLOADED_DAYS, default 30)
+#       failed_upload    signed PDFs never uploaded; the only copy, so
+#                        kept unless ESIGN_RETENTION_FAILED_UPLOAD_DAYS > 0
+#
+#     Candidates come from the artifact index (ordered by created_at), and
+#     for previews also from an os.scandir walk of the dated preview/
+#     folders that stops at the first folder inside the retention window,
+#     so files are never stat'ed one by one to find their age. Deletes run
+#     in batches with a pause between them (ESIGN_RETENTION_BATCH_SIZE,
+#     ESIGN_RETENTION_BATCH_PAUSE) to keep IO to a trickle. A dry run walks
+#     the same candidates and reports what would be reclaimed.
+#
+#     Index rows of deleted previews are dropped. Rows of signed PDFs are
+#     kept with local_deleted_at set, so their remote_path still leads to
+#     the team-folder copy (the /signed/ and /download/ routes and the
+#     export serve it from there). Existing databases need the column:
+#
+#       ALTER TABLE artifacts ADD COLUMN local_deleted_at timestamptz;
+# ------------------------------------------------------------------------
+
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from log_utils.logging_config import configure_logging
+from app.db.models import Artifact
+from app.db.session import get_session
+from app.core.storage import get_storage, BACKEND_DROPBOX
+from app.core.artifacts import KIND_PREVIEW, KIND_SIGNED
+
+logger = configure_logging(name="apps.esign.retention", logfile="esign.log", level=None)
+
+CLASS_PREVIEW = "preview"
+CLASS_SIGNED_UPLOADED = "signed_uploaded"
+CLASS_FAILED_UPLOAD = "failed_upload"
+
+_DATE_FOLDER = re.compile(r"^\d{8}$")
+
+
+class RetentionPolicy:
+    """How long one class of artifact is kept; max_age None keeps it forever."""
+
+    def __init__(self, name: str, kind: str, max_age: timedelta | None, uploaded: bool | None = None,
+                 walk_prefix: str = None):
+        self.name = name
+        self.kind = kind
+        self.max_age = max_age
+        self.uploaded = uploaded        # filter on Artifact.remote_path being set (True) or empty (False)
+        self.walk_prefix = walk_prefix  # dated folder also swept for unindexed files (local storage only)
+
+    def cutoff(self, now: datetime) -> datetime | None:
+        return now - self.max_age if self.max_age else None
+
+
+def _age(variable: str, default: str, unit: str) -> timedelta | None:
+    value = float(os.environ.get(variable, default))
+    return timedelta(**{unit: value}) if value > 0 else None
+
+
+def default_policies() -> list:
+    return [
+        RetentionPolicy(CLASS_PREVIEW, KIND_PREVIEW, _age("ESIGN_RETENTION_PREVIEW_HOURS", "24", "hours"),
+                        walk_prefix="preview"),
+        RetentionPolicy(CLASS_SIGNED_UPLOADED, KIND_SIGNED,
+                        _age("ESIGN_RETENTION_SIGNED_UPLOADED_DAYS", "30", "days"), uploaded=True),
+        RetentionPolicy(CLASS_FAILED_UPLOAD, KIND_SIGNED,
+                        _age("ESIGN_RETENTION_FAILED_UPLOAD_DAYS", "0", "days"), uploaded=False),
+    ]
+
+
+class RetentionRun:
+    """Applies policies in throttled batches and collects per-class metrics."""
+
+    def __init__(self, policies: list = None, dry_run: bool = False, batch_size: int = None,
+                 batch_pause: float = None, storage=None, now: datetime = None):
+        self.policies = policies if policies is not None else default_policies()
+        self.dry_run = dry_run
+        self.batch_size = batch_size or int(os.environ.get("ESIGN_RETENTION_BATCH_SIZE", "200"))
+        self.batch_pause = batch_pause if batch_pause is not None else float(
+            os.environ.get("ESIGN_RETENTION_BATCH_PAUSE", "0.2"))
+        self.storage = storage or get_storage()
+        self.now = now or datetime.now(timezone.utc)
+        self.metrics = {}
+        self.samples = []  # first few candidate keys, so a dry run shows what it would delete
+        self._counted = set()  # keys a dry run has counted, so the folder sweep does not count them twice
+
+    def run(self) -> dict:
+        started = time.monotonic()
+        for policy in self.policies:
+            stats = self.metrics.setdefault(policy.name, {
+                "candidates": 0, "deleted": 0, "bytes_reclaimed": 0, "missing": 0, "errors": 0,
+            })
+            cutoff = policy.cutoff(self.now)
+            if cutoff is None:
+                stats["kept_forever"] = True
+                continue
+            stats["cutoff"] = cutoff.isoformat()
+            self._sweep_index(policy, cutoff, stats)
+            if policy.walk_prefix:
+                self._sweep_folders(policy, cutoff, stats)
+        result = {
+            "dry_run": self.dry_run,
+            "classes": self.metrics,
+            "bytes_reclaimed": sum(stats["bytes_reclaimed"] for stats in self.metrics.values()),
+            "deleted": sum(stats["deleted"] for stats in self.metrics.values()),
+            "duration_s": round(time.monotonic() - started, 2),
+        }
+        if self.dry_run:
+            result["sample"] = self.samples
+        logger.info(f"Retention run finished: {result}")
+        return result
+
+    def _pause(self) -> None:
+        if self.batch_pause and not self.dry_run:
+            time.sleep(self.batch_pause)
+
+    def _record(self, stats: dict, key: str, size: int) -> bool:
+        """
+        Delete one artifact, or only count it in a dry run. True when it is
+        gone from storage (deleted, or already missing), so its index row
+        can be updated; False if the delete failed.
+        """
+        stats["candidates"] += 1
+        if len(self.samples) < 20:
+            self.samples.append(key)
+        if self.dry_run:
+            self._counted.add(key)
+            stats["bytes_reclaimed"] += size or 0
+            return True
+        try:
+            deleted = self.storage.delete(key)
+        except Exception:
+            stats["errors"] += 1
+            logger.exception(f"Retention: failed to delete {key}")
+            return False
+        if deleted:
+            stats["deleted"] += 1
+            stats["bytes_reclaimed"] += size or 0
+        else:
+            stats["missing"] += 1
+        return True
+
+    def _sweep_index(self, policy: RetentionPolicy, cutoff: datetime, stats: dict) -> None:
+        session = get_session()
+        query = session.query(Artifact).filter(Artifact.kind == policy.kind, Artifact.created_at < cutoff,
+                                               Artifact.local_deleted_at.is_(None))
+        if policy.uploaded is True:
+            # A signed PDF stored in Dropbox is itself the team-folder copy
+            query = query.filter(Artifact.remote_path.isnot(None), Artifact.backend != BACKEND_DROPBOX)
+        elif policy.uploaded is False:
+            query = query.filter(Artifact.remote_path.is_(None))
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                page = page.filter(
+                    (Artifact.created_at > last[0]) | ((Artifact.created_at == last[0]) & (Artifact.id > last[1]))
+                )
+            rows = page.order_by(Artifact.created_at, Artifact.id).limit(self.batch_size).all()
+            if not rows:
+                return
+            last = (rows[-1].created_at, rows[-1].id)
+            gone = []
+            for row in rows:
+                if self._record(stats, row.storage_key, row.size):
+                    gone.append(row.id)
+                    # Logged with its hash and remote copy, for the audit trail of what was removed
+                    logger.info(f"Retention ({policy.name}): {'would delete' if self.dry_run else 'deleted'} "
+                                f"{row.storage_key} ({row.size} bytes, sha256 {row.sha256}, remote {row.remote_path})")
+            if gone and not self.dry_run:
+                # Missing files are marked too, so they are not revisited on every run
+                self._forget(session, policy.kind, Artifact.id.in_(gone))
+            self._pause()
+
+    def _forget(self, session, kind: str, condition) -> None:
+        """
+        Update the index after local copies are gone: signed rows keep their
+        remote_path and are only marked, preview rows are dropped.
+        """
+        rows = session.query(Artifact).filter(condition)
+        if kind == KIND_SIGNED:
+            rows.update({Artifact.local_deleted_at: self.now}, synchronize_session=False)
+        else:
+            rows.delete(synchronize_session=False)
+        session.commit()
+
+    def _sweep_folders(self, policy: RetentionPolicy, cutoff: datetime, stats: dict) -> None:
+        """Sweep dated folders under walk_prefix whose whole day is older than the cutoff."""
+        root = self.storage.local_path(policy.walk_prefix)
+        if not root or not os.path.isdir(root):
+            return
+        with os.scandir(root) as entries:
+            folders = sorted(entry.name for entry in entries if entry.is_dir() and _DATE_FOLDER.match(entry.name))
+        # The signer names date folders in server local time
+        local_cutoff = cutoff.astimezone().replace(tzinfo=None)
+        for folder in folders:
+            try:
+                day_end = datetime.strptime(folder, "%Y%m%d") + timedelta(days=1)
+            except ValueError:
+                continue
+            if day_end > local_cutoff:
+                break  # folders are in date order; everything after this one is inside the window
+            folder_path = os.path.join(root, folder)
+            with os.scandir(folder_path) as entries:
+                files = [entry for entry in entries if entry.is_file()]
+            for start in range(0, len(files), self.batch_size):
+                self._delete_walked(policy, folder, files[start:start + self.batch_size], stats)
+            if not self.dry_run:
+                try:
+                    os.rmdir(folder_path)
+                except OSError:
+                    pass  # not empty (a delete failed) or already gone
+
+    def _delete_walked(self, policy: RetentionPolicy, folder: str, entries: list, stats: dict) -> None:
+        keys = []
+        for entry in entries:
+            key = f"{policy.walk_prefix}/{folder}/{entry.name}"
+            if key in self._counted:
+                continue  # dry run: already counted through the index
+            try:
+                size = entry.stat().st_size  # only files being deleted are stat'ed, for the byte count
+            except FileNotFoundError:
+                continue
+            if self._record(stats, key, size):
+                keys.append(key)
+        if keys and not self.dry_run:
+            self._forget(get_session(), policy.kind, Artifact.storage_key.in_(keys))
+        if keys:
+            logger.info(f"Retention ({policy.name}): {'would delete' if self.dry_run else 'deleted'} "
+                        f"{len(keys)} files swept from {policy.walk_prefix}/{folder}")
+        self._pause()
+
+
+def apply_retention(classes: list = None, dry_run: bool = False, **kwargs) -> dict:
+    """Run the default policies (optionally only the named classes) and return metrics."""
+    policies = [policy for policy in default_policies() if not classes or policy.name in classes]
+    return RetentionRun(policies, dry_run=dry_run, **kwargs).run()
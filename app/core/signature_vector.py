@@ -0,0 +1,138 @@
+# ------------------------------------------------------------------------
+# File: signature_vector.py
+# Location: /srv/apps/esign/app/core/signature_vector.py
+# Description:
+#     Vector signatures. The signing page sends the strokes from
+#     signaturePad.toData() instead of a canvas PNG:
+#
+#       {"v": 1, "w": 600, "h": 200, "q": 2, "d": true,
+#        "pen": [0.5, 2.5], "strokes": [[x0, y0, x1, y1, ...], ...]}
+#
+#     w/h is the pad size in CSS pixels, coordinates are integers in 1/q
+#     pixel units, and with d (delta) every point after the first of a
+#     stroke is the difference to the previous one, which keeps the numbers
+#     small. pen is signature_pad's min/max stroke width. A signature is a
+#     few KB instead of a full-canvas PNG and needs no image decoding.
+#
+#     The strokes are drawn into the signature field as PDF paths
+#     (midpoint-smoothed curves, round caps), scaled uniformly to fit the
+#     field box and centred in it, so they print crisply at any zoom.
+# ------------------------------------------------------------------------
+
+import os
+
+MAX_POINTS = int(os.environ.get("ESIGN_SIGNATURE_MAX_POINTS", "20000"))
+MAX_STROKES = 500
+MAX_PAD_SIZE = 10000  # CSS pixels
+DEFAULT_PEN = (0.5, 2.5)
+
+
+class VectorSignature:
+    """Decoded strokes in pad pixels (y down, as drawn on the canvas)."""
+
+    def __init__(self, strokes: list, width: float, height: float, pen: tuple = DEFAULT_PEN):
+        self.strokes = strokes  # [[(x, y), ...], ...]
+        self.width = width
+        self.height = height
+        self.pen = pen
+
+    @property
+    def point_count(self) -> int:
+        return sum(len(stroke) for stroke in self.strokes)
+
+    def bounds(self) -> tuple:
+        xs = [x for stroke in self.strokes for x, _ in stroke]
+        ys = [y for stroke in self.strokes for _, y in stroke]
+        return min(xs), min(ys), max(xs), max(ys)
+
+
+def _number(value, name: str, low: float, high: float) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        raise ValueError(f"Invalid vector signature: {name} must be a number in [{low}, {high}]")
+    return value
+
+
+def parse_vector_signature(payload: dict) -> VectorSignature:
+    """Validate and decode the wire format; raises ValueError on anything malformed."""
+    if not isinstance(payload, dict) or payload.get("v") != 1:
+        raise ValueError("Unsupported vector signature format")
+    width = _number(payload.get("w"), "w", 1, MAX_PAD_SIZE)
+    height = _number(payload.get("h"), "h", 1, MAX_PAD_SIZE)
+    quantum = _number(payload.get("q", 1), "q", 1, 16)
+    delta = bool(payload.get("d"))
+    pen = payload.get("pen") or DEFAULT_PEN
+    if not isinstance(pen, (list, tuple)) or len(pen) != 2:
+        raise ValueError("Invalid vector signature: pen must be [minWidth, maxWidth]")
+    pen = (_number(pen[0], "pen", 0.1, 20), _number(pen[1], "pen", 0.1, 20))
+
+    raw_strokes = payload.get("strokes")
+    if not isinstance(raw_strokes, list) or not raw_strokes or len(raw_strokes) > MAX_STROKES:
+        raise ValueError("Invalid vector signature: strokes must be a non-empty list")
+    limit = MAX_PAD_SIZE * quantum
+    strokes, total = [], 0
+    for raw in raw_strokes:
+        if not isinstance(raw, list) or len(raw) < 2 or len(raw) % 2:
+            raise ValueError("Invalid vector signature: each stroke is a flat list of x, y pairs")
+        total += len(raw) // 2
+        if total > MAX_POINTS:
+            raise ValueError(f"Vector signature has more than {MAX_POINTS} points")
+        points, x, y = [], 0, 0
+        for index in range(0, len(raw), 2):
+            dx, dy = raw[index], raw[index + 1]
+            if type(dx) is not int or type(dy) is not int:
+                raise ValueError("Invalid vector signature: coordinates must be integers")
+            if delta and index:
+                x, y = x + dx, y + dy
+            else:
+                x, y = dx, dy
+            if not (-limit <= x <= 2 * limit and -limit <= y <= 2 * limit):
+                raise ValueError("Invalid vector signature: point outside the pad")
+            points.append((x / quantum, y / quantum))
+        strokes.append(points)
+    return VectorSignature(strokes, width, height, pen)
+
+
+def draw_vector_signature(c, signature: VectorSignature, x: float, y: float, width: float, height: float) -> None:
+    """Draw the strokes on a reportlab canvas, fitted and centred in the box at (x, y)."""
+    pen = (signature.pen[0] + signature.pen[1]) / 2
+    left, top, right, bottom = signature.bounds()
+    # Pad by the pen width so the outermost strokes are not clipped by the box
+    left, top, right, bottom = left - pen, top - pen, right + pen, bottom + pen
+    scale = min(width / (right - left), height / (bottom - top))
+    offset_x = x + (width - (right - left) * scale) / 2
+    offset_y = y + (height - (bottom - top) * scale) / 2
+
+    def to_pdf(point):
+        # Canvas y grows downwards, PDF y upwards
+        return offset_x + (point[0] - left) * scale, offset_y + (bottom - point[1]) * scale
+
+    line_width = min(max(pen * scale, 0.4), 3.0)
+    c.saveState()
+    c.setStrokeColorRGB(0, 0, 0)
+    c.setFillColorRGB(0, 0, 0)
+    c.setLineWidth(line_width)
+    c.setLineCap(1)
+    c.setLineJoin(1)
+    path = c.beginPath()
+    for stroke in signature.strokes:
+        points = [to_pdf(point) for point in stroke]
+        if len(points) == 1 or all(point == points[0] for point in points):
+            c.circle(points[0][0], points[0][1], line_width / 2, stroke=0, fill=1)  # a dot
+            continue
+        path.moveTo(*points[0])
+        if len(points) == 2:
+            path.lineTo(*points[1])
+            continue
+        # Quadratic curves through the midpoints, written as cubics
+        previous = points[0]
+        for control, following in zip(points[1:-1], points[2:]):
+            end = ((control[0] + following[0]) / 2, (control[1] + following[1]) / 2)
+            path.curveTo(
+                previous[0] + 2 / 3 * (control[0] - previous[0]), previous[1] + 2 / 3 * (control[1] - previous[1]),
+                end[0] + 2 / 3 * (control[0] - end[0]), end[1] + 2 / 3 * (control[1] - end[1]),
+                *end,
+            )
+            previous = end
+        path.lineTo(*points[-1])
+    c.drawPath(path, stroke=1, fill=0)
+    c.restoreState()
@@ -7,6 +7,18 @@
 #     reportlab to generate a transparent overlay and PyPDF2 to merge
 #     the overlay with the original PDF. This function is called after a client
 #     submits their electronic signature through the signing interface.
+#     The output is written through the artifact storage layer
+#     (app/core/storage.py) and the storage key is returned.
+#     Before writing, the output stage deduplicates identical objects and
+#     compresses content streams; per-template "output" options in the
+#     registry can also pack object streams and linearize the file for
+#     fast first-page display (both need pikepdf), or select incremental
+#     mode: the template bytes are copied untouched and only the signed
+#     pages, their overlays and a new xref section are appended.
+#     Clients that send the pad's strokes (signature_vector, see
+#     app/core/signature_vector.py) get them drawn as PDF paths; the
+#     PNG remains the fallback, uploaded as binary (signature_image) or,
+#     from older clients, as base64.
 # ------------------------------------------------------------------------
 
 import base64
@@ -21,6 +33,10 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.utils import ImageReader
 from log_utils.logging_config import configure_logging
+from app.core.storage import get_storage, artifact_key
+from app.core.pdf_increment import IncrementalUpdate
+from app.core.signature_vector import parse_vector_signature, draw_vector_signature
+from app.core.metrics import StageTimer, record_pdf_size
 from PIL import Image
 from datetime import datetime
 
@@ -29,6 +45,120 @@ with open("/srv/apps/esign/config/template_registry.json", "r") as f:
 
 logger = configure_logging(name="apps.esign.signer", logfile="esign.log", level=None)
 
+# Decoded size limit for signature images (the pad is a few hundred pixels each way)
+MAX_SIGNATURE_PIXELS = 4096 * 4096
+
+# Output stage defaults; a template's "output" entry in the registry overrides them
+DEFAULT_OUTPUT_OPTIONS = {
+    "compress": True,         # deduplicate identical objects and deflate content streams
+    "object_streams": False,  # pack objects into compressed object streams (pikepdf)
+    "linearize": False,       # "fast web view" layout so page 1 shows before the download ends (pikepdf)
+    "incremental": False,     # append the signed pages to the original bytes instead of rewriting the file
+}
+
+_pikepdf_warned = False
+
+
+def output_options_for(template_key: str, overrides: dict = None) -> dict:
+    """Output stage options for a template: defaults, registry "output" entry, then overrides."""
+    options = dict(DEFAULT_OUTPUT_OPTIONS)
+    options.update(TEMPLATE_REGISTRY.get(template_key, {}).get("output", {}))
+    options.update(overrides or {})
+    return options
+
+
+def build_signed_document(template_path: str, overlays: dict, options: dict):
+    """
+    Merge the per-page overlays ({page number: overlay PDF stream}) onto the
+    template. Returns a PdfWriter, or in incremental mode an IncrementalUpdate
+    that touches only the pages receiving an overlay.
+    """
+    if options.get("incremental"):
+        document = IncrementalUpdate.from_file(template_path)
+        for page_number, overlay in overlays.items():
+            document.stamp_overlay(page_number, overlay, compress=options.get("compress"))
+        return document
+
+    template_pdf = PdfReader(template_path)
+    writer = PdfWriter()
+    for i, page in enumerate(template_pdf.pages):
+        page_number = i + 1
+        if page_number in overlays:
+            page.merge_page(PdfReader(overlays[page_number]).pages[0])
+        writer.add_page(page)
+    return writer
+
+
+def write_output(document, options: dict) -> io.BytesIO:
+    """Serialize the signed document with the requested output optimizations."""
+    if isinstance(document, IncrementalUpdate):
+        # Deduplication and repacking would rewrite the original revision
+        if options.get("object_streams") or options.get("linearize"):
+            logger.debug("Incremental output: object streams and linearization are skipped")
+        return document.write()
+
+    writer = document
+    if options.get("compress"):
+        for page in writer.pages:
+            page.compress_content_streams()
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    if options.get("object_streams") or options.get("linearize"):
+        buffer = _repack(buffer, options)
+    buffer.seek(0)
+    return buffer
+
+
+def _repack(buffer: io.BytesIO, options: dict) -> io.BytesIO:
+    """Rewrite with pikepdf (qpdf) for object streams and linearization; unchanged if unavailable."""
+    global _pikepdf_warned
+    try:
+        import pikepdf
+    except ImportError:
+        if not _pikepdf_warned:
+            logger.warning("pikepdf is not installed; skipping object streams and linearization")
+            _pikepdf_warned = True
+        return buffer
+    buffer.seek(0)
+    repacked = io.BytesIO()
+    with pikepdf.open(buffer) as pdf:
+        pdf.save(
+            repacked,
+            linearize=bool(options.get("linearize")),
+            compress_streams=bool(options.get("compress")),
+            object_stream_mode=(
+                pikepdf.ObjectStreamMode.generate if options.get("object_streams")
+                else pikepdf.ObjectStreamMode.preserve
+            ),
+        )
+    return repacked
+
+def _decode_signature_b64(signature_b64: str) -> bytes:
+    """Bytes of a base64 signature image, with or without a data: URI prefix."""
+    # Normalize and extract Base64 data
+    logger.debug(f"Raw signature input: {signature_b64[:30]!r}...")
+    b64_data = signature_b64.strip()
+    # If it's a Data‑URI, extract the part after "base64,"
+    match = re.match(r"^data:.*?;base64,(.+)$", b64_data, re.IGNORECASE)
+    if match:
+        b64_data = match.group(1).strip()
+
+    # Remove any whitespace or non-base64 characters
+    b64_clean = re.sub(r'[^A-Za-z0-9+/=]', '', b64_data)
+
+    # Add padding if necessary
+    missing_padding = len(b64_clean) % 4
+    if missing_padding:
+        b64_clean += '=' * (4 - missing_padding)
+
+    # Decode with validation
+    try:
+        return base64.b64decode(b64_clean, validate=True)
+    except Exception as decode_err:
+        logger.error(f"Failed to decode base64 signature: {decode_err}")
+        raise ValueError("Unable to decode signature image") from decode_err
+
 def embed_signature_on_pdf(
     template_key: str,
     output_path: str,
@@ -37,9 +167,14 @@ def embed_signature_on_pdf(
     sign_date: str,
     test_mode: bool = False,
     smoke_test: bool = False,
-    is_preview: bool = False
+    is_preview: bool = False,
+    signature_request_id=None,
+    output_options: dict = None,
+    signature_vector: dict = None,
+    signature_image: bytes = None
 ) -> str:
     try:
+        timer = StageTimer("embed_signature_on_pdf")
         logger.info("Starting signature embedding process.")
         if test_mode:
             logger.info("Test mode enabled. Output PDF will not be written.")
@@ -64,6 +199,7 @@ def embed_signature_on_pdf(
         logger.info(f"Template PDF found: {template_path}")
 
         # --- Signature image handling ---
+        signature_img = vector = None
         if is_preview:
             # Use the generic signature image for preview
             generic_sig_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static", "assets", "signature_here.png"))
@@ -72,38 +208,27 @@ def embed_signature_on_pdf(
                 raise FileNotFoundError(f"Generic signature image not found: {generic_sig_path}")
             signature_img = Image.open(generic_sig_path).convert("RGBA")
             logger.info("Using generic signature image for preview PDF.")
+        elif signature_vector is not None:
+            vector = parse_vector_signature(signature_vector)
+            logger.info(f"Vector signature parsed: {len(vector.strokes)} strokes, {vector.point_count} points.")
         else:
-            # Normalize and extract Base64 data
-            logger.debug(f"Raw signature input: {signature_b64[:30]!r}...")
-            b64_data = signature_b64.strip()
-            # If it's a Data‑URI, extract the part after "base64,"
-            match = re.match(r"^data:.*?;base64,(.+)$", b64_data, re.IGNORECASE)
-            if match:
-                b64_data = match.group(1).strip()
-
-            # Remove any whitespace or non-base64 characters
-            b64_clean = re.sub(r'[^A-Za-z0-9+/=]', '', b64_data)
-
-            # Add padding if necessary
-            missing_padding = len(b64_clean) % 4
-            if missing_padding:
-                b64_clean += '=' * (4 - missing_padding)
-
-            # Decode with validation
-            try:
-                signature_bytes = base64.b64decode(b64_clean, validate=True)
-            except Exception as decode_err:
-                logger.error(f"Failed to decode base64 signature: {decode_err}")
-                raise ValueError("Unable to decode signature image") from decode_err
+            if signature_image is not None:
+                # Binary upload: no base64 step
+                signature_bytes = signature_image
+            else:
+                signature_bytes = _decode_signature_b64(signature_b64)
 
             try:
-                signature_img = Image.open(io.BytesIO(signature_bytes)).convert("RGBA")
+                signature_img = Image.open(io.BytesIO(signature_bytes))
+                if signature_img.width * signature_img.height > MAX_SIGNATURE_PIXELS:
+                    raise ValueError(f"Signature image too large: {signature_img.width}x{signature_img.height}")
                 signature_img.verify()  # validate image file format
                 signature_img = Image.open(io.BytesIO(signature_bytes)).convert("RGBA")
             except Exception as decode_err:
                 logger.error("Failed to decode and parse signature image.")
                 raise ValueError("Invalid signature image format or corrupt data.") from decode_err
             logger.info("Signature image successfully decoded and verified.")
+        timer.lap("signature")
 
         overlay_buffers = {}
         for field in signature_fields:
@@ -119,7 +244,9 @@ def embed_signature_on_pdf(
             c = overlay_buffers[field["page"]]["canvas"]
             x, y = field["x"], field["y"]
             label = field["label"].lower()
-            if "signature" in label:
+            if "signature" in label and vector is not None:
+                draw_vector_signature(c, vector, x, y, field["width"], field["height"])
+            elif "signature" in label:
                 c.drawImage(ImageReader(signature_img), x, y, width=field["width"], height=field["height"], mask='auto')
             elif "name" in label:
                 c.setFont("Helvetica", 10)
@@ -131,15 +258,13 @@ def embed_signature_on_pdf(
         for key in overlay_buffers:
             overlay_buffers[key]["canvas"].save()
             overlay_buffers[key]["buffer"].seek(0)
+        timer.lap("overlay")
 
-        template_pdf = PdfReader(template_path)
-        writer = PdfWriter()
-        for i, page in enumerate(template_pdf.pages):
-            page_number = i + 1
-            if page_number in overlay_buffers:
-                overlay_pdf = PdfReader(overlay_buffers[page_number]["buffer"])
-                page.merge_page(overlay_pdf.pages[0])
-            writer.add_page(page)
+        options = output_options_for(template_key, output_options)
+        writer = build_signed_document(
+            template_path, {page: overlay["buffer"] for page, overlay in overlay_buffers.items()}, options
+        )
+        timer.lap("merge")
 
         if smoke_test:
             logger.info("Smoke test complete. PDF pipeline executed successfully.")
@@ -150,20 +275,39 @@ def embed_signature_on_pdf(
             last_name = client_name.strip().split()[-1].lower()
             # Get current date as YYYYMMDD
             date_folder = datetime.now().strftime("%Y%m%d")
-            # Create dated subfolder under the parent output dir
+            # output_path is a storage key such as "signed/<name>.pdf" (absolute paths
+            # under the storage root are accepted too); the file goes into a dated
+            # folder under the same prefix
+            storage = get_storage()
             signed_root = os.path.dirname(output_path)
-            dated_output_dir = os.path.join(signed_root, date_folder)
-            os.makedirs(dated_output_dir, exist_ok=True)
+            signed_root = storage.key_for(signed_root) if signed_root else ""
             base_output_name = os.path.basename(output_path)
             timestamp_suffix = datetime.now().strftime("%Y%m%d_%H%M%S")
             name_part, ext_part = os.path.splitext(base_output_name)
             final_output_name = f"{last_name}_{template_key}_{name_part}_{timestamp_suffix}{ext_part}"
-            output_path = os.path.join(dated_output_dir, final_output_name)
-            # Write the signed output PDF to the given path
-            with open(output_path, "wb") as f_out:
-                writer.write(f_out)
-            logger.info(f"Signed PDF written to: {output_path}")
-            return output_path
+            output_key = artifact_key(signed_root, date_folder, final_output_name)
+            buffer = write_output(writer, options)
+            timer.lap("write")
+            artifact = storage.put(output_key, buffer)
+            timer.lap("store")
+            record_pdf_size(template_key, "preview" if is_preview else "signed", artifact.size)
+            logger.info(f"Signed PDF written to {artifact.backend} storage: {artifact.key} ({artifact.size} bytes)")
+            if signature_request_id is not None:
+                # Imported here so the signer can run without a database when nothing is indexed
+                from app.core.artifacts import index_artifact, KIND_PREVIEW, KIND_SIGNED
+                try:
+                    index_artifact(artifact, KIND_PREVIEW if is_preview else KIND_SIGNED, signature_request_id)
+                except Exception:
+                    # Routes serve only indexed artifacts: fail before the caller records the request
+                    # as signed, and drop the file so no unservable copy is left behind
+                    logger.exception(f"Failed to index artifact {artifact.key}")
+                    try:
+                        storage.delete(artifact.key)
+                    except Exception:
+                        logger.exception(f"Failed to remove unindexed artifact {artifact.key}")
+                    raise
+                timer.lap("index")
+            return artifact.key
         # If test_mode, just return the intended output_path
         return output_path
     except Exception as e:
@@ -175,7 +319,7 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Manual test runner for embed_signature_on_pdf")
     parser.add_argument("--template", required=True, help="Template key name from the registry")
-    parser.add_argument("--output", required=True, help="Path to save the signed PDF")
+    parser.add_argument("--output", required=True, help="Storage key to save the signed PDF under (e.g. signed/test.pdf)")
     parser.add_argument("--signature", required=True, help="Path to a base64-encoded signature file (PNG)")
     parser.add_argument("--name", default="Test User", help="Client name")
     parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"), help="Signing date (YYYY-MM-DD)")
@@ -208,8 +352,8 @@ if __name__ == "__main__":
     # Example test logic with updated variable usage
     # (Assuming this block is for manual testing and demonstration)
     if not args.test and not args.smoke:
-        assert os.path.exists(output)
-        assert os.path.getsize(output) > 1000
+        stored = get_storage().stat(output)
+        assert stored is not None
+        assert stored.size > 1000
         # Cleanup after test
-        if os.path.exists(output):
-            os.remove(output)
\ No newline at end of file
+        get_storage().delete(output)
\ No newline at end of file
@@ -0,0 +1,293 @@
+# ------------------------------------------------------------------------
+# File: signing_jobs.py
+# Location: /srv/apps/esign/app/core/signing_jobs.py
+# Description:
+#     Background signing jobs. submit_signature validates the submission,
+#     records a SigningJob and returns its ID at once; the pipeline (PDF,
+#     Dropbox, Salesforce, final check) runs on a small in-process pool
+#     (ESIGN_SIGNING_WORKERS, default 4) and records each stage in the
+#     signing_jobs row as it finishes. The signing page polls the job's
+#     JSON status, so no request is held open for the whole pipeline.
+#
+#     A Server-Sent Events stream of the stages is also available, but each
+#     open stream occupies a worker thread for up to STREAM_SECONDS, which
+#     starves sync gunicorn workers. Streams are therefore off by default;
+#     set ESIGN_SIGNING_EVENT_STREAMS to the number of concurrent streams a
+#     process may serve, and only with gthread or gevent workers. Requests
+#     beyond the cap get a 503 and the page falls back to polling.
+#
+#     A job runs in a copy of the submitting request's context, so its
+#     stages are spans of the same trace (app/core/tracing.py).
+#
+#     Progress lives in the database, not in the worker, so the stream can
+#     be served by any app process. A retried submission for a request that
+#     already has a queued or running job gets that job back instead of
+#     starting the work again.
+# ------------------------------------------------------------------------
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from log_utils.logging_config import configure_logging
+from app.db.models import SigningJob, SignatureRequest
+from app.db.session import get_engine, get_session, SessionLocal
+from app.core.forking import reset_after_fork
+from app.core.metrics import STAGE_LATENCY, set_queue_depth, QUEUE_SIGNING_JOBS
+from app.core.tracing import bind_context, record_span, span
+
+logger = configure_logging(name="apps.esign.signing_jobs", logfile="esign.log", level=None)
+
+STAGE_GENERATE = "generate"
+STAGE_UPLOAD = "upload"
+STAGE_RECORDS = "records"
+STAGE_FINALIZE = "finalize"
+STAGES = (STAGE_GENERATE, STAGE_UPLOAD, STAGE_RECORDS, STAGE_FINALIZE)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+POLL_SECONDS = float(os.environ.get("ESIGN_SIGNING_POLL_SECONDS", "0.5"))
+STREAM_SECONDS = float(os.environ.get("ESIGN_SIGNING_STREAM_SECONDS", "120"))  # then the browser reconnects
+HEARTBEAT_SECONDS = 15
+# Concurrent event streams per process; 0 turns streaming off
+MAX_EVENT_STREAMS = int(os.environ.get("ESIGN_SIGNING_EVENT_STREAMS", "0"))
+# A queued or running job older than this is assumed lost with its process and no longer blocks a retry
+STALE_JOB_MINUTES = int(os.environ.get("ESIGN_SIGNING_STALE_MINUTES", "10"))
+
+
+def create_job(signature_request_id) -> tuple[SigningJob, bool]:
+    """
+    The active job for a signature request, or a new queued one. Returns
+    (job, created). The request row is locked meanwhile, so concurrent
+    submissions agree on one job.
+    """
+    session = get_session()
+    session.query(SignatureRequest).filter(SignatureRequest.id == signature_request_id).with_for_update().one()
+    stale_before = datetime.now(timezone.utc) - timedelta(minutes=STALE_JOB_MINUTES)
+    job = (
+        session.query(SigningJob)
+        .filter(
+            SigningJob.signature_request_id == signature_request_id,
+            SigningJob.status.in_(ACTIVE_STATUSES),
+            SigningJob.updated_at >= stale_before,
+        )
+        .order_by(SigningJob.created_at.desc())
+        .first()
+    )
+    created = job is None
+    if created:
+        job = SigningJob(signature_request_id=signature_request_id, status=STATUS_QUEUED, stages=[])
+        session.add(job)
+    session.commit()
+    return job, created
+
+
+def get_job(job_id) -> SigningJob | None:
+    return get_session().get(SigningJob, job_id)
+
+
+def job_state(job: SigningJob) -> dict:
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "stage": job.stage,
+        "stages": list(job.stages or []),
+        "redirect_url": job.redirect_url,
+        "error": job.error,
+    }
+
+
+class JobProgress:
+    """
+    Stage updates for one job, each committed on its own short-lived session.
+    Stage durations go to esign_stage_duration_seconds under `operation`.
+    """
+
+    def __init__(self, job_id, operation: str = "submit_signature"):
+        self.job_id = job_id
+        self.operation = operation
+        self._started = {}
+
+    def _update(self, **changes) -> None:
+        with Session(get_engine()) as session:
+            job = session.get(SigningJob, self.job_id)
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.updated_at = datetime.now(timezone.utc)
+            session.commit()
+
+    def start(self, stage: str) -> None:
+        self._started[stage] = (time.perf_counter(), time.time_ns())
+        self._update(status=STATUS_RUNNING, stage=stage)
+
+    def done(self, stage: str) -> None:
+        if stage in self._started:
+            started, started_ns = self._started.pop(stage)
+            STAGE_LATENCY.labels(self.operation, stage).observe(time.perf_counter() - started)
+            record_span(f"{self.operation}.{stage}", started_ns, time.time_ns(), operation=self.operation, stage=stage)
+        with Session(get_engine()) as session:
+            job = session.get(SigningJob, self.job_id)
+            # A new list, so the JSON column is seen as changed
+            job.stages = list(job.stages or []) + [{"stage": stage, "at": datetime.now(timezone.utc).isoformat()}]
+            job.stage = None
+            job.updated_at = datetime.now(timezone.utc)
+            session.commit()
+
+    def complete(self, redirect_url: str) -> None:
+        self._update(status=STATUS_COMPLETED, stage=None, redirect_url=redirect_url)
+
+    def fail(self, error: str) -> None:
+        self._update(status=STATUS_FAILED, stage=None, error=error)
+
+
+class SigningJobRunner:
+    def __init__(self, workers: int = None):
+        self.workers = workers or int(os.environ.get("ESIGN_SIGNING_WORKERS", "4"))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._outstanding = 0  # queued or running in this process
+        reset_after_fork(self)
+
+    def _after_fork(self) -> None:
+        # The parent's jobs are not running here
+        self._lock = threading.Lock()
+        self._executor = None
+        self._outstanding = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Caller holds the lock
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="signing-job")
+        return self._executor
+
+    def _track(self, change: int) -> None:
+        with self._lock:
+            self._outstanding += change
+            set_queue_depth(QUEUE_SIGNING_JOBS, self._outstanding)
+
+    def submit(self, job_id, pipeline, *args, **kwargs):
+        """Run pipeline(progress, *args, **kwargs) in the background; failures are recorded on the job."""
+        with self._lock:
+            pool = self._pool()
+        self._track(1)
+        future = pool.submit(bind_context(self._run), job_id, pipeline, args, kwargs)
+        future.add_done_callback(lambda _: self._track(-1))
+        return future
+
+    @staticmethod
+    def _run(job_id, pipeline, args, kwargs) -> None:
+        progress = JobProgress(job_id)
+        try:
+            with span("signing_job", job_id=str(job_id)):
+                pipeline(progress, *args, **kwargs)
+        except Exception as e:
+            logger.exception(f"Signing job {job_id} failed")
+            try:
+                progress.fail(str(e) or e.__class__.__name__)
+            except Exception:
+                logger.exception(f"Could not record the failure of signing job {job_id}")
+        finally:
+            # Worker threads get their own scoped session; drop it with the job
+            SessionLocal.remove()
+
+
+_runner = SigningJobRunner()
+
+
+def run_job(job_id, pipeline, *args, **kwargs):
+    return _runner.submit(job_id, pipeline, *args, **kwargs)
+
+
+def _sse(event: str, data: dict, event_id: int = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+_stream_slots = threading.BoundedSemaphore(MAX_EVENT_STREAMS) if MAX_EVENT_STREAMS > 0 else None
+
+
+def event_streams_enabled() -> bool:
+    return _stream_slots is not None
+
+
+def set_event_stream_limit(limit: int) -> None:
+    """Replace the per-process stream cap (tests); 0 turns streaming off."""
+    global _stream_slots
+    _stream_slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+
+class EventStream:
+    """job_events() holding one of the process's stream slots until the response is closed."""
+
+    def __init__(self, events, slots):
+        self._events = events
+        self._slots = slots
+        self._closed = False
+
+    def __iter__(self):
+        return self._events
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._events.close()
+            self._slots.release()
+
+
+def open_event_stream(job_id, last_event_id: int = 0) -> EventStream | None:
+    """An event stream for the job, or None when streams are off or every slot is taken."""
+    slots = _stream_slots
+    if slots is None or not slots.acquire(blocking=False):
+        return None
+    return EventStream(job_events(job_id, last_event_id=last_event_id), slots)
+
+
+def job_events(job_id, last_event_id: int = 0, poll_seconds: float = None, stream_seconds: float = None):
+    """
+    Server-Sent Events for a job: one "stage" event per completed stage
+    (ids count them, so a reconnect with Last-Event-ID resumes), "progress"
+    when a stage starts, then "done" or "failed". Ends after
+    stream_seconds; the browser reconnects.
+    """
+    poll_seconds = poll_seconds or POLL_SECONDS
+    deadline = time.monotonic() + (stream_seconds or STREAM_SECONDS)
+    sent, running, heartbeat = last_event_id, None, time.monotonic()
+    yield "retry: 1000\n\n"
+    with Session(get_engine()) as session:
+        while True:
+            job = session.get(SigningJob, job_id, populate_existing=True)
+            if job is None:
+                yield _sse("failed", {"error": "Unknown signing job."})
+                return
+            stages = list(job.stages or [])
+            for index in range(sent, len(stages)):
+                yield _sse("stage", stages[index], event_id=index + 1)
+            sent = max(sent, len(stages))
+            if job.stage and job.stage != running:
+                yield _sse("progress", {"stage": job.stage})
+            running = job.stage
+            if job.status == STATUS_COMPLETED:
+                yield _sse("done", {"redirect_url": job.redirect_url})
+                return
+            if job.status == STATUS_FAILED:
+                yield _sse("failed", {"error": "Error saving signed document."})
+                return
+            session.rollback()  # end the read transaction so the next poll sees new commits
+            if time.monotonic() >= deadline:
+                return
+            if time.monotonic() - heartbeat >= HEARTBEAT_SECONDS:
+                heartbeat = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(poll_seconds)
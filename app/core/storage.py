@@ -0,0 +1,698 @@
+# ------------------------------------------------------------------------
+# File: storage.py
+# Location: /srv/apps/esign/app/core/storage.py
+# Description:
+#     Pluggable storage for generated artifacts (preview and signed PDFs).
+#     Artifacts are addressed by a relative key such as
+#     "signed/20250615/doe_cea_ab12cd34_signed_20250615_152703.pdf" and can
+#     be written and read as streams on any node. Backends:
+#
+#       local    files under ESIGN_STORAGE_ROOT (default: the app root),
+#                which may be a shared mount for multi-node deployments
+#       dropbox  files under ESIGN_DROPBOX_STORAGE_ROOT in the eSign team
+#                folder, reached through the Dropbox circuit breaker
+#       memory   process-local dictionary, for tests and smoke runs
+#
+#     Select the backend with ESIGN_STORAGE_BACKEND (default: local).
+#
+#     send_artifact() serves an artifact over HTTP. For local storage it can
+#     hand the transfer to the fronting web server instead of streaming it
+#     from the worker (ESIGN_FILE_DELIVERY, see file_delivery_mode()).
+# ------------------------------------------------------------------------
+
+import hashlib
+import io
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import uuid
+from urllib.parse import quote
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging(name="apps.esign.storage", logfile="esign.log", level=None)
+
+APP_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CHUNK_SIZE = 64 * 1024
+
+BACKEND_LOCAL = "local"
+BACKEND_DROPBOX = "dropbox"
+BACKEND_MEMORY = "memory"
+
+# How send_artifact() delivers local files:
+#   app         stream from the gunicorn worker (send_file)
+#   x-accel     nginx internal redirect (X-Accel-Redirect to ESIGN_X_ACCEL_PREFIX + key)
+#   x-sendfile  Apache mod_xsendfile / lighttpd (X-Sendfile with the absolute path)
+DELIVERY_APP = "app"
+DELIVERY_X_ACCEL = "x-accel"
+DELIVERY_X_SENDFILE = "x-sendfile"
+DELIVERY_MODES = (DELIVERY_APP, DELIVERY_X_ACCEL, DELIVERY_X_SENDFILE)
+
+# nginx location marked "internal" whose alias is the local storage root
+X_ACCEL_PREFIX = os.environ.get("ESIGN_X_ACCEL_PREFIX", "/_esign_files/")
+
+
+class ArtifactNotFoundError(FileNotFoundError):
+    """Raised when no artifact is stored under the requested key."""
+
+
+class StoredArtifact:
+    """Metadata for a stored artifact."""
+
+    def __init__(self, key: str, size: int, sha256: str = None, content_type: str = "application/pdf",
+                 backend: str = None, location: str = None, url: str = None, modified_at: datetime = None):
+        self.key = key
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+        self.backend = backend
+        self.location = location        # backend-specific path (local file path, Dropbox path, ...)
+        self.url = url                  # direct download URL, if the backend offers one
+        self.modified_at = modified_at
+
+    @property
+    def filename(self) -> str:
+        return posixpath.basename(self.key)
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "size": self.size,
+            "sha256": self.sha256,
+            "content_type": self.content_type,
+            "backend": self.backend,
+            "location": self.location,
+            "url": self.url,
+            "modified_at": self.modified_at.isoformat() if self.modified_at else None,
+        }
+
+
+def normalize_key(key: str) -> str:
+    """Validate a relative artifact key and return it in canonical form."""
+    if not key:
+        raise ValueError("Artifact key must not be empty")
+    normalized = posixpath.normpath(key.replace("\\", "/")).lstrip("/")
+    if normalized in ("", ".") or normalized.startswith("../") or normalized == "..":
+        raise ValueError(f"Invalid artifact key: {key!r}")
+    return normalized
+
+
+def artifact_key(*parts: str) -> str:
+    return normalize_key(posixpath.join(*parts))
+
+
+class _HashingReader:
+    """Reads a stream in chunks while tracking its size and SHA-256."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def chunks(self):
+        while True:
+            chunk = self.stream.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            self.size += len(chunk)
+            self._sha256.update(chunk)
+            yield chunk
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+
+class _IterStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (e.g. an HTTP response body)."""
+
+    def __init__(self, chunks, close=None):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self._on_close = close
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed and self._on_close:
+            self._on_close()
+        super().close()
+
+
+class _RangeReader(io.RawIOBase):
+    """Read-only view of `length` bytes of an underlying stream, from its current position."""
+
+    def __init__(self, stream, length: int):
+        self._stream = stream
+        self._remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._remaining <= 0:
+            return 0
+        data = self._stream.read(min(len(b), self._remaining))
+        b[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+class StorageBackend:
+    """Interface shared by all storage backends."""
+
+    name = None
+
+    def put(self, key: str, stream, content_type: str = "application/pdf") -> StoredArtifact:
+        """Store the contents of a binary stream under key, replacing any existing artifact."""
+        raise NotImplementedError
+
+    def put_bytes(self, key: str, data: bytes, content_type: str = "application/pdf") -> StoredArtifact:
+        return self.put(key, io.BytesIO(data), content_type)
+
+    def put_file(self, key: str, local_path: str, content_type: str = "application/pdf") -> StoredArtifact:
+        with open(local_path, "rb") as f:
+            return self.put(key, f, content_type)
+
+    def open(self, key: str):
+        """Return a readable binary stream. Raises ArtifactNotFoundError."""
+        raise NotImplementedError
+
+    def read_bytes(self, key: str) -> bytes:
+        with self.open(key) as stream:
+            return stream.read()
+
+    def open_range(self, key: str, offset: int, length: int):
+        """Readable stream over `length` bytes at `offset` (e.g. one member of an archive)."""
+        stream = self.open(key)
+        if stream.seekable():
+            stream.seek(offset)
+        else:
+            remaining = offset
+            while remaining:
+                skipped = len(stream.read(min(CHUNK_SIZE, remaining)))
+                if not skipped:
+                    break
+                remaining -= skipped
+        return _RangeReader(stream, length)
+
+    def stat(self, key: str) -> StoredArtifact | None:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def delete(self, key: str) -> bool:
+        """Remove the artifact. Returns False if it did not exist."""
+        raise NotImplementedError
+
+    def url(self, key: str) -> str | None:
+        """A direct download URL for the artifact, if the backend can provide one."""
+        return None
+
+    def local_path(self, key: str) -> str | None:
+        """Path on this node's filesystem, if the backend keeps artifacts there."""
+        return None
+
+    def key_for(self, path_or_key: str) -> str:
+        """Map a stored reference (a key, or a legacy absolute path) to a key."""
+        return normalize_key(path_or_key)
+
+    @contextmanager
+    def local_copy(self, key: str):
+        """Yield a filesystem path holding the artifact, for APIs that need one."""
+        path = self.local_path(key)
+        if path and os.path.isfile(path):
+            yield path
+            return
+        suffix = posixpath.splitext(key)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            with self.open(key) as stream:
+                shutil.copyfileobj(stream, tmp, CHUNK_SIZE)
+        try:
+            yield tmp.name
+        finally:
+            os.remove(tmp.name)
+
+
+class LocalStorage(StorageBackend):
+    name = BACKEND_LOCAL
+
+    def __init__(self, root: str = None):
+        self.root = os.path.abspath(root or APP_ROOT)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *normalize_key(key).split("/"))
+
+    def put(self, key: str, stream, content_type: str = "application/pdf") -> StoredArtifact:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        reader = _HashingReader(stream)
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in reader.chunks():
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return StoredArtifact(normalize_key(key), reader.size, reader.sha256, content_type, self.name, path,
+                              modified_at=datetime.now(timezone.utc))
+
+    def open(self, key: str):
+        try:
+            return open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise ArtifactNotFoundError(key)
+
+    def stat(self, key: str) -> StoredArtifact | None:
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return StoredArtifact(normalize_key(key), st.st_size, None, "application/pdf", self.name, path,
+                              modified_at=datetime.fromtimestamp(st.st_mtime, timezone.utc))
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def local_path(self, key: str) -> str | None:
+        return self._path(key)
+
+    def key_for(self, path_or_key: str) -> str:
+        # Rows written before the storage layer hold absolute paths under the app root
+        if os.path.isabs(path_or_key):
+            path = os.path.abspath(path_or_key)
+            if os.path.commonpath([self.root, path]) != self.root:
+                raise ValueError(f"Path is outside the storage root: {path_or_key}")
+            return normalize_key(os.path.relpath(path, self.root).replace(os.sep, "/"))
+        return normalize_key(path_or_key)
+
+
+class MemoryStorage(StorageBackend):
+    name = BACKEND_MEMORY
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, stream, content_type: str = "application/pdf") -> StoredArtifact:
+        key = normalize_key(key)
+        reader = _HashingReader(stream)
+        data = b"".join(reader.chunks())
+        artifact = StoredArtifact(key, reader.size, reader.sha256, content_type, self.name, f"memory:{key}",
+                                  modified_at=datetime.now(timezone.utc))
+        with self._lock:
+            self._objects[key] = (data, artifact)
+        return artifact
+
+    def open(self, key: str):
+        with self._lock:
+            entry = self._objects.get(normalize_key(key))
+        if entry is None:
+            raise ArtifactNotFoundError(key)
+        return io.BytesIO(entry[0])
+
+    def stat(self, key: str) -> StoredArtifact | None:
+        with self._lock:
+            entry = self._objects.get(normalize_key(key))
+        return entry[1] if entry else None
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._objects.pop(normalize_key(key), None) is not None
+
+    def keys(self) -> list:
+        with self._lock:
+            return sorted(self._objects)
+
+
+def team_folder_client(shared_folder_id: str = None):
+    """Dropbox client rooted in the eSign team folder's shared-folder namespace."""
+    from dropbox import common
+    from utils.dropbox_api.client import DropboxClient
+
+    client = DropboxClient(use_shared_app=True)
+    metadata = client.dbx.sharing_get_folder_metadata(shared_folder_id or team_folder_id())
+    return client.dbx.with_path_root(common.PathRoot.namespace_id(metadata.shared_folder_id))
+
+
+def team_folder_id() -> str:
+    return os.environ.get("DROPBOX_ESIGN_FOLDER_ID", "1387609128")
+
+
+class DropboxStorage(StorageBackend):
+    """
+    Artifacts in the eSign Dropbox team folder, using the same shared-folder
+    namespace as utils.dropbox_api.upload_file. All calls go through the
+    Dropbox circuit breaker and bulkhead.
+    """
+
+    name = BACKEND_DROPBOX
+
+    def __init__(self, root: str = "/Potential Clients/_esign", shared_folder_id: str = None, recent_size: int = 256,
+                 session_chunk_size: int = None):
+        self.root = "/" + root.strip("/")
+        self.shared_folder_id = shared_folder_id or team_folder_id()
+        # Artifacts larger than one chunk go up in an upload session, one chunk in memory at a time
+        self.session_chunk_size = session_chunk_size or int(
+            float(os.environ.get("ESIGN_DROPBOX_CHUNK_MB", "8")) * 1024 * 1024)
+        self._dbx = None
+        self._lock = threading.Lock()
+        # Metadata of artifacts written by this process, so a put followed by stat costs one call
+        self._recent = OrderedDict()
+        self._recent_size = recent_size
+
+    def _client(self):
+        with self._lock:
+            if self._dbx is None:
+                self._dbx = team_folder_client(self.shared_folder_id)
+            return self._dbx
+
+    def _call(self, func, *args, **kwargs):
+        from app.core.resilience import get_dependency, DROPBOX
+        return get_dependency(DROPBOX).call(func, *args, **kwargs)
+
+    def _path(self, key: str) -> str:
+        return f"{self.root.rstrip('/')}/{normalize_key(key)}"
+
+    @staticmethod
+    def _is_not_found(error) -> bool:
+        from dropbox.exceptions import ApiError
+        return isinstance(error, ApiError) and "not_found" in str(error.error)
+
+    def _remember(self, artifact: StoredArtifact) -> None:
+        with self._lock:
+            self._recent[artifact.key] = artifact
+            self._recent.move_to_end(artifact.key)
+            while len(self._recent) > self._recent_size:
+                self._recent.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._recent.pop(key, None)
+
+    def put(self, key: str, stream, content_type: str = "application/pdf") -> StoredArtifact:
+        from dropbox.files import CommitInfo, UploadSessionCursor, WriteMode
+
+        key = normalize_key(key)
+        path = self._path(key)
+        reader = _HashingReader(stream)
+        pending, session_id, offset = bytearray(), None, 0
+        for chunk in reader.chunks():
+            pending += chunk
+            if len(pending) < self.session_chunk_size:
+                continue
+            data = bytes(pending[:self.session_chunk_size])
+            del pending[:self.session_chunk_size]
+            if session_id is None:
+                session_id = self._call(lambda: self._client().files_upload_session_start(data)).session_id
+            else:
+                cursor = UploadSessionCursor(session_id, offset)
+                self._call(lambda: self._client().files_upload_session_append_v2(data, cursor))
+            offset += len(data)
+        data = bytes(pending)
+        if session_id is None:
+            metadata = self._call(lambda: self._client().files_upload(data, path, mode=WriteMode.overwrite))
+        else:
+            cursor = UploadSessionCursor(session_id, offset)
+            commit = CommitInfo(path=path, mode=WriteMode.overwrite)
+            metadata = self._call(lambda: self._client().files_upload_session_finish(data, cursor, commit))
+        artifact = StoredArtifact(key, reader.size, reader.sha256, content_type, self.name, metadata.path_display,
+                                  modified_at=metadata.server_modified.replace(tzinfo=timezone.utc))
+        self._remember(artifact)
+        return artifact
+
+    def open(self, key: str):
+        try:
+            _, response = self._call(lambda: self._client().files_download(self._path(key)))
+        except Exception as e:
+            if self._is_not_found(e):
+                raise ArtifactNotFoundError(key)
+            raise
+        return io.BufferedReader(_IterStream(response.iter_content(CHUNK_SIZE), response.close), CHUNK_SIZE)
+
+    def stat(self, key: str) -> StoredArtifact | None:
+        key = normalize_key(key)
+        with self._lock:
+            if key in self._recent:
+                return self._recent[key]
+        try:
+            metadata = self._call(lambda: self._client().files_get_metadata(self._path(key)))
+        except Exception as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        artifact = StoredArtifact(key, metadata.size, None, "application/pdf", self.name, metadata.path_display,
+                                  modified_at=metadata.server_modified.replace(tzinfo=timezone.utc))
+        self._remember(artifact)
+        return artifact
+
+    def delete(self, key: str) -> bool:
+        key = normalize_key(key)
+        self._forget(key)
+        try:
+            self._call(lambda: self._client().files_delete_v2(self._path(key)))
+            return True
+        except Exception as e:
+            if self._is_not_found(e):
+                return False
+            raise
+
+    def url(self, key: str) -> str | None:
+        # Temporary links are valid for four hours
+        return self._call(lambda: self._client().files_get_temporary_link(self._path(key))).link
+
+
+def build_storage(backend: str = None) -> StorageBackend:
+    backend = (backend or os.environ.get("ESIGN_STORAGE_BACKEND", BACKEND_LOCAL)).lower()
+    if backend == BACKEND_LOCAL:
+        return LocalStorage(os.environ.get("ESIGN_STORAGE_ROOT") or APP_ROOT)
+    if backend == BACKEND_DROPBOX:
+        return DropboxStorage(os.environ.get("ESIGN_DROPBOX_STORAGE_ROOT", "/Potential Clients/_esign"))
+    if backend == BACKEND_MEMORY:
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Return the process-wide storage backend, configured from ESIGN_STORAGE_* environment variables."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = build_storage()
+            logger.info(f"Using {_storage.name} artifact storage")
+        return _storage
+
+
+def set_storage(storage: StorageBackend | None) -> None:
+    """Replace the process-wide backend (tests); None re-reads the environment on next use."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
+
+
+def publish_to_team_folder(key: str, storage: StorageBackend = None) -> tuple[bool, str | None]:
+    """
+    Make a signed artifact available in the eSign Dropbox team folder and
+    return (success, dropbox_path). Artifacts already stored in Dropbox are
+    not uploaded again. Packets above the upload-session threshold go up in
+    chunks (app/integrations/dropbox/upload.py) instead of one call.
+
+    Every Dropbox call in here goes through the Dropbox circuit breaker and
+    bulkhead on its own, so callers must not wrap this in the dependency
+    too: a caller's slot held around the inner calls would starve them.
+    DependencyUnavailableError is raised (not returned as a failure) so the
+    caller can defer the upload.
+    """
+    from app.core.resilience import get_dependency, DependencyUnavailableError, DROPBOX
+
+    storage = storage or get_storage()
+    if storage.name == BACKEND_DROPBOX:
+        artifact = storage.stat(key)
+        return (artifact is not None), (artifact.location if artifact else None)
+
+    from utils.dropbox_api.upload_file import upload_file_to_team_folder
+    from app.integrations.dropbox.upload import SessionUploader, team_folder_path
+
+    with storage.local_copy(key) as path:
+        uploader = SessionUploader()
+        if os.path.getsize(path) <= uploader.threshold:
+            def upload():
+                success, dropbox_path = upload_file_to_team_folder(local_path=path, filename=posixpath.basename(key))
+                if not success:
+                    raise RuntimeError(f"Dropbox upload of {key} failed")
+                return dropbox_path
+            try:
+                return True, get_dependency(DROPBOX).call(upload)
+            except DependencyUnavailableError:
+                raise
+            except Exception as e:
+                logger.error(f"Upload of {key} to the team folder failed: {e}")
+                return False, None
+        try:
+            metadata = uploader.upload(path, team_folder_path(posixpath.basename(key)))
+        except DependencyUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"Chunked upload of {key} to the team folder failed: {e}")
+            return False, None
+        return True, metadata.path_display
+
+
+_team_folder = None
+
+
+def team_folder_storage() -> DropboxStorage:
+    """
+    The whole eSign team folder as a read backend, keyed by Dropbox path:
+    the remote_path recorded in the artifact index opens the uploaded copy.
+    """
+    global _team_folder
+    with _storage_lock:
+        if _team_folder is None:
+            _team_folder = DropboxStorage("/")
+        return _team_folder
+
+
+def file_delivery_mode(route: str = None) -> str:
+    """
+    Delivery mode for a file-serving route: ESIGN_FILE_DELIVERY_<ROUTE>
+    (e.g. ESIGN_FILE_DELIVERY_DOWNLOAD), then ESIGN_FILE_DELIVERY, then "app".
+    """
+    mode = os.environ.get(f"ESIGN_FILE_DELIVERY_{route.upper()}", "") if route else ""
+    mode = (mode or os.environ.get("ESIGN_FILE_DELIVERY", DELIVERY_APP)).strip().lower()
+    if mode not in DELIVERY_MODES:
+        logger.warning(f"Unknown file delivery mode {mode!r} for route {route}; using {DELIVERY_APP}")
+        return DELIVERY_APP
+    return mode
+
+
+def send_artifact(key: str, download_name: str = None, as_attachment: bool = False, storage: StorageBackend = None,
+                  sha256: str = None, size: int = None, last_modified: datetime = None, max_age: int = 0,
+                  delivery: str = DELIVERY_APP, archive: tuple = None):
+    """
+    Flask response streaming an artifact from whichever backend holds it.
+
+    The response is conditional: the SHA-256 (when known) becomes a strong
+    ETag, If-None-Match / If-Modified-Since are answered with 304 before the
+    backend is touched, and byte ranges are served with 206. Artifacts are
+    personal documents, so caching is private to the browser.
+
+    With delivery "x-accel" or "x-sendfile" a local file is not streamed by
+    the worker: the response carries only headers and the internal-redirect
+    header, and the fronting web server sends the file (including ranges).
+    Other backends have no path the web server can read and fall back to
+    streaming.
+
+    archive=(archive_key, offset) serves an artifact that was compacted into
+    an archive: its `size` bytes are read from that offset of the archive.
+    """
+    from flask import current_app, request, send_file
+    from werkzeug.http import is_resource_modified
+    from werkzeug.wsgi import wrap_file
+
+    storage = storage or get_storage()
+    download_name = download_name or posixpath.basename(key)
+    if archive and size is None:
+        raise ValueError("Serving an archived artifact needs its size")
+    path = None if archive else storage.local_path(key)
+    if path and not os.path.isfile(path):
+        raise ArtifactNotFoundError(key)
+
+    if (sha256 or last_modified) and not is_resource_modified(request.environ, etag=sha256,
+                                                              last_modified=last_modified):
+        response = current_app.response_class(status=304)
+        _set_validators(response, sha256, last_modified)
+        return _private_cache(response, max_age)
+
+    if path:
+        if delivery in (DELIVERY_X_ACCEL, DELIVERY_X_SENDFILE):
+            # Empty body: the web server substitutes the file and sets its own Content-Length
+            response = current_app.response_class(b"", mimetype="application/pdf")
+            if delivery == DELIVERY_X_ACCEL:
+                response.headers["X-Accel-Redirect"] = quote(X_ACCEL_PREFIX.rstrip("/") + "/" + normalize_key(key))
+            else:
+                response.headers["X-Sendfile"] = path
+            response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline",
+                                 filename=download_name)
+            response.accept_ranges = "bytes"
+            _set_validators(response, sha256, last_modified)
+            return _private_cache(response, max_age)
+
+        response = send_file(path, mimetype="application/pdf", as_attachment=as_attachment,
+                             download_name=download_name, conditional=True, etag=sha256 or True,
+                             last_modified=last_modified, max_age=max_age)
+        # Advertised on full responses too, so PDF viewers switch to range loading
+        response.accept_ranges = "bytes"
+        return _private_cache(response, max_age)
+
+    if size is None:
+        stored = storage.stat(key)
+        if stored is None:
+            raise ArtifactNotFoundError(key)
+        size = stored.size
+    stream = storage.open_range(archive[0], archive[1], size) if archive else storage.open(key)
+    response = current_app.response_class(wrap_file(request.environ, stream), mimetype="application/pdf",
+                                          direct_passthrough=True)
+    response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline", filename=download_name)
+    response.content_length = size
+    response.accept_ranges = "bytes"
+    _set_validators(response, sha256, last_modified)
+    _private_cache(response, max_age)
+    # Non-seekable streams are skipped forward for ranges, so only the requested bytes go to the client
+    return response.make_conditional(request.environ, accept_ranges=True, complete_length=size)
+
+
+def _set_validators(response, sha256: str, last_modified: datetime) -> None:
+    if sha256:
+        response.set_etag(sha256)
+    if last_modified:
+        response.last_modified = last_modified
+
+
+def _private_cache(response, max_age: int):
+    response.cache_control.public = None
+    response.cache_control.private = True
+    if max_age:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    # Revalidation is cheap (304 from the index), so stale copies are never used
+    response.cache_control.must_revalidate = True
+    return response
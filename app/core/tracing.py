@@ -0,0 +1,499 @@
+# ------------------------------------------------------------------------
+# File: tracing.py
+# Location: /srv/apps/esign/app/core/tracing.py
+# Description:
+#     Lightweight request tracing. Every request gets a trace ID at the
+#     edge: taken from a W3C traceparent header, else from X-Request-ID,
+#     else generated. The ID is returned in X-Request-ID and traceparent
+#     and prefixed to every log line written while the request (or work
+#     started by it) runs, as "[trace=<id>]".
+#
+#     The current span lives in a contextvar. Stage and dependency timers
+#     (app/core/metrics.py) and database statements add child spans, and
+#     work handed to the background carries the context along: signing
+#     jobs and preview renders run in a copy of the submitting context,
+#     webhook messages and deferred tasks store the trace ID with the
+#     message or task.
+#
+#     Finished spans are batched by a background thread and exported
+#     (ESIGN_TRACE_EXPORT):
+#       none   IDs and log correlation only (default)
+#       jsonl  one JSON object per span appended to ESIGN_TRACE_FILE, which
+#              is rotated at ESIGN_TRACE_FILE_MAX_MB (default 100) keeping
+#              ESIGN_TRACE_FILE_BACKUPS old files (default 3)
+#       otlp   OTLP/HTTP JSON posted to ESIGN_OTLP_ENDPOINT
+#     ESIGN_TRACE_SAMPLE_RATE (default 1) sets the share of new traces that
+#     are exported; an incoming traceparent's sampled flag is honoured.
+#     Every request with its statements is several spans, so a busy server
+#     exporting to jsonl should also lower the sample rate.
+#     scripts/trace_report.py breaks a trace down from the JSONL file.
+# ------------------------------------------------------------------------
+
+import atexit
+import contextvars
+import fcntl
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+from app.core.forking import reset_after_fork
+
+APP_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+EXPORT_JSONL = "jsonl"
+EXPORT_OTLP = "otlp"
+EXPORT_NONE = "none"
+
+KIND_INTERNAL = "internal"
+KIND_SERVER = "server"
+KIND_CLIENT = "client"
+_OTLP_KINDS = {KIND_INTERNAL: 1, KIND_SERVER: 2, KIND_CLIENT: 3}
+
+SERVICE_NAME = "esign"
+REQUEST_ID_HEADER = "X-Request-ID"
+MAX_ATTRIBUTE_LENGTH = 256
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Not logged through configure_logging: export problems must not feed back into traced log lines
+logger = logging.getLogger("apps.esign.tracing")
+
+_current_span = contextvars.ContextVar("esign_current_span", default=None)
+
+
+class SpanContext:
+    """The identity of a span, enough to continue its trace elsewhere (another thread, a queued task)."""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str | None, sampled: bool = True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def to_dict(self) -> dict:
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "sampled": self.sampled}
+
+    @classmethod
+    def from_dict(cls, data) -> "SpanContext | None":
+        if not isinstance(data, dict) or not _TRACE_ID.match(str(data.get("trace_id", ""))):
+            return None
+        return cls(data["trace_id"], data.get("span_id"), bool(data.get("sampled", True)))
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "sampled",
+                 "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, sampled: bool,
+                 kind: str = KIND_INTERNAL, attributes: dict = None, start_ns: int = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = {}
+        self.error = None
+        self._token = None
+        for key, value in (attributes or {}).items():
+            self.set_attribute(key, value)
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id, self.sampled)
+
+    @property
+    def duration_ms(self) -> float | None:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value) -> None:
+        if value is None:
+            return
+        if not isinstance(value, (bool, int, float)):
+            value = str(value)[:MAX_ATTRIBUTE_LENGTH]
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3) if self.end_ns is not None else None,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+            "pid": os.getpid(),
+        }
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def _sample() -> bool:
+    try:
+        rate = float(os.environ.get("ESIGN_TRACE_SAMPLE_RATE", "1"))
+    except ValueError:
+        rate = 1.0
+    return rate >= 1 or random.random() < rate
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def current_trace_id() -> str | None:
+    active = _current_span.get()
+    return active.trace_id if active is not None else None
+
+
+def current_context() -> SpanContext | None:
+    active = _current_span.get()
+    return active.context if active is not None else None
+
+
+def start_span(name: str, kind: str = KIND_INTERNAL, parent: SpanContext = None, attributes: dict = None,
+               trace_id: str = None) -> Span:
+    """
+    Start a span and make it current. The parent is `parent` if given,
+    else the current span; without either a new trace starts (with
+    `trace_id` if given). Must be ended with end_span in the same context.
+    """
+    parent = parent or current_context()
+    if parent is not None:
+        started = Span(name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+    else:
+        started = Span(name, trace_id or new_trace_id(), None, _sample(), kind, attributes)
+    started._token = _current_span.set(started)
+    return started
+
+
+def end_span(finished: Span, error: BaseException | str = None) -> None:
+    finished.end_ns = time.time_ns()
+    if error is not None:
+        finished.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"[:MAX_ATTRIBUTE_LENGTH]
+    if finished._token is not None:
+        try:
+            _current_span.reset(finished._token)
+        except ValueError:
+            # Ended from another context (e.g. a streamed response closed elsewhere)
+            pass
+        finished._token = None
+    if finished.sampled:
+        get_exporter().export(finished)
+
+
+@contextmanager
+def span(name: str, kind: str = KIND_INTERNAL, parent: SpanContext = None, **attributes):
+    """Run the block in a child span of the current one (or of `parent`)."""
+    current = start_span(name, kind, parent, attributes)
+    try:
+        yield current
+    except BaseException as e:
+        end_span(current, e)
+        raise
+    end_span(current)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, kind: str = KIND_INTERNAL, error: str = None,
+                **attributes) -> None:
+    """Record an already finished child of the current span (no-op outside a trace)."""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        return
+    finished = Span(name, parent.trace_id, parent.span_id, True, kind, attributes, start_ns=start_ns)
+    finished.end_ns = end_ns
+    finished.error = error
+    get_exporter().export(finished)
+
+
+def bind_context(func):
+    """func wrapped to run in a copy of the current context, e.g. for ThreadPoolExecutor.submit."""
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+# -- edge: incoming requests ----------------------------------------------
+
+def parse_traceparent(header: str | None) -> SpanContext | None:
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+def format_traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-{'01' if span.sampled else '00'}"
+
+
+def incoming_context(headers) -> tuple[SpanContext | None, str | None]:
+    """(remote parent, trace ID to use) from request headers; both None for a fresh trace."""
+    remote = parse_traceparent(headers.get("traceparent"))
+    if remote is not None:
+        return remote, None
+    request_id = (headers.get(REQUEST_ID_HEADER) or "").strip()
+    if not request_id:
+        return None, None
+    if _TRACE_ID.match(request_id.lower()):
+        return None, request_id.lower()
+    # Any other request ID maps to a stable trace ID; the original is kept as an attribute
+    return None, hashlib.sha256(request_id.encode()).hexdigest()[:32]
+
+
+def install_tracing(app) -> None:
+    """Open a server span per request and return its trace ID to the client."""
+    from flask import g, request
+
+    install_log_correlation()
+
+    @app.before_request
+    def _start_request_span():
+        remote, trace_id = incoming_context(request.headers)
+        g.trace_span = start_span(
+            f"{request.method} {request.path}", KIND_SERVER, remote,
+            {"http.method": request.method, "request_id": request.headers.get(REQUEST_ID_HEADER)},
+            trace_id=trace_id,
+        )
+
+    @app.after_request
+    def _return_trace_id(response):
+        request_span = g.get("trace_span")
+        if request_span is not None:
+            if request.url_rule is not None:
+                # The rule, not the URL, so tokens stay out of span names
+                request_span.name = f"{request.method} {request.url_rule.rule}"
+                request_span.set_attribute("http.route", request.url_rule.rule)
+            request_span.set_attribute("http.status_code", response.status_code)
+            response.headers.setdefault(REQUEST_ID_HEADER, request.headers.get(REQUEST_ID_HEADER)
+                                        or request_span.trace_id)
+            response.headers["traceparent"] = format_traceparent(request_span)
+        return response
+
+    @app.teardown_request
+    def _end_request_span(error=None):
+        request_span = g.pop("trace_span", None)
+        if request_span is not None:
+            if request.url_rule is None:
+                request_span.name = f"{request.method} <unmatched>"
+            end_span(request_span, error)
+
+
+# -- log correlation ------------------------------------------------------
+
+_log_factory_installed = False
+
+
+def install_log_correlation() -> None:
+    """Stamp log records with the current trace (record.trace_id, and a "[trace=...]" message prefix)."""
+    global _log_factory_installed
+    if _log_factory_installed:
+        return
+    _log_factory_installed = True
+    previous = logging.getLogRecordFactory()
+    prefix = os.environ.get("ESIGN_TRACE_LOG_PREFIX", "true").lower() != "false"
+
+    def factory(*args, **kwargs):
+        record = previous(*args, **kwargs)
+        current = _current_span.get()
+        record.trace_id = current.trace_id if current is not None else ""
+        record.span_id = current.span_id if current is not None else ""
+        if prefix and current is not None and isinstance(record.msg, str):
+            record.msg = f"[trace={current.trace_id}] {record.msg}"
+        return record
+
+    logging.setLogRecordFactory(factory)
+
+
+# -- export -----------------------------------------------------------------
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: list) -> dict:
+    """OTLP/HTTP JSON (ExportTraceServiceRequest) for finished spans."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "app.core.tracing"},
+            "spans": [{
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                **({"parentSpanId": s["parent_id"]} if s["parent_id"] else {}),
+                "name": s["name"],
+                "kind": _OTLP_KINDS.get(s["kind"], 1),
+                "startTimeUnixNano": str(s["start_ns"]),
+                "endTimeUnixNano": str(s["end_ns"]),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+class SpanExporter:
+    """
+    Finished spans queue in memory (bounded; the oldest are dropped when
+    full) and a background thread writes them out in batches every
+    flush_seconds, or sooner once batch_size are waiting.
+    """
+
+    def __init__(self, mode: str = None, path: str = None, endpoint: str = None,
+                 batch_size: int = 256, flush_seconds: float = 2.0, max_queue: int = 10000,
+                 max_bytes: int = None, backups: int = None):
+        self.mode = (mode or os.environ.get("ESIGN_TRACE_EXPORT", EXPORT_NONE)).lower()
+        self.path = path or os.environ.get("ESIGN_TRACE_FILE", os.path.join(APP_ROOT, "logs", "traces.jsonl"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.environ.get("ESIGN_TRACE_FILE_MAX_MB", "100")) * 1024 * 1024)
+        self.backups = backups if backups is not None else int(os.environ.get("ESIGN_TRACE_FILE_BACKUPS", "3"))
+        self.endpoint = endpoint or os.environ.get("ESIGN_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._session = None
+        self.dropped = 0
+        reset_after_fork(self)
+
+    def export(self, finished: Span) -> None:
+        if self.mode == EXPORT_NONE:
+            return
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(finished.to_dict())
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_started()
+
+    def flush(self) -> int:
+        """Write everything queued now; returns the number of spans written."""
+        with self._cond:
+            batch = list(self._queue)
+            self._queue.clear()
+        if not batch:
+            return 0
+        try:
+            with self._write_lock:
+                if self.mode == EXPORT_OTLP:
+                    self._post(batch)
+                else:
+                    self._append(batch)
+        except Exception as e:
+            logger.warning(f"Dropped {len(batch)} spans, export to {self.mode} failed: {e}")
+            return 0
+        return len(batch)
+
+    def _append(self, batch: list) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # One write per batch, so lines from several worker processes do not interleave
+        data = "".join(json.dumps(s, separators=(",", ":")) + "\n" for s in batch).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if self.max_bytes and os.fstat(fd).st_size >= self.max_bytes:
+                self._rotate(fd)
+                os.close(fd)
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _rotate(self, fd: int) -> None:
+        """
+        Shift the full file to .1 (and older ones up to .<backups>). The
+        lock serialises worker processes, and only the file still at the
+        path is rotated, so two workers never rotate it twice.
+        """
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            try:
+                if os.stat(self.path).st_ino != os.fstat(fd).st_ino:
+                    return  # another process rotated it already
+            except FileNotFoundError:
+                return
+            if self.backups <= 0:
+                os.remove(self.path)
+                return
+            for number in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{number}"):
+                    os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _post(self, batch: list) -> None:
+        if self._session is None:
+            self._session = requests.Session()
+        response = self._session.post(self.endpoint, json=otlp_payload(batch), timeout=5)
+        response.raise_for_status()
+
+    def _after_fork(self) -> None:
+        # The parent exports its own spans
+        self._queue = deque(maxlen=self._queue.maxlen)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._session = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_seconds)
+            self.flush()
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> SpanExporter:
+    """The process-wide exporter, configured from ESIGN_TRACE_* environment variables."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = SpanExporter()
+            atexit.register(_exporter.flush)
+        return _exporter
+
+
+def set_exporter(exporter: SpanExporter | None) -> None:
+    """Replace the process-wide exporter (tests; None rebuilds it from the environment)."""
+    global _exporter
+    with _exporter_lock:
+        _exporter = exporter
@@ -0,0 +1,138 @@
+# ------------------------------------------------------------------------
+# File: view_counter.py
+# Location: /srv/apps/esign/app/core/view_counter.py
+# Description:
+#     Buffered page-view counts for the signing routes. A view is recorded
+#     in memory (no database access on the request path) and a background
+#     thread adds the buffered counts to view_counters every
+#     ESIGN_VIEW_FLUSH_SECONDS (default 30), one upsert per request, page
+#     and day, and once more at exit.
+#
+#     With ESIGN_VIEW_SAMPLE_RATE below 1 only that fraction of views is
+#     recorded, each weighted by 1 / rate, so the stored counts are an
+#     estimate; the first view of a request in a process is always counted.
+# ------------------------------------------------------------------------
+
+import atexit
+import os
+import random
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.postgresql import insert
+
+from log_utils.logging_config import configure_logging
+from app.db.models import ViewCounter
+from app.db.session import get_session, SessionLocal
+from app.core.forking import reset_after_fork
+
+logger = configure_logging(name="apps.esign.view_counter", logfile="esign.log", level=None)
+
+PAGE_SIGN = "sign"
+PAGE_FINAL_REVIEW = "final_review"
+
+
+class ViewCounterBuffer:
+    def __init__(self, sample_rate: float = None, flush_seconds: float = None):
+        rate = sample_rate if sample_rate is not None else float(os.environ.get("ESIGN_VIEW_SAMPLE_RATE", "1"))
+        self.sample_rate = min(max(rate, 0.0), 1.0)
+        self.flush_seconds = flush_seconds or float(os.environ.get("ESIGN_VIEW_FLUSH_SECONDS", "30"))
+        self._lock = threading.Lock()
+        self._counts = {}  # (signature_request_id, page, day) -> [weighted views, first seen, last seen]
+        self._seen = set()
+        self._wake = threading.Event()
+        self._thread = None
+        reset_after_fork(self)
+
+    def record(self, signature_request_id, page: str) -> None:
+        """Count a view of `page` for a request; never touches the database."""
+        key_seen = (signature_request_id, page)
+        if key_seen in self._seen and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return
+        weight = 1.0 if key_seen not in self._seen else 1.0 / self.sample_rate
+        now = datetime.now(timezone.utc)
+        key = (signature_request_id, page, now.date())
+        with self._lock:
+            self._seen.add(key_seen)
+            entry = self._counts.get(key)
+            if entry is None:
+                self._counts[key] = [weight, now, now]
+            else:
+                entry[0] += weight
+                entry[2] = now
+        self._ensure_started()
+
+    def flush(self) -> int:
+        """Add the buffered counts to view_counters; returns the number of rows upserted."""
+        with self._lock:
+            pending = {}
+            for key, (weight, first, last) in self._counts.items():
+                views = int(weight)
+                if views:
+                    pending[key] = (views, first, last)
+            # Fractions of a view left by sampling stay buffered for the next flush
+            self._counts = {
+                key: [weight - int(weight), first, last]
+                for key, (weight, first, last) in self._counts.items() if weight - int(weight) > 1e-9
+            }
+            if len(self._seen) > 100000:
+                self._seen.clear()
+        if not pending:
+            return 0
+
+        session = get_session()
+        try:
+            for (signature_request_id, page, day), (views, first, last) in pending.items():
+                statement = insert(ViewCounter).values(
+                    signature_request_id=signature_request_id, page=page, day=day, views=views,
+                    first_viewed_at=first, last_viewed_at=last,
+                )
+                session.execute(statement.on_conflict_do_update(
+                    constraint="uq_view_counters_request_page_day",
+                    set_={"views": ViewCounter.views + statement.excluded.views,
+                          "last_viewed_at": statement.excluded.last_viewed_at},
+                ))
+            session.commit()
+        except Exception:
+            session.rollback()
+            logger.exception(f"Failed to flush {len(pending)} view counters; they are dropped")
+            return 0
+        return len(pending)
+
+    def _after_fork(self) -> None:
+        # The parent flushes its own buffer
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._seen = set()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._wake.wait(self.flush_seconds):
+            try:
+                self.flush()
+            finally:
+                SessionLocal.remove()
+
+
+_buffer = ViewCounterBuffer()
+
+
+def record_view(signature_request_id, page: str) -> None:
+    _buffer.record(signature_request_id, page)
+
+
+def flush_view_counters() -> int:
+    return _buffer.flush()
+
+
+atexit.register(flush_view_counters)
@@ -1,7 +1,7 @@
 # File: /srv/apps/esign/app/db/models.py
 
 from sqlalchemy import (
-    Column, String, DateTime, Enum, JSON, Text, Boolean, Integer
+    Column, String, DateTime, Date, Enum, JSON, Text, Boolean, Integer, BigInteger, UniqueConstraint
 )
 from sqlalchemy.dialects.postgresql import UUID, INET
 from sqlalchemy.orm import declarative_base
@@ -40,4 +40,87 @@ class SignatureRequest(Base):
     updated_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     preview_path = Column(String, nullable=True)
     signing_url = Column(String, nullable=True)
-    envelope_document_id = Column(String, nullable=True)
\ No newline at end of file
+    envelope_document_id = Column(String, nullable=True)
+
+class DeferredTask(Base):
+    """Work that could not run inline (e.g. a dependency's circuit was open) and is replayed later."""
+    __tablename__ = "deferred_tasks"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False, index=True)  # e.g. 'dropbox_upload' or 'salesforce_update'
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    run_after = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, index=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class Artifact(Base):
+    """Index of stored preview/signed PDFs, so serving a file never scans storage."""
+    __tablename__ = "artifacts"
+    __table_args__ = (UniqueConstraint("signature_request_id", "filename", name="uq_artifacts_request_filename"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    signature_request_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    kind = Column(String, nullable=False)  # 'preview' or 'signed'
+    filename = Column(String, nullable=False, index=True)
+    storage_key = Column(String, nullable=False, index=True)
+    backend = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=True)
+    remote_path = Column(String, nullable=True)  # copy in the Dropbox team folder, once uploaded
+    local_deleted_at = Column(DateTime(timezone=True), nullable=True)  # local copy removed by retention
+    created_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+
+class ArchivedArtifact(Base):
+    """Location of a PDF compacted out of its date folder into that folder's archive."""
+    __tablename__ = "archived_artifacts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    storage_key = Column(String, nullable=False, unique=True, index=True)  # key the file had before compaction
+    archive_key = Column(String, nullable=False, index=True)  # e.g. 'signed/archive/20250615.zip'
+    member = Column(String, nullable=False)
+    offset = Column(BigInteger, nullable=False)  # first byte of the member's (stored, uncompressed) data
+    size = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    archived_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+
+class DropboxSyncCursor(Base):
+    """list_folder cursor for one Dropbox folder, so each sync only fetches changes since the last one."""
+    __tablename__ = "dropbox_sync_cursors"
+    __table_args__ = (UniqueConstraint("namespace_id", "path", name="uq_dropbox_sync_cursors_folder"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    namespace_id = Column(String, nullable=False)  # shared folder namespace the path is rooted in
+    path = Column(String, nullable=False)  # e.g. '/Potential Clients/_esign'
+    cursor = Column(Text, nullable=False)
+    synced_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class ViewCounter(Base):
+    """Page views per signature request, page and day; written in batches by the view counter, not per request."""
+    __tablename__ = "view_counters"
+    __table_args__ = (UniqueConstraint("signature_request_id", "page", "day", name="uq_view_counters_request_page_day"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    signature_request_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    page = Column(String, nullable=False)  # 'sign' or 'final_review'
+    day = Column(Date, nullable=False)  # UTC
+    views = Column(BigInteger, nullable=False, default=0)  # estimated from the sampled views
+    first_viewed_at = Column(DateTime(timezone=True), nullable=True)
+    last_viewed_at = Column(DateTime(timezone=True), nullable=True)
+
+class SigningJob(Base):
+    """A signature submission being processed in the background; its stages are streamed to the signing page."""
+    __tablename__ = "signing_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    signature_request_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, completed, failed
+    stage = Column(String, nullable=True)  # stage currently running
+    stages = Column(JSON, nullable=False, default=list)  # completed stages: [{"stage": ..., "at": ...}, ...]
+    error = Column(Text, nullable=True)
+    redirect_url = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True), default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
@@ -0,0 +1,284 @@
+# ------------------------------------------------------------------------
+# File: sync.py
+# Location: /srv/apps/esign/app/integrations/dropbox/sync.py
+# Description:
+#     Incremental reconciliation between the artifact index and the eSign
+#     Dropbox team folder (/Potential Clients/_esign).
+#
+#     1. Listing. The first run lists the folder recursively once and keeps
+#        the list_folder cursor in dropbox_sync_cursors; later runs call
+#        list_folder/continue with it and only see what changed since. New
+#        remote files are matched to signed artifacts by filename and their
+#        remote_path recorded; deleted ones clear it again. An expired
+#        cursor (reset) falls back to one full listing.
+#     2. Re-upload. Signed artifacts still without a remote_path (the
+#        UPLOAD_FAILED ones) are uploaded again with upload sessions by a
+#        bounded pool (ESIGN_DROPBOX_SYNC_WORKERS, default 4) and committed
+#        with finish_batch (ESIGN_DROPBOX_SYNC_BATCH files per batch),
+#        through the Dropbox circuit breaker and bulkhead. Artifacts packed
+#        by compaction are read back out of their day's archive. Artifacts
+#        younger than ESIGN_DROPBOX_SYNC_MIN_AGE_MINUTES are left to the
+#        request path and the deferred task runner.
+#     3. Salesforce. Every path learned in 1 or 2 is written back to
+#        dropbox_file_path__c with sObject Collection updates (200 records
+#        per request); if Salesforce is unavailable they are deferred.
+# ------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from log_utils.logging_config import configure_logging
+from app.db.models import Artifact, DropboxSyncCursor, SignatureRequest
+from app.db.session import get_session
+from app.core.artifacts import KIND_SIGNED
+from app.core.compaction import find_archived
+from app.core.deferred import defer_task, KIND_SALESFORCE_UPDATE
+from app.core.resilience import get_dependency, DROPBOX
+from app.core.storage import (
+    get_storage, team_folder_client, team_folder_id, ArtifactNotFoundError, BACKEND_DROPBOX, CHUNK_SIZE,
+)
+from app.integrations.dropbox.upload import SessionUploader, team_folder_path
+
+logger = configure_logging(name="apps.esign.dropbox_sync", logfile="esign.log", level=None)
+
+TEAM_FOLDER_ROOT = os.environ.get("ESIGN_DROPBOX_SYNC_ROOT", "/Potential Clients/_esign")
+MATCH_CHUNK_SIZE = 500
+
+
+def _chunked(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@contextmanager
+def _archived_copy(storage, archived, suffix: str):
+    """Yield a temporary file holding one document copied out of its compaction archive."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        with storage.open_range(archived.archive_key, archived.offset, archived.size) as stream:
+            shutil.copyfileobj(stream, tmp, CHUNK_SIZE)
+    try:
+        yield tmp.name
+    finally:
+        os.remove(tmp.name)
+
+
+class DropboxSync:
+    def __init__(self, root: str = None, workers: int = None, upload_limit: int = None, min_age: timedelta = None,
+                 since: datetime = None, until: datetime = None, dry_run: bool = False, client=None, storage=None,
+                 reconciler=None, uploader: SessionUploader = None):
+        self.root = "/" + (root or TEAM_FOLDER_ROOT).strip("/")
+        self.namespace_id = team_folder_id()
+        self.batch_size = int(os.environ.get("ESIGN_DROPBOX_SYNC_BATCH", "100"))  # re-uploads per finish_batch
+        self.upload_limit = upload_limit  # re-uploads per run (default: all missing)
+        self.min_age = min_age if min_age is not None else timedelta(
+            minutes=float(os.environ.get("ESIGN_DROPBOX_SYNC_MIN_AGE_MINUTES", "15")))
+        self.since = since  # only re-upload artifacts created in [since, until)
+        self.until = until or datetime.now(timezone.utc) - self.min_age
+        self.dry_run = dry_run
+        self.storage = storage or get_storage()
+        self._client = client
+        self._reconciler = reconciler
+        self.uploader = uploader or SessionUploader(
+            workers=workers or int(os.environ.get("ESIGN_DROPBOX_SYNC_WORKERS", "4")))
+        self.totals = {
+            "listing": None, "remote_entries": 0, "matched": 0, "remote_deleted": 0,
+            "missing": 0, "reuploaded": 0, "upload_errors": 0,
+            "salesforce_patched": 0, "salesforce_deferred": 0,
+        }
+        self._learned = {}  # artifact id -> dropbox path to write back to Salesforce
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_dependency(DROPBOX).call(team_folder_client, self.namespace_id)
+        return self._client
+
+    @property
+    def reconciler(self):
+        if self._reconciler is None:
+            from app.integrations.salesforce.reconcile import SalesforceReconciler
+            self._reconciler = SalesforceReconciler()
+        return self._reconciler
+
+    def _dropbox(self, method: str, *args, **kwargs):
+        return get_dependency(DROPBOX).call(lambda: getattr(self.client, method)(*args, **kwargs))
+
+    # -- 1. listing ------------------------------------------------------
+
+    def sync_listing(self) -> None:
+        from dropbox.exceptions import ApiError
+
+        session = get_session()
+        state = (
+            session.query(DropboxSyncCursor)
+            .filter(DropboxSyncCursor.namespace_id == self.namespace_id, DropboxSyncCursor.path == self.root)
+            .first()
+        )
+        result = None
+        if state is not None:
+            try:
+                result = self._dropbox("files_list_folder_continue", state.cursor)
+                self.totals["listing"] = "incremental"
+            except ApiError as e:
+                if not (hasattr(e.error, "is_reset") and e.error.is_reset()):
+                    raise
+                logger.warning(f"Dropbox cursor for {self.root} expired; listing the folder again")
+        if result is None:
+            result = self._dropbox("files_list_folder", self.root, recursive=True)
+            self.totals["listing"] = "full"
+
+        while True:
+            self._apply_entries(result.entries)
+            if not self.dry_run:
+                # Saved after every page, so an interrupted run resumes from the last page it applied
+                if state is None:
+                    state = DropboxSyncCursor(namespace_id=self.namespace_id, path=self.root, cursor=result.cursor)
+                    session.add(state)
+                state.cursor = result.cursor
+                state.synced_at = datetime.now(timezone.utc)
+                session.commit()
+            if not result.has_more:
+                break
+            result = self._dropbox("files_list_folder_continue", result.cursor)
+
+    def _apply_entries(self, entries: list) -> None:
+        from dropbox.files import DeletedMetadata, FileMetadata
+
+        files = {entry.name: entry for entry in entries if isinstance(entry, FileMetadata)}
+        deleted = [entry.path_lower for entry in entries if isinstance(entry, DeletedMetadata)]
+        self.totals["remote_entries"] += len(files)
+        session = get_session()
+
+        for names in _chunked(list(files), MATCH_CHUNK_SIZE):
+            rows = (
+                session.query(Artifact)
+                .filter(Artifact.kind == KIND_SIGNED, Artifact.remote_path.is_(None), Artifact.filename.in_(names))
+                .all()
+            )
+            for row in rows:
+                row.remote_path = files[row.filename].path_display
+                self._learned[row.id] = row.remote_path
+            self.totals["matched"] += len(rows)
+
+        for paths in _chunked(deleted, MATCH_CHUNK_SIZE):
+            # A deleted path may be a file or a whole folder
+            condition = func.lower(Artifact.remote_path).in_(paths)
+            for path in paths:
+                condition = condition | func.lower(Artifact.remote_path).startswith(path + "/", autoescape=True)
+            removed = session.query(Artifact).filter(Artifact.kind == KIND_SIGNED, condition).all()
+            for row in removed:
+                logger.warning(f"Team-folder copy of {row.storage_key} was deleted ({row.remote_path})")
+                row.remote_path = None
+                self._learned.pop(row.id, None)
+            self.totals["remote_deleted"] += len(removed)
+
+        if self.dry_run:
+            session.rollback()
+        else:
+            session.commit()
+
+    # -- 2. re-upload ----------------------------------------------------
+
+    def _missing(self) -> list:
+        query = (
+            get_session().query(Artifact)
+            .filter(
+                Artifact.kind == KIND_SIGNED,
+                Artifact.remote_path.is_(None),
+                Artifact.backend != BACKEND_DROPBOX,
+                Artifact.local_deleted_at.is_(None),  # nothing left to upload
+                Artifact.created_at < self.until,
+            )
+            .order_by(Artifact.created_at, Artifact.id)
+        )
+        if self.since is not None:
+            query = query.filter(Artifact.created_at >= self.since)
+        if self.upload_limit is not None:
+            query = query.limit(self.upload_limit)
+        return query.all()
+
+    def reupload_missing(self) -> None:
+        missing = self._missing()
+        self.totals["missing"] = len(missing)
+        if not missing or self.dry_run:
+            return
+        started = time.monotonic()
+        for start in range(0, len(missing), self.batch_size):
+            self._reupload_batch(missing[start:start + self.batch_size])
+        self.totals["upload"] = self.uploader.metrics.snapshot()
+        logger.info(f"Re-uploaded {self.totals['reuploaded']}/{len(missing)} missing artifacts in "
+                    f"{time.monotonic() - started:.2f}s with {self.uploader.workers} workers")
+
+    def _reupload_batch(self, rows: list) -> None:
+        session = get_session()
+        with ExitStack() as stack:
+            items, targets = [], {}
+            for row in rows:
+                try:
+                    local_path = stack.enter_context(self.storage.local_copy(row.storage_key))
+                except ArtifactNotFoundError:
+                    # Compaction packs old signed PDFs into an archive but keeps their index rows
+                    archived = find_archived(row.storage_key)
+                    if archived is None:
+                        self.totals["upload_errors"] += 1
+                        logger.error(f"Cannot re-upload {row.storage_key}: not in {self.storage.name} storage")
+                        continue
+                    local_path = stack.enter_context(
+                        _archived_copy(self.storage, archived, os.path.splitext(row.filename)[1]))
+                dropbox_path = team_folder_path(row.filename)
+                items.append((local_path, dropbox_path))
+                targets[dropbox_path] = row
+            results = self.uploader.upload_many(items) if items else {}
+
+        for dropbox_path, row in targets.items():
+            result = results.get(dropbox_path)
+            if result is None or isinstance(result, Exception):
+                self.totals["upload_errors"] += 1
+                logger.warning(f"Re-upload of {row.storage_key} failed, left for the next sync: {result}")
+                continue
+            row.remote_path = result.path_display
+            self._learned[row.id] = row.remote_path
+            self.totals["reuploaded"] += 1
+        # Index updates stay on this thread; the session is not shared with the upload workers
+        session.commit()
+
+    # -- 3. Salesforce ---------------------------------------------------
+
+    def patch_salesforce(self) -> None:
+        if not self._learned or self.dry_run:
+            return
+        session = get_session()
+        updates_by_id = {}
+        for ids in _chunked(list(self._learned), MATCH_CHUNK_SIZE):
+            rows = (
+                session.query(Artifact.id, SignatureRequest.envelope_document_id)
+                .join(SignatureRequest, SignatureRequest.id == Artifact.signature_request_id)
+                .filter(Artifact.id.in_(ids), SignatureRequest.envelope_document_id.isnot(None))
+            )
+            for artifact_id, envelope_document_id in rows:
+                updates_by_id[envelope_document_id] = {"dropbox_file_path__c": self._learned[artifact_id]}
+        if not updates_by_id:
+            return
+        try:
+            self.totals["salesforce_patched"] += self.reconciler.apply_updates(updates_by_id)
+        except Exception as e:
+            logger.warning(f"Deferring {len(updates_by_id)} Salesforce Dropbox path updates: {e}")
+            for record_id, updates in updates_by_id.items():
+                defer_task(KIND_SALESFORCE_UPDATE, {"record_id": record_id, "updates": updates})
+            self.totals["salesforce_deferred"] += len(updates_by_id)
+
+    def run(self) -> dict:
+        started = time.monotonic()
+        self.sync_listing()
+        self.reupload_missing()
+        self.patch_salesforce()
+        self.totals["duration_s"] = round(time.monotonic() - started, 2)
+        self.totals["dry_run"] = self.dry_run
+        logger.info(f"Dropbox sync finished: {self.totals}")
+        return self.totals
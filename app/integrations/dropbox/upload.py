@@ -0,0 +1,217 @@
+# ------------------------------------------------------------------------
+# File: upload.py
+# Location: /srv/apps/esign/app/integrations/dropbox/upload.py
+# Description:
+#     Chunked uploads to the eSign Dropbox team folder with upload
+#     sessions, for packets too large for one files/upload call and for
+#     bulk re-uploads.
+#
+#       upload()       one file: start + append_v2 chunks + finish
+#                      (files up to ESIGN_DROPBOX_SESSION_THRESHOLD_MB, default
+#                      8, still go up in a single files/upload call)
+#       upload_many()  many files: each file's chunks are appended by a pool
+#                      of ESIGN_DROPBOX_UPLOAD_WORKERS (default 4) workers and
+#                      the closed sessions are committed together with
+#                      finish_batch_v2, which takes the namespace write lock
+#                      once per batch instead of once per file
+#
+#     Chunks are ESIGN_DROPBOX_CHUNK_MB (default 8; Dropbox wants multiples
+#     of 4 MB). An interrupted chunk is retried from the session's current
+#     offset: when the chunk did reach Dropbox but the answer was lost, the
+#     retry gets incorrect_offset with the correct offset and the upload
+#     resumes from there instead of starting over. Every call goes through
+#     the Dropbox circuit breaker and bulkhead, so the worker count should
+#     not exceed ESIGN_DROPBOX_MAX_CONCURRENT.
+# ------------------------------------------------------------------------
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from log_utils.logging_config import configure_logging
+from app.core.resilience import get_dependency, DependencyUnavailableError, DROPBOX
+from app.core.storage import team_folder_client
+
+logger = configure_logging(name="apps.esign.dropbox_upload", logfile="esign.log", level=None)
+
+MB = 1024 * 1024
+TEAM_FOLDER_ROOT = os.environ.get("ESIGN_DROPBOX_SYNC_ROOT", "/Potential Clients/_esign")
+FINISH_BATCH_SIZE = 1000  # entries per finish_batch_v2 call (Dropbox maximum)
+MAX_CHUNK_ATTEMPTS = 4
+
+
+def team_folder_path(filename: str, when: datetime = None) -> str:
+    """Team-folder path for a signed PDF: the upload day's folder, as the shared upload utility uses."""
+    return f"{TEAM_FOLDER_ROOT}/{(when or datetime.now()).strftime('%Y%m%d')}/{filename}"
+
+
+class UploadMetrics:
+    """Counters for one uploader; throughput is bytes over wall-clock time spent uploading."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.retries = 0
+        self.resumed = 0
+        self.seconds = 0.0
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "files": self.files,
+                "failed": self.failed,
+                "bytes": self.bytes,
+                "chunks": self.chunks,
+                "retries": self.retries,
+                "resumed": self.resumed,
+                "seconds": round(self.seconds, 3),
+                "mb_per_s": round(self.bytes / MB / self.seconds, 2) if self.seconds else 0.0,
+            }
+
+
+class SessionUploader:
+    def __init__(self, client=None, chunk_size: int = None, workers: int = None, threshold: int = None):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.chunk_size = chunk_size or int(float(os.environ.get("ESIGN_DROPBOX_CHUNK_MB", "8")) * MB)
+        self.workers = workers or int(os.environ.get("ESIGN_DROPBOX_UPLOAD_WORKERS", "4"))
+        self.threshold = threshold if threshold is not None else int(
+            float(os.environ.get("ESIGN_DROPBOX_SESSION_THRESHOLD_MB", "8")) * MB)
+        self.metrics = UploadMetrics()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = get_dependency(DROPBOX).call(team_folder_client)
+            return self._client
+
+    def _call(self, method: str, *args, **kwargs):
+        # The client is built under its own guard first, so one call never holds two bulkhead slots
+        client = self.client
+        return get_dependency(DROPBOX).call(lambda: getattr(client, method)(*args, **kwargs))
+
+    @staticmethod
+    def _commit_info(dropbox_path: str):
+        from dropbox.files import CommitInfo, WriteMode
+        return CommitInfo(path=dropbox_path, mode=WriteMode.overwrite)
+
+    def _send_chunk(self, f, session_id: str | None, offset: int, size: int) -> tuple[str, int]:
+        """
+        Send the chunk at `offset` (opening the session with it when
+        session_id is None); the last chunk closes the session. Returns
+        (session_id, new offset), resuming from Dropbox's offset if it
+        already holds more than we thought.
+        """
+        from dropbox.exceptions import ApiError
+        from dropbox.files import UploadSessionCursor
+
+        for attempt in range(1, MAX_CHUNK_ATTEMPTS + 1):
+            f.seek(offset)
+            data = f.read(self.chunk_size)
+            close = offset + len(data) >= size
+            try:
+                if session_id is None:
+                    session_id = self._call("files_upload_session_start", data, close=close).session_id
+                else:
+                    self._call("files_upload_session_append_v2", data, UploadSessionCursor(session_id, offset),
+                               close=close)
+                self.metrics.add(chunks=1)
+                return session_id, offset + len(data)
+            except ApiError as e:
+                error = e.error
+                if session_id and hasattr(error, "is_incorrect_offset") and error.is_incorrect_offset():
+                    correct = error.get_incorrect_offset().correct_offset
+                    logger.info(f"Resuming upload session {session_id[:16]} at offset {correct} (sent {offset})")
+                    self.metrics.add(resumed=1)
+                    return session_id, correct
+                raise
+            except (DependencyUnavailableError, OSError) as e:
+                # Transient: bulkhead full, circuit probing, or the connection dropped mid-chunk
+                if attempt == MAX_CHUNK_ATTEMPTS:
+                    raise
+                self.metrics.add(retries=1)
+                logger.warning(f"Chunk at offset {offset} failed (attempt {attempt}), retrying: {e}")
+                time.sleep(min(0.25 * 2 ** (attempt - 1), 2.0))
+
+    def _append_file(self, local_path: str) -> tuple[str, int]:
+        """Upload a whole file into a new, closed session. Returns (session_id, size)."""
+        size = os.path.getsize(local_path)
+        session_id, offset = None, 0
+        with open(local_path, "rb") as f:
+            while session_id is None or offset < size:
+                session_id, offset = self._send_chunk(f, session_id, offset, size)
+        return session_id, size
+
+    def upload(self, local_path: str, dropbox_path: str):
+        """Upload one file and return its Dropbox FileMetadata."""
+        from dropbox.files import UploadSessionCursor
+
+        started = time.monotonic()
+        size = os.path.getsize(local_path)
+        if size <= self.threshold:
+            with open(local_path, "rb") as f:
+                metadata = self._call("files_upload", f.read(), dropbox_path, mode=self._commit_info(dropbox_path).mode)
+            self.metrics.add(chunks=1)
+        else:
+            session_id, size = self._append_file(local_path)
+            metadata = self._call("files_upload_session_finish", b"", UploadSessionCursor(session_id, size),
+                                  self._commit_info(dropbox_path))
+        self.metrics.add(files=1, bytes=size, seconds=time.monotonic() - started)
+        return metadata
+
+    def upload_many(self, items: list) -> dict:
+        """
+        Upload (local_path, dropbox_path) pairs concurrently and commit them
+        in batches. Returns {dropbox_path: FileMetadata or the exception}.
+        """
+        from dropbox.files import UploadSessionCursor, UploadSessionFinishArg
+
+        started = time.monotonic()
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dropbox-upload") as pool:
+            futures = [(dropbox_path, pool.submit(self._append_file, local_path)) for local_path, dropbox_path in items]
+            closed = []
+            for dropbox_path, future in futures:
+                try:
+                    session_id, size = future.result()
+                except Exception as e:
+                    logger.error(f"Upload session for {dropbox_path} failed: {e}")
+                    results[dropbox_path] = e
+                    continue
+                closed.append((dropbox_path, session_id, size))
+
+        for start in range(0, len(closed), FINISH_BATCH_SIZE):
+            batch = closed[start:start + FINISH_BATCH_SIZE]
+            entries = [
+                UploadSessionFinishArg(UploadSessionCursor(session_id, size), self._commit_info(dropbox_path))
+                for dropbox_path, session_id, size in batch
+            ]
+            try:
+                outcome = self._call("files_upload_session_finish_batch_v2", entries).entries
+            except Exception as e:
+                logger.error(f"finish_batch for {len(batch)} upload sessions failed: {e}")
+                outcome = [e] * len(batch)
+            for (dropbox_path, _, size), entry in zip(batch, outcome):
+                if isinstance(entry, Exception):
+                    results[dropbox_path] = entry
+                elif entry.is_success():
+                    results[dropbox_path] = entry.get_success()
+                    self.metrics.add(files=1, bytes=size)
+                else:
+                    results[dropbox_path] = RuntimeError(f"Commit failed: {entry.get_failure()}")
+
+        failed = sum(1 for value in results.values() if isinstance(value, Exception))
+        self.metrics.add(failed=failed, seconds=time.monotonic() - started)
+        logger.info(f"Uploaded {len(items) - failed}/{len(items)} files: {self.metrics.snapshot()}")
+        return results
@@ -0,0 +1,452 @@
+# ------------------------------------------------------------------------
+# File: dispatcher.py
+# Location: /srv/apps/esign/app/integrations/ringcentral/dispatcher.py
+# Description:
+#     Asynchronous delivery of RingCentral webhook notifications. Request
+#     handlers enqueue a message and return immediately; a small pool of
+#     background sender threads posts them over a pooled requests.Session.
+#     Routine messages of the same type that are already waiting for the
+#     same URL are coalesced into a single post; different types are never
+#     mixed, and failure notifications are always posted on their own, so
+#     an alert is never buried in a routine batch. Failed posts are retried
+#     with exponential backoff (or the server's Retry-After on 429). The
+#     queue is bounded and in-memory: when it is full new messages are
+#     dropped and counted rather than blocking the caller. Delivery counters
+#     are exposed via /health/dependencies.
+#
+#     Digest mode (ESIGN_WEBHOOK_DIGEST_WINDOW > 0) holds routine
+#     notifications of the same type for the window and posts them as one
+#     summary with a line per item; failure notifications always go out
+#     immediately.
+# ------------------------------------------------------------------------
+
+import atexit
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from log_utils.logging_config import configure_logging
+from app.core.forking import reset_after_fork
+from app.core.resilience import get_dependency, DependencyUnavailableError, RINGCENTRAL
+from app.core.metrics import record_retry, set_queue_depth, QUEUE_WEBHOOKS
+from app.core.tracing import current_context, span
+
+logger = configure_logging(name="apps.esign.webhooks", logfile="esign.log", level=None)
+
+# Separator between coalesced messages in one post
+BATCH_SEPARATOR = "\n\n"
+
+# Notification types, see WEBHOOK_NOTIFICATIONS.md
+NOTIFY_INITIATED = "initiated"
+NOTIFY_SIGNED_UPLOADED = "signed_uploaded"
+NOTIFY_UPLOAD_FAILED = "upload_failed"
+NOTIFY_SALESFORCE_UPDATED = "salesforce_updated"
+NOTIFY_SALESFORCE_RETRY_FAILED = "salesforce_retry_failed"
+NOTIFY_SALESFORCE_FAILED = "salesforce_failed"
+
+# Routine notification types that digest mode may coalesce, with the summary title.
+# Anything not listed here (all failure types) is sent immediately.
+DIGEST_TITLES = {
+    NOTIFY_INITIATED: "📝 New documents ready for signing",
+    NOTIFY_SIGNED_UPLOADED: "✅ Documents signed and uploaded to Dropbox",
+    NOTIFY_SALESFORCE_UPDATED: "✅ Salesforce envelopes updated",
+}
+
+
+class WebhookDeliveryError(RuntimeError):
+    """A webhook post failed; retry_after is the server-requested delay, if any."""
+
+    def __init__(self, message: str, retry_after: float = None, retryable: bool = True):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+class WebhookMessage:
+    __slots__ = ("url", "text", "kind", "attempts", "enqueued_at", "trace")
+
+    def __init__(self, url: str, text: str, kind: str = None):
+        self.url = url
+        self.text = text
+        self.kind = kind
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        self.trace = current_context()  # the delivery is a span of the enqueuing trace
+
+
+class _Digest:
+    """Notifications of one type held for a digest window."""
+
+    def __init__(self, url: str, kind: str):
+        self.url = url
+        self.kind = kind
+        self.items = []  # (full text, one-line summary)
+        self.opened_at = time.monotonic()
+
+
+class _DigestMarker(WebhookMessage):
+    """Heap entry that becomes the digest post once the window has passed."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, url: str, key: tuple):
+        super().__init__(url, "")
+        self.key = key
+
+
+def _retry_after_seconds(response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class WebhookDispatcher:
+    """
+    Bounded queue of webhook messages drained by background sender threads.
+
+    Messages are held in a heap ordered by the time they become due, so a
+    message waiting out its retry backoff does not hold up newer ones.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = 1000,
+        workers: int = 2,
+        batch_size: int = 10,
+        max_batch_chars: int = 8000,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 5.0,
+        digest_window: float = 0.0,
+        digest_max_lines: int = 50,
+        session: requests.Session = None,
+    ):
+        self.max_queue_size = max_queue_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.digest_window = digest_window
+        self.digest_max_lines = digest_max_lines
+        self.session = session or self._build_session(workers)
+
+        self._heap = []
+        self._digests = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._in_flight = 0
+        self._metrics = {
+            "enqueued": 0,
+            "digested": 0,
+            "digests_sent": 0,
+            "delivered": 0,
+            "posts": 0,
+            "failed_posts": 0,
+            "retries": 0,
+            "dropped_queue_full": 0,
+            "dropped_after_retries": 0,
+        }
+        self._last_error = None
+        self._last_delivered_at = None
+        self._latency_total = 0.0
+        reset_after_fork(self)
+
+    @staticmethod
+    def _build_session(workers: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    # -- producer side -------------------------------------------------
+
+    def enqueue(self, text: str, url: str = None, kind: str = None, summary: str = None) -> bool:
+        """
+        Queue a message for delivery. Returns False if it was dropped.
+
+        kind is one of the NOTIFY_* types; in digest mode routine types are
+        held for the window and summarised using summary (default: the
+        first line of text).
+        """
+        url = url or os.environ.get("RC_WEBHOOK_URL")
+        if not url:
+            logger.debug("RC_WEBHOOK_URL not set, webhook message discarded")
+            return False
+        self._ensure_started()
+        if self.digest_window > 0 and kind in DIGEST_TITLES:
+            return self._add_to_digest(url, kind, text, summary or text.splitlines()[0])
+        return self._push(WebhookMessage(url, text, kind), time.monotonic())
+
+    def _push(self, message: WebhookMessage, due: float) -> bool:
+        with self._cond:
+            if len(self._heap) >= self.max_queue_size:
+                self._metrics["dropped_queue_full"] += 1
+                logger.warning(f"Webhook queue full ({self.max_queue_size}), dropping message: {message.text[:80]!r}")
+                return False
+            heapq.heappush(self._heap, (due, next(self._seq), message))
+            set_queue_depth(QUEUE_WEBHOOKS, len(self._heap))
+            if message.attempts == 0 and not isinstance(message, _DigestMarker):
+                self._metrics["enqueued"] += 1
+            self._cond.notify()
+        return True
+
+    def _add_to_digest(self, url: str, kind: str, text: str, summary: str) -> bool:
+        key = (url, kind)
+        with self._cond:
+            digest = self._digests.get(key)
+            if digest is None:
+                if not self._push(_DigestMarker(url, key), time.monotonic() + self.digest_window):
+                    return False
+                digest = self._digests[key] = _Digest(url, kind)
+            digest.items.append((text, summary))
+            self._metrics["enqueued"] += 1
+            self._metrics["digested"] += 1
+        return True
+
+    def _render_digest(self, digest: _Digest) -> str:
+        if len(digest.items) == 1:
+            # Nothing to coalesce: send the notification as it was written
+            return digest.items[0][0]
+        lines = [f"{DIGEST_TITLES[digest.kind]}: {len(digest.items)} in the last {self.digest_window:g}s"]
+        lines += [f"• {summary}" for _, summary in digest.items[:self.digest_max_lines]]
+        if len(digest.items) > self.digest_max_lines:
+            lines.append(f"… and {len(digest.items) - self.digest_max_lines} more")
+        return "\n".join(lines)
+
+    def _resolve(self, message: WebhookMessage) -> WebhookMessage:
+        """Turn a due digest marker into the summary message (caller holds the lock)."""
+        if not isinstance(message, _DigestMarker):
+            return message
+        digest = self._digests.pop(message.key)
+        self._metrics["digests_sent"] += 1
+        return WebhookMessage(digest.url, self._render_digest(digest), digest.kind)
+
+    # -- worker side ---------------------------------------------------
+
+    def _after_fork(self) -> None:
+        # Inherited entries belong to the parent; open digests would point at dropped markers
+        self._cond = threading.Condition()
+        self._heap = []
+        self._digests = {}
+        self._in_flight = 0
+        self._threads = []
+
+    def _ensure_started(self) -> None:
+        if self._threads and all(t.is_alive() for t in self._threads):
+            return
+        with self._cond:
+            if self._threads and all(t.is_alive() for t in self._threads):
+                return
+            self._stopping = False
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f"webhook-sender-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    @staticmethod
+    def _coalescible(first: WebhookMessage, message: WebhookMessage) -> bool:
+        """Whether message may share a post with first: same URL and type, and not a failure type."""
+        if message.url != first.url or message.kind != first.kind:
+            return False
+        return first.kind is None or first.kind in DIGEST_TITLES
+
+    def _take_batch(self) -> list | None:
+        """Block until at least one message is due, then take it plus due messages it can be coalesced with."""
+        with self._cond:
+            while True:
+                if self._stopping and not self._heap:
+                    return None
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0 or self._stopping:
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+            _, _, first = heapq.heappop(self._heap)
+            first = self._resolve(first)
+            batch, chars = [first], len(first.text)
+            now = time.monotonic()
+            skipped = []
+            while self._heap and len(batch) < self.batch_size and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                message = self._resolve(entry[2])
+                entry = (entry[0], entry[1], message)
+                if not self._coalescible(first, message) or chars + len(message.text) > self.max_batch_chars:
+                    skipped.append(entry)
+                    continue
+                batch.append(message)
+                chars += len(message.text) + len(BATCH_SEPARATOR)
+            for entry in skipped:
+                heapq.heappush(self._heap, entry)
+            set_queue_depth(QUEUE_WEBHOOKS, len(self._heap))
+            self._in_flight += len(batch)
+            return batch
+
+    def _post(self, url: str, text: str):
+        started = time.monotonic()
+        response = self.session.post(url, json={"text": text}, timeout=self.timeout)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise WebhookDeliveryError(f"HTTP {response.status_code}", _retry_after_seconds(response))
+        if response.status_code >= 400:
+            raise WebhookDeliveryError(f"HTTP {response.status_code}: {response.text[:200]}", retryable=False)
+        return time.monotonic() - started
+
+    def _deliver(self, batch: list) -> None:
+        text = BATCH_SEPARATOR.join(message.text for message in batch)
+        try:
+            with span("webhook.deliver", parent=batch[0].trace, messages=len(batch), attempt=batch[0].attempts + 1):
+                elapsed = get_dependency(RINGCENTRAL).call(self._post, batch[0].url, text)
+        except (DependencyUnavailableError, WebhookDeliveryError, requests.RequestException) as e:
+            self._handle_failure(batch, e)
+            return
+        finally:
+            with self._cond:
+                self._in_flight -= len(batch)
+
+        with self._cond:
+            self._metrics["posts"] += 1
+            self._metrics["delivered"] += len(batch)
+            self._latency_total += elapsed
+            self._last_delivered_at = time.time()
+        logger.info(f"Webhook delivered ({len(batch)} message(s)) in {elapsed * 1000:.0f} ms")
+
+    def _handle_failure(self, batch: list, error: Exception) -> None:
+        retryable = getattr(error, "retryable", True)
+        retry_after = getattr(error, "retry_after", None)
+        with self._cond:
+            self._metrics["failed_posts"] += 1
+            self._last_error = f"{type(error).__name__}: {error}"
+
+        for message in batch:
+            message.attempts += 1
+            if not retryable or message.attempts >= self.max_attempts:
+                with self._cond:
+                    self._metrics["dropped_after_retries"] += 1
+                logger.error(f"Giving up on webhook after {message.attempts} attempt(s) ({error}): "
+                             f"{message.text[:80]!r}")
+                continue
+            delay = retry_after
+            if delay is None:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (message.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+            with self._cond:
+                self._metrics["retries"] += 1
+            record_retry(RINGCENTRAL, "post")
+            self._push(message, time.monotonic() + delay)
+        logger.warning(f"Webhook post failed ({error}); {len(batch)} message(s) scheduled for retry where possible")
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self._deliver(batch)
+            except Exception:
+                logger.exception("Unexpected error in webhook sender")
+
+    # -- lifecycle / monitoring ----------------------------------------
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything currently queued has been handled. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if not self._heap and not self._in_flight:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Deliver what is due within timeout, then stop the sender threads."""
+        if not self._threads:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            if self._heap:
+                logger.warning(f"Webhook dispatcher stopped with {len(self._heap)} undelivered message(s)")
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            posts = self._metrics["posts"]
+            return {
+                **self._metrics,
+                "queue_depth": len(self._heap),
+                "open_digests": {kind: len(d.items) for (_, kind), d in self._digests.items()},
+                "in_flight": self._in_flight,
+                "max_queue_size": self.max_queue_size,
+                "workers_alive": sum(1 for t in self._threads if t.is_alive()),
+                "avg_post_ms": round(self._latency_total / posts * 1000, 1) if posts else None,
+                "last_delivered_at": self._last_delivered_at,
+                "last_error": self._last_error,
+            }
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}")
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}")
+        return default
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> WebhookDispatcher:
+    """Return the process-wide dispatcher, configured from ESIGN_WEBHOOK_* environment variables."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = WebhookDispatcher(
+                max_queue_size=_env_int("ESIGN_WEBHOOK_QUEUE_SIZE", 1000),
+                workers=_env_int("ESIGN_WEBHOOK_WORKERS", 2),
+                batch_size=_env_int("ESIGN_WEBHOOK_BATCH_SIZE", 10),
+                max_attempts=_env_int("ESIGN_WEBHOOK_MAX_ATTEMPTS", 5),
+                backoff_base=_env_float("ESIGN_WEBHOOK_BACKOFF_BASE", 1.0),
+                backoff_max=_env_float("ESIGN_WEBHOOK_BACKOFF_MAX", 60.0),
+                timeout=_env_float("ESIGN_WEBHOOK_TIMEOUT", 5.0),
+                digest_window=_env_float("ESIGN_WEBHOOK_DIGEST_WINDOW", 0.0),
+                digest_max_lines=_env_int("ESIGN_WEBHOOK_DIGEST_MAX_LINES", 50),
+            )
+            atexit.register(_dispatcher.shutdown, _env_float("ESIGN_WEBHOOK_SHUTDOWN_TIMEOUT", 5.0))
+        return _dispatcher
+
+
+def enqueue_webhook(text: str, url: str = None, kind: str = None, summary: str = None) -> bool:
+    """Queue a RingCentral webhook message; never blocks on the network."""
+    return get_dispatcher().enqueue(text, url, kind, summary)
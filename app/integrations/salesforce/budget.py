@@ -0,0 +1,181 @@
+# ------------------------------------------------------------------------
+# File: budget.py
+# Location: /srv/apps/esign/app/integrations/salesforce/budget.py
+# Description:
+#     Meters Salesforce API calls made by this service against a rolling
+#     24h budget. The org-wide limit is shared with our other integrations,
+#     so whenever a response carries the Sforce-Limit-Info header the
+#     org-reported usage is taken into account as well. As usage crosses
+#     the configured thresholds, low-priority work (reconciliation,
+#     prefetch, expiry notifications) is throttled first and signature
+#     completions are always let through.
+# ------------------------------------------------------------------------
+
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from log_utils.logging_config import configure_logging
+from app.core.resilience import DependencyUnavailableError, SALESFORCE
+
+logger = configure_logging(name="apps.esign.salesforce_budget", logfile="esign.log", level=None)
+
+PRIORITY_CRITICAL = "critical"  # signature completions
+PRIORITY_NORMAL = "normal"      # interactive lookups
+PRIORITY_LOW = "low"            # reconciliation, prefetch, expiry notifications
+
+CALL_TOKEN = "token"
+CALL_SOQL = "soql"
+CALL_UPDATE = "update"
+CALL_COMPOSITE = "composite"
+
+WINDOW_SECONDS = 24 * 60 * 60
+# Org usage reported by Salesforce is trusted for this long after it was seen
+ORG_USAGE_TTL_SECONDS = 15 * 60
+
+_LIMIT_INFO_RE = re.compile(r"api-usage=(\d+)/(\d+)")
+
+
+class SalesforceBudgetExceeded(DependencyUnavailableError):
+    """Raised when a call of the given priority is throttled by the API budget."""
+
+
+def parse_limit_info(header_value: str):
+    """Parse 'api-usage=25/15000' from a Sforce-Limit-Info header into (used, limit)."""
+    if not header_value:
+        return None
+    match = _LIMIT_INFO_RE.search(header_value)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class SalesforceApiBudget:
+    """Rolling-window counter of Salesforce calls, broken down by call type."""
+
+    def __init__(
+        self,
+        daily_budget: int = 5000,
+        low_priority_threshold: float = 0.7,
+        normal_priority_threshold: float = 0.9,
+        clock=time.time,
+    ):
+        self.daily_budget = daily_budget
+        self.thresholds = {
+            PRIORITY_LOW: low_priority_threshold,
+            PRIORITY_NORMAL: normal_priority_threshold,
+        }
+        self._clock = clock
+        self._calls = {}
+        self._throttled = {}
+        self._org_usage = None
+        self._org_usage_seen_at = 0.0
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - WINDOW_SECONDS
+        for timestamps in self._calls.values():
+            while timestamps and timestamps[0] < cutoff:
+                timestamps.popleft()
+
+    def record(self, call_type: str, headers=None) -> None:
+        """Count one call of call_type, reading Sforce-Limit-Info from headers if present."""
+        now = self._clock()
+        org_usage = parse_limit_info((headers or {}).get("Sforce-Limit-Info", ""))
+        with self._lock:
+            self._calls.setdefault(call_type, deque()).append(now)
+            if org_usage:
+                self._org_usage = org_usage
+                self._org_usage_seen_at = now
+            self._prune(now)
+
+    def record_org_usage(self, used: int, limit: int) -> None:
+        """Record org-wide usage obtained some other way (e.g. simple_salesforce.api_usage)."""
+        with self._lock:
+            self._org_usage = (used, limit)
+            self._org_usage_seen_at = self._clock()
+
+    def usage_ratio(self) -> float:
+        """The larger of our share of the local budget and the org-wide usage."""
+        now = self._clock()
+        with self._lock:
+            self._prune(now)
+            local_used = sum(len(t) for t in self._calls.values())
+            ratio = local_used / self.daily_budget if self.daily_budget else 0.0
+            if self._org_usage and now - self._org_usage_seen_at <= ORG_USAGE_TTL_SECONDS:
+                used, limit = self._org_usage
+                if limit:
+                    ratio = max(ratio, used / limit)
+        return ratio
+
+    def allow(self, priority: str) -> bool:
+        """Whether a call of this priority may go out now. Critical calls always may."""
+        if priority == PRIORITY_CRITICAL:
+            return True
+        allowed = self.usage_ratio() < self.thresholds.get(priority, 1.0)
+        if not allowed:
+            with self._lock:
+                self._throttled[priority] = self._throttled.get(priority, 0) + 1
+        return allowed
+
+    def check(self, priority: str) -> None:
+        """Raise SalesforceBudgetExceeded if a call of this priority must be deferred."""
+        if not self.allow(priority):
+            logger.warning(f"Salesforce API budget at {self.usage_ratio():.0%}, deferring {priority} priority call")
+            raise SalesforceBudgetExceeded(SALESFORCE, f"Salesforce API budget exhausted for {priority} priority work")
+
+    def snapshot(self) -> dict:
+        ratio = self.usage_ratio()
+        with self._lock:
+            calls_by_type = {call_type: len(t) for call_type, t in self._calls.items()}
+            org_usage = None
+            if self._org_usage:
+                org_usage = {
+                    "used": self._org_usage[0],
+                    "limit": self._org_usage[1],
+                    "age_seconds": round(self._clock() - self._org_usage_seen_at),
+                }
+            return {
+                "daily_budget": self.daily_budget,
+                "calls_last_24h": sum(calls_by_type.values()),
+                "calls_by_type": calls_by_type,
+                "org_usage": org_usage,
+                "usage_ratio": round(ratio, 4),
+                "throttled_calls": dict(self._throttled),
+            }
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Ignoring invalid value for {name}")
+        return default
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget() -> SalesforceApiBudget:
+    """Return the process-wide budget, configured from SALESFORCE_API_* environment variables."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = SalesforceApiBudget(
+                daily_budget=int(_env_float("SALESFORCE_API_DAILY_BUDGET", 5000)),
+                low_priority_threshold=_env_float("SALESFORCE_API_LOW_PRIORITY_THRESHOLD", 0.7),
+                normal_priority_threshold=_env_float("SALESFORCE_API_NORMAL_PRIORITY_THRESHOLD", 0.9),
+            )
+        return _budget
+
+
+def record_simple_salesforce_call(sf, call_type: str) -> None:
+    """Meter a call made through simple_salesforce, which parses Sforce-Limit-Info into sf.api_usage."""
+    budget = get_budget()
+    budget.record(call_type)
+    usage = (getattr(sf, "api_usage", None) or {}).get("api-usage")
+    if usage is not None:
+        budget.record_org_usage(usage.used, usage.total)
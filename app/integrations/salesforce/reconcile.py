@@ -0,0 +1,293 @@
+# ------------------------------------------------------------------------
+# File: reconcile.py
+# Location: /srv/apps/esign/app/integrations/salesforce/reconcile.py
+# Description:
+#     Bulk reconciliation between local signature_requests rows and their
+#     Envelope_Document__c records in Salesforce. Local rows are paged by
+#     (updated_at, id); the matching Salesforce records are fetched with one
+#     SOQL IN query per chunk of up to 200 IDs, diffed on status, sign date
+#     and Dropbox path, and repaired with sObject Collection updates (also
+#     200 records per request). Progress is checkpointed to a JSON file so an
+#     interrupted run resumes where it stopped; a dry run may start from
+#     the checkpoint but never writes or clears it. Runs at low API-budget
+#     priority and stops cleanly when the budget throttles it.
+# ------------------------------------------------------------------------
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+from simple_salesforce import Salesforce
+
+from log_utils.logging_config import configure_logging
+from app.db.models import SignatureRequest, SignatureStatus
+from app.db.session import get_session
+from app.core.resilience import get_dependency, SALESFORCE
+from app.api.update_envelope_document import get_salesforce_token
+from app.integrations.salesforce.budget import (
+    get_budget, record_simple_salesforce_call, SalesforceBudgetExceeded,
+    PRIORITY_LOW, CALL_SOQL, CALL_COMPOSITE
+)
+
+logger = configure_logging(name="apps.esign.reconcile", logfile="esign.log", level=None)
+
+SOQL_CHUNK_SIZE = 200
+COLLECTION_CHUNK_SIZE = 200
+
+DRIFT_STATUS = "status"
+DRIFT_SIGN_DATE = "sign_date"
+DRIFT_DROPBOX_PATH = "dropbox_path"
+DRIFT_MISSING_ENVELOPE_ID = "missing_envelope_id"
+DRIFT_MISSING_IN_SALESFORCE = "missing_in_salesforce"
+
+
+def chunked(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def soql_in(values) -> str:
+    """Render values as a quoted SOQL IN list."""
+    escaped = (str(v).replace("\\", "\\\\").replace("'", "\\'") for v in values)
+    return "(" + ",".join(f"'{v}'" for v in escaped) + ")"
+
+
+def _parse_sf_datetime(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00").replace("+0000", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def diff_record(row: SignatureRequest, record: dict) -> tuple[dict, list]:
+    """
+    Compare a local row with its Envelope_Document__c record.
+
+    Returns (updates, drift): the field updates that would repair Salesforce
+    and the list of drift kinds found. Dropbox path drift is only reported,
+    the local row does not know the uploaded path.
+    """
+    updates, drift = {}, []
+    if row.status != SignatureStatus.Completed:
+        return updates, drift
+
+    if record.get("Envelope_Status__c") != "Completed":
+        updates["Envelope_Status__c"] = "Completed"
+        drift.append(DRIFT_STATUS)
+
+    if row.signed_at:
+        signed_at = row.signed_at if row.signed_at.tzinfo else row.signed_at.replace(tzinfo=timezone.utc)
+        remote = _parse_sf_datetime(record.get("Sign_Date__c"))
+        if remote is None or abs((remote - signed_at).total_seconds()) >= 1:
+            updates["Sign_Date__c"] = signed_at.isoformat()
+            drift.append(DRIFT_SIGN_DATE)
+
+    dropbox_path = record.get("dropbox_file_path__c") or ""
+    if not dropbox_path or dropbox_path.startswith("UPLOAD_FAILED"):
+        drift.append(DRIFT_DROPBOX_PATH)
+
+    return updates, drift
+
+
+class Checkpoint:
+    """Resume position (updated_at, id) and running totals, persisted as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {"updated_at": None, "id": None, "upper_bound": None, "totals": {}}
+        if path and os.path.isfile(path):
+            with open(path, "r") as f:
+                self.state.update(json.load(f))
+            logger.info(f"Resuming reconciliation from checkpoint {path}: {self.state['updated_at']} / {self.state['id']}")
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if self.path and os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+class SalesforceReconciler:
+    def __init__(self, checkpoint_path: str = None, page_size: int = 1000, dry_run: bool = False, sf=None):
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self._sf = sf
+        self.totals = {
+            "rows": 0, "salesforce_records": 0, "repaired": 0, "repair_errors": 0,
+            "local_envelope_ids_set": 0,
+            DRIFT_STATUS: 0, DRIFT_SIGN_DATE: 0, DRIFT_DROPBOX_PATH: 0,
+            DRIFT_MISSING_ENVELOPE_ID: 0, DRIFT_MISSING_IN_SALESFORCE: 0,
+        }
+        self.totals.update(self.checkpoint.state.get("totals") or {})
+
+    @property
+    def sf(self) -> Salesforce:
+        if self._sf is None:
+            token_data = get_salesforce_token(PRIORITY_LOW)
+            self._sf = Salesforce(instance_url=token_data["instance_url"], session_id=token_data["access_token"])
+        return self._sf
+
+    def _query(self, soql: str) -> list:
+        get_budget().check(PRIORITY_LOW)
+
+        def run_query():
+            try:
+                return self.sf.query_all(soql)
+            finally:
+                record_simple_salesforce_call(self.sf, CALL_SOQL)
+
+        return get_dependency(SALESFORCE).call(run_query).get("records", [])
+
+    def fetch_by_ids(self, record_ids: list) -> dict:
+        records = {}
+        for chunk in chunked(record_ids, SOQL_CHUNK_SIZE):
+            soql = (
+                "SELECT Id, Signing_Token__c, Envelope_Status__c, Sign_Date__c, dropbox_file_path__c "
+                f"FROM Envelope_Document__c WHERE Id IN {soql_in(chunk)}"
+            )
+            for record in self._query(soql):
+                records[record["Id"]] = record
+        return records
+
+    def fetch_by_tokens(self, tokens: list) -> dict:
+        records = {}
+        for chunk in chunked(tokens, SOQL_CHUNK_SIZE):
+            soql = (
+                "SELECT Id, Signing_Token__c, Envelope_Status__c, Sign_Date__c, dropbox_file_path__c "
+                f"FROM Envelope_Document__c WHERE Signing_Token__c IN {soql_in(chunk)}"
+            )
+            for record in self._query(soql):
+                records[record["Signing_Token__c"]] = record
+        return records
+
+    def apply_updates(self, updates_by_id: dict) -> int:
+        """Send repairs as sObject Collection PATCH requests. Returns the number of records updated."""
+        updated = 0
+        items = list(updates_by_id.items())
+        for chunk in chunked(items, COLLECTION_CHUNK_SIZE):
+            body = {
+                "allOrNone": False,
+                "records": [
+                    {"attributes": {"type": "Envelope_Document__c"}, "id": record_id, **fields}
+                    for record_id, fields in chunk
+                ],
+            }
+            get_budget().check(PRIORITY_LOW)
+
+            def patch_collection():
+                try:
+                    return self.sf.restful("composite/sobjects", method="PATCH", json=body)
+                finally:
+                    record_simple_salesforce_call(self.sf, CALL_COMPOSITE)
+
+            results = get_dependency(SALESFORCE).call(patch_collection) or []
+            for (record_id, _), result in zip(chunk, results):
+                if result.get("success"):
+                    updated += 1
+                else:
+                    self.totals["repair_errors"] += 1
+                    logger.error(f"Failed to repair Envelope Document {record_id}: {result.get('errors')}")
+        return updated
+
+    def _next_page(self, session, upper_bound: datetime) -> list:
+        query = session.query(SignatureRequest).filter(SignatureRequest.updated_at <= upper_bound)
+        last_updated_at, last_id = self.checkpoint.state["updated_at"], self.checkpoint.state["id"]
+        if last_updated_at:
+            last_updated_at = datetime.fromisoformat(last_updated_at)
+            last_id = uuid.UUID(last_id)
+            query = query.filter(
+                (SignatureRequest.updated_at > last_updated_at)
+                | ((SignatureRequest.updated_at == last_updated_at) & (SignatureRequest.id > last_id))
+            )
+        return query.order_by(SignatureRequest.updated_at, SignatureRequest.id).limit(self.page_size).all()
+
+    def reconcile_page(self, session, rows: list) -> None:
+        # Rows without an envelope ID are matched by signing token first
+        missing = [row for row in rows if not row.envelope_document_id and row.token]
+        if missing:
+            self.totals[DRIFT_MISSING_ENVELOPE_ID] += len(missing)
+            by_token = self.fetch_by_tokens([row.token for row in missing])
+            for row in missing:
+                record = by_token.get(row.token)
+                if record:
+                    self.totals["local_envelope_ids_set"] += 1
+                    if not self.dry_run:
+                        row.envelope_document_id = record["Id"]
+
+        rows_by_id = {row.envelope_document_id: row for row in rows if row.envelope_document_id}
+        records = self.fetch_by_ids(list(rows_by_id))
+        self.totals["salesforce_records"] += len(records)
+
+        updates_by_id = {}
+        for record_id, row in rows_by_id.items():
+            record = records.get(record_id)
+            if record is None:
+                self.totals[DRIFT_MISSING_IN_SALESFORCE] += 1
+                continue
+            updates, drift = diff_record(row, record)
+            for kind in drift:
+                self.totals[kind] += 1
+            if updates:
+                updates_by_id[record_id] = updates
+                logger.info(f"Drift on Envelope Document {record_id}: {', '.join(drift)}")
+
+        if updates_by_id and not self.dry_run:
+            self.totals["repaired"] += self.apply_updates(updates_by_id)
+        if not self.dry_run:
+            session.commit()
+
+    def run(self, max_pages: int = None) -> dict:
+        session = get_session()
+        state = self.checkpoint.state
+        if not state.get("upper_bound"):
+            # Rows touched after the run starts (including our own repairs) are left for the next run
+            state["upper_bound"] = datetime.now(timezone.utc).isoformat()
+        upper_bound = datetime.fromisoformat(state["upper_bound"])
+
+        started = time.monotonic()
+        pages = 0
+        completed = False
+        while max_pages is None or pages < max_pages:
+            rows = self._next_page(session, upper_bound)
+            if not rows:
+                completed = True
+                break
+            page_started = time.monotonic()
+            last_updated_at, last_id = rows[-1].updated_at.isoformat(), str(rows[-1].id)
+            try:
+                self.reconcile_page(session, rows)
+            except SalesforceBudgetExceeded:
+                session.rollback()
+                logger.warning("Salesforce API budget throttled reconciliation; stopping at checkpoint")
+                break
+            pages += 1
+            self.totals["rows"] += len(rows)
+            state.update({"updated_at": last_updated_at, "id": last_id, "totals": self.totals})
+            if not self.dry_run:
+                self.checkpoint.save()
+
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"Reconciled page {pages}: {len(rows)} rows in {time.monotonic() - page_started:.2f}s, "
+                f"{self.totals['rows']} total, {self.totals['rows'] / elapsed if elapsed else 0:.1f} rows/s"
+            )
+
+        if completed:
+            logger.info("Reconciliation complete")
+            if not self.dry_run:
+                self.checkpoint.clear()
+        return self.totals
@@ -2,8 +2,10 @@ import os
 import time
 import jwt
 import requests
+from app.integrations.salesforce.budget import get_budget, PRIORITY_CRITICAL, CALL_TOKEN
 
-def get_salesforce_access_token():
+def get_salesforce_access_token(priority=PRIORITY_CRITICAL):
+    get_budget().check(priority)
     client_id = os.getenv("SALESFORCE_CLIENT_ID")
     username = os.getenv("SALESFORCE_USERNAME")
     login_url = os.getenv("SALESFORCE_LOGIN_URL", "https://login.salesforce.com")
@@ -30,7 +32,9 @@ def get_salesforce_access_token():
             "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
             "assertion": assertion
         },
+        timeout=10,
     )
+    get_budget().record(CALL_TOKEN, response.headers)
 
     if response.status_code != 200:
         raise Exception(f"Token request failed: {response.status_code} {response.text}")
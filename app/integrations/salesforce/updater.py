@@ -1,15 +1,17 @@
 import requests
 from app.integrations.salesforce.token import get_salesforce_access_token
+from app.integrations.salesforce.budget import get_budget, PRIORITY_CRITICAL, CALL_UPDATE
 
-def update_envelope_record(record_id, updates):
+def update_envelope_record(record_id, updates, priority=PRIORITY_CRITICAL):
     """
     Updates a custom Envelope__c record in Salesforce using the REST API.
 
     :param record_id: str, Salesforce ID of the Envelope__c record (e.g., "a01HS0000001abc")
     :param updates: dict, field names and new values to update
+    :param priority: str, API budget priority (see salesforce.budget)
     :return: True if successful, raises Exception on failure
     """
-    access_token, instance_url = get_salesforce_access_token()
+    access_token, instance_url = get_salesforce_access_token(priority)
 
     url = f"{instance_url}/services/data/v59.0/sobjects/Envelope__c/{record_id}"
 
@@ -18,7 +20,9 @@ def update_envelope_record(record_id, updates):
         "Content-Type": "application/json"
     }
 
-    response = requests.patch(url, json=updates, headers=headers)
+    get_budget().check(priority)
+    response = requests.patch(url, json=updates, headers=headers, timeout=10)
+    get_budget().record(CALL_UPDATE, response.headers)
 
     if response.status_code == 204:
         print(f"✅ Envelope {record_id} updated successfully.")
@@ -17,6 +17,151 @@ document.addEventListener("DOMContentLoaded", function () {
         signaturePad.fromData(data);
     }
 
+    // Compact stroke data for vector rendering (see app/core/signature_vector.py):
+    // half-pixel integer coordinates, each point stored as the delta to the previous one
+    const VECTOR_QUANTUM = 2;
+    const VECTOR_MAX_POINTS = 20000;
+
+    function vectorSignature() {
+        const data = signaturePad.toData();
+        const strokes = [];
+        let total = 0;
+        for (const group of data) {
+            const stroke = [];
+            let lastX = 0;
+            let lastY = 0;
+            group.points.forEach((point, index) => {
+                const x = Math.round(point.x * VECTOR_QUANTUM);
+                const y = Math.round(point.y * VECTOR_QUANTUM);
+                if (index === 0) {
+                    stroke.push(x, y);
+                } else if (x !== lastX || y !== lastY) {
+                    stroke.push(x - lastX, y - lastY);
+                } else {
+                    return;
+                }
+                lastX = x;
+                lastY = y;
+            });
+            if (stroke.length) {
+                strokes.push(stroke);
+                total += stroke.length / 2;
+            }
+        }
+        if (!strokes.length || total > VECTOR_MAX_POINTS) {
+            return null;
+        }
+        return {
+            v: 1,
+            w: Math.round(canvas.offsetWidth),
+            h: Math.round(canvas.offsetHeight),
+            q: VECTOR_QUANTUM,
+            d: true,
+            pen: [signaturePad.minWidth, signaturePad.maxWidth],
+            strokes: strokes
+        };
+    }
+
+    // PNG fallback, sent as a binary multipart part at roughly 4x the
+    // 160pt signature field rather than at full device-pixel resolution
+    const UPLOAD_MAX_WIDTH = 640;
+
+    function signatureBlob() {
+        return new Promise((resolve, reject) => {
+            const scale = Math.min(1, UPLOAD_MAX_WIDTH / canvas.width);
+            const scaled = document.createElement("canvas");
+            scaled.width = Math.round(canvas.width * scale);
+            scaled.height = Math.round(canvas.height * scale);
+            scaled.getContext("2d").drawImage(canvas, 0, 0, scaled.width, scaled.height);
+            scaled.toBlob(blob => {
+                if (blob) {
+                    resolve(blob);
+                } else {
+                    reject(new Error("Could not encode the signature."));
+                }
+            }, "image/png");
+        });
+    }
+
+    function signatureRequestBody(signatureVector) {
+        if (signatureVector) {
+            return Promise.resolve({
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ signature_vector: signatureVector, consent: true })
+            });
+        }
+        return signatureBlob().then(blob => {
+            const form = new FormData();
+            form.append("signature", blob, "signature.png");
+            form.append("consent", "true");
+            // The browser sets the multipart Content-Type with its boundary
+            return { headers: {}, body: form };
+        });
+    }
+
+    // The submission returns a job at once; its stages arrive by polling the
+    // job's status (or as server-sent events where the server offers a
+    // stream) and tick off the overlay steps
+    function markStage(stage, state) {
+        const step = document.querySelector(`.loading-steps li[data-stage="${stage}"]`);
+        if (step) {
+            step.classList.remove("active");
+            step.classList.add(state);
+        }
+    }
+
+    function applyJobState(state) {
+        (state.stages || []).forEach(entry => markStage(entry.stage, "done"));
+        if (state.stage) {
+            markStage(state.stage, "active");
+        }
+    }
+
+    function followSigningJob(job) {
+        if (!job.events_url || !window.EventSource) {
+            return pollSigningJob(job.status_url);
+        }
+        return new Promise((resolve, reject) => {
+            const events = new EventSource(job.events_url);
+            events.addEventListener("stage", e => markStage(JSON.parse(e.data).stage, "done"));
+            events.addEventListener("progress", e => markStage(JSON.parse(e.data).stage, "active"));
+            events.addEventListener("done", e => {
+                events.close();
+                resolve(JSON.parse(e.data));
+            });
+            events.addEventListener("failed", e => {
+                events.close();
+                reject(new Error(JSON.parse(e.data).error || "Signing failed."));
+            });
+            // Dropped streams reconnect by themselves; a refused stream (503) is closed, so poll instead
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED) {
+                    pollSigningJob(job.status_url).then(resolve, reject);
+                }
+            };
+        });
+    }
+
+    function pollSigningJob(statusUrl) {
+        return fetch(statusUrl, { cache: "no-store" })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error("Lost track of the signing progress. Please reload the page.");
+                }
+                return response.json();
+            })
+            .then(state => {
+                applyJobState(state);
+                if (state.status === "completed") {
+                    return state;
+                }
+                if (state.status === "failed") {
+                    throw new Error(state.error || "Signing failed.");
+                }
+                return new Promise(resolve => setTimeout(resolve, 1000)).then(() => pollSigningJob(statusUrl));
+            });
+    }
+
     window.addEventListener("resize", resizeCanvas);
     resizeCanvas();
 
@@ -42,21 +187,18 @@ document.addEventListener("DOMContentLoaded", function () {
             return;
         }
 
-        const signatureData = signaturePad.toDataURL();
+        // Strokes when they fit, otherwise the PNG
+        const signatureVector = vectorSignature();
 
         // Show enhanced loading state
         showLoadingState(submitBtn, clearBtn, loadingMsg, loadingOverlay, pageContent);
 
-        fetch(`/v1/sign/${token}`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json"
-            },
-            body: JSON.stringify({
-                signature: signatureData,
-                consent: true
-            })
-        })
+        signatureRequestBody(signatureVector)
+            .then(({ headers, body }) => fetch(`/v1/sign/${token}`, {
+                method: "POST",
+                headers: headers,
+                body: body
+            }))
             .then(response => {
                 if (!response.ok) {
                     return response.json().then(data => {
@@ -65,6 +207,7 @@ document.addEventListener("DOMContentLoaded", function () {
                 }
                 return response.json();
             })
+            .then(data => (data.job_id ? followSigningJob(data) : data))
             .then(data => {
                 if (data.redirect_url) {
                     window.location.href = data.redirect_url;
@@ -109,6 +252,9 @@ document.addEventListener("DOMContentLoaded", function () {
         
         // Re-enable signature pad
         signaturePad.on();
+
+        // Reset the progress steps
+        document.querySelectorAll(".loading-steps li").forEach(step => step.classList.remove("active", "done"));
         
         // Hide loading overlay
         if (loadingOverlay) {
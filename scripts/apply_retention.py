@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Apply the retention policies for generated PDFs (see app/core/retention.py):
+previews, signed PDFs already copied to the team folder, and signed PDFs
+whose upload never succeeded. Ages come from the ESIGN_RETENTION_* settings.
+Run with --dry-run first to see what would be deleted and how many bytes
+it would reclaim.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.retention import apply_retention, CLASS_PREVIEW, CLASS_SIGNED_UPLOADED, CLASS_FAILED_UPLOAD
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging("apps.esign.retention_job", "esign.log")
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply eSign artifact retention policies")
+    parser.add_argument(
+        "--class",
+        dest="classes",
+        action="append",
+        choices=[CLASS_PREVIEW, CLASS_SIGNED_UPLOADED, CLASS_FAILED_UPLOAD],
+        help="Only apply this retention class (repeatable; default: all)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Deletes per batch (default: ESIGN_RETENTION_BATCH_SIZE or 200)"
+    )
+    parser.add_argument(
+        "--batch-pause",
+        type=float,
+        default=None,
+        help="Seconds to sleep between batches (default: ESIGN_RETENTION_BATCH_PAUSE or 0.2)"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be deleted without deleting"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"Starting retention run (classes: {args.classes or 'all'}, dry run: {args.dry_run})")
+    try:
+        result = apply_retention(args.classes, dry_run=args.dry_run, batch_size=args.batch_size,
+                                 batch_pause=args.batch_pause)
+        print(json.dumps(result, indent=2))
+    except Exception:
+        logger.exception("Error during retention run")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Backfill the artifacts index for preview and signed PDFs written before the
+index existed. Each signature_requests row with a preview_path or pdf_path is
+looked up in the configured storage backend and indexed with its size and
+SHA-256. Already indexed artifacts are skipped, so it is safe to re-run.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.artifacts import backfill_index
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging("apps.esign.artifact_backfill", "esign.log")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the eSign artifact index")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="signature_requests rows per batch (default: 500)"
+    )
+    parser.add_argument(
+        "--skip-hash",
+        action="store_true",
+        help="Do not read files to compute SHA-256 (faster, leaves sha256 empty)"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be indexed without writing"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"Starting artifact index backfill (dry run: {args.dry_run})")
+    try:
+        totals = backfill_index(batch_size=args.batch_size, compute_hash=not args.skip_hash, dry_run=args.dry_run)
+        logger.info(f"Artifact index backfill finished: {totals}")
+        print(json.dumps(totals, indent=2))
+    except Exception:
+        logger.exception("Error during artifact index backfill")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Build the fingerprinted static assets (run on deploy, before the app restarts).
+
+Copies the CSS, JavaScript and images under app/static to app/static/dist
+with a content hash in the filename, writes gzip and brotli variants of the
+text files and the manifest the templates resolve asset_url() against. See
+app/core/assets.py. Previous builds are kept so pages rendered before the
+deploy keep working; --clean removes files the new manifest no longer lists.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.assets import build_assets, STATIC_DIR, DIST_DIR
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging("apps.esign.build_assets", "esign.log")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets")
+    parser.add_argument("--static-dir", default=STATIC_DIR, help=f"Source directory (default: {STATIC_DIR})")
+    parser.add_argument("--dist-dir", default=DIST_DIR, help=f"Output directory (default: {DIST_DIR})")
+    parser.add_argument(
+        "--clean",
+        action="store_true",
+        help="Delete fingerprinted files from earlier builds that the new manifest does not reference"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        manifest = build_assets(args.static_dir, args.dist_dir, clean=args.clean)
+        print(json.dumps({
+            "dist_dir": args.dist_dir,
+            "assets": len(manifest),
+            "precompressed": sum(1 for entry in manifest.values() if entry["encodings"]),
+            "manifest": manifest,
+        }, indent=2))
+    except Exception:
+        logger.exception("Error building static assets")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,24 @@
 """
 Script to clean up old prefilled PDFs.
 This can be run manually or via cron job.
+
+Applies the preview retention policy from app/core/retention.py: indexed
+previews older than --max-age are deleted, and dated preview/ folders older
+than that are swept for unindexed files. scripts/apply_retention.py runs
+every retention class.
 """
 
 import os
 import sys
+import json
 import argparse
-from datetime import datetime
+from datetime import timedelta
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.api.routes_signing import cleanup_prefilled_pdfs
+from app.core.artifacts import KIND_PREVIEW
+from app.core.retention import RetentionPolicy, RetentionRun, CLASS_PREVIEW
 from log_utils.logging_config import configure_logging
 
 logger = configure_logging("apps.esign.cleanup", "esign.log")
@@ -37,17 +44,16 @@ def main():
     logger.info(f"Dry run: {args.dry_run}")
     
     try:
-        if args.dry_run:
-            # In dry run mode, we'll just log what would be deleted
-            logger.info("Dry run mode - no files will be deleted")
-            # TODO: Implement dry run functionality if needed
-        else:
-            deleted, skipped = cleanup_prefilled_pdfs(max_age_hours=args.max_age)
-            logger.info(f"Cleanup completed. Deleted: {deleted}, Skipped: {skipped}")
+        policy = RetentionPolicy(CLASS_PREVIEW, KIND_PREVIEW, timedelta(hours=args.max_age), walk_prefix="preview")
+        result = RetentionRun([policy], dry_run=args.dry_run).run()
+        stats = result["classes"][CLASS_PREVIEW]
+        logger.info(f"Cleanup completed. Deleted: {stats['deleted']}, Missing: {stats['missing']}, "
+                    f"Errors: {stats['errors']}, Bytes reclaimed: {stats['bytes_reclaimed']}")
+        print(json.dumps(result, indent=2))
             
     except Exception as e:
         logger.exception("Error during cleanup")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Pack old signed/YYYYMMDD folders into per-day archives (signed/archive/
+YYYYMMDD.zip, see app/core/compaction.py). Each PDF stays readable by
+seeking to the offset recorded in archived_artifacts, and the serve and
+download routes read through to the archives. Run with --dry-run first to
+see how many folders, files and bytes would be packed.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.compaction import compact_signed_folders
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging("apps.esign.compaction_job", "esign.log")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old signed PDF date folders into indexed archives")
+    parser.add_argument(
+        "--older-than-days",
+        type=int,
+        default=None,
+        help="Only compact folders older than this (default: ESIGN_COMPACT_AFTER_DAYS or 60)"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Compact at most this many folders in this run"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be compacted without writing archives"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"Starting signed folder compaction (older than: {args.older_than_days}, dry run: {args.dry_run})")
+    try:
+        result = compact_signed_folders(args.older_than_days, dry_run=args.dry_run, limit=args.limit)
+        print(json.dumps(result, indent=2))
+    except Exception:
+        logger.exception("Error during signed folder compaction")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Reconcile signature_requests with Envelope_Document__c records in Salesforce.
+Finds completed requests whose Salesforce record is out of date (status,
+sign date, Dropbox path) or rows missing envelope_document_id, and repairs
+them with batched collection updates. Safe to interrupt: re-running with the
+same --checkpoint file resumes where the previous run stopped.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.integrations.salesforce.reconcile import SalesforceReconciler
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging("apps.esign.reconcile_cli", "esign.log")
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile local signature requests with Salesforce")
+    parser.add_argument(
+        "--checkpoint",
+        default="reconcile_checkpoint.json",
+        help="Checkpoint file used to resume an interrupted run (default: reconcile_checkpoint.json)"
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=1000,
+        help="Local rows per page (default: 1000)"
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        default=None,
+        help="Stop after this many pages (default: run to completion)"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report drift without updating Salesforce, local rows or the checkpoint"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"Starting Salesforce reconciliation (dry run: {args.dry_run})")
+    try:
+        reconciler = SalesforceReconciler(
+            checkpoint_path=args.checkpoint,
+            page_size=args.page_size,
+            dry_run=args.dry_run
+        )
+        totals = reconciler.run(max_pages=args.max_pages)
+        logger.info(f"Reconciliation finished: {totals}")
+        print(json.dumps(totals, indent=2))
+    except Exception:
+        logger.exception("Error during reconciliation")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Replay deferred tasks (Dropbox uploads, Salesforce updates) that were
+parked while a dependency's circuit breaker was open.
+This can be run manually or via cron job.
+"""
+
+import os
+import sys
+import argparse
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.deferred import run_pending_tasks
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging("apps.esign.deferred_runner", "esign.log")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay deferred eSign tasks")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=50,
+        help="Maximum number of due tasks to process (default: 50)"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"Running up to {args.limit} deferred tasks")
+    try:
+        succeeded, failed = run_pending_tasks(limit=args.limit)
+        logger.info(f"Deferred task run completed. Succeeded: {succeeded}, Failed: {failed}")
+    except Exception:
+        logger.exception("Error running deferred tasks")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Incremental sync between the artifact index and the eSign Dropbox team
+folder (see app/integrations/dropbox/sync.py). Picks up remote changes with
+the saved list_folder cursor, re-uploads signed PDFs whose upload failed
+(UPLOAD_FAILED in Salesforce) with a bounded pool of workers, and writes
+the recovered Dropbox paths back to Salesforce in batches. Run it from cron;
+only the first run lists the whole folder.
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.integrations.dropbox.sync import DropboxSync
+from log_utils.logging_config import configure_logging
+
+logger = configure_logging("apps.esign.dropbox_sync_job", "esign.log")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the eSign artifact index with the Dropbox team folder")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Concurrent re-uploads (default: ESIGN_DROPBOX_SYNC_WORKERS or 4)"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Re-upload at most this many missing artifacts in this run"
+    )
+    parser.add_argument(
+        "--since",
+        type=lambda value: datetime.fromisoformat(value).replace(tzinfo=timezone.utc),
+        default=None,
+        help="Only re-upload artifacts created on or after this date (YYYY-MM-DD, UTC)"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be matched and re-uploaded without changing anything"
+    )
+
+    args = parser.parse_args()
+
+    logger.info(f"Starting Dropbox sync (workers: {args.workers}, limit: {args.limit}, dry run: {args.dry_run})")
+    try:
+        totals = DropboxSync(workers=args.workers, upload_limit=args.limit, since=args.since,
+                             dry_run=args.dry_run).run()
+        print(json.dumps(totals, indent=2))
+    except Exception:
+        logger.exception("Error during Dropbox sync")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Break down traces from the JSON-lines span file (ESIGN_TRACE_FILE, written
+with ESIGN_TRACE_EXPORT=jsonl, see app/core/tracing.py). Rotated files
+(traces.jsonl.1, ...) can be passed with --file.
+
+With --trace-id, prints that trace as a tree: every span with its offset
+from the start of the trace and its duration, so a slow signing shows which
+stage (PDF rendering, a database statement, Dropbox, Salesforce, a webhook)
+took the time. Without it, lists the slowest traces whose root span matches
+--name (e.g. "POST /v1/sign/<token>"), with their longest child spans.
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.tracing import APP_ROOT
+
+DEFAULT_TRACE_FILE = os.environ.get("ESIGN_TRACE_FILE", os.path.join(APP_ROOT, "logs", "traces.jsonl"))
+
+
+def load_spans(path: str, trace_id: str = None) -> dict:
+    """Spans by trace ID, optionally only one trace."""
+    traces = defaultdict(list)
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if trace_id is None or span.get("trace_id") == trace_id:
+                traces[span["trace_id"]].append(span)
+    return traces
+
+
+def trace_tree(spans: list) -> dict:
+    """The trace as nested spans with offsets (ms) from its first span."""
+    start = min(span["start_ns"] for span in spans)
+    ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        # Spans whose parent was not exported (or is in another process's unflushed batch) hang off the root
+        children[span["parent_id"] if span["parent_id"] in ids else None].append(span)
+
+    def node(span):
+        return {
+            "name": span["name"],
+            "offset_ms": round((span["start_ns"] - start) / 1e6, 3),
+            "duration_ms": span["duration_ms"],
+            "status": span["status"],
+            **({"error": span["error"]} if span.get("error") else {}),
+            "attributes": span["attributes"],
+            "children": [node(child) for child in sorted(children[span["span_id"]], key=lambda s: s["start_ns"])],
+        }
+
+    return {
+        "trace_id": spans[0]["trace_id"],
+        "duration_ms": round((max(span["end_ns"] for span in spans) - start) / 1e6, 3),
+        "spans": [node(span) for span in sorted(children[None], key=lambda s: s["start_ns"])],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Break down eSign traces")
+    parser.add_argument("--file", default=DEFAULT_TRACE_FILE, help=f"Span file (default: {DEFAULT_TRACE_FILE})")
+    parser.add_argument("--trace-id", help="Show one trace as a tree")
+    parser.add_argument("--name", default="POST /v1/sign/<token>", help="Root span name for --slowest")
+    parser.add_argument("--slowest", type=int, default=10, help="Number of traces to list (default: 10)")
+
+    args = parser.parse_args()
+
+    try:
+        traces = load_spans(args.file, args.trace_id)
+    except FileNotFoundError:
+        print(json.dumps({"error": f"No span file at {args.file}"}))
+        sys.exit(1)
+
+    if args.trace_id:
+        if args.trace_id not in traces:
+            print(json.dumps({"error": f"Trace {args.trace_id} not found"}))
+            sys.exit(1)
+        print(json.dumps(trace_tree(traces[args.trace_id]), indent=2))
+        return
+
+    matching = []
+    for trace_id, spans in traces.items():
+        roots = [span for span in spans if span["parent_id"] is None and span["name"] == args.name]
+        if not roots:
+            continue
+        start = min(span["start_ns"] for span in spans)
+        longest = sorted((span for span in spans if span["parent_id"] is not None),
+                         key=lambda s: s["duration_ms"] or 0, reverse=True)[:5]
+        matching.append({
+            "trace_id": trace_id,
+            # Includes background work (the signing job) that outlived the request
+            "duration_ms": round((max(span["end_ns"] for span in spans) - start) / 1e6, 3),
+            "request_ms": roots[0]["duration_ms"],
+            "spans": len(spans),
+            "longest": [{"name": span["name"], "duration_ms": span["duration_ms"]} for span in longest],
+        })
+    matching.sort(key=lambda t: t["duration_ms"], reverse=True)
+    print(json.dumps({"name": args.name, "traces": len(matching), "slowest": matching[:args.slowest]}, indent=2))
+
+if __name__ == "__main__":
+    main()
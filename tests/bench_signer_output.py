@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Signer Output Benchmark
+=======================
+Compares the signer's output stage variants for each template: file size,
+render latency and the bytes a browser needs before it can show page 1
+(the /E offset of a linearized file, otherwise the whole file).
+
+Variants:
+  plain        no output optimization (the previous behaviour)
+  compress     deduplicated objects + deflated content streams (default)
+  objstreams   compress + compressed object streams (pikepdf)
+  linearized   compress + object streams + linearization (pikepdf)
+  incremental  template bytes kept as-is; signed pages appended as an update
+
+Signed PDFs are written to in-memory storage, so nothing touches disk or
+the database. --synthetic-pages adds a generated long packet, signed on
+its first and last page, to show how the variants scale.
+
+Examples:
+  PYTHONPATH=/srv/shared:/srv/apps/esign python tests/bench_signer_output.py
+  PYTHONPATH=/srv/shared:/srv/apps/esign python tests/bench_signer_output.py --synthetic-pages 40 --runs 10 --json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import signer
+from app.core.storage import MemoryStorage, set_storage
+
+SIGNATURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data", "signature.txt")
+
+VARIANTS = {
+    "plain": {"compress": False, "object_streams": False, "linearize": False, "incremental": False},
+    "compress": {"compress": True, "object_streams": False, "linearize": False, "incremental": False},
+    "objstreams": {"compress": True, "object_streams": True, "linearize": False, "incremental": False},
+    "linearized": {"compress": True, "object_streams": True, "linearize": True, "incremental": False},
+    "incremental": {"compress": True, "object_streams": False, "linearize": False, "incremental": True},
+}
+
+
+def build_synthetic_template(path: str, pages: int) -> dict:
+    """A text-heavy packet of `pages` letter pages; returns its registry entry."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    c = canvas.Canvas(path, pagesize=letter, pageCompression=0)
+    for page in range(1, pages + 1):
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(72, 720, f"Retainer Agreement - Page {page} of {pages}")
+        c.setFont("Helvetica", 10)
+        for line in range(55):
+            c.drawString(72, 700 - line * 11, f"{page}.{line} The client agrees to the terms set out in this section " * 1)
+        c.showPage()
+    c.save()
+    fields = []
+    for page in (1, pages):
+        fields += [
+            {"page": page, "x": 130, "y": 90, "width": 160, "height": 35, "label": f"Client Signature Image (Page {page})"},
+            {"page": page, "x": 120, "y": 137, "width": 150, "height": 15, "label": f"Client Name (Page {page})"},
+            {"page": page, "x": 362, "y": 95, "width": 100, "height": 15, "label": f"Signing Date (Page {page})"},
+        ]
+    return {"path": path, "pages": pages, "signature_fields": fields}
+
+
+def first_page_bytes(data: bytes) -> int:
+    """Bytes needed before page 1 can render: /E of the linearization dictionary, else the file size."""
+    head = data[:1024]
+    if b"/Linearized" in head:
+        match = re.search(rb"/E\s+(\d+)", head)
+        if match:
+            return int(match.group(1))
+    return len(data)
+
+
+def bench_template(template_key: str, signature: str, storage: MemoryStorage, runs: int) -> dict:
+    results = {}
+    for name, options in VARIANTS.items():
+        timings = []
+        size = first_page = 0
+        for _ in range(runs):
+            started = time.perf_counter()
+            key = signer.embed_signature_on_pdf(
+                template_key=template_key,
+                output_path=f"signed/bench_{name}.pdf",
+                signature_b64=signature,
+                client_name="Bench Client",
+                sign_date=datetime.now().strftime("%Y-%m-%d"),
+                output_options=options,
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            data = storage.read_bytes(key)
+            size, first_page = len(data), first_page_bytes(data)
+            storage.delete(key)
+        timings.sort()
+        results[name] = {
+            "bytes": size,
+            "first_page_bytes": first_page,
+            "p50_ms": round(timings[len(timings) // 2], 2),
+            "max_ms": round(timings[-1], 2),
+        }
+    baseline = results["plain"]["bytes"] or 1
+    for row in results.values():
+        row["size_vs_plain"] = round(row["bytes"] / baseline, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare signer output stage variants (size / latency / first page)")
+    parser.add_argument("--templates", nargs="*", help="Registry keys to benchmark (default: all with a template on disk)")
+    parser.add_argument("--synthetic-pages", type=int, default=0, help="Also benchmark a generated packet with this many pages")
+    parser.add_argument("--runs", type=int, default=5, help="Renders per variant")
+    parser.add_argument("--json", action="store_true", help="Print JSON only")
+    args = parser.parse_args()
+
+    with open(SIGNATURE_PATH, "r") as f:
+        signature = f.read().strip()
+    storage = MemoryStorage()
+    set_storage(storage)
+
+    templates = args.templates or [key for key, entry in signer.TEMPLATE_REGISTRY.items() if os.path.isfile(entry["path"])]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic_pages:
+            key = f"synthetic_{args.synthetic_pages}p"
+            signer.TEMPLATE_REGISTRY[key] = build_synthetic_template(os.path.join(tmp, f"{key}.pdf"), args.synthetic_pages)
+            templates.append(key)
+        report = {key: bench_template(key, signature, storage, args.runs) for key in templates}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, results in report.items():
+        print(f"\n{key}")
+        print(f"  {'variant':<12}{'bytes':>10}{'vs plain':>10}{'page 1 bytes':>14}{'p50 ms':>10}{'max ms':>10}")
+        for name, row in results.items():
+            print(f"  {name:<12}{row['bytes']:>10}{row['size_vs_plain']:>10}{row['first_page_bytes']:>14}"
+                  f"{row['p50_ms']:>10}{row['max_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
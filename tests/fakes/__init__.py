@@ -0,0 +1,68 @@
+# ------------------------------------------------------------------------
+# File: __init__.py
+# Location: /srv/apps/esign/tests/fakes/__init__.py
+# Description:
+#     Hermetic local stand-ins for Salesforce, Dropbox and the RingCentral
+#     webhook. FakeStack starts all three over HTTPS with a throwaway
+#     certificate and exposes the environment variables that point the
+#     eSign app (and the SDKs it uses) at them instead of live services.
+# ------------------------------------------------------------------------
+
+import os
+import tempfile
+
+from tests.fakes.server import FakeServer, FaultProfile
+from tests.fakes.salesforce import FakeSalesforce
+from tests.fakes.dropbox import FakeDropbox
+from tests.fakes.webhook import FakeWebhookReceiver
+from tests.fakes.tls import generate_rsa_key_pem, generate_self_signed_cert
+
+
+class FakeStack:
+    """Salesforce, Dropbox and webhook fakes sharing one TLS certificate."""
+
+    def __init__(self, salesforce_faults=None, dropbox_faults=None, webhook_faults=None):
+        self.workdir = tempfile.mkdtemp(prefix="esign-fakes-")
+        self.cert_path, self.key_path = generate_self_signed_cert(self.workdir)
+        tls = (self.cert_path, self.key_path)
+        self.salesforce = FakeSalesforce(salesforce_faults, tls=tls)
+        self.dropbox = FakeDropbox(dropbox_faults, tls=tls)
+        self.webhook = FakeWebhookReceiver(webhook_faults, tls=tls)
+        self.jwt_key_path = os.path.join(self.workdir, "salesforce_jwt.pem")
+        with open(self.jwt_key_path, "wb") as f:
+            f.write(generate_rsa_key_pem())
+
+    def start(self) -> "FakeStack":
+        for fake in (self.salesforce, self.dropbox, self.webhook):
+            fake.start()
+        return self
+
+    def stop(self) -> None:
+        for fake in (self.salesforce, self.dropbox, self.webhook):
+            fake.stop()
+
+    def env(self) -> dict:
+        """Environment that routes every outbound call of the app to the fakes."""
+        return {
+            "REQUESTS_CA_BUNDLE": self.cert_path,
+            "SALESFORCE_LOGIN_URL": self.salesforce.url,
+            "SALESFORCE_CLIENT_ID": "fake-client-id",
+            "SALESFORCE_USERNAME": "integration@example.com.fake",
+            "SALESFORCE_JWT_PRIVATE_KEY_PATH": self.jwt_key_path,
+            "DROPBOX_API_HOST": self.dropbox.host,
+            "DROPBOX_API_CONTENT_HOST": self.dropbox.host,
+            "DROPBOX_ESIGN_FOLDER_ID": self.dropbox.shared_folder_id,
+            "RC_WEBHOOK_URL": self.webhook.webhook_url,
+            "DISABLE_WEBHOOKS": "false",
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+__all__ = [
+    "FakeServer", "FaultProfile", "FakeSalesforce", "FakeDropbox", "FakeWebhookReceiver", "FakeStack",
+]
@@ -0,0 +1,318 @@
+# ------------------------------------------------------------------------
+# File: dropbox.py
+# Location: /srv/apps/esign/tests/fakes/dropbox.py
+# Description:
+#     In-process stand-in for the Dropbox API v2 endpoints used for the
+#     team-folder upload flow: OAuth refresh, shared folder metadata,
+#     files/upload, files/download, files/get_metadata, create_folder_v2,
+#     delete_v2, list_folder (+ continue, with cursors that report
+#     deletions) and upload sessions (start, append_v2, finish,
+#     finish_batch_v2, with incorrect_offset errors so clients can resume).
+#     drop_append_acks makes the next appends store their chunk but answer
+#     500, like a response lost in transit. Files are kept in memory
+#     per namespace (taken from the Dropbox-API-Path-Root header), so the
+#     official SDK can be pointed at it via DROPBOX_API_HOST and
+#     DROPBOX_API_CONTENT_HOST.
+# ------------------------------------------------------------------------
+
+import hashlib
+import itertools
+import json
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from tests.fakes.server import FakeServer, json_response
+
+DEFAULT_NAMESPACE = "home"
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def dropbox_content_hash(data: bytes) -> str:
+    """Dropbox's content_hash: SHA-256 over the SHA-256 digests of 4 MB blocks."""
+    block_hashes = b"".join(
+        hashlib.sha256(data[i:i + BLOCK_SIZE]).digest() for i in range(0, len(data), BLOCK_SIZE)
+    )
+    return hashlib.sha256(block_hashes).hexdigest()
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def error_response(summary: str, tag: dict, status: int = 409):
+    return json_response({"error_summary": summary, "error": tag}, status)
+
+
+class FakeDropbox(FakeServer):
+    name = "dropbox"
+
+    def __init__(self, *args, shared_folder_id: str = "1387609128", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shared_folder_id = shared_folder_id
+        self.files = {}       # (namespace, path_lower) -> {"data", "metadata"}
+        self.folders = set()  # (namespace, path_lower)
+        self.changes = []     # (seq, namespace, path_lower) in upload order
+        self._seq = itertools.count(1)
+        self._revs = itertools.count(0x100000000)
+        self._data_lock = threading.Lock()
+        self.sessions = {}    # session_id -> {"data", "closed", "namespace"}
+        self.drop_append_acks = 0
+        self.upload_calls = {"upload": 0, "start": 0, "append": 0, "finish": 0, "finish_batch": 0}
+        self.route("POST", r"/oauth2/token", self.oauth_token)
+        self.route("POST", r"/2/users/get_current_account", self.current_account)
+        self.route("POST", r"/2/sharing/get_folder_metadata", self.get_folder_metadata)
+        self.route("POST", r"/2/files/upload", self.upload)
+        self.route("POST", r"/2/files/download", self.download)
+        self.route("POST", r"/2/files/get_metadata", self.get_metadata)
+        self.route("POST", r"/2/files/create_folder_v2", self.create_folder)
+        self.route("POST", r"/2/files/delete_v2", self.delete)
+        self.route("POST", r"/2/files/upload_session/start", self.session_start)
+        self.route("POST", r"/2/files/upload_session/append_v2", self.session_append)
+        self.route("POST", r"/2/files/upload_session/finish", self.session_finish)
+        self.route("POST", r"/2/files/upload_session/finish_batch_v2", self.session_finish_batch)
+        self.route("POST", r"/2/files/list_folder", self.list_folder)
+        self.route("POST", r"/2/files/list_folder/continue", self.list_folder_continue)
+
+    # -- helpers -------------------------------------------------------
+
+    @staticmethod
+    def namespace(request) -> str:
+        header = request.headers.get("Dropbox-API-Path-Root")
+        if not header:
+            return DEFAULT_NAMESPACE
+        root = json.loads(header)
+        return str(root.get("namespace_id") or root.get("root") or DEFAULT_NAMESPACE)
+
+    @staticmethod
+    def api_arg(request) -> dict:
+        return json.loads(request.headers.get("Dropbox-API-Arg") or "{}")
+
+    def put_file(self, path: str, data: bytes, namespace: str = DEFAULT_NAMESPACE) -> dict:
+        """Store a file (also usable directly from tests to seed remote state)."""
+        path_lower = path.lower()
+        metadata = {
+            ".tag": "file",
+            "name": path.rsplit("/", 1)[-1],
+            "id": f"id:{uuid.uuid4().hex[:22]}",
+            "client_modified": _timestamp(),
+            "server_modified": _timestamp(),
+            "rev": f"{next(self._revs):x}",
+            "size": len(data),
+            "path_lower": path_lower,
+            "path_display": path,
+            "is_downloadable": True,
+            "content_hash": dropbox_content_hash(data),
+        }
+        with self._data_lock:
+            self.files[(namespace, path_lower)] = {"data": data, "metadata": metadata}
+            parent = path_lower.rsplit("/", 1)[0]
+            while parent:
+                self.folders.add((namespace, parent))
+                parent = parent.rsplit("/", 1)[0]
+            self.changes.append((next(self._seq), namespace, path_lower))
+        return metadata
+
+    def _entries_under(self, namespace: str, path_lower: str, recursive: bool, keys=None) -> list:
+        prefix = path_lower.rstrip("/") + "/"
+        entries = []
+        for (ns, file_path), entry in self.files.items():
+            if ns != namespace or not file_path.startswith(prefix):
+                continue
+            if keys is not None and file_path not in keys:
+                continue
+            if not recursive and "/" in file_path[len(prefix):]:
+                continue
+            entries.append(dict(entry["metadata"]))
+        return sorted(entries, key=lambda e: e["path_lower"])
+
+    def delete_file(self, path: str, namespace: str = DEFAULT_NAMESPACE) -> dict | None:
+        """Remove a file; list_folder/continue reports it as deleted."""
+        path_lower = path.lower()
+        with self._data_lock:
+            entry = self.files.pop((namespace, path_lower), None)
+            if entry is not None:
+                self.changes.append((next(self._seq), namespace, path_lower))
+        return entry and entry["metadata"]
+
+    def _cursor(self, namespace: str, path_lower: str, recursive: bool) -> str:
+        seq = self.changes[-1][0] if self.changes else 0
+        return json.dumps({"ns": namespace, "path": path_lower, "recursive": recursive, "seq": seq})
+
+    # -- routes --------------------------------------------------------
+
+    def oauth_token(self, request):
+        return json_response({"access_token": f"sl.fake-{uuid.uuid4().hex}", "expires_in": 14400, "token_type": "bearer"})
+
+    def current_account(self, request):
+        return json_response({
+            "account_id": "dbid:FAKE", "name": {"given_name": "Fake", "surname": "Account",
+                                                "familiar_name": "Fake", "display_name": "Fake Account",
+                                                "abbreviated_name": "FA"},
+            "email": "fake@example.com", "email_verified": True, "disabled": False, "locale": "en",
+            "referral_link": "https://db.tt/fake", "is_paired": False,
+            "account_type": {".tag": "business"}, "root_info": {".tag": "team", "root_namespace_id": "1",
+                                                                 "home_namespace_id": "2", "home_path": "/Fake"},
+        })
+
+    def get_folder_metadata(self, request):
+        folder_id = (request.json() or {}).get("shared_folder_id")
+        return json_response({
+            "access_type": {".tag": "editor"},
+            "is_inside_team_folder": True,
+            "is_team_folder": False,
+            "name": "Potential Clients",
+            "policy": {
+                "acl_update_policy": {".tag": "editors"},
+                "shared_link_policy": {".tag": "anyone"},
+            },
+            "preview_url": f"https://www.dropbox.com/scl/fo/{folder_id}",
+            "shared_folder_id": folder_id,
+            "time_invited": _timestamp(),
+        })
+
+    def upload(self, request):
+        arg = self.api_arg(request)
+        with self._data_lock:
+            self.upload_calls["upload"] += 1
+        metadata = self.put_file(arg["path"], request.body, self.namespace(request))
+        response = dict(metadata)
+        response.pop(".tag")
+        return json_response(response)
+
+    # -- upload sessions -----------------------------------------------
+
+    @staticmethod
+    def _lookup_error(tag: str, status: int = 409, **fields):
+        return error_response(f"{tag}/", {".tag": tag, **fields}, status)
+
+    def _session(self, cursor: dict):
+        """(session, error response) for an upload session cursor."""
+        session = self.sessions.get(cursor["session_id"])
+        if session is None:
+            return None, self._lookup_error("not_found")
+        if cursor["offset"] != len(session["data"]):
+            return None, self._lookup_error("incorrect_offset", correct_offset=len(session["data"]))
+        return session, None
+
+    def session_start(self, request):
+        arg = self.api_arg(request)
+        session_id = f"fake-session-{uuid.uuid4().hex}"
+        with self._data_lock:
+            self.upload_calls["start"] += 1
+            self.sessions[session_id] = {"data": bytearray(request.body), "closed": bool(arg.get("close")),
+                                         "namespace": self.namespace(request)}
+        return json_response({"session_id": session_id})
+
+    def session_append(self, request):
+        arg = self.api_arg(request)
+        with self._data_lock:
+            self.upload_calls["append"] += 1
+            session, error = self._session(arg["cursor"])
+            if error:
+                return error
+            if session["closed"]:
+                return self._lookup_error("closed")
+            session["data"] += request.body
+            session["closed"] = bool(arg.get("close"))
+            if self.drop_append_acks > 0:
+                self.drop_append_acks -= 1
+                return json_response({"error": "ack_lost"}, 500)
+        return json_response(None)
+
+    def _commit(self, cursor: dict, commit: dict, body: bytes = b""):
+        with self._data_lock:
+            session, error = self._session(cursor)
+            if error:
+                return None, error
+            self.sessions.pop(cursor["session_id"])
+        metadata = dict(self.put_file(commit["path"], bytes(session["data"]) + body, session["namespace"]))
+        metadata.pop(".tag")
+        return metadata, None
+
+    def session_finish(self, request):
+        arg = self.api_arg(request)
+        with self._data_lock:
+            self.upload_calls["finish"] += 1
+        metadata, error = self._commit(arg["cursor"], arg["commit"], request.body)
+        if error:
+            status, headers, body = error
+            tag = json.loads(body)["error"]
+            return error_response("lookup_failed/", {".tag": "lookup_failed", "lookup_failed": tag})
+        return json_response(metadata)
+
+    def session_finish_batch(self, request):
+        with self._data_lock:
+            self.upload_calls["finish_batch"] += 1
+        entries = []
+        for entry in (request.json() or {})["entries"]:
+            session = self.sessions.get(entry["cursor"]["session_id"])
+            if session is not None and not session["closed"]:
+                entries.append({".tag": "failure", "failure": {".tag": "lookup_failed",
+                                                               "lookup_failed": {".tag": "not_closed"}}})
+                continue
+            metadata, error = self._commit(entry["cursor"], entry["commit"])
+            if error:
+                entries.append({".tag": "failure", "failure": {".tag": "lookup_failed",
+                                                               "lookup_failed": json.loads(error[2])["error"]}})
+            else:
+                entries.append({".tag": "success", **metadata})
+        return json_response({"entries": entries})
+
+    def download(self, request):
+        path_lower = self.api_arg(request)["path"].lower()
+        entry = self.files.get((self.namespace(request), path_lower))
+        if entry is None:
+            return error_response("path/not_found/", {".tag": "path", "path": {".tag": "not_found"}})
+        metadata = dict(entry["metadata"])
+        metadata.pop(".tag")
+        return 200, {"Content-Type": "application/octet-stream", "Dropbox-API-Result": json.dumps(metadata)}, entry["data"]
+
+    def get_metadata(self, request):
+        path_lower = (request.json() or {})["path"].lower()
+        namespace = self.namespace(request)
+        entry = self.files.get((namespace, path_lower))
+        if entry is not None:
+            return json_response(entry["metadata"])
+        if (namespace, path_lower) in self.folders:
+            return json_response({".tag": "folder", "name": path_lower.rsplit("/", 1)[-1], "id": "id:folder",
+                                  "path_lower": path_lower, "path_display": path_lower})
+        return error_response("path/not_found/", {".tag": "path", "path": {".tag": "not_found"}})
+
+    def create_folder(self, request):
+        path = (request.json() or {})["path"]
+        with self._data_lock:
+            self.folders.add((self.namespace(request), path.lower()))
+        return json_response({"metadata": {"name": path.rsplit("/", 1)[-1], "id": "id:folder",
+                                           "path_lower": path.lower(), "path_display": path}})
+
+    def delete(self, request):
+        path = (request.json() or {})["path"]
+        metadata = self.delete_file(path, self.namespace(request))
+        if metadata is None:
+            return error_response("path_lookup/not_found/", {".tag": "path_lookup", "path_lookup": {".tag": "not_found"}})
+        return json_response({"metadata": metadata})
+
+    def list_folder(self, request):
+        body = request.json() or {}
+        namespace = self.namespace(request)
+        path_lower = body.get("path", "").lower()
+        recursive = bool(body.get("recursive"))
+        with self._data_lock:
+            entries = self._entries_under(namespace, path_lower, recursive)
+            cursor = self._cursor(namespace, path_lower, recursive)
+        return json_response({"entries": entries, "cursor": cursor, "has_more": False})
+
+    def list_folder_continue(self, request):
+        cursor = json.loads((request.json() or {})["cursor"])
+        with self._data_lock:
+            changed = {path for seq, ns, path in self.changes if seq > cursor["seq"] and ns == cursor["ns"]}
+            entries = self._entries_under(cursor["ns"], cursor["path"], cursor["recursive"], keys=changed)
+            prefix = cursor["path"].rstrip("/") + "/"
+            entries += [
+                {".tag": "deleted", "name": path.rsplit("/", 1)[-1], "path_lower": path, "path_display": path}
+                for path in sorted(changed)
+                if path.startswith(prefix) and (cursor["ns"], path) not in self.files
+            ]
+            new_cursor = self._cursor(cursor["ns"], cursor["path"], cursor["recursive"])
+        return json_response({"entries": entries, "cursor": new_cursor, "has_more": False})
@@ -0,0 +1,118 @@
+# ------------------------------------------------------------------------
+# File: salesforce.py
+# Location: /srv/apps/esign/tests/fakes/salesforce.py
+# Description:
+#     In-process stand-in for the Salesforce endpoints the service uses:
+#     the JWT-bearer OAuth token endpoint, SOQL queries (= and IN filters),
+#     single-record sObject PATCH and sObject Collection PATCH. Records are
+#     kept in memory and every data response carries a Sforce-Limit-Info
+#     header so the API budget tracker can be exercised.
+# ------------------------------------------------------------------------
+
+import itertools
+import re
+import threading
+import uuid
+
+from tests.fakes.server import FakeServer, json_response
+
+_SOQL_RE = re.compile(
+    r"SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<object>\w+)"
+    r"(?:\s+WHERE\s+(?P<field>\w+)\s*(?P<op>=|IN)\s*(?P<value>\(.*?\)|'(?:[^'\\]|\\.)*'))?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+))?",
+    re.IGNORECASE | re.DOTALL,
+)
+_VALUE_RE = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+class FakeSalesforce(FakeServer):
+    name = "salesforce"
+
+    def __init__(self, *args, api_limit: int = 15000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_limit = api_limit
+        self.api_used = 0
+        self.objects = {}
+        self.tokens_issued = 0
+        self._ids = itertools.count(1)
+        self._data_lock = threading.Lock()
+        self.route("POST", r"/services/oauth2/token", self.token)
+        self.route("GET", r"/services/data/v[\d.]+/query/?", self.query)
+        self.route("PATCH", r"/services/data/v[\d.]+/composite/sobjects", self.collection_update)
+        self.route("GET", r"/services/data/v[\d.]+/sobjects/(?P<object>\w+)/(?P<id>\w+)/?", self.get_record)
+        self.route("PATCH", r"/services/data/v[\d.]+/sobjects/(?P<object>\w+)/(?P<id>\w+)/?", self.update_record)
+
+    def add_record(self, object_name: str, record_id: str = None, **fields) -> str:
+        with self._data_lock:
+            record_id = record_id or f"a44FAKE{next(self._ids):011d}"
+            self.objects.setdefault(object_name, {})[record_id] = {"Id": record_id, **fields}
+        return record_id
+
+    def record(self, object_name: str, record_id: str) -> dict:
+        return self.objects.get(object_name, {}).get(record_id)
+
+    def _limit_headers(self) -> dict:
+        with self._data_lock:
+            self.api_used += 1
+            return {"Sforce-Limit-Info": f"api-usage={self.api_used}/{self.api_limit}"}
+
+    def token(self, request):
+        with self._data_lock:
+            self.tokens_issued += 1
+        return json_response({
+            "access_token": f"00DFAKE!{uuid.uuid4().hex}",
+            "instance_url": self.url,
+            "id": f"{self.url}/id/00DFAKE/005FAKE",
+            "token_type": "Bearer",
+            "scope": "api",
+        })
+
+    def query(self, request):
+        soql = (request.query.get("q") or [""])[0]
+        match = _SOQL_RE.match(soql.strip())
+        if not match:
+            return json_response([{"errorCode": "MALFORMED_QUERY", "message": soql}], 400)
+        with self._data_lock:
+            records = list(self.objects.get(match.group("object"), {}).values())
+        if match.group("field"):
+            wanted = {v.replace("\\'", "'") for v in _VALUE_RE.findall(match.group("value"))}
+            records = [r for r in records if str(r.get(match.group("field"))) in wanted]
+        if match.group("limit"):
+            records = records[:int(match.group("limit"))]
+        payload = [{"attributes": {"type": match.group("object")}, **r} for r in records]
+        return json_response(
+            {"totalSize": len(payload), "done": True, "records": payload},
+            headers=self._limit_headers(),
+        )
+
+    def get_record(self, request):
+        record = self.record(request.match.group("object"), request.match.group("id"))
+        if record is None:
+            return json_response([{"errorCode": "NOT_FOUND", "message": "The requested resource does not exist"}], 404)
+        return json_response(record, headers=self._limit_headers())
+
+    def update_record(self, request):
+        object_name, record_id = request.match.group("object"), request.match.group("id")
+        with self._data_lock:
+            record = self.objects.get(object_name, {}).get(record_id)
+            if record is not None:
+                record.update(request.json() or {})
+        if record is None:
+            return json_response([{"errorCode": "NOT_FOUND", "message": "The requested resource does not exist"}], 404)
+        return 204, self._limit_headers(), b""
+
+    def collection_update(self, request):
+        body = request.json() or {}
+        results = []
+        with self._data_lock:
+            for item in body.get("records", []):
+                fields = {k: v for k, v in item.items() if k not in ("attributes", "id")}
+                object_name = item.get("attributes", {}).get("type")
+                record = self.objects.get(object_name, {}).get(item.get("id"))
+                if record is None:
+                    results.append({"id": item.get("id"), "success": False,
+                                    "errors": [{"statusCode": "ENTITY_IS_DELETED", "message": "not found"}]})
+                    continue
+                record.update(fields)
+                results.append({"id": item.get("id"), "success": True, "errors": []})
+        return json_response(results, headers=self._limit_headers())
@@ -0,0 +1,182 @@
+# ------------------------------------------------------------------------
+# File: server.py
+# Location: /srv/apps/esign/tests/fakes/server.py
+# Description:
+#     Base class for the in-process fake servers that stand in for
+#     Salesforce, Dropbox and the RingCentral webhook. Each fake runs a
+#     threaded HTTP(S) server on 127.0.0.1 with a FaultProfile that injects
+#     latency, random 5xx errors and a requests-per-second rate limit
+#     (answered with 429 + Retry-After), all adjustable while running.
+# ------------------------------------------------------------------------
+
+import json
+import random
+import re
+import ssl
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FaultProfile:
+    """Latency, error-rate and rate-limit settings applied to every request."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, rate_limit: float = None, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bucket_rate = None
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def take_token(self) -> bool:
+        """Token bucket sized to one second of traffic. False means rate limited."""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self._bucket_rate != self.rate_limit:
+                # Limit was (re)configured: start with a full bucket
+                self._bucket_rate = self.rate_limit
+                self._tokens = self.rate_limit
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._last_refill) * self.rate_limit)
+            self._last_refill = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class FakeRequest:
+    def __init__(self, method: str, path: str, query: dict, headers, body: bytes, match):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.match = match
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+
+def json_response(payload, status: int = 200, headers: dict = None):
+    body = json.dumps(payload).encode()
+    return status, {"Content-Type": "application/json", **(headers or {})}, body
+
+
+class FakeServer:
+    """
+    Threaded fake HTTP server. Subclasses register routes with self.route()
+    and return (status, headers, body) tuples from their handlers.
+    """
+
+    name = "fake"
+
+    def __init__(self, faults: FaultProfile = None, tls: tuple = None, port: int = 0):
+        self.faults = faults or FaultProfile()
+        self.tls = tls
+        self.port = port
+        self.requests = deque(maxlen=10000)
+        self.counts = {"total": 0, "injected_errors": 0, "rate_limited": 0}
+        self._routes = []
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def route(self, method: str, pattern: str, handler) -> None:
+        self._routes.append((method, re.compile(f"^{pattern}$"), handler))
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self._httpd.server_address[1]}"
+
+    @property
+    def url(self) -> str:
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://{self.host}"
+
+    def dispatch(self, method: str, raw_path: str, headers, body: bytes):
+        parsed = urlparse(raw_path)
+        with self._lock:
+            self.counts["total"] += 1
+            self.requests.append((method, parsed.path))
+
+        delay = self.faults.delay()
+        if delay:
+            time.sleep(delay)
+        if not self.faults.take_token():
+            with self._lock:
+                self.counts["rate_limited"] += 1
+            return json_response({"error": "rate_limited"}, 429, {"Retry-After": "1"})
+        if self.faults.should_fail():
+            with self._lock:
+                self.counts["injected_errors"] += 1
+            return json_response({"error": "injected_fault"}, self.faults.error_status)
+
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(parsed.path)
+            if match and route_method == method:
+                request = FakeRequest(method, parsed.path, parse_qs(parsed.query), headers, body, match)
+                return handler(request)
+        return json_response({"error": "not_found", "path": parsed.path}, 404)
+
+    def start(self) -> "FakeServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, headers, payload = fake.dispatch(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = do_HEAD = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._httpd.daemon_threads = True
+        if self.tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*self.tls)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=f"{self.name}-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,63 @@
+# ------------------------------------------------------------------------
+# File: tls.py
+# Location: /srv/apps/esign/tests/fakes/tls.py
+# Description:
+#     Generates a throwaway self-signed certificate for 127.0.0.1 so the
+#     fakes can serve HTTPS. simple_salesforce and the Dropbox SDK always
+#     build https:// URLs; pointing REQUESTS_CA_BUNDLE at the generated
+#     certificate makes them trust the fakes without code changes.
+# ------------------------------------------------------------------------
+
+import ipaddress
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+
+def generate_rsa_key_pem() -> bytes:
+    """A fresh RSA private key in PEM form (also used as the fake Salesforce JWT key)."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    )
+
+
+def generate_self_signed_cert(directory: str = None) -> tuple[str, str]:
+    """Write cert.pem/key.pem for localhost/127.0.0.1 and return their paths."""
+    directory = directory or tempfile.mkdtemp(prefix="esign-fakes-")
+    key_pem = generate_rsa_key_pem()
+    key = serialization.load_pem_private_key(key_pem, password=None)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "esign-fakes")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([
+                x509.DNSName("localhost"),
+                x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+            ]),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key_pem)
+    return cert_path, key_path
@@ -0,0 +1,32 @@
+# ------------------------------------------------------------------------
+# File: webhook.py
+# Location: /srv/apps/esign/tests/fakes/webhook.py
+# Description:
+#     In-process stand-in for the RingCentral incoming-webhook receiver.
+#     Accepts JSON posts on any path and keeps the received messages so
+#     tests can assert on what was (or was not) sent.
+# ------------------------------------------------------------------------
+
+import threading
+
+from tests.fakes.server import FakeServer, json_response
+
+
+class FakeWebhookReceiver(FakeServer):
+    name = "webhook"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = []
+        self._messages_lock = threading.Lock()
+        self.route("POST", r"/.*", self.receive)
+
+    @property
+    def webhook_url(self) -> str:
+        return f"{self.url}/webhook/fake"
+
+    def receive(self, request):
+        payload = request.json() or {}
+        with self._messages_lock:
+            self.messages.append(payload)
+        return json_response({"status": "OK"})
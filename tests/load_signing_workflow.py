@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+End-to-End Signing Load Harness
+===============================
+Drives the full signing path at a target request rate and reports latency
+percentiles per stage:
+
+1. POST /api/v1/initiate   (HMAC-signed, like Salesforce)
+2. GET  /v1/sign/<token>   (signing page + preview render)
+3. POST /v1/sign/<token>   (signature submission)
+4. GET  /v1/sign/final/<token>
+
+Modes:
+  --serve-app      Start the Salesforce/Dropbox/webhook fakes, point the app at
+                   them and serve it in-process (needs ESIGN_DATABASE_URL).
+  --fakes-only     Start the fakes and print the environment to export before
+                   starting the app yourself; blocks until Ctrl-C.
+  --base-url URL   Drive an already running app.
+
+Examples:
+  PYTHONPATH=/srv/shared:/srv/apps/esign python tests/load_signing_workflow.py --serve-app --rps 5 --duration 60
+  PYTHONPATH=/srv/shared:/srv/apps/esign python tests/load_signing_workflow.py --base-url http://localhost:5000 --rps 2
+"""
+
+import os
+import sys
+import json
+import time
+import hmac
+import uuid
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.fakes import FakeStack, FaultProfile
+
+STAGES = ["initiate", "sign_page", "submit", "signing_job", "final_review"]
+SIGNATURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data", "signature.txt")
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class StageStats:
+    def __init__(self):
+        self.latencies = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+        self.error_samples = []
+        self.flows_completed = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, ok: bool, detail: str = None):
+        with self._lock:
+            self.latencies[stage].append(seconds)
+            if not ok:
+                self.errors[stage] += 1
+                if detail and len(self.error_samples) < 10:
+                    self.error_samples.append(f"{stage}: {detail}")
+
+    def flow_done(self):
+        with self._lock:
+            self.flows_completed += 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = {"elapsed_seconds": round(elapsed, 2), "flows_completed": self.flows_completed,
+                  "flows_per_second": round(self.flows_completed / elapsed, 2) if elapsed else 0, "stages": {}}
+        for stage in STAGES:
+            values = sorted(self.latencies[stage])
+            result["stages"][stage] = {
+                "count": len(values),
+                "errors": self.errors[stage],
+                **{f"p{p}_ms": round(percentile(values, p) * 1000, 1) for p in (50, 90, 95, 99)},
+                "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+            }
+        result["error_samples"] = self.error_samples
+        return result
+
+
+def hmac_headers(body: str, secret: str) -> dict:
+    timestamp = str(int(time.time()))
+    signature = hmac.new(secret.encode(), f"{timestamp}{body}".encode(), hashlib.sha256).hexdigest()
+    return {"Content-Type": "application/json", "X-Timestamp": timestamp, "X-Signature": signature}
+
+
+def run_flow(base_url: str, secret: str, template: str, signature_b64: str, stats: StageStats, stack: FakeStack = None):
+    session = requests.Session()
+    envelope_id = None
+    if stack is not None:
+        envelope_id = stack.salesforce.add_record("Envelope_Document__c", Envelope_Status__c="Sent")
+
+    def timed(stage, func):
+        started = time.perf_counter()
+        try:
+            response = func()
+        except requests.RequestException as e:
+            stats.record(stage, time.perf_counter() - started, False, str(e))
+            return None
+        ok = response.status_code < 400
+        stats.record(stage, time.perf_counter() - started, ok, None if ok else f"{response.status_code} {response.text[:120]}")
+        return response if ok else None
+
+    body = json.dumps({
+        "template_type": template,
+        "client_name": f"Load Test {uuid.uuid4().hex[:6]}",
+        "client_email": f"load.{uuid.uuid4().hex[:8]}@example.com",
+        "salesforce_case_id": "a0B7V00000LoadTestEAA",
+        "envelope_document_id": envelope_id,
+    })
+    response = timed("initiate", lambda: session.post(f"{base_url}/api/v1/initiate", data=body, headers=hmac_headers(body, secret)))
+    if response is None:
+        return
+    token = response.json()["token"]
+    if stack is not None:
+        stack.salesforce.objects["Envelope_Document__c"][envelope_id]["Signing_Token__c"] = token
+
+    if timed("sign_page", lambda: session.get(f"{base_url}/v1/sign/{token}")) is None:
+        return
+    response = timed("submit", lambda: session.post(f"{base_url}/v1/sign/{token}", json={"signature": signature_b64, "consent": True}))
+    if response is None:
+        return
+    # The submission returns a job; the pipeline's own latency is its time to completion
+    if timed("signing_job", lambda: wait_for_signing_job(session, base_url, response.json()["status_url"])) is None:
+        return
+    if timed("final_review", lambda: session.get(f"{base_url}/v1/sign/final/{token}")) is None:
+        return
+    stats.flow_done()
+
+
+def wait_for_signing_job(session: requests.Session, base_url: str, status_url: str, timeout: float = 120.0):
+    """Poll a signing job until it finishes; returns the final status response."""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = session.get(f"{base_url}{status_url}")
+        if response.status_code >= 400 or response.json()["status"] == "completed":
+            return response
+        if response.json()["status"] == "failed" or time.monotonic() >= deadline:
+            raise requests.RequestException(f"signing job {response.json()['status']}: {response.json().get('error')}")
+        time.sleep(0.25)
+
+
+def drive(base_url: str, secret: str, rps: float, duration: float, concurrency: int, template: str, stack: FakeStack = None) -> dict:
+    """Open-loop load: one new flow every 1/rps seconds regardless of how long earlier flows take."""
+    with open(SIGNATURE_PATH, "r") as f:
+        signature_b64 = f.read().strip()
+
+    stats = StageStats()
+    interval = 1.0 / rps
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        next_start = started
+        while time.perf_counter() - started < duration:
+            pool.submit(run_flow, base_url, secret, template, signature_b64, stats, stack)
+            next_start += interval
+            time.sleep(max(0.0, next_start - time.perf_counter()))
+    return stats.summary(time.perf_counter() - started)
+
+
+def print_report(summary: dict):
+    print(f"\nFlows completed: {summary['flows_completed']} in {summary['elapsed_seconds']}s "
+          f"({summary['flows_per_second']}/s)")
+    print(f"{'stage':<14}{'count':>7}{'errors':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for stage, s in summary["stages"].items():
+        print(f"{stage:<14}{s['count']:>7}{s['errors']:>8}{s['p50_ms']:>9}{s['p90_ms']:>9}"
+              f"{s['p95_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+    for sample in summary["error_samples"]:
+        print(f"  ! {sample}")
+
+
+def start_fakes(args) -> FakeStack:
+    def faults(prefix):
+        return FaultProfile(
+            latency=getattr(args, f"{prefix}_latency"),
+            error_rate=getattr(args, f"{prefix}_error_rate"),
+            rate_limit=getattr(args, f"{prefix}_rate_limit"),
+        )
+    stack = FakeStack(faults("salesforce"), faults("dropbox"), faults("webhook")).start()
+    print(f"Fakes running: salesforce={stack.salesforce.url} dropbox={stack.dropbox.url} webhook={stack.webhook.url}",
+          file=sys.stderr)
+    return stack
+
+
+def serve_app_in_process() -> str:
+    # Imported late so the fake endpoints are in the environment before the app and SDKs load
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="esign-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the full eSign signing workflow")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--serve-app", action="store_true", help="Start fakes and serve the app in-process")
+    mode.add_argument("--fakes-only", action="store_true", help="Start fakes, print their env and wait")
+    mode.add_argument("--base-url", help="Drive an already running app at this URL")
+    parser.add_argument("--rps", type=float, default=2.0, help="Signing flows started per second (default: 2)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load (default: 30)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum flows in flight (default: 32)")
+    parser.add_argument("--template", default="cea", help="Template key to sign (default: cea)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    for prefix in ("salesforce", "dropbox", "webhook"):
+        parser.add_argument(f"--{prefix}-latency", type=float, default=0.0, help=f"Added latency for the {prefix} fake (s)")
+        parser.add_argument(f"--{prefix}-error-rate", type=float, default=0.0, help=f"Share of {prefix} fake calls failing with 503")
+        parser.add_argument(f"--{prefix}-rate-limit", type=float, default=None, help=f"Requests/s before the {prefix} fake answers 429")
+    args = parser.parse_args()
+
+    stack = None
+    if args.fakes_only or args.serve_app:
+        stack = start_fakes(args)
+        os.environ.update(stack.env())
+        os.environ.setdefault("SF_SECRET_KEY", uuid.uuid4().hex)
+
+    if args.fakes_only:
+        for key, value in {**stack.env(), "SF_SECRET_KEY": os.environ["SF_SECRET_KEY"]}.items():
+            print(f"export {key}={value!r}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stack.stop()
+            return
+
+    base_url = serve_app_in_process() if args.serve_app else args.base_url.rstrip("/")
+    secret = os.environ["SF_SECRET_KEY"]
+    summary = drive(base_url, secret, args.rps, args.duration, args.concurrency, args.template, stack)
+    if stack is not None:
+        summary["fakes"] = {name: fake.counts for name, fake in
+                            (("salesforce", stack.salesforce), ("dropbox", stack.dropbox), ("webhook", stack.webhook))}
+        summary["webhook_messages"] = len(stack.webhook.messages)
+        stack.stop()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# ------------------------------------------------------------------------
+# File: test_artifacts.py
+# Location: /srv/apps/esign/tests/test_artifacts.py
+# Description:
+#     Tests for the artifact index: lookups by filename, and the backfill
+#     that indexes legacy rows. Uses the in-memory storage backend and
+#     the database configured by ESIGN_DATABASE_URL (skipped without one).
+# ------------------------------------------------------------------------
+
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+from app.db.models import Artifact, SignatureRequest, SignatureStatus
+from app.core.artifacts import (
+    KIND_PREVIEW,
+    KIND_SIGNED,
+    backfill_index,
+    find_artifact,
+    index_artifact,
+    set_remote_path,
+)
+from app.core.storage import MemoryStorage, set_storage
+
+
+@pytest.fixture
+def storage():
+    memory = MemoryStorage()
+    set_storage(memory)
+    yield memory
+    set_storage(None)
+
+
+@pytest.fixture
+def signature_request():
+    session = get_session()
+    row = SignatureRequest(
+        client_name="Jane Test",
+        client_email="jane@example.com",
+        template_type="cea",
+        salesforce_case_id="CASE-ARTIFACTS",
+        token_hash=hashlib.sha256(uuid.uuid4().bytes).hexdigest(),
+        status=SignatureStatus.Completed,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+    session.add(row)
+    session.commit()
+    yield row
+    session.query(Artifact).filter(Artifact.signature_request_id == row.id).delete()
+    session.delete(row)
+    session.commit()
+
+
+def unique_key(prefix: str) -> str:
+    return f"{prefix}/20250615/test_{uuid.uuid4().hex[:12]}.pdf"
+
+
+def test_index_and_resolve(storage, signature_request):
+    key = unique_key("signed")
+    stored = storage.put_bytes(key, b"%PDF-signed")
+    index_artifact(stored, KIND_SIGNED, signature_request.id)
+
+    filename = key.rsplit("/", 1)[1]
+    assert find_artifact(filename, KIND_SIGNED).storage_key == key
+    assert find_artifact(filename, KIND_PREVIEW) is None
+
+    row = find_artifact(filename, KIND_SIGNED)
+    assert row.size == len(b"%PDF-signed")
+    assert row.sha256 == hashlib.sha256(b"%PDF-signed").hexdigest()
+
+    set_remote_path(key, "/Potential Clients/_esign/20250615/x.pdf")
+    get_session().refresh(row)
+    assert row.remote_path == "/Potential Clients/_esign/20250615/x.pdf"
+
+
+def test_unindexed_artifact_is_found_after_the_backfill(storage, signature_request):
+    key = unique_key("preview")
+    storage.put_bytes(key, b"%PDF-preview")
+    signature_request.preview_path = key
+    get_session().commit()
+
+    filename = key.rsplit("/", 1)[1]
+    assert find_artifact(filename, KIND_PREVIEW) is None
+    backfill_index()
+    assert find_artifact(filename, KIND_PREVIEW).storage_key == key
+    assert find_artifact(filename, KIND_PREVIEW).signature_request_id == signature_request.id
+
+
+def test_backfill_is_idempotent(storage, signature_request):
+    key = unique_key("signed")
+    storage.put_bytes(key, b"%PDF-backfill")
+    signature_request.pdf_path = key
+    get_session().commit()
+
+    backfill_index()
+    row = find_artifact(key.rsplit("/", 1)[1], KIND_SIGNED)
+    assert row is not None and row.sha256 == hashlib.sha256(b"%PDF-backfill").hexdigest()
+
+    assert backfill_index()["already_indexed"] >= 1
+    assert get_session().query(Artifact).filter(Artifact.signature_request_id == signature_request.id).count() == 1
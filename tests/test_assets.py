@@ -0,0 +1,130 @@
+# ------------------------------------------------------------------------
+# File: test_assets.py
+# Location: /srv/apps/esign/tests/test_assets.py
+# Description:
+#     Tests for the static asset build: hashed filenames and precompressed
+#     variants in the manifest, content negotiation and immutable caching
+#     on /assets/ (for earlier builds too), and asset_url() falling back to
+#     the plain static URL when no build has been run.
+# ------------------------------------------------------------------------
+
+import gzip
+import json
+import os
+
+import pytest
+from flask import Flask, render_template_string
+
+from app.core import assets
+from app.api.routes_assets import assets_bp
+
+STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "static"))
+
+
+@pytest.fixture
+def dist(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "DIST_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(assets_bp)
+    app.add_template_global(assets.asset_url)
+    return app.test_client()
+
+
+def test_build_fingerprints_and_precompresses(dist):
+    manifest = assets.build_assets(STATIC_DIR, str(dist))
+
+    entry = manifest["css/esign-sign.css"]
+    assert entry["path"].startswith("css/esign-sign.") and entry["path"].endswith(".css")
+    assert set(entry["encodings"]) <= {"br", "gzip"} and "gzip" in entry["encodings"]
+    with open(os.path.join(STATIC_DIR, "css", "esign-sign.css"), "rb") as f:
+        original = f.read()
+    assert (dist / entry["path"]).read_bytes() == original
+    assert gzip.decompress((dist / (entry["path"] + ".gz")).read_bytes()) == original
+    # Images are fingerprinted but not recompressed
+    assert manifest["assets/signature_here.png"]["encodings"] == []
+    assert json.loads((dist / "manifest.json").read_text()) == manifest
+
+    # Same content, same name; a rebuild is a no-op
+    assert assets.build_assets(STATIC_DIR, str(dist)) == manifest
+
+
+def test_clean_removes_only_stale_files(tmp_path):
+    static, dist = tmp_path / "static", tmp_path / "dist"
+    (static / "css").mkdir(parents=True)
+    (static / "css" / "a.css").write_text("body { color: red; }\n" * 50)
+    first = assets.build_assets(str(static), str(dist))["css/a.css"]["path"]
+    (static / "css" / "a.css").write_text("body { color: blue; }\n" * 50)
+
+    second = assets.build_assets(str(static), str(dist))["css/a.css"]["path"]
+    assert second != first
+    assert (dist / first).exists()  # kept for pages rendered before the deploy
+
+    assets.build_assets(str(static), str(dist), clean=True)
+    assert not (dist / first).exists() and not (dist / (first + ".gz")).exists()
+    assert (dist / second).exists()
+
+
+def test_serves_best_variant_with_immutable_caching(dist, client):
+    path = assets.build_assets(STATIC_DIR, str(dist))["js/esign-sign.js"]["path"]
+    url = f"/assets/{path}"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip, deflate, br"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "br"
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.mimetype in ("text/javascript", "application/javascript")
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    with open(os.path.join(STATIC_DIR, "js", "esign-sign.js"), "rb") as f:
+        original = f.read()
+    assert gzip.decompress(response.data) == original
+
+    response = client.get(url)
+    assert "Content-Encoding" not in response.headers
+    assert response.data == original
+    assert "immutable" in response.headers["Cache-Control"]
+
+
+def test_unknown_asset_is_404(dist, client):
+    path = assets.build_assets(STATIC_DIR, str(dist))["css/esign-sign.css"]["path"]
+    assert client.get("/assets/css/esign-sign.000000000000.css").status_code == 404
+    assert client.get("/assets/manifest.json").status_code == 404
+    assert client.get(f"/assets/{path}.gz").status_code == 404
+    (dist.parent / "outside.0123456789ab.css").write_text("body {}")
+    assert client.get("/assets/../outside.0123456789ab.css").status_code == 404
+    assert client.get("/assets/%2E%2E/outside.0123456789ab.css").status_code == 404
+    assert assets.asset_file("../outside.0123456789ab.css", None) is None
+
+
+def test_previous_build_is_still_served(tmp_path, monkeypatch, client):
+    static, dist = tmp_path / "static", tmp_path / "dist"
+    monkeypatch.setattr(assets, "DIST_DIR", str(dist))
+    (static / "js").mkdir(parents=True)
+    (static / "js" / "a.js").write_text("console.log('old');\n" * 50)
+    old = assets.build_assets(str(static), str(dist))["js/a.js"]["path"]
+    (static / "js" / "a.js").write_text("console.log('new');\n" * 50)
+    assets.build_assets(str(static), str(dist))
+
+    response = client.get(f"/assets/{old}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == (static / "js" / "a.js").read_bytes().replace(b"new", b"old")
+    assert "immutable" in response.headers["Cache-Control"]
+
+
+def test_asset_url_uses_manifest_or_falls_back(dist, client):
+    template = "{{ asset_url('css/esign-sign.css') }}"
+    with client.application.test_request_context():
+        assert render_template_string(template) == "/static/esign/css/esign-sign.css"
+
+        path = assets.build_assets(STATIC_DIR, str(dist))["css/esign-sign.css"]["path"]
+        assert render_template_string(template) == f"/assets/{path}"
+        # Not in the manifest (e.g. added after the build)
+        assert assets.asset_url("css/new.css") == "/static/esign/css/new.css"
@@ -0,0 +1,111 @@
+# ------------------------------------------------------------------------
+# File: test_compaction.py
+# Location: /srv/apps/esign/tests/test_compaction.py
+# Description:
+#     Tests for cold-storage compaction: old signed/ date folders are packed
+#     into a stored zip, each document is readable at its recorded offset,
+#     recent folders are left alone, and the serve route reads through to
+#     the archive. Folders are dated 2001 so real data is never touched.
+#     Uses local storage in a temporary directory and the database
+#     configured by ESIGN_DATABASE_URL (skipped without one).
+# ------------------------------------------------------------------------
+
+import hashlib
+import os
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+from app.db.models import ArchivedArtifact
+from app.core.compaction import Compaction, find_archived
+from app.core.storage import LocalStorage, send_artifact
+
+NOW = datetime(2001, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    local = LocalStorage(str(tmp_path))
+    yield local
+    session = get_session()
+    session.query(ArchivedArtifact).filter(ArchivedArtifact.storage_key.like("signed/2001%")).delete(
+        synchronize_session=False)
+    session.commit()
+
+
+def put_signed(storage, key):
+    data = b"%PDF-1.4\n" + os.urandom(2000) + b"\n%%EOF\n"
+    storage.put_bytes(key, data)
+    return data
+
+
+def test_old_folders_are_packed_and_readable_by_offset(storage):
+    old = {key: put_signed(storage, key) for key in ("signed/20010101/a_signed.pdf", "signed/20010101/b_signed.pdf")}
+    recent = put_signed(storage, "signed/20010520/c_signed.pdf")
+
+    result = Compaction(older_than_days=60, storage=storage, now=NOW).run()
+
+    assert result["folders"] == 1 and result["files"] == 2 and result["errors"] == 0
+    assert not os.path.isdir(storage.local_path("signed/20010101"))
+    assert storage.read_bytes("signed/20010520/c_signed.pdf") == recent
+    with zipfile.ZipFile(storage.local_path("signed/archive/20010101.zip")) as archive:
+        assert sorted(archive.namelist()) == ["a_signed.pdf", "b_signed.pdf"]
+    for key, data in old.items():
+        archived = find_archived(key)
+        assert archived.archive_key == "signed/archive/20010101.zip"
+        assert archived.sha256 == hashlib.sha256(data).hexdigest()
+        with storage.open_range(archived.archive_key, archived.offset, archived.size) as stream:
+            assert stream.read() == data
+
+
+def test_rerun_appends_to_the_existing_archive(storage):
+    first = put_signed(storage, "signed/20010101/a_signed.pdf")
+    Compaction(older_than_days=60, storage=storage, now=NOW).run()
+    # A late write into an already-compacted day
+    late = put_signed(storage, "signed/20010101/late_signed.pdf")
+
+    result = Compaction(older_than_days=60, storage=storage, now=NOW).run()
+
+    assert result["files"] == 1
+    for key, data in (("signed/20010101/a_signed.pdf", first), ("signed/20010101/late_signed.pdf", late)):
+        archived = find_archived(key)
+        with storage.open_range(archived.archive_key, archived.offset, archived.size) as stream:
+            assert stream.read() == data
+
+
+def test_dry_run_reports_without_packing(storage):
+    put_signed(storage, "signed/20010101/a_signed.pdf")
+
+    result = Compaction(older_than_days=60, dry_run=True, storage=storage, now=NOW).run()
+
+    assert result["folders"] == 1 and result["files"] == 1 and result["bytes"] > 2000
+    assert storage.exists("signed/20010101/a_signed.pdf")
+    assert not os.path.exists(storage.local_path("signed/archive/20010101.zip"))
+
+
+def test_archived_documents_are_served_with_ranges(storage):
+    data = put_signed(storage, "signed/20010101/a_signed.pdf")
+    Compaction(older_than_days=60, storage=storage, now=NOW).run()
+    archived = find_archived("signed/20010101/a_signed.pdf")
+
+    app = Flask(__name__)
+
+    @app.route("/signed")
+    def signed():
+        return send_artifact(archived.storage_key, storage=storage, sha256=archived.sha256, size=archived.size,
+                             archive=(archived.archive_key, archived.offset))
+
+    client = app.test_client()
+    response = client.get("/signed")
+    assert response.status_code == 200 and response.data == data
+    assert response.headers["ETag"] == f'"{archived.sha256}"'
+
+    response = client.get("/signed", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206 and response.data == data[100:200]
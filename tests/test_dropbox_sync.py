@@ -0,0 +1,181 @@
+# ------------------------------------------------------------------------
+# File: test_dropbox_sync.py
+# Location: /srv/apps/esign/tests/test_dropbox_sync.py
+# Description:
+#     Tests for the incremental Dropbox sync against the in-process Dropbox
+#     fake (the official SDK pointed at it over HTTPS): a first full listing
+#     matches remote files to the artifact index, re-uploads the missing
+#     ones and patches Salesforce in one collection request; the next run
+#     only sees changes through the saved cursor, including deletions, and
+#     documents packed by compaction are re-uploaded from their archive.
+#     Artifacts are dated 2001 and the re-upload window is set to match, so
+#     rows from other tests are never picked up. Skipped without a database.
+# ------------------------------------------------------------------------
+
+import hashlib
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+pytest.importorskip("dropbox")
+pytest.importorskip("utils.dropbox_api.upload_file", reason="shared Dropbox utilities not installed")
+
+from app.db.models import ArchivedArtifact, Artifact, DropboxSyncCursor, SignatureRequest, SignatureStatus
+from app.core.artifacts import KIND_SIGNED, index_artifact
+from app.core.resilience import reset_dependencies
+from app.core.storage import MemoryStorage, set_storage
+from app.integrations.dropbox.sync import DropboxSync
+from app.integrations.salesforce.reconcile import SalesforceReconciler
+from tests.fakes.dropbox import FakeDropbox
+from tests.fakes.tls import generate_self_signed_cert
+
+ROOT = "/Potential Clients/_esign"
+CREATED = datetime(2001, 1, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeSalesforce:
+    def __init__(self):
+        self.patches = []
+        self.api_usage = {}
+
+    def restful(self, path, method="GET", json=None):
+        self.patches.append(json)
+        return [{"id": r["id"], "success": True, "errors": []} for r in json["records"]]
+
+
+@pytest.fixture
+def fake_dropbox(monkeypatch):
+    import dropbox.dropbox_client
+
+    cert_path, key_path = generate_self_signed_cert(tempfile.mkdtemp(prefix="esign-sync-"))
+    with FakeDropbox(tls=(cert_path, key_path)) as fake:
+        monkeypatch.setattr(dropbox.dropbox_client, "API_HOST", fake.host)
+        monkeypatch.setattr(dropbox.dropbox_client, "API_CONTENT_HOST", fake.host)
+        monkeypatch.setenv("REQUESTS_CA_BUNDLE", cert_path)
+        monkeypatch.setenv("DROPBOX_ESIGN_FOLDER_ID", fake.shared_folder_id)
+        reset_dependencies()
+        yield fake
+    reset_dependencies()
+
+
+@pytest.fixture
+def signed(fake_dropbox):
+    """Three signed requests: one already in the team folder, two whose upload failed."""
+    storage = MemoryStorage()
+    set_storage(storage)
+    session = get_session()
+    rows = []
+    for number in range(3):
+        request_row = SignatureRequest(
+            client_name=f"Sync Client {number}",
+            client_email="sync@example.com",
+            template_type="cea",
+            salesforce_case_id="CASE-SYNC",
+            token_hash=hashlib.sha256(uuid.uuid4().bytes).hexdigest(),
+            status=SignatureStatus.Completed,
+            envelope_document_id=f"a0X{uuid.uuid4().hex[:12]}",
+            expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+        )
+        session.add(request_row)
+        session.commit()
+        key = f"signed/20010101/sync{number}_{uuid.uuid4().hex[:8]}_signed.pdf"
+        artifact = index_artifact(storage.put_bytes(key, b"%PDF-1.4\n" + bytes([number]) * 3000), KIND_SIGNED,
+                                  request_row.id)
+        artifact.created_at = CREATED
+        session.commit()
+        rows.append((request_row, artifact))
+    fake_dropbox.put_file(f"{ROOT}/20010101/{rows[0][1].filename}", b"%PDF-1.4\n" + b"\x00" * 3000,
+                          namespace=fake_dropbox.shared_folder_id)
+    yield rows
+    for request_row, artifact in rows:
+        session.query(Artifact).filter(Artifact.id == artifact.id).delete()
+        session.delete(request_row)
+    session.query(DropboxSyncCursor).filter(DropboxSyncCursor.namespace_id == fake_dropbox.shared_folder_id).delete()
+    session.commit()
+    set_storage(None)
+
+
+def make_sync(salesforce):
+    return DropboxSync(workers=2, since=CREATED - timedelta(days=1), until=CREATED + timedelta(days=1),
+                       reconciler=SalesforceReconciler(sf=salesforce))
+
+
+def test_first_sync_lists_reuploads_and_patches_salesforce(signed, fake_dropbox):
+    salesforce = FakeSalesforce()
+
+    totals = make_sync(salesforce).run()
+
+    assert totals["listing"] == "full"
+    assert totals["matched"] == 1 and totals["missing"] == 2 and totals["reuploaded"] == 2
+    session = get_session()
+    for _, artifact in signed:
+        session.refresh(artifact)
+        assert artifact.remote_path.endswith(artifact.filename)
+        assert (fake_dropbox.shared_folder_id, artifact.remote_path.lower()) in fake_dropbox.files
+    # One collection request carries all three paths
+    assert len(salesforce.patches) == 1
+    patched = {record["id"]: record["dropbox_file_path__c"] for record in salesforce.patches[0]["records"]}
+    assert patched == {request_row.envelope_document_id: artifact.remote_path for request_row, artifact in signed}
+
+
+def test_next_sync_only_sees_changes_through_the_cursor(signed, fake_dropbox):
+    make_sync(FakeSalesforce()).run()
+    list_calls = sum(1 for _, path in fake_dropbox.requests if path == "/2/files/list_folder")
+    _, gone = signed[1]
+    session = get_session()
+    session.refresh(gone)
+    fake_dropbox.delete_file(gone.remote_path, namespace=fake_dropbox.shared_folder_id)
+
+    salesforce = FakeSalesforce()
+    totals = make_sync(salesforce).run()
+
+    assert totals["listing"] == "incremental"
+    assert sum(1 for _, path in fake_dropbox.requests if path == "/2/files/list_folder") == list_calls
+    # The deleted copy is noticed and uploaded again
+    assert totals["remote_deleted"] == 1 and totals["reuploaded"] == 1
+    session.refresh(gone)
+    assert (fake_dropbox.shared_folder_id, gone.remote_path.lower()) in fake_dropbox.files
+
+
+def test_dry_run_changes_nothing(signed, fake_dropbox):
+    totals = DropboxSync(since=CREATED - timedelta(days=1), until=CREATED + timedelta(days=1), dry_run=True).run()
+
+    assert totals["matched"] == 1 and totals["missing"] == 3 and totals["reuploaded"] == 0
+    session = get_session()
+    for _, artifact in signed:
+        session.refresh(artifact)
+        assert artifact.remote_path is None
+    assert session.query(DropboxSyncCursor).filter(
+        DropboxSyncCursor.namespace_id == fake_dropbox.shared_folder_id).count() == 0
+
+
+def test_compacted_artifacts_are_reuploaded_from_their_archive(signed, fake_dropbox):
+    storage = MemoryStorage()
+    set_storage(storage)
+    _, artifact = signed[1]
+    data = b"%PDF-1.4\n" + b"\x01" * 3000
+    # Packed into the day's archive by compaction: the loose file is gone, the index row is unchanged
+    archive_key = f"signed/archive/20010101_{uuid.uuid4().hex[:8]}.zip"
+    storage.put_bytes(archive_key, b"PK-header" + data + b"PK-trailer")
+    session = get_session()
+    session.add(ArchivedArtifact(storage_key=artifact.storage_key, archive_key=archive_key, member=artifact.filename,
+                                 offset=len(b"PK-header"), size=len(data), sha256=hashlib.sha256(data).hexdigest()))
+    session.commit()
+    try:
+        totals = DropboxSync(workers=2, since=CREATED - timedelta(days=1), until=CREATED + timedelta(days=1),
+                             storage=storage, reconciler=SalesforceReconciler(sf=FakeSalesforce())).run()
+    finally:
+        session.query(ArchivedArtifact).filter(ArchivedArtifact.archive_key == archive_key).delete()
+        session.commit()
+
+    # signed[2] has no loose file in this storage either, and no archive entry
+    assert totals["reuploaded"] == 1 and totals["upload_errors"] == 1
+    session.refresh(artifact)
+    assert fake_dropbox.files[(fake_dropbox.shared_folder_id, artifact.remote_path.lower())]["data"] == data
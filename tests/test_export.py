@@ -0,0 +1,154 @@
+# ------------------------------------------------------------------------
+# File: test_export.py
+# Location: /srv/apps/esign/tests/test_export.py
+# Description:
+#     Tests for the streaming signed-document export: selection by case and
+#     date range, manifest.csv first, PDFs read through to compaction
+#     archives and team-folder copies, missing and unindexed documents
+#     listed, and the HMAC-protected endpoint.
+#     Uses the in-memory storage backend and the database configured by
+#     ESIGN_DATABASE_URL (skipped without one).
+# ------------------------------------------------------------------------
+
+import csv
+import hashlib
+import hmac
+import io
+import json
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+from app.db.models import Artifact, SignatureRequest, SignatureStatus
+from app.core.artifacts import KIND_SIGNED, index_artifact
+from app.core.export import MANIFEST_COLUMNS, SignedExport
+from app.core.storage import MemoryStorage, set_storage
+
+CASE_ID = "CASE-EXPORT"
+
+
+@pytest.fixture
+def storage():
+    memory = MemoryStorage()
+    set_storage(memory)
+    yield memory
+    set_storage(None)
+
+
+@pytest.fixture
+def signed(storage):
+    """Three signed requests for the case, signed on consecutive days of 2001."""
+    session = get_session()
+    rows = []
+    for day in range(3):
+        row = SignatureRequest(
+            client_name=f"Client {day}",
+            client_email=f"client{day}@example.com",
+            template_type="cea",
+            salesforce_case_id=CASE_ID,
+            token_hash=hashlib.sha256(uuid.uuid4().bytes).hexdigest(),
+            status=SignatureStatus.Completed,
+            signed_at=datetime(2001, 1, 1 + day, 12, tzinfo=timezone.utc),
+            expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+        )
+        session.add(row)
+        session.commit()
+        data = b"%PDF-1.4\n" + bytes([day]) * 5000 + b"\n%%EOF\n"
+        index_artifact(storage.put_bytes(f"signed/2001010{day + 1}/client{day}_signed.pdf", data), KIND_SIGNED, row.id)
+        rows.append((row, data))
+    yield rows
+    for row, _ in rows:
+        session.query(Artifact).filter(Artifact.signature_request_id == row.id).delete()
+        session.delete(row)
+    session.commit()
+
+
+def read_zip(chunks) -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+def test_export_streams_manifest_then_documents(signed, storage):
+    archive = read_zip(SignedExport(CASE_ID, page_size=2).stream())
+
+    assert archive.namelist()[0] == "manifest.csv"
+    manifest = list(csv.DictReader(io.StringIO(archive.read("manifest.csv").decode())))
+    assert list(manifest[0]) == MANIFEST_COLUMNS
+    assert [row["client_name"] for row in manifest] == ["Client 0", "Client 1", "Client 2"]
+    for (row, data), entry in zip(signed, manifest):
+        assert archive.read(f"signed/{entry['filename']}") == data
+        assert entry["sha256"] == hashlib.sha256(data).hexdigest()
+    assert archive.testzip() is None
+
+
+def test_export_filters_by_date_and_lists_missing_files(signed, storage):
+    storage.delete("signed/20010102/client1_signed.pdf")
+    export = SignedExport(CASE_ID, signed_from=datetime(2001, 1, 2, tzinfo=timezone.utc),
+                          signed_to=datetime(2001, 1, 4, tzinfo=timezone.utc))
+
+    archive = read_zip(export.stream())
+
+    assert sorted(archive.namelist()) == ["manifest.csv", "missing.csv", "signed/client2_signed.pdf"]
+    assert "signed/20010102/client1_signed.pdf" in archive.read("missing.csv").decode()
+    assert export.totals["documents"] == 1 and export.totals["missing"] == 1
+
+
+def test_export_reads_team_folder_copies_and_lists_unindexed_requests(signed, storage):
+    team_folder = MemoryStorage()
+    session = get_session()
+    row, data = signed[0]
+    artifact = session.query(Artifact).filter(Artifact.signature_request_id == row.id).one()
+    artifact.remote_path = team_folder.put_bytes("/Potential Clients/_esign/client0_signed.pdf", data).key
+    artifact.local_deleted_at = datetime(2001, 2, 1, tzinfo=timezone.utc)
+    storage.delete(artifact.storage_key)
+    unindexed, _ = signed[1]
+    session.query(Artifact).filter(Artifact.signature_request_id == unindexed.id).delete()
+    unindexed.pdf_path = "signed/20010102/client1_signed.pdf"
+    session.commit()
+
+    export = SignedExport(CASE_ID, remote_storage=team_folder)
+    archive = read_zip(export.stream())
+
+    assert archive.read("signed/client0_signed.pdf") == data
+    assert "signed/client1_signed.pdf" not in archive.namelist()
+    manifest = list(csv.DictReader(io.StringIO(archive.read("manifest.csv").decode())))
+    assert [entry["filename"] for entry in manifest] == ["client0_signed.pdf", "client1_signed.pdf",
+                                                          "client2_signed.pdf"]
+    missing = list(csv.DictReader(io.StringIO(archive.read("missing.csv").decode())))
+    assert [(entry["signature_request_id"], entry["reason"]) for entry in missing] == [(str(unindexed.id),
+                                                                                        "not_indexed")]
+    assert export.totals["documents"] == 2 and export.totals["from_team_folder"] == 1
+
+
+def test_export_needs_a_selection():
+    with pytest.raises(ValueError):
+        SignedExport()
+
+
+def test_export_endpoint_requires_hmac(signed, monkeypatch):
+    from app.api.routes_api import api_bp
+
+    monkeypatch.setenv("SF_SECRET_KEY", "test-secret")
+    app = Flask(__name__)
+    app.register_blueprint(api_bp)
+    client = app.test_client()
+    body = json.dumps({"salesforce_case_id": CASE_ID})
+
+    assert client.post("/api/v1/export/signed", data=body, content_type="application/json").status_code == 401
+
+    timestamp = str(int(time.time()))
+    signature = hmac.new(b"test-secret", f"{timestamp}{body}".encode(), hashlib.sha256).hexdigest()
+    response = client.post("/api/v1/export/signed", data=body, content_type="application/json",
+                           headers={"X-Timestamp": timestamp, "X-Signature": signature})
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    assert f"esign_export_{CASE_ID}.zip" in response.headers["Content-Disposition"]
+    assert len(read_zip([response.data]).namelist()) == 4
@@ -0,0 +1,123 @@
+# ------------------------------------------------------------------------
+# File: test_file_delivery.py
+# Location: /srv/apps/esign/tests/test_file_delivery.py
+# Description:
+#     Header checks for offloaded PDF delivery: X-Accel-Redirect (nginx)
+#     and X-Sendfile responses carry no body but keep the download name,
+#     validators and private caching; 304s are still answered by the app,
+#     backends without a local path fall back to streaming, and signed PDFs
+#     removed by retention are streamed from their team-folder copy.
+# ------------------------------------------------------------------------
+
+import hashlib
+import os
+
+import pytest
+from flask import Flask
+
+from app.core.storage import (
+    DELIVERY_APP,
+    DELIVERY_X_ACCEL,
+    DELIVERY_X_SENDFILE,
+    LocalStorage,
+    MemoryStorage,
+    X_ACCEL_PREFIX,
+    file_delivery_mode,
+    send_artifact,
+)
+
+PDF_BYTES = b"%PDF-1.4\n" + os.urandom(64 * 1024) + b"\n%%EOF\n"
+KEY = "signed/20250615/doe jane_cea_ab12cd34_signed.pdf"
+
+
+def make_client(storage, delivery):
+    artifact = storage.put_bytes(KEY, PDF_BYTES)
+    app = Flask(__name__)
+
+    @app.route("/download")
+    def download():
+        return send_artifact(artifact.key, as_attachment=True, storage=storage, sha256=artifact.sha256,
+                             size=artifact.size, last_modified=artifact.modified_at, max_age=60,
+                             delivery=delivery)
+
+    return app.test_client()
+
+
+def test_x_accel_redirect_hands_the_file_to_nginx(tmp_path):
+    response = make_client(LocalStorage(str(tmp_path)), DELIVERY_X_ACCEL).get("/download")
+
+    assert response.status_code == 200
+    assert response.data == b""
+    assert response.headers["X-Accel-Redirect"] == (
+        X_ACCEL_PREFIX.rstrip("/") + "/signed/20250615/doe%20jane_cea_ab12cd34_signed.pdf"
+    )
+    assert "X-Sendfile" not in response.headers
+    assert response.headers["Content-Type"] == "application/pdf"
+    assert response.headers["Content-Disposition"].startswith("attachment;")
+    assert "doe jane_cea_ab12cd34_signed.pdf" in response.headers["Content-Disposition"]
+    assert response.headers["ETag"] == f'"{hashlib.sha256(PDF_BYTES).hexdigest()}"'
+    assert "private" in response.headers["Cache-Control"]
+
+
+def test_x_sendfile_uses_the_absolute_path(tmp_path):
+    response = make_client(LocalStorage(str(tmp_path)), DELIVERY_X_SENDFILE).get("/download")
+
+    assert response.status_code == 200
+    assert response.data == b""
+    assert response.headers["X-Sendfile"] == os.path.join(str(tmp_path), *KEY.split("/"))
+    assert "X-Accel-Redirect" not in response.headers
+
+
+@pytest.mark.parametrize("delivery", [DELIVERY_X_ACCEL, DELIVERY_X_SENDFILE])
+def test_offloaded_routes_still_answer_revalidation(tmp_path, delivery):
+    client = make_client(LocalStorage(str(tmp_path)), delivery)
+    etag = client.get("/download").headers["ETag"]
+
+    response = client.get("/download", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert "X-Accel-Redirect" not in response.headers and "X-Sendfile" not in response.headers
+
+
+def test_backends_without_a_local_path_fall_back_to_streaming():
+    response = make_client(MemoryStorage(), DELIVERY_X_ACCEL).get("/download")
+
+    assert response.status_code == 200
+    assert response.data == PDF_BYTES
+    assert "X-Accel-Redirect" not in response.headers
+
+
+def test_delivery_mode_is_configurable_per_route(monkeypatch):
+    monkeypatch.delenv("ESIGN_FILE_DELIVERY", raising=False)
+    monkeypatch.delenv("ESIGN_FILE_DELIVERY_PREVIEW", raising=False)
+    assert file_delivery_mode("preview") == DELIVERY_APP
+
+    monkeypatch.setenv("ESIGN_FILE_DELIVERY", "X-Accel")
+    monkeypatch.setenv("ESIGN_FILE_DELIVERY_PREVIEW", "app")
+    assert file_delivery_mode("download") == DELIVERY_X_ACCEL
+    assert file_delivery_mode("preview") == DELIVERY_APP
+
+    monkeypatch.setenv("ESIGN_FILE_DELIVERY", "bogus")
+    assert file_delivery_mode("download") == DELIVERY_APP
+
+
+def test_signed_pdf_removed_by_retention_is_streamed_from_the_team_folder(monkeypatch):
+    from datetime import datetime, timezone
+    from types import SimpleNamespace
+    from app.api import routes_signing
+
+    team_folder = MemoryStorage()
+    copy = team_folder.put_bytes("/Potential Clients/_esign/20250615/doe_signed.pdf", PDF_BYTES)
+    monkeypatch.setattr(routes_signing, "team_folder_storage", lambda: team_folder)
+    artifact = SimpleNamespace(storage_key=KEY, sha256=copy.sha256, size=copy.size, remote_path=copy.key,
+                               created_at=datetime(2025, 6, 15, tzinfo=timezone.utc),
+                               local_deleted_at=datetime(2025, 7, 15, tzinfo=timezone.utc))
+    app = Flask(__name__)
+
+    @app.route("/download")
+    def download():
+        return routes_signing._send_indexed_artifact(artifact, "doe_signed.pdf", "download", as_attachment=True)
+
+    response = app.test_client().get("/download")
+    assert response.status_code == 200
+    assert response.data == PDF_BYTES
+    assert "doe_signed.pdf" in response.headers["Content-Disposition"]
@@ -0,0 +1,113 @@
+# ------------------------------------------------------------------------
+# File: test_metrics.py
+# Location: /srv/apps/esign/tests/test_metrics.py
+# Description:
+#     Tests for the Prometheus metrics: request counts labelled by route
+#     rule, stage and dependency timings, the /metrics endpoint (including
+#     its optional bearer token) and aggregation across worker processes
+#     in multiprocess mode.
+# ------------------------------------------------------------------------
+
+import os
+import subprocess
+import sys
+
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+
+from app.core.metrics import (
+    StageTimer, dependency_timer, install_request_metrics, metrics_authorized, render_metrics
+)
+from app.core.resilience import Dependency, CircuitBreaker, Bulkhead
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    install_request_metrics(app)
+
+    @app.route("/v1/sign/<token>")
+    def page(token):
+        return "ok"
+
+    return app.test_client()
+
+
+def test_requests_are_labelled_by_rule_not_url(client):
+    labels = {"route": "/v1/sign/<token>", "method": "GET", "status": "200"}
+    before = sample("esign_http_requests_total", **labels)
+    client.get("/v1/sign/secret-token-1")
+    client.get("/v1/sign/secret-token-2")
+    assert sample("esign_http_requests_total", **labels) == before + 2
+    assert sample("esign_http_request_duration_seconds_count", route="/v1/sign/<token>", method="GET") >= 2
+
+    before = sample("esign_http_requests_total", route="<unmatched>", method="GET", status="404")
+    client.get("/nowhere")
+    assert sample("esign_http_requests_total", route="<unmatched>", method="GET", status="404") == before + 1
+    assert b"secret-token" not in render_metrics()[0]
+
+
+def test_stage_timer_records_each_lap():
+    before = sample("esign_stage_duration_seconds_count", operation="test_op", stage="one")
+    timer = StageTimer("test_op")
+    timer.lap("one")
+    timer.lap("two")
+    assert sample("esign_stage_duration_seconds_count", operation="test_op", stage="one") == before + 1
+    assert sample("esign_stage_duration_seconds_count", operation="test_op", stage="two") >= 1
+
+
+def test_dependency_calls_are_timed_by_outcome():
+    dependency = Dependency("test_dep", CircuitBreaker("test_dep"), Bulkhead("test_dep"))
+
+    def fetch():
+        return 42
+
+    def broken():
+        raise RuntimeError("boom")
+
+    assert dependency.call(fetch) == 42
+    with pytest.raises(RuntimeError):
+        dependency.call(broken)
+    with pytest.raises(ValueError):
+        with dependency_timer("test_dep", "manual"):
+            raise ValueError()
+
+    count = "esign_dependency_call_duration_seconds_count"
+    assert sample(count, dependency="test_dep", operation="fetch", outcome="ok") >= 1
+    assert sample(count, dependency="test_dep", operation="broken", outcome="error") >= 1
+    assert sample(count, dependency="test_dep", operation="manual", outcome="error") >= 1
+
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.delenv("ESIGN_METRICS_TOKEN", raising=False)
+    assert metrics_authorized(None)
+    monkeypatch.setenv("ESIGN_METRICS_TOKEN", "s3cret")
+    assert not metrics_authorized(None)
+    assert not metrics_authorized("Bearer wrong")
+    assert metrics_authorized("Bearer s3cret")
+
+
+WORKER = """
+from app.core.metrics import StageTimer, set_queue_depth, QUEUE_WEBHOOKS
+StageTimer("multi").lap("stage")
+set_queue_depth(QUEUE_WEBHOOKS, {depth})
+"""
+
+
+def test_multiprocess_aggregates_workers(tmp_path):
+    path = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=path)
+    for depth in (2, 3):
+        subprocess.run([sys.executable, "-c", WORKER.format(depth=depth)], cwd=ROOT, env=env, check=True)
+    render = "from app.core.metrics import render_metrics; print(render_metrics()[0].decode())"
+    output = subprocess.run(
+        [sys.executable, "-c", render], cwd=ROOT, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    assert 'esign_stage_duration_seconds_count{operation="multi",stage="stage"} 2.0' in output
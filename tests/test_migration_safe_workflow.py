@@ -114,8 +114,17 @@ def test_migration_safe_workflow():
     try:
         response = requests.post(f"{base_url}/v1/sign/{token}", json=signature_payload)
         
-        if response.status_code == 200:
-            result = response.json()
+        if response.status_code == 202:
+            # The signing pipeline runs as a background job; wait for it to finish
+            status_url = f"{base_url}{response.json()['status_url']}"
+            result = requests.get(status_url).json()
+            deadline = time.time() + 120
+            while result["status"] not in ("completed", "failed") and time.time() < deadline:
+                time.sleep(1)
+                result = requests.get(status_url).json()
+            if result["status"] != "completed":
+                print(f"   ❌ Signing job did not complete: {result}")
+                return False
             print(f"   ✅ Signature submitted successfully!")
             print(f"   🔗 Redirect URL: {result.get('redirect_url', 'N/A')}")
             print(f"   💡 Salesforce errors (if any) were handled gracefully")
@@ -0,0 +1,127 @@
+# ------------------------------------------------------------------------
+# File: test_preview_warming.py
+# Location: /srv/apps/esign/tests/test_preview_warming.py
+# Description:
+#     Tests for preview warming: the background render indexes a preview
+#     the signing page picks up, renders are de-duplicated, yesterday's
+#     preview is not reused, and the page defers to the on-demand preview
+#     endpoint instead of rendering. Uses the in-memory storage backend and
+#     the database configured by ESIGN_DATABASE_URL (skipped without one).
+# ------------------------------------------------------------------------
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+from app.db.models import Artifact, SignatureRequest, SignatureStatus
+from app.core import preview_warming
+from app.core.artifacts import KIND_PREVIEW, index_artifact
+from app.core.preview_warming import PreviewWarmer, current_preview
+from app.core.storage import MemoryStorage, set_storage
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "templates"))
+
+
+@pytest.fixture
+def storage():
+    memory = MemoryStorage()
+    set_storage(memory)
+    yield memory
+    set_storage(None)
+
+
+@pytest.fixture
+def pending(storage):
+    """A sent signature request and its signing token."""
+    session = get_session()
+    token = str(uuid.uuid4())
+    row = SignatureRequest(
+        client_name="Preview Client",
+        client_email="preview@example.com",
+        template_type="cea",
+        salesforce_case_id="CASE-PREVIEW",
+        token=token,
+        token_hash=hashlib.sha256(token.encode()).hexdigest(),
+        status=SignatureStatus.Sent,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+    session.add(row)
+    session.commit()
+    yield row, token
+    session.rollback()
+    session.query(Artifact).filter(Artifact.signature_request_id == row.id).delete()
+    session.delete(row)
+    session.commit()
+
+
+def test_warm_up_renders_and_indexes_the_preview(pending, storage):
+    row, _ = pending
+    PreviewWarmer(workers=1).submit(row.id).result(timeout=60)
+
+    preview = current_preview(row)
+    assert preview is not None
+    assert storage.read_bytes(preview.storage_key).startswith(b"%PDF")
+    get_session().refresh(row)
+    assert row.preview_path == preview.storage_key
+
+
+def test_renders_are_deduplicated(pending, monkeypatch):
+    row, _ = pending
+    release, calls = threading.Event(), []
+
+    def slow_render(signature_request):
+        calls.append(signature_request.id)
+        release.wait(10)
+        return "preview/fake.pdf"
+
+    monkeypatch.setattr(preview_warming, "render_preview", slow_render)
+    warmer = PreviewWarmer(workers=2)
+    first = warmer.submit(row.id)
+    assert warmer.submit(row.id) is first
+    release.set()
+    first.result(timeout=10)
+    assert calls == [row.id]
+
+
+def test_yesterdays_preview_is_not_current(pending, storage):
+    row, _ = pending
+    artifact = index_artifact(storage.put_bytes("preview/20010101/old_sample.pdf", b"%PDF-1.4\n"), KIND_PREVIEW, row.id)
+    assert current_preview(row) is not None
+
+    artifact.created_at = datetime.now(timezone.utc) - timedelta(days=1)
+    get_session().commit()
+    assert current_preview(row) is None
+
+
+def test_signing_page_does_not_wait_for_the_preview(pending, monkeypatch):
+    import app.api.routes_signing as routes_signing
+
+    row, token = pending
+    queued = []
+    monkeypatch.setattr(routes_signing, "warm_preview", queued.append)
+    app = Flask(__name__, template_folder=TEMPLATE_DIR)
+    app.register_blueprint(routes_signing.signing_bp)
+    client = app.test_client()
+
+    page = client.get(f"/v1/sign/{token}")
+    assert page.status_code == 200
+    assert f"/v1/sign/{token}/preview".encode() in page.data
+    assert queued == [row.id] and current_preview(row) is None
+
+    response = client.get(f"/v1/sign/{token}/preview")
+    assert response.status_code == 302
+    assert client.get(response.headers["Location"]).data.startswith(b"%PDF")
+
+    page = client.get(f"/v1/sign/{token}")
+    preview = current_preview(row)
+    assert f"/v1/sign/preview/{preview.filename}".encode() in page.data
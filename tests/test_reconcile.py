@@ -0,0 +1,123 @@
+# ------------------------------------------------------------------------
+# File: test_reconcile.py
+# Location: /srv/apps/esign/tests/test_reconcile.py
+# Description:
+#     Unit tests for the Salesforce reconciliation job: drift detection on
+#     a single record, SOQL IN chunking and batched collection repairs,
+#     dry runs leaving the checkpoint alone, using an in-process stand-in
+#     for the simple_salesforce client.
+# ------------------------------------------------------------------------
+
+import json
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app.db.models import SignatureRequest, SignatureStatus
+from app.integrations.salesforce import reconcile
+from app.integrations.salesforce.reconcile import (
+    SalesforceReconciler,
+    diff_record,
+    soql_in,
+    DRIFT_DROPBOX_PATH,
+    DRIFT_SIGN_DATE,
+    DRIFT_STATUS,
+)
+
+SIGNED_AT = datetime(2025, 6, 15, 15, 27, 3, tzinfo=timezone.utc)
+
+
+class FakeSalesforce:
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+        self.patches = []
+        self.api_usage = {}
+
+    def query_all(self, soql):
+        self.queries.append(soql)
+        return {"records": [r for r in self.records if f"'{r['Id']}'" in soql]}
+
+    def restful(self, path, method="GET", json=None):
+        self.patches.append(json)
+        return [{"id": r["id"], "success": True, "errors": []} for r in json["records"]]
+
+
+def make_row(envelope_id, status=SignatureStatus.Completed):
+    return SignatureRequest(
+        client_name="Jane Test",
+        client_email="jane@example.com",
+        template_type="cea",
+        salesforce_case_id="CASE-1",
+        token_hash="x",
+        status=status,
+        signed_at=SIGNED_AT,
+        envelope_document_id=envelope_id,
+    )
+
+
+def test_diff_record_detects_stale_status_and_date():
+    record = {"Id": "a1", "Envelope_Status__c": "Sent", "Sign_Date__c": None, "dropbox_file_path__c": "/x.pdf"}
+    updates, drift = diff_record(make_row("a1"), record)
+    assert drift == [DRIFT_STATUS, DRIFT_SIGN_DATE]
+    assert updates == {"Envelope_Status__c": "Completed", "Sign_Date__c": SIGNED_AT.isoformat()}
+
+
+def test_diff_record_in_sync():
+    record = {
+        "Id": "a1",
+        "Envelope_Status__c": "Completed",
+        "Sign_Date__c": "2025-06-15T15:27:03.000+0000",
+        "dropbox_file_path__c": "/Potential Clients/_esign/20250615/x.pdf",
+    }
+    assert diff_record(make_row("a1"), record) == ({}, [])
+
+
+def test_diff_record_reports_failed_upload_path_without_repairing_it():
+    record = {
+        "Id": "a1",
+        "Envelope_Status__c": "Completed",
+        "Sign_Date__c": SIGNED_AT.isoformat(),
+        "dropbox_file_path__c": "UPLOAD_FAILED: /srv/apps/esign/signed/x.pdf",
+    }
+    assert diff_record(make_row("a1"), record) == ({}, [DRIFT_DROPBOX_PATH])
+
+
+def test_diff_record_ignores_unsigned_rows():
+    record = {"Id": "a1", "Envelope_Status__c": "Sent"}
+    assert diff_record(make_row("a1", SignatureStatus.Delivered), record) == ({}, [])
+
+
+def test_soql_in_escapes_quotes():
+    assert soql_in(["a", "b'c"]) == "('a','b\\'c')"
+
+
+def test_fetch_and_repair_are_chunked_by_200():
+    records = [{"Id": f"a{i}", "Envelope_Status__c": "Sent"} for i in range(450)]
+    sf = FakeSalesforce(records)
+    reconciler = SalesforceReconciler(sf=sf)
+
+    fetched = reconciler.fetch_by_ids([r["Id"] for r in records])
+    assert len(fetched) == 450
+    assert len(sf.queries) == 3
+
+    repaired = reconciler.apply_updates({r["Id"]: {"Envelope_Status__c": "Completed"} for r in records})
+    assert repaired == 450
+    assert [len(p["records"]) for p in sf.patches] == [200, 200, 50]
+
+
+def test_dry_run_does_not_write_the_checkpoint(tmp_path, monkeypatch):
+    checkpoint = tmp_path / "reconcile.json"
+    saved = {"updated_at": "2025-06-01T00:00:00+00:00", "id": str(uuid.uuid4()), "upper_bound": None, "totals": {}}
+    checkpoint.write_text(json.dumps(saved))
+    pages = [[SimpleNamespace(updated_at=SIGNED_AT, id=uuid.uuid4()) for _ in range(3)], []]
+    monkeypatch.setattr(reconcile, "get_session", lambda: None)
+    reconciler = SalesforceReconciler(checkpoint_path=str(checkpoint), dry_run=True, sf=FakeSalesforce([]))
+    monkeypatch.setattr(reconciler, "_next_page", lambda session, upper_bound: pages.pop(0))
+    monkeypatch.setattr(reconciler, "reconcile_page", lambda session, rows: None)
+
+    totals = reconciler.run()
+
+    assert totals["rows"] == 3
+    # Neither advanced page by page nor cleared at the end
+    assert json.loads(checkpoint.read_text()) == saved
@@ -0,0 +1,121 @@
+# ------------------------------------------------------------------------
+# File: test_resilience.py
+# Location: /srv/apps/esign/tests/test_resilience.py
+# Description:
+#     Unit tests for resilience.py, driving the circuit breaker and bulkhead
+#     with a fault-injecting local stub instead of the real Dropbox,
+#     Salesforce or RingCentral endpoints.
+# ------------------------------------------------------------------------
+
+import threading
+
+import pytest
+
+from app.core.resilience import (
+    Bulkhead,
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    Dependency,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FaultInjectingStub:
+    """Stands in for an outbound call; fails while `failing` is True."""
+
+    def __init__(self):
+        self.failing = False
+        self.calls = 0
+        self.release = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        if self.failing:
+            raise ConnectionError("injected fault")
+        return "ok"
+
+
+def make_dependency(clock, max_concurrent=4):
+    breaker = CircuitBreaker("stub", failure_rate=0.5, window_size=10, min_calls=4, reset_timeout=30, clock=clock)
+    return Dependency("stub", breaker, Bulkhead("stub", max_concurrent=max_concurrent, max_wait=0.05))
+
+
+def test_breaker_opens_and_fails_fast():
+    clock = FakeClock()
+    dependency = make_dependency(clock)
+    stub = FaultInjectingStub()
+    stub.failing = True
+
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            dependency.call(stub)
+    assert dependency.breaker.state == STATE_OPEN
+
+    with pytest.raises(CircuitOpenError):
+        dependency.call(stub)
+    assert stub.calls == 4
+    assert dependency.snapshot()["breaker"]["rejected_calls"] == 1
+
+
+def test_half_open_probe_closes_breaker_on_success():
+    clock = FakeClock()
+    dependency = make_dependency(clock)
+    stub = FaultInjectingStub()
+    stub.failing = True
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            dependency.call(stub)
+
+    clock.now += 31
+    assert dependency.breaker.state == STATE_HALF_OPEN
+    stub.failing = False
+    assert dependency.call(stub) == "ok"
+    assert dependency.breaker.state == STATE_CLOSED
+
+
+def test_half_open_probe_failure_reopens_breaker():
+    clock = FakeClock()
+    dependency = make_dependency(clock)
+    stub = FaultInjectingStub()
+    stub.failing = True
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            dependency.call(stub)
+
+    clock.now += 31
+    with pytest.raises(ConnectionError):
+        dependency.call(stub)
+    assert dependency.breaker.state == STATE_OPEN
+    assert dependency.breaker.times_opened == 2
+
+
+def test_bulkhead_rejects_when_full():
+    dependency = make_dependency(FakeClock(), max_concurrent=1)
+    stub = FaultInjectingStub()
+    stub.release = threading.Event()
+
+    worker = threading.Thread(target=dependency.call, args=(stub,))
+    worker.start()
+    while dependency.bulkhead.in_flight == 0:
+        pass
+
+    with pytest.raises(BulkheadFullError):
+        dependency.call(stub)
+
+    stub.release.set()
+    worker.join()
+    assert dependency.snapshot()["bulkhead"]["rejected_calls"] == 1
+    assert dependency.breaker.state == STATE_CLOSED
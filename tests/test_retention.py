@@ -0,0 +1,105 @@
+# ------------------------------------------------------------------------
+# File: test_retention.py
+# Location: /srv/apps/esign/tests/test_retention.py
+# Description:
+#     Tests for the retention engine: per-class policies over the artifact
+#     index, the dated-folder sweep for unindexed previews, and dry runs.
+#     Artifacts are back-dated to 2001 and the run's clock is set just
+#     after, so rows from other tests or local runs are never candidates.
+#     Uses local storage in a temporary directory and the database
+#     configured by ESIGN_DATABASE_URL (skipped without one).
+# ------------------------------------------------------------------------
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+from app.db.models import Artifact
+from app.core.artifacts import KIND_PREVIEW, KIND_SIGNED, index_artifact, find_artifact
+from app.core.retention import RetentionPolicy, RetentionRun, CLASS_PREVIEW, CLASS_SIGNED_UPLOADED, CLASS_FAILED_UPLOAD
+from app.core.storage import LocalStorage
+
+CREATED = datetime(2001, 1, 1, 12, tzinfo=timezone.utc)
+NOW = datetime(2001, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    local = LocalStorage(str(tmp_path))
+    yield local
+    session = get_session()
+    session.query(Artifact).filter(Artifact.created_at < datetime(2002, 1, 1, tzinfo=timezone.utc)).delete()
+    session.commit()
+
+
+def put_indexed(storage, key, kind, remote_path=None, created_at=CREATED):
+    row = index_artifact(storage.put_bytes(key, b"%PDF-" + b"x" * 995), kind)
+    row.created_at = created_at
+    row.remote_path = remote_path
+    get_session().commit()
+    return row
+
+
+def policies():
+    return [
+        RetentionPolicy(CLASS_PREVIEW, KIND_PREVIEW, timedelta(hours=24), walk_prefix="preview"),
+        RetentionPolicy(CLASS_SIGNED_UPLOADED, KIND_SIGNED, timedelta(days=30), uploaded=True),
+        RetentionPolicy(CLASS_FAILED_UPLOAD, KIND_SIGNED, None, uploaded=False),
+    ]
+
+
+def test_policies_apply_per_class(storage):
+    put_indexed(storage, "preview/20010101/old_preview.pdf", KIND_PREVIEW)
+    put_indexed(storage, "signed/20010101/uploaded_signed.pdf", KIND_SIGNED, remote_path="/team/uploaded_signed.pdf")
+    put_indexed(storage, "signed/20010101/failed_signed.pdf", KIND_SIGNED)
+    put_indexed(storage, "signed/20010228/recent_signed.pdf", KIND_SIGNED, remote_path="/team/recent_signed.pdf",
+                created_at=NOW - timedelta(days=1))
+    storage.put_bytes("preview/20010102/unindexed_preview.pdf", b"y" * 500)
+    storage.put_bytes("preview/20010228/todays_preview.pdf", b"z" * 500)
+
+    result = RetentionRun(policies(), batch_size=1, batch_pause=0, storage=storage, now=NOW).run()
+
+    assert result["classes"][CLASS_PREVIEW]["deleted"] == 2
+    assert result["classes"][CLASS_SIGNED_UPLOADED]["deleted"] == 1
+    assert result["classes"][CLASS_FAILED_UPLOAD]["kept_forever"] is True
+    assert result["bytes_reclaimed"] == 1000 + 1000 + 500
+
+    assert not storage.exists("preview/20010101/old_preview.pdf")
+    assert not storage.exists("preview/20010102/unindexed_preview.pdf")
+    assert not storage.exists("signed/20010101/uploaded_signed.pdf")
+    assert storage.exists("signed/20010101/failed_signed.pdf")
+    assert storage.exists("signed/20010228/recent_signed.pdf")
+    assert storage.exists("preview/20010228/todays_preview.pdf")
+    # Emptied date folders are removed; deleted previews leave the index
+    assert not os.path.isdir(storage.local_path("preview/20010101"))
+    assert find_artifact("old_preview.pdf", KIND_PREVIEW) is None
+    assert find_artifact("failed_signed.pdf", KIND_SIGNED) is not None
+    # Deleted signed PDFs keep their row and the path of their team-folder copy
+    uploaded = find_artifact("uploaded_signed.pdf", KIND_SIGNED)
+    assert uploaded.local_deleted_at == NOW
+    assert uploaded.remote_path == "/team/uploaded_signed.pdf"
+
+    again = RetentionRun(policies(), batch_pause=0, storage=storage, now=NOW).run()
+    assert again["classes"][CLASS_SIGNED_UPLOADED]["candidates"] == 0
+
+
+def test_dry_run_reports_without_deleting(storage):
+    put_indexed(storage, "preview/20010101/old_preview.pdf", KIND_PREVIEW)
+    storage.put_bytes("preview/20010102/unindexed_preview.pdf", b"y" * 500)
+
+    result = RetentionRun(policies()[:1], dry_run=True, batch_pause=0, storage=storage, now=NOW).run()
+
+    stats = result["classes"][CLASS_PREVIEW]
+    # The indexed preview is counted once, not again by the folder sweep
+    assert stats["candidates"] == 2 and stats["deleted"] == 0
+    assert result["bytes_reclaimed"] == 1500
+    assert sorted(result["sample"]) == ["preview/20010101/old_preview.pdf", "preview/20010102/unindexed_preview.pdf"]
+    assert storage.exists("preview/20010101/old_preview.pdf")
+    assert storage.exists("preview/20010102/unindexed_preview.pdf")
+    assert find_artifact("old_preview.pdf", KIND_PREVIEW) is not None
@@ -0,0 +1,80 @@
+# ------------------------------------------------------------------------
+# File: test_salesforce_budget.py
+# Location: /srv/apps/esign/tests/test_salesforce_budget.py
+# Description:
+#     Unit tests for the Salesforce API budget tracker: Sforce-Limit-Info
+#     parsing, per-call-type accounting over the rolling window and
+#     priority-based throttling.
+# ------------------------------------------------------------------------
+
+import pytest
+
+from app.integrations.salesforce.budget import (
+    SalesforceApiBudget,
+    SalesforceBudgetExceeded,
+    parse_limit_info,
+    PRIORITY_CRITICAL,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    CALL_SOQL,
+    CALL_TOKEN,
+    CALL_UPDATE,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_limit_info():
+    assert parse_limit_info("api-usage=25/15000") == (25, 15000)
+    assert parse_limit_info("api-usage=3/5000; per-app-api-usage=1/100(appName=esign)") == (3, 5000)
+    assert parse_limit_info("") is None
+    assert parse_limit_info("garbage") is None
+
+
+def test_consumption_reported_per_call_type():
+    clock = FakeClock()
+    budget = SalesforceApiBudget(daily_budget=100, clock=clock)
+    budget.record(CALL_TOKEN)
+    budget.record(CALL_SOQL)
+    budget.record(CALL_UPDATE)
+    budget.record(CALL_UPDATE)
+
+    snapshot = budget.snapshot()
+    assert snapshot["calls_by_type"] == {CALL_TOKEN: 1, CALL_SOQL: 1, CALL_UPDATE: 2}
+    assert snapshot["calls_last_24h"] == 4
+
+    clock.now += 24 * 60 * 60 + 1
+    assert budget.snapshot()["calls_last_24h"] == 0
+
+
+def test_low_priority_throttled_before_completions():
+    budget = SalesforceApiBudget(daily_budget=10, low_priority_threshold=0.5, normal_priority_threshold=0.9, clock=FakeClock())
+    for _ in range(6):
+        budget.record(CALL_UPDATE)
+
+    assert not budget.allow(PRIORITY_LOW)
+    assert budget.allow(PRIORITY_NORMAL)
+    assert budget.allow(PRIORITY_CRITICAL)
+    with pytest.raises(SalesforceBudgetExceeded):
+        budget.check(PRIORITY_LOW)
+    assert budget.snapshot()["throttled_calls"][PRIORITY_LOW] == 2
+
+
+def test_org_wide_usage_from_header_drives_throttling():
+    clock = FakeClock()
+    budget = SalesforceApiBudget(daily_budget=5000, clock=clock)
+    budget.record(CALL_SOQL, {"Sforce-Limit-Info": "api-usage=14000/15000"})
+
+    assert budget.usage_ratio() > 0.9
+    assert not budget.allow(PRIORITY_NORMAL)
+    assert budget.allow(PRIORITY_CRITICAL)
+
+    # Stale org usage is ignored once it ages out
+    clock.now += 60 * 60
+    assert budget.allow(PRIORITY_NORMAL)
@@ -0,0 +1,94 @@
+# ------------------------------------------------------------------------
+# File: test_signature_upload.py
+# Location: /srv/apps/esign/tests/test_signature_upload.py
+# Description:
+#     Tests for binary signature uploads to /v1/sign/<token>: multipart and
+#     raw image bodies are read without base64, under a size cap.
+# ------------------------------------------------------------------------
+
+import io
+import os
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import app.api.routes_signing as routes_signing
+from app.core.signer import embed_signature_on_pdf, TEMPLATE_REGISTRY
+
+TEMPLATES = [key for key, entry in TEMPLATE_REGISTRY.items() if os.path.isfile(entry["path"])]
+
+
+def _png(width: int = 640, height: int = 200) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (width, height), (0, 0, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _payload(**request_kwargs):
+    app = Flask(__name__)
+    with app.test_request_context("/v1/sign/token", method="POST", **request_kwargs):
+        return routes_signing._signature_payload()
+
+
+def test_multipart_part_is_read_as_bytes():
+    png = _png()
+    payload = _payload(data={"signature": (io.BytesIO(png), "signature.png"), "consent": "true"},
+                       content_type="multipart/form-data")
+    assert payload == (None, None, png)
+
+
+@pytest.mark.parametrize("content_type", ["application/octet-stream", "image/png"])
+def test_raw_body_is_read_as_bytes(content_type):
+    png = _png()
+    assert _payload(data=png, content_type=content_type) == (None, None, png)
+
+
+def test_json_and_urlencoded_bodies_still_work():
+    assert _payload(data=json.dumps({"signature": "data:image/png;base64,AAAA"}),
+                    content_type="application/json") == ("data:image/png;base64,AAAA", None, None)
+    assert _payload(data={"signature": "AAAA"}) == ("AAAA", None, None)
+
+
+def test_oversized_uploads_are_cut_off(monkeypatch):
+    monkeypatch.setattr(routes_signing, "SIGNATURE_MAX_BYTES", 1000)
+    with pytest.raises(RequestEntityTooLarge):
+        _payload(data=b"x" * 5000, content_type="application/octet-stream")
+    with pytest.raises(RequestEntityTooLarge):
+        _payload(data={"signature": (io.BytesIO(b"x" * 1500), "signature.png")}, content_type="multipart/form-data")
+
+
+def test_capped_reader_stops_after_the_limit():
+    stream = io.BytesIO(b"x" * 10 * 1024 * 1024)
+    with pytest.raises(RequestEntityTooLarge):
+        routes_signing._read_capped(stream, 1000)
+    assert stream.tell() == 1001
+
+
+@pytest.mark.parametrize("template_key", TEMPLATES)
+def test_embed_signature_accepts_binary_image(template_key):
+    embed_signature_on_pdf(
+        template_key=template_key,
+        output_path="signed/binary_smoke.pdf",
+        signature_b64="",
+        client_name="Test User",
+        sign_date=datetime.now().strftime("%Y-%m-%d"),
+        smoke_test=True,
+        signature_image=_png(),
+    )
+
+
+def test_embed_signature_rejects_huge_images():
+    with pytest.raises(ValueError):
+        embed_signature_on_pdf(
+            template_key=next(iter(TEMPLATES), "cea"),
+            output_path="signed/binary_smoke.pdf",
+            signature_b64="",
+            client_name="Test User",
+            sign_date=datetime.now().strftime("%Y-%m-%d"),
+            smoke_test=True,
+            signature_image=_png(5000, 4000),
+        )
@@ -0,0 +1,96 @@
+# ------------------------------------------------------------------------
+# File: test_signature_vector.py
+# Location: /srv/apps/esign/tests/test_signature_vector.py
+# Description:
+#     Tests for vector signatures: decoding the compact stroke format and
+#     drawing the strokes as PDF paths fitted to the signature field.
+# ------------------------------------------------------------------------
+
+import io
+import os
+from datetime import datetime
+
+import pytest
+from pypdf import PdfReader
+from reportlab.pdfgen import canvas
+
+from app.core.signature_vector import parse_vector_signature, draw_vector_signature, MAX_POINTS
+from app.core.signer import embed_signature_on_pdf, TEMPLATE_REGISTRY
+
+TEMPLATES = [key for key, entry in TEMPLATE_REGISTRY.items() if os.path.isfile(entry["path"])]
+
+PAYLOAD = {
+    "v": 1, "w": 600, "h": 200, "q": 2, "d": True, "pen": [0.5, 2.5],
+    "strokes": [
+        [100, 200, 20, -10, 20, -10, 20, 10, 20, 10, 20, -5],
+        [500, 300],
+    ],
+}
+
+
+def test_delta_strokes_are_decoded_to_pad_pixels():
+    signature = parse_vector_signature(PAYLOAD)
+    assert signature.strokes[0] == [(50, 100), (60, 95), (70, 90), (80, 95), (90, 100), (100, 97.5)]
+    assert signature.strokes[1] == [(250, 150)]
+    assert signature.point_count == 7
+    assert signature.bounds() == (50, 90, 250, 150)
+
+    absolute = dict(PAYLOAD, d=False, strokes=[[100, 200, 120, 190]])
+    assert parse_vector_signature(absolute).strokes == [[(50, 100), (60, 95)]]
+
+
+@pytest.mark.parametrize("payload", [
+    None,
+    {"v": 2, "w": 600, "h": 200, "strokes": [[1, 2]]},
+    dict(PAYLOAD, strokes=[]),
+    dict(PAYLOAD, strokes=[[1, 2, 3]]),
+    dict(PAYLOAD, strokes=[[1.5, 2]]),
+    dict(PAYLOAD, strokes=[["1", 2]]),
+    dict(PAYLOAD, w=0),
+    dict(PAYLOAD, pen=[1]),
+    dict(PAYLOAD, d=False, strokes=[[10 ** 9, 0]]),
+    dict(PAYLOAD, strokes=[[0, 0] * (MAX_POINTS + 1)]),
+])
+def test_malformed_or_oversized_payloads_are_rejected(payload):
+    with pytest.raises(ValueError):
+        parse_vector_signature(payload)
+
+
+def test_strokes_are_drawn_as_paths_inside_the_field():
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pageCompression=0)
+    draw_vector_signature(c, parse_vector_signature(PAYLOAD), 72, 100, 200, 40)
+    c.showPage()
+    c.save()
+
+    page = PdfReader(io.BytesIO(buffer.getvalue())).pages[0]
+    content = page.get_contents().get_data().decode("latin-1")
+    assert " c\n" in content or " c " in content  # curveto
+    assert "1 J" in content and "1 j" in content  # round caps and joins
+    assert "/XObject" not in page["/Resources"]
+
+    coordinates, operands = [], []
+    for token in content.split():
+        try:
+            operands.append(float(token))
+            continue
+        except ValueError:
+            pass
+        if token in ("m", "l", "c"):
+            coordinates.extend(zip(operands[0::2], operands[1::2]))
+        operands = []
+    assert coordinates
+    assert all(72 <= x <= 272 and 100 <= y <= 140 for x, y in coordinates)
+
+
+@pytest.mark.parametrize("template_key", TEMPLATES)
+def test_embed_signature_accepts_vector_strokes(template_key):
+    embed_signature_on_pdf(
+        template_key=template_key,
+        output_path="signed/vector_smoke.pdf",
+        signature_b64="",
+        client_name="Test User",
+        sign_date=datetime.now().strftime("%Y-%m-%d"),
+        smoke_test=True,
+        signature_vector=PAYLOAD,
+    )
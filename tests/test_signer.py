@@ -7,10 +7,17 @@
 # ------------------------------------------------------------------------
 
 import base64
+import io
 import os
 import pytest
 from datetime import datetime
-from app.core.signer import embed_signature_on_pdf
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from app.core.signer import (
+    embed_signature_on_pdf, build_signed_document, write_output, output_options_for, DEFAULT_OUTPUT_OPTIONS
+)
+from app.core.pdf_increment import original_revision_intact
+from app.core.storage import get_storage
 import json
 
 REGISTRY_PATH = "/srv/apps/esign/config/template_registry.json"
@@ -74,13 +81,113 @@ def test_embed_signature_writes_file(template_key):
             sign_date=datetime.now().strftime("%Y-%m-%d"),
             test_mode=False
         )
-        assert os.path.exists(actual_output_path), f"{template_key}: Signed PDF file was not created"
-        assert os.path.getsize(actual_output_path) > 1000, f"{template_key}: Output file too small"
+        stored = get_storage().stat(actual_output_path)
+        assert stored is not None, f"{template_key}: Signed PDF file was not created"
+        assert stored.size > 1000, f"{template_key}: Output file too small"
         logger.info(f"File output test passed for {template_key}.")
     except Exception as e:
         logger.exception(f"File output test failed for {template_key}.")
         pytest.fail(f"{template_key}: embed_signature_on_pdf raised an exception: {e}")
     finally:
-        if not KEEP_FILES and os.path.exists(actual_output_path):
-            os.remove(actual_output_path)
-            logger.info("Cleaned up test output file.")
\ No newline at end of file
+        if not KEEP_FILES and get_storage().delete(actual_output_path):
+            logger.info("Cleaned up test output file.")
+
+
+@pytest.mark.skipif(not TEMPLATES_TO_TEST or not os.path.isfile(SIGNATURE_PATH), reason="Sample data is missing")
+def test_failed_indexing_fails_the_signing(monkeypatch):
+    """An artifact the routes could never serve is not left behind as if signing had succeeded"""
+    import uuid
+    from app.core import artifacts
+    from app.core.storage import MemoryStorage, set_storage
+
+    def broken_index(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    with open(SIGNATURE_PATH, "r") as f:
+        signature_b64 = f.read().strip()
+    memory = MemoryStorage()
+    set_storage(memory)
+    monkeypatch.setattr(artifacts, "index_artifact", broken_index)
+    try:
+        with pytest.raises(RuntimeError, match="database unavailable"):
+            embed_signature_on_pdf(
+                template_key=TEMPLATES_TO_TEST[0],
+                output_path="signed/test_signed.pdf",
+                signature_b64=signature_b64,
+                client_name="Test User",
+                sign_date=datetime.now().strftime("%Y-%m-%d"),
+                signature_request_id=uuid.uuid4(),
+            )
+    finally:
+        set_storage(None)
+    assert memory.keys() == []
+
+
+def _uncompressed_writer(pages: int = 5) -> PdfWriter:
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pageCompression=0)
+    for page in range(pages):
+        for line in range(50):
+            c.drawString(72, 750 - line * 12, f"Page {page} line {line}: the client agrees to these terms.")
+        c.showPage()
+    c.save()
+    buffer.seek(0)
+    return PdfWriter(clone_from=PdfReader(buffer))
+
+
+def test_output_stage_compresses_without_losing_pages():
+    plain = write_output(_uncompressed_writer(), {"compress": False}).getvalue()
+    compressed = write_output(_uncompressed_writer(), {"compress": True}).getvalue()
+
+    assert len(compressed) < len(plain) / 2
+    reader = PdfReader(io.BytesIO(compressed))
+    assert len(reader.pages) == 5
+    assert "Page 4 line 49" in reader.pages[4].extract_text()
+
+
+def test_output_options_merge_registry_and_overrides():
+    assert output_options_for("no-such-template") == DEFAULT_OUTPUT_OPTIONS
+    assert output_options_for("cea", {"linearize": True})["linearize"] is True
+    assert output_options_for("cea", {"compress": False})["compress"] is False
+
+
+def _sign_incrementally(template_path: str, page_number: int) -> bytes:
+    overlay = io.BytesIO()
+    c = canvas.Canvas(overlay)
+    c.drawString(100, 100, "SIGNED BY CLIENT")
+    c.save()
+    options = {"compress": True, "incremental": True}
+    return write_output(build_signed_document(template_path, {page_number: overlay}, options), options).getvalue()
+
+
+def test_incremental_mode_appends_only_the_signed_pages(tmp_path):
+    template_path = str(tmp_path / "packet.pdf")
+    with open(template_path, "wb") as f:
+        f.write(write_output(_uncompressed_writer(pages=30), {"compress": True}).getvalue())
+
+    signed = _sign_incrementally(template_path, 30)
+
+    assert original_revision_intact(signed, template_path)
+    # The page object, the overlay form and its font, two wrapper streams and the xref section
+    assert len(signed) - os.path.getsize(template_path) < 2000
+    reader = PdfReader(io.BytesIO(signed))
+    assert len(reader.pages) == 30
+    assert "SIGNED BY CLIENT" in reader.pages[29].extract_text()
+    assert "Page 29 line 49" in reader.pages[29].extract_text()
+    assert "SIGNED BY CLIENT" not in reader.pages[0].extract_text()
+
+
+def test_incremental_mode_extends_cross_reference_streams(tmp_path):
+    pikepdf = pytest.importorskip("pikepdf")
+    template_path = str(tmp_path / "packet.pdf")
+    with pikepdf.open(write_output(_uncompressed_writer(pages=3), {"compress": True})) as pdf:
+        pdf.save(template_path, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+    signed = _sign_incrementally(template_path, 2)
+
+    assert original_revision_intact(signed, template_path)
+    with pikepdf.open(io.BytesIO(signed)) as pdf:
+        # Pdf.check() in the pinned pikepdf 9.x; renamed check_pdf_syntax() in 10.x
+        check = getattr(pdf, "check", None) or pdf.check_pdf_syntax
+        assert check() == []
+    assert "SIGNED BY CLIENT" in PdfReader(io.BytesIO(signed)).pages[1].extract_text()
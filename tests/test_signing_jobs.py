@@ -0,0 +1,214 @@
+# ------------------------------------------------------------------------
+# File: test_signing_jobs.py
+# Location: /srv/apps/esign/tests/test_signing_jobs.py
+# Description:
+#     Tests for background signing jobs: one active job per request, stage
+#     events streamed (and resumed with Last-Event-ID) up to the per-process
+#     stream cap, and a submission that returns a job ID and completes in
+#     the background; with the Salesforce breaker open, the records update
+#     is deferred by token and replayed later. Uses the in-memory storage
+#     backend and the database configured by ESIGN_DATABASE_URL (skipped
+#     without one).
+# ------------------------------------------------------------------------
+
+import hashlib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+from app.db.models import Artifact, DeferredTask, SignatureRequest, SignatureStatus, SigningJob
+from app.core.signing_jobs import (
+    create_job, job_events, open_event_stream, set_event_stream_limit, JobProgress, STAGES, STATUS_COMPLETED,
+    STATUS_FAILED
+)
+from app.core.deferred import KIND_SALESFORCE_UPDATE, _handle_salesforce_update
+from app.core.resilience import CircuitOpenError, SALESFORCE
+from app.core.storage import MemoryStorage, set_storage
+from tests.test_signature_vector import PAYLOAD
+
+
+@pytest.fixture
+def storage():
+    memory = MemoryStorage()
+    set_storage(memory)
+    yield memory
+    set_storage(None)
+
+
+@pytest.fixture
+def delivered(storage):
+    session = get_session()
+    token = str(uuid.uuid4())
+    row = SignatureRequest(
+        client_name="Job Client",
+        client_email="jobs@example.com",
+        template_type="cea",
+        salesforce_case_id="CASE-JOBS",
+        token=token,
+        token_hash=hashlib.sha256(token.encode()).hexdigest(),
+        status=SignatureStatus.Delivered,
+        audit_log=[],
+        expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+    session.add(row)
+    session.commit()
+    yield row, token
+    session.rollback()
+    session.query(SigningJob).filter(SigningJob.signature_request_id == row.id).delete()
+    session.query(Artifact).filter(Artifact.signature_request_id == row.id).delete()
+    session.delete(row)
+    session.commit()
+
+
+def test_one_active_job_per_request(delivered):
+    row, _ = delivered
+    job, created = create_job(row.id)
+    again, created_again = create_job(row.id)
+    assert created and not created_again and again.id == job.id
+
+    JobProgress(job.id).fail("boom")
+    retry, created = create_job(row.id)
+    assert created and retry.id != job.id
+
+
+def test_stage_events_are_streamed_and_resumable(delivered):
+    row, _ = delivered
+    job, _ = create_job(row.id)
+    progress = JobProgress(job.id)
+    for stage in STAGES:
+        progress.start(stage)
+        progress.done(stage)
+    progress.complete("/v1/sign/final/token")
+
+    events = "".join(job_events(job.id, poll_seconds=0.01, stream_seconds=1))
+    assert events.count("event: stage") == len(STAGES)
+    assert "id: 4" in events
+    assert 'event: done\ndata: {"redirect_url": "/v1/sign/final/token"}' in events
+
+    resumed = "".join(job_events(job.id, last_event_id=3, poll_seconds=0.01, stream_seconds=1))
+    assert resumed.count("event: stage") == 1 and '"stage": "finalize"' in resumed
+
+
+@pytest.fixture
+def event_streams():
+    set_event_stream_limit(1)
+    yield
+    set_event_stream_limit(0)
+
+
+def test_submission_returns_a_job_and_completes_in_background(delivered, event_streams, monkeypatch):
+    import app.api.routes_signing as routes_signing
+
+    row, token = delivered
+    monkeypatch.setattr(routes_signing, "publish_to_team_folder", lambda key: (True, f"/esign/{key}"))
+    monkeypatch.setattr(routes_signing, "send_webhook_if_enabled", lambda *args, **kwargs: None)
+    monkeypatch.setattr(routes_signing, "find_envelope_id_by_token", lambda token: None)
+    app = Flask(__name__)
+    app.register_blueprint(routes_signing.signing_bp)
+    client = app.test_client()
+
+    response = client.post(f"/v1/sign/{token}", json={"signature_vector": PAYLOAD, "consent": True})
+    assert response.status_code == 202
+    job_id = response.json["job_id"]
+    assert response.json["events_url"] == f"/v1/sign/{token}/jobs/{job_id}/events"
+
+    # A retried submission attaches to the same job
+    retry = client.post(f"/v1/sign/{token}", json={"signature_vector": PAYLOAD, "consent": True})
+    assert retry.status_code in (202, 403)
+    if retry.status_code == 202:
+        assert retry.json["job_id"] == job_id
+
+    deadline = time.monotonic() + 60
+    state = client.get(response.json["status_url"]).json
+    while state["status"] not in (STATUS_COMPLETED, STATUS_FAILED) and time.monotonic() < deadline:
+        time.sleep(0.1)
+        state = client.get(response.json["status_url"]).json
+    assert state["status"] == STATUS_COMPLETED, state
+    assert [entry["stage"] for entry in state["stages"]] == list(STAGES)
+    assert state["redirect_url"] == f"/v1/sign/final/{token}"
+
+    events = client.get(response.json["events_url"])
+    assert events.mimetype == "text/event-stream"
+    assert b"event: done" in events.data
+    set_event_stream_limit(0)
+    assert client.get(response.json["events_url"]).status_code == 503
+
+    get_session().refresh(row)
+    assert row.status == SignatureStatus.Completed and row.pdf_path.startswith("signed/")
+    assert client.get(f"/v1/sign/{uuid.uuid4()}/jobs/{job_id}").status_code == 404
+
+
+def test_event_streams_are_capped_per_process(delivered, event_streams):
+    row, _ = delivered
+    job, _ = create_job(row.id)
+
+    first = open_event_stream(job.id)
+    assert first is not None
+    assert open_event_stream(job.id) is None
+    first.close()
+    second = open_event_stream(job.id)
+    assert second is not None
+    second.close()
+
+    set_event_stream_limit(0)
+    assert open_event_stream(job.id) is None
+
+
+def test_envelope_lookup_is_deferred_while_salesforce_is_unavailable(delivered, monkeypatch):
+    import app.api.routes_signing as routes_signing
+    import app.api.update_envelope_document as update_envelope_document
+
+    row, token = delivered
+
+    def circuit_open(token):
+        raise CircuitOpenError(SALESFORCE, "salesforce circuit is open")
+
+    monkeypatch.setattr(routes_signing, "publish_to_team_folder", lambda key: (True, f"/esign/{key}"))
+    monkeypatch.setattr(routes_signing, "send_webhook_if_enabled", lambda *args, **kwargs: None)
+    monkeypatch.setattr(routes_signing, "find_envelope_id_by_token", circuit_open)
+    monkeypatch.setattr(routes_signing, "update_envelope_document",
+                        lambda *args, **kwargs: pytest.fail("no envelope to update yet"))
+    app = Flask(__name__)
+    app.register_blueprint(routes_signing.signing_bp)
+    client = app.test_client()
+
+    response = client.post(f"/v1/sign/{token}", json={"signature_vector": PAYLOAD, "consent": True})
+    assert response.status_code == 202
+    deadline = time.monotonic() + 60
+    state = client.get(response.json["status_url"]).json
+    while state["status"] not in (STATUS_COMPLETED, STATUS_FAILED) and time.monotonic() < deadline:
+        time.sleep(0.1)
+        state = client.get(response.json["status_url"]).json
+    assert state["status"] == STATUS_COMPLETED, state
+
+    session = get_session()
+    tasks = [task for task in session.query(DeferredTask).filter(DeferredTask.kind == KIND_SALESFORCE_UPDATE)
+             if task.payload.get("token") == token]
+    try:
+        assert len(tasks) == 1
+        payload = tasks[0].payload
+        assert "record_id" not in payload
+        assert payload["updates"]["Envelope_Status__c"] == "Completed"
+
+        # Replayed once Salesforce is back: the envelope is looked up by token, then updated and remembered
+        updated = []
+        monkeypatch.setattr(update_envelope_document, "find_envelope_id_by_token", lambda token: "a0Xdeferred")
+        monkeypatch.setattr(update_envelope_document, "update_envelope_document",
+                            lambda updates, record_id: updated.append((record_id, updates)))
+        _handle_salesforce_update(payload)
+
+        assert updated == [("a0Xdeferred", payload["updates"])]
+        session.refresh(row)
+        assert row.envelope_document_id == "a0Xdeferred"
+    finally:
+        for task in tasks:
+            session.delete(task)
+        session.commit()
@@ -0,0 +1,122 @@
+# ------------------------------------------------------------------------
+# File: test_storage.py
+# Location: /srv/apps/esign/tests/test_storage.py
+# Description:
+#     Unit tests for the artifact storage backends in storage.py. The
+#     local and in-memory backends share one contract test; key handling,
+#     legacy absolute paths and conditional/range serving are checked
+#     separately.
+# ------------------------------------------------------------------------
+
+import hashlib
+import io
+import os
+
+import pytest
+from flask import Flask
+
+from app.core.storage import (
+    ArtifactNotFoundError,
+    LocalStorage,
+    MemoryStorage,
+    artifact_key,
+    normalize_key,
+    send_artifact,
+)
+
+PDF_BYTES = b"%PDF-1.4\n" + os.urandom(200 * 1024) + b"\n%%EOF\n"
+
+
+@pytest.fixture(params=["local", "memory"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path))
+    return MemoryStorage()
+
+
+def test_put_open_stat_delete(storage):
+    key = "signed/20250615/doe_cea_ab12cd34_signed.pdf"
+    artifact = storage.put(key, io.BytesIO(PDF_BYTES))
+
+    assert artifact.key == key
+    assert artifact.size == len(PDF_BYTES)
+    assert artifact.sha256 == hashlib.sha256(PDF_BYTES).hexdigest()
+    assert artifact.backend == storage.name
+    assert artifact.filename == "doe_cea_ab12cd34_signed.pdf"
+
+    with storage.open(key) as stream:
+        assert stream.read() == PDF_BYTES
+    assert storage.stat(key).size == len(PDF_BYTES)
+    with storage.local_copy(key) as path:
+        with open(path, "rb") as f:
+            assert f.read() == PDF_BYTES
+
+    assert storage.delete(key)
+    assert storage.stat(key) is None
+    assert not storage.delete(key)
+    with pytest.raises(ArtifactNotFoundError):
+        storage.open(key)
+
+
+def test_put_replaces_existing_artifact(storage):
+    storage.put_bytes("preview/a.pdf", b"first")
+    storage.put_bytes("preview/a.pdf", b"second")
+    assert storage.read_bytes("preview/a.pdf") == b"second"
+
+
+def test_keys_cannot_escape_the_root():
+    assert normalize_key("/signed//20250615/./a.pdf") == "signed/20250615/a.pdf"
+    assert artifact_key("preview", "20250615", "a.pdf") == "preview/20250615/a.pdf"
+    for bad in ("", "..", "../etc/passwd", "signed/../../x"):
+        with pytest.raises(ValueError):
+            normalize_key(bad)
+
+
+def test_local_storage_maps_legacy_absolute_paths(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.put_bytes("signed/20250615/a.pdf", b"data")
+
+    legacy_path = os.path.join(str(tmp_path), "signed", "20250615", "a.pdf")
+    assert storage.key_for(legacy_path) == "signed/20250615/a.pdf"
+    assert storage.local_path(storage.key_for(legacy_path)) == legacy_path
+    with pytest.raises(ValueError):
+        storage.key_for("/etc/passwd")
+
+
+@pytest.fixture
+def client(storage):
+    artifact = storage.put_bytes("signed/20250615/a.pdf", PDF_BYTES)
+    app = Flask(__name__)
+
+    @app.route("/a.pdf")
+    def serve():
+        return send_artifact(artifact.key, storage=storage, sha256=artifact.sha256, size=artifact.size,
+                             last_modified=artifact.modified_at, max_age=60)
+
+    return app.test_client()
+
+
+def test_send_artifact_sets_validators_and_private_caching(client):
+    response = client.get("/a.pdf")
+    assert response.status_code == 200
+    assert response.data == PDF_BYTES
+    assert response.headers["ETag"] == f'"{hashlib.sha256(PDF_BYTES).hexdigest()}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert "Last-Modified" in response.headers
+    cache_control = response.headers["Cache-Control"]
+    assert "private" in cache_control and "max-age=60" in cache_control and "public" not in cache_control
+
+
+def test_send_artifact_answers_conditional_requests_with_304(client):
+    etag = client.get("/a.pdf").headers["ETag"]
+    response = client.get("/a.pdf", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get("/a.pdf", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_send_artifact_serves_byte_ranges(client):
+    response = client.get("/a.pdf", headers={"Range": "bytes=1000-1999"})
+    assert response.status_code == 206
+    assert response.data == PDF_BYTES[1000:2000]
+    assert response.headers["Content-Range"] == f"bytes 1000-1999/{len(PDF_BYTES)}"
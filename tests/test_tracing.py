@@ -0,0 +1,177 @@
+# ------------------------------------------------------------------------
+# File: test_tracing.py
+# Location: /srv/apps/esign/tests/test_tracing.py
+# Description:
+#     Tests for request tracing: trace IDs from traceparent / X-Request-ID
+#     headers, child spans from stage and dependency timers, propagation
+#     into background threads and queued webhooks, log correlation, the
+#     JSON-lines and OTLP export formats, rotation of the span file, and
+#     export from a forked worker.
+# ------------------------------------------------------------------------
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask
+
+from app.core import tracing
+from app.core.metrics import StageTimer
+from app.core.resilience import Dependency, CircuitBreaker, Bulkhead
+from app.integrations.ringcentral.dispatcher import WebhookMessage
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+@pytest.fixture
+def exported(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.SpanExporter(mode=tracing.EXPORT_JSONL, path=str(path))
+    tracing.set_exporter(exporter)
+
+    def spans():
+        exporter.flush()
+        return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+    yield spans
+    tracing.set_exporter(None)
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    tracing.install_tracing(app)
+    pool = ThreadPoolExecutor(max_workers=1)
+    dependency = Dependency("trace_dep", CircuitBreaker("trace_dep"), Bulkhead("trace_dep"))
+
+    def fetch():
+        return "fetched"
+
+    def background():
+        with tracing.span("background_job"):
+            return tracing.current_trace_id()
+
+    @app.route("/v1/sign/<token>", methods=["POST"])
+    def sign(token):
+        timer = StageTimer("test_sign")
+        dependency.call(fetch)
+        timer.lap("generate")
+        background_trace = pool.submit(tracing.bind_context(background)).result()
+        return {"trace_id": tracing.current_trace_id(), "background": background_trace}
+
+    yield app.test_client()
+    pool.shutdown()
+
+
+def test_request_span_tree(client, exported):
+    response = client.post("/v1/sign/secret-token")
+    trace_id = response.json["trace_id"]
+    assert response.headers["X-Request-ID"] == trace_id
+    assert response.headers["traceparent"].startswith(f"00-{trace_id}-")
+    assert response.json["background"] == trace_id
+
+    spans = {span["name"]: span for span in exported() if span["trace_id"] == trace_id}
+    root = spans["POST /v1/sign/<token>"]
+    assert root["parent_id"] is None and root["kind"] == "server"
+    assert root["attributes"]["http.status_code"] == 200
+    for name in ("test_sign.generate", "trace_dep.fetch", "background_job"):
+        assert spans[name]["parent_id"] == root["span_id"]
+    assert spans["trace_dep.fetch"]["kind"] == "client"
+    assert not any("secret-token" in json.dumps(span) for span in spans.values())
+
+
+def test_trace_id_from_headers(client, exported):
+    parent = "00f067aa0ba902b7"
+    response = client.post("/v1/sign/t", headers={"traceparent": f"00-{TRACE_ID}-{parent}-01"})
+    assert response.json["trace_id"] == TRACE_ID
+    root = next(span for span in exported() if span["name"] == "POST /v1/sign/<token>")
+    assert root["parent_id"] == parent
+
+    response = client.post("/v1/sign/t", headers={"X-Request-ID": "req-123"})
+    assert response.headers["X-Request-ID"] == "req-123"
+    again = client.post("/v1/sign/t", headers={"X-Request-ID": "req-123"})
+    assert response.json["trace_id"] == again.json["trace_id"]
+
+    # An unsampled incoming trace is propagated but not exported
+    before = len(exported())
+    client.post("/v1/sign/t", headers={"traceparent": f"00-{TRACE_ID}-{parent}-00"})
+    assert len(exported()) == before
+
+
+def test_invalid_traceparent_starts_new_trace():
+    assert tracing.parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+    assert tracing.parse_traceparent("garbage") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_webhook_message_carries_trace(exported):
+    with tracing.span("enqueue") as active:
+        message = WebhookMessage("https://example.com/hook", "text")
+    assert message.trace.trace_id == active.trace_id and message.trace.span_id == active.span_id
+    assert WebhookMessage("https://example.com/hook", "text").trace is None
+
+
+def test_log_lines_carry_trace_id(caplog, exported):
+    tracing.install_log_correlation()
+    with caplog.at_level(logging.INFO, logger="apps.esign.test_tracing"):
+        with tracing.span("logged") as active:
+            logging.getLogger("apps.esign.test_tracing").info("inside")
+        logging.getLogger("apps.esign.test_tracing").info("outside")
+    inside, outside = caplog.records[-2:]
+    assert inside.getMessage() == f"[trace={active.trace_id}] inside" and inside.trace_id == active.trace_id
+    assert outside.getMessage() == "outside" and outside.trace_id == ""
+
+
+def test_otlp_payload(exported):
+    with tracing.span("outer", note="x"):
+        with pytest.raises(ValueError):
+            with tracing.span("inner", tracing.KIND_CLIENT, count=3):
+                raise ValueError("bad")
+    spans = exported()
+    payload = tracing.otlp_payload(spans)
+    otlp = {span["name"]: span for span in payload["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+    assert otlp["inner"]["parentSpanId"] == otlp["outer"]["spanId"]
+    assert otlp["inner"]["kind"] == 3
+    assert otlp["inner"]["status"] == {"code": 2, "message": "ValueError: bad"}
+    assert {"key": "count", "value": {"intValue": "3"}} in otlp["inner"]["attributes"]
+    assert "parentSpanId" not in otlp["outer"]
+
+
+def test_export_is_off_by_default_and_the_span_file_rotates(tmp_path, monkeypatch):
+    monkeypatch.delenv("ESIGN_TRACE_EXPORT", raising=False)
+    assert tracing.SpanExporter().mode == tracing.EXPORT_NONE
+
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.SpanExporter(mode=tracing.EXPORT_JSONL, path=str(path), max_bytes=1000, backups=2)
+    for batch in range(5):
+        exporter._append([{"trace_id": TRACE_ID, "batch": batch, "pad": "x" * 600}])
+
+    # Each batch past the cap starts a new file; only two old files are kept
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert [json.loads(line)["batch"] for line in path.read_text().splitlines()] == [4]
+    assert [json.loads(line)["batch"] for line in (tmp_path / "traces.jsonl.2").read_text().splitlines()] == [0, 1]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_worker_exports_its_own_spans(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.SpanExporter(mode=tracing.EXPORT_JSONL, path=str(path), flush_seconds=3600)
+    tracing.set_exporter(exporter)
+    try:
+        with tracing.span("parent_span"):
+            pass
+
+        pid = os.fork()
+        if pid == 0:
+            with tracing.span("child_span"):
+                pass
+            os._exit(0 if exporter.flush() == 1 else 1)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        tracing.set_exporter(None)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["child_span"]
+    assert exporter.flush() == 1
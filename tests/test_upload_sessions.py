@@ -0,0 +1,169 @@
+# ------------------------------------------------------------------------
+# File: test_upload_sessions.py
+# Location: /srv/apps/esign/tests/test_upload_sessions.py
+# Description:
+#     Tests for chunked Dropbox uploads against the in-process Dropbox fake
+#     (the official SDK pointed at it over HTTPS): a single large packet via
+#     start/append/finish, many files committed with one finish_batch,
+#     resuming after a chunk whose answer was lost, the throughput gain of
+#     concurrent workers under injected per-request latency, DropboxStorage
+#     streaming large artifacts through a session, and more concurrent
+#     signed uploads than Dropbox bulkhead slots.
+# ------------------------------------------------------------------------
+
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("dropbox")
+pytest.importorskip("utils.dropbox_api.upload_file", reason="shared Dropbox utilities not installed")
+
+from app.core.resilience import reset_dependencies
+from app.core.deferred import _handle_dropbox_upload
+from app.core.storage import DropboxStorage, LocalStorage, set_storage
+from app.integrations.dropbox.upload import SessionUploader
+from tests.fakes.dropbox import FakeDropbox
+from tests.fakes.server import FaultProfile
+from tests.fakes.tls import generate_self_signed_cert
+
+CHUNK = 256 * 1024
+ROOT = "/Potential Clients/_esign/20010101"
+
+
+@pytest.fixture
+def fake_dropbox(monkeypatch):
+    import dropbox.dropbox_client
+
+    cert_path, key_path = generate_self_signed_cert(tempfile.mkdtemp(prefix="esign-upload-"))
+    with FakeDropbox(FaultProfile(), tls=(cert_path, key_path)) as fake:
+        monkeypatch.setattr(dropbox.dropbox_client, "API_HOST", fake.host)
+        monkeypatch.setattr(dropbox.dropbox_client, "API_CONTENT_HOST", fake.host)
+        monkeypatch.setenv("REQUESTS_CA_BUNDLE", cert_path)
+        monkeypatch.setenv("DROPBOX_ESIGN_FOLDER_ID", fake.shared_folder_id)
+        monkeypatch.setenv("ESIGN_DROPBOX_MAX_CONCURRENT", "8")
+        reset_dependencies()
+        yield fake
+    reset_dependencies()
+
+
+@pytest.fixture
+def packets(tmp_path):
+    """Eight 600 KB packets: three chunks each."""
+    paths = []
+    for number in range(8):
+        path = tmp_path / f"packet{number}_signed.pdf"
+        path.write_bytes(b"%PDF-1.4\n" + os.urandom(600 * 1024))
+        paths.append(str(path))
+    return paths
+
+
+def remote(fake, dropbox_path: str) -> bytes:
+    return fake.files[(fake.shared_folder_id, dropbox_path.lower())]["data"]
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_large_packet_uses_a_chunked_session(fake_dropbox, packets):
+    uploader = SessionUploader(chunk_size=CHUNK, threshold=CHUNK)
+
+    metadata = uploader.upload(packets[0], f"{ROOT}/packet0_signed.pdf")
+
+    assert metadata.path_display == f"{ROOT}/packet0_signed.pdf"
+    assert remote(fake_dropbox, metadata.path_display) == read(packets[0])
+    assert fake_dropbox.upload_calls["start"] == 1
+    assert fake_dropbox.upload_calls["append"] == 2
+    assert fake_dropbox.upload_calls["finish"] == 1
+    assert fake_dropbox.upload_calls["upload"] == 0
+
+
+def test_small_files_use_a_single_call(fake_dropbox, tmp_path):
+    path = tmp_path / "small_signed.pdf"
+    path.write_bytes(b"%PDF-1.4\n" + b"x" * 1000)
+
+    SessionUploader(chunk_size=CHUNK, threshold=CHUNK).upload(str(path), f"{ROOT}/small_signed.pdf")
+
+    assert fake_dropbox.upload_calls["upload"] == 1 and fake_dropbox.upload_calls["start"] == 0
+
+
+def test_many_files_are_committed_in_one_batch(fake_dropbox, packets):
+    uploader = SessionUploader(chunk_size=CHUNK, workers=4)
+
+    results = uploader.upload_many([(path, f"{ROOT}/{os.path.basename(path)}") for path in packets])
+
+    assert fake_dropbox.upload_calls["finish_batch"] == 1
+    for path in packets:
+        metadata = results[f"{ROOT}/{os.path.basename(path)}"]
+        assert remote(fake_dropbox, metadata.path_display) == read(path)
+    metrics = uploader.metrics.snapshot()
+    assert metrics["files"] == 8 and metrics["failed"] == 0 and metrics["chunks"] == 24
+    assert metrics["bytes"] == sum(os.path.getsize(path) for path in packets)
+
+
+def test_lost_chunk_acknowledgement_resumes_from_the_server_offset(fake_dropbox, packets):
+    fake_dropbox.drop_append_acks = 1
+    uploader = SessionUploader(chunk_size=CHUNK, threshold=CHUNK)
+
+    metadata = uploader.upload(packets[0], f"{ROOT}/packet0_signed.pdf")
+
+    assert remote(fake_dropbox, metadata.path_display) == read(packets[0])
+    assert uploader.metrics.snapshot()["resumed"] == 1
+
+
+def test_storage_put_streams_large_artifacts_through_a_session(fake_dropbox, packets):
+    storage = DropboxStorage("/Potential Clients/_esign", session_chunk_size=CHUNK)
+    data = read(packets[0])
+
+    stored = storage.put("signed/20010101/packet0_signed.pdf", io.BytesIO(data))
+
+    assert remote(fake_dropbox, stored.location) == data
+    assert stored.size == len(data)
+    assert fake_dropbox.upload_calls["start"] == 1
+    assert fake_dropbox.upload_calls["append"] == 1
+    assert fake_dropbox.upload_calls["finish"] == 1
+    assert fake_dropbox.upload_calls["upload"] == 0
+
+    storage.put("signed/20010101/small_signed.pdf", io.BytesIO(b"%PDF-1.4\n" + b"x" * 1000))
+    assert fake_dropbox.upload_calls["upload"] == 1
+
+
+def test_concurrent_workers_raise_throughput(fake_dropbox, packets):
+    fake_dropbox.faults.latency = 0.03
+    items = [(path, f"{ROOT}/{os.path.basename(path)}") for path in packets]
+
+    sequential = SessionUploader(chunk_size=CHUNK, workers=1)
+    sequential.upload_many(items)
+    concurrent = SessionUploader(chunk_size=CHUNK, workers=4)
+    concurrent.upload_many(items)
+
+    assert concurrent.metrics.snapshot()["files"] == sequential.metrics.snapshot()["files"] == 8
+    assert concurrent.metrics.snapshot()["mb_per_s"] > 1.5 * sequential.metrics.snapshot()["mb_per_s"]
+
+
+def test_more_concurrent_uploads_than_bulkhead_slots(fake_dropbox, packets, monkeypatch):
+    # Chunk calls are guarded one by one: an upload never holds a slot its own chunks need
+    fake_dropbox.faults.latency = 0.02
+    monkeypatch.setenv("ESIGN_DROPBOX_MAX_CONCURRENT", "2")
+    monkeypatch.setenv("ESIGN_DROPBOX_MAX_WAIT", "5")
+    monkeypatch.setenv("ESIGN_DROPBOX_CHUNK_MB", str(CHUNK / (1024 * 1024)))
+    monkeypatch.setenv("ESIGN_DROPBOX_SESSION_THRESHOLD_MB", str(CHUNK / (1024 * 1024)))
+    reset_dependencies()
+    storage = LocalStorage(os.path.dirname(packets[0]))
+    set_storage(storage)
+    try:
+        keys = [os.path.basename(path) for path in packets[:4]]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda key: _handle_dropbox_upload({"storage_key": key}), keys))
+    finally:
+        set_storage(None)
+
+    assert fake_dropbox.upload_calls["start"] == 4 and fake_dropbox.upload_calls["finish"] == 4
+    for path in packets[:4]:
+        matches = [entry["data"] for (_, name), entry in fake_dropbox.files.items()
+                   if name.endswith("/" + os.path.basename(path).lower())]
+        assert matches == [read(path)]
@@ -0,0 +1,131 @@
+# ------------------------------------------------------------------------
+# File: test_view_counter.py
+# Location: /srv/apps/esign/tests/test_view_counter.py
+# Description:
+#     Tests for buffered view counting: views are kept in memory until a
+#     flush adds them to view_counters, sampling keeps an estimate, and
+#     repeat views of the final review page do not rewrite the request.
+#     A forked worker counts its own views from the first one. Uses the
+#     database configured by ESIGN_DATABASE_URL (skipped without one).
+# ------------------------------------------------------------------------
+
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+try:
+    from app.db.session import get_session
+except Exception:
+    pytest.skip("Database not available", allow_module_level=True)
+
+from app.db.models import SignatureRequest, SignatureStatus, ViewCounter
+from app.core.view_counter import ViewCounterBuffer, PAGE_SIGN, PAGE_FINAL_REVIEW
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "templates"))
+
+
+@pytest.fixture
+def completed():
+    session = get_session()
+    token = str(uuid.uuid4())
+    row = SignatureRequest(
+        client_name="View Client",
+        client_email="views@example.com",
+        template_type="cea",
+        salesforce_case_id="CASE-VIEWS",
+        token=token,
+        token_hash=hashlib.sha256(token.encode()).hexdigest(),
+        status=SignatureStatus.Completed,
+        pdf_path="signed/20010101/client_signed.pdf",
+        audit_log=[{"event": "signed", "timestamp": "2001-01-01T00:00:00+00:00"}],
+        expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+    session.add(row)
+    session.commit()
+    yield row, token
+    session.rollback()
+    session.query(ViewCounter).filter(ViewCounter.signature_request_id == row.id).delete()
+    session.delete(row)
+    session.commit()
+
+
+def counts(signature_request_id) -> dict:
+    rows = get_session().query(ViewCounter).filter(ViewCounter.signature_request_id == signature_request_id)
+    return {row.page: row.views for row in rows}
+
+
+def test_views_are_buffered_until_flushed(completed, monkeypatch):
+    row, _ = completed
+    buffer = ViewCounterBuffer(sample_rate=1, flush_seconds=3600)
+    for _ in range(3):
+        buffer.record(row.id, PAGE_SIGN)
+    buffer.record(row.id, PAGE_FINAL_REVIEW)
+    assert counts(row.id) == {}
+
+    assert buffer.flush() == 2
+    assert counts(row.id) == {PAGE_SIGN: 3, PAGE_FINAL_REVIEW: 1}
+
+    buffer.record(row.id, PAGE_SIGN)
+    buffer.flush()
+    get_session().expire_all()
+    assert counts(row.id) == {PAGE_SIGN: 4, PAGE_FINAL_REVIEW: 1}
+    assert buffer.flush() == 0
+
+
+def test_sampled_views_are_weighted(completed, monkeypatch):
+    row, _ = completed
+    buffer = ViewCounterBuffer(sample_rate=0.25, flush_seconds=3600)
+    draws = iter([0.1, 0.9, 0.9, 0.9, 0.2, 0.9, 0.9, 0.9])
+    monkeypatch.setattr("app.core.view_counter.random.random", lambda: next(draws))
+    for _ in range(9):
+        buffer.record(row.id, PAGE_SIGN)  # the first view is always counted, then 2 of 8 sampled
+    buffer.flush()
+    assert counts(row.id) == {PAGE_SIGN: 9}
+
+
+def test_repeat_final_review_views_do_not_write(completed, monkeypatch):
+    import app.api.routes_signing as routes_signing
+
+    row, token = completed
+    recorded = []
+    monkeypatch.setattr(routes_signing, "record_view", lambda *args: recorded.append(args))
+    app = Flask(__name__, template_folder=TEMPLATE_DIR)
+    app.register_blueprint(routes_signing.signing_bp)
+    client = app.test_client()
+
+    assert client.get(f"/v1/sign/final/{token}").status_code == 200
+    session = get_session()
+    session.refresh(row)
+    updated_at = row.updated_at
+    assert [event["event"] for event in row.audit_log] == ["signed", "final_review_viewed"]
+
+    for _ in range(3):
+        assert client.get(f"/v1/sign/final/{token}").status_code == 200
+    session.refresh(row)
+    assert row.updated_at == updated_at and len(row.audit_log) == 2
+    assert recorded == [(row.id, PAGE_FINAL_REVIEW)] * 4
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_worker_keeps_its_first_view(completed):
+    row, _ = completed
+    buffer = ViewCounterBuffer(sample_rate=1, flush_seconds=3600)
+    buffer.record(row.id, PAGE_SIGN)  # the parent's buffer, flushed by the parent
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        buffer.record(row.id, PAGE_FINAL_REVIEW)
+        views = {page: entry[0] for (_, page, _), entry in buffer._counts.items()}
+        os.write(write_end, repr(views).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        child_views = pipe.read()
+    os.waitpid(pid, 0)
+
+    assert child_views == repr({PAGE_FINAL_REVIEW: 1.0})
+    assert {page for (_, page, _) in buffer._counts} == {PAGE_SIGN}
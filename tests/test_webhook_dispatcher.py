@@ -0,0 +1,158 @@
+# ------------------------------------------------------------------------
+# File: test_webhook_dispatcher.py
+# Location: /srv/apps/esign/tests/test_webhook_dispatcher.py
+# Description:
+#     Tests for the background RingCentral webhook dispatcher against the
+#     in-process fake webhook receiver: non-blocking enqueue, coalescing
+#     (by type, never for failures), retry after injected failures, the
+#     bounded queue and digest mode.
+# ------------------------------------------------------------------------
+
+import os
+import time
+
+import pytest
+
+from app.core.resilience import reset_dependencies
+from app.integrations.ringcentral.dispatcher import (
+    WebhookDispatcher, NOTIFY_INITIATED, NOTIFY_SIGNED_UPLOADED, NOTIFY_UPLOAD_FAILED
+)
+from tests.fakes.server import FaultProfile
+from tests.fakes.webhook import FakeWebhookReceiver
+
+
+@pytest.fixture
+def receiver():
+    reset_dependencies()
+    fake = FakeWebhookReceiver(FaultProfile()).start()
+    yield fake
+    fake.stop()
+    reset_dependencies()
+
+
+def test_enqueue_returns_before_delivery(receiver):
+    receiver.faults.latency = 0.5
+    dispatcher = WebhookDispatcher(workers=1)
+    started = time.monotonic()
+    assert dispatcher.enqueue("hello", receiver.webhook_url)
+    assert time.monotonic() - started < 0.1
+
+    assert dispatcher.flush(timeout=5)
+    assert receiver.messages == [{"text": "hello"}]
+    assert dispatcher.snapshot()["delivered"] == 1
+    dispatcher.shutdown()
+
+
+def test_waiting_messages_are_coalesced_into_one_post(receiver):
+    receiver.faults.latency = 0.3
+    dispatcher = WebhookDispatcher(workers=1, batch_size=10)
+    dispatcher.enqueue("message 0", receiver.webhook_url)
+    time.sleep(0.05)
+    # Queued while the first post is held up by latency
+    for i in range(1, 5):
+        dispatcher.enqueue(f"message {i}", receiver.webhook_url)
+    assert dispatcher.flush(timeout=5)
+
+    texts = "\n\n".join(m["text"] for m in receiver.messages)
+    assert [f"message {i}" in texts for i in range(5)] == [True] * 5
+    assert len(receiver.messages) < 5
+    assert dispatcher.snapshot()["delivered"] == 5
+    dispatcher.shutdown()
+
+
+def test_only_routine_messages_of_one_type_are_coalesced(receiver):
+    receiver.faults.latency = 0.3
+    dispatcher = WebhookDispatcher(workers=1, batch_size=10)
+    dispatcher.enqueue("first", receiver.webhook_url)
+    time.sleep(0.05)
+    # Queued while the first post is held up by latency
+    dispatcher.enqueue("initiated 1", receiver.webhook_url, kind=NOTIFY_INITIATED)
+    dispatcher.enqueue("upload failed 1", receiver.webhook_url, kind=NOTIFY_UPLOAD_FAILED)
+    dispatcher.enqueue("initiated 2", receiver.webhook_url, kind=NOTIFY_INITIATED)
+    dispatcher.enqueue("upload failed 2", receiver.webhook_url, kind=NOTIFY_UPLOAD_FAILED)
+    dispatcher.enqueue("uploaded 1", receiver.webhook_url, kind=NOTIFY_SIGNED_UPLOADED)
+    assert dispatcher.flush(timeout=5)
+
+    assert sorted(m["text"] for m in receiver.messages) == [
+        "first", "initiated 1\n\ninitiated 2", "upload failed 1", "upload failed 2", "uploaded 1",
+    ]
+    dispatcher.shutdown()
+
+
+def test_failed_posts_are_retried(receiver):
+    receiver.faults.error_rate = 1.0
+    dispatcher = WebhookDispatcher(workers=1, backoff_base=0.05, backoff_max=0.1, max_attempts=5)
+    dispatcher.enqueue("retry me", receiver.webhook_url)
+    time.sleep(0.2)
+    receiver.faults.error_rate = 0.0
+    assert dispatcher.flush(timeout=5)
+
+    snapshot = dispatcher.snapshot()
+    assert receiver.messages == [{"text": "retry me"}]
+    assert snapshot["retries"] >= 1
+    assert snapshot["failed_posts"] >= 1
+    assert snapshot["dropped_after_retries"] == 0
+    dispatcher.shutdown()
+
+
+def test_full_queue_drops_instead_of_blocking(receiver):
+    receiver.faults.latency = 0.5
+    dispatcher = WebhookDispatcher(workers=1, max_queue_size=2, batch_size=1)
+    results = [dispatcher.enqueue(f"m{i}", receiver.webhook_url) for i in range(6)]
+
+    assert results.count(False) >= 1
+    assert dispatcher.snapshot()["dropped_queue_full"] == results.count(False)
+    dispatcher.shutdown(timeout=0.1)
+
+
+def test_digest_mode_coalesces_routine_notifications(receiver):
+    dispatcher = WebhookDispatcher(workers=1, digest_window=0.3)
+    for i in range(3):
+        dispatcher.enqueue(f"📝 New document ready for signing:\nName: Client {i}", receiver.webhook_url,
+                           kind=NOTIFY_INITIATED, summary=f"Client {i}")
+    assert receiver.messages == []
+    assert dispatcher.flush(timeout=5)
+
+    assert len(receiver.messages) == 1
+    text = receiver.messages[0]["text"]
+    assert text.startswith("📝 New documents ready for signing: 3 in the last 0.3s")
+    assert "• Client 0" in text and "• Client 2" in text
+    assert dispatcher.snapshot()["digests_sent"] == 1
+    dispatcher.shutdown()
+
+
+def test_digest_mode_sends_failures_immediately(receiver):
+    dispatcher = WebhookDispatcher(workers=1, digest_window=5)
+    dispatcher.enqueue("routine", receiver.webhook_url, kind=NOTIFY_SIGNED_UPLOADED)
+    dispatcher.enqueue("❌ Document signed but Dropbox upload failed", receiver.webhook_url, kind=NOTIFY_UPLOAD_FAILED)
+
+    deadline = time.monotonic() + 2
+    while not receiver.messages and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert receiver.messages == [{"text": "❌ Document signed but Dropbox upload failed"}]
+    assert dispatcher.snapshot()["open_digests"] == {NOTIFY_SIGNED_UPLOADED: 1}
+
+    # A lone notification in its window is sent unchanged once the window closes (here: at shutdown)
+    dispatcher.shutdown(timeout=2)
+    assert receiver.messages[-1] == {"text": "routine"}
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_fork_discards_the_parents_queue_and_digests(receiver):
+    dispatcher = WebhookDispatcher(workers=1, digest_window=5)
+    dispatcher.enqueue("held", receiver.webhook_url, kind=NOTIFY_INITIATED)
+    assert dispatcher.snapshot()["open_digests"] == {NOTIFY_INITIATED: 1}
+
+    pid = os.fork()
+    if pid == 0:
+        # A pre-forked worker: the parent's digest is not inherited, its own is sent at shutdown
+        dispatcher.enqueue("child", receiver.webhook_url, kind=NOTIFY_INITIATED)
+        snapshot = dispatcher.snapshot()
+        dispatcher.shutdown(timeout=2)
+        os._exit(0 if snapshot["open_digests"] == {NOTIFY_INITIATED: 1} and snapshot["queue_depth"] == 1 else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert receiver.messages == [{"text": "child"}]
+    dispatcher.shutdown(timeout=2)
+    assert receiver.messages == [{"text": "child"}, {"text": "held"}]